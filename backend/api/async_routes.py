@@ -0,0 +1,108 @@
+import json
+import logging
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from api.direct_question import answer_event, answer_response, parse_question_request
+from api.problem_solving import parse_solve_request, solution_event, solution_response
+from models.response import parse_exclude
+from services.rate_limiter import PRIORITY_INTERACTIVE, RateLimitExceeded
+from utils.streaming import STREAM_HEADERS, STREAM_MIMETYPES, aiter_stream, get_stream_format
+
+logger = logging.getLogger(__name__)
+
+# ASGI模式下调用大模型的接口，路径、参数和响应格式与对应的Flask蓝图路由相同（共用蓝图中的参数读取和响应构建），
+# 但等待上游响应时不占用线程；其余接口仍由Flask应用处理
+async_router = APIRouter()
+
+
+async def read_json_body(request: Request):
+    """读取JSON请求体，格式无效时返回空字典
+
+    作为路由的依赖在路由执行之前运行，请求体和字段的大小限制与Flask路由相同，
+    超过上限时抛出PayloadTooLarge，由应用的异常处理器返回413。
+    """
+    body = await request.app.state.request_limits.aread_body(request)
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _stream(events, stream_format, request):
+    """把(事件名称, 事件数据)的异步生成器包装为流式响应"""
+    return StreamingResponse(
+        aiter_stream(events, stream_format, getattr(request.state, 'request_id', None)),
+        media_type=STREAM_MIMETYPES[stream_format],
+        headers=STREAM_HEADERS
+    )
+
+
+@async_router.post('/api/direct-question/ask')
+async def ask_question(request: Request, data: dict = Depends(read_json_body)):
+    """直接向千问API提问并获取回答（异步版本）"""
+    try:
+        question, error = parse_question_request(data)
+        if error:
+            body, status = error
+            return JSONResponse(body, status_code=status)
+
+        qianwen_service = request.app.state.services.qianwen_service
+        stream_format = get_stream_format(data, request.headers.get('accept'))
+        if stream_format:
+            # 在开始流式输出之前取得限流配额，超出配额时由应用的异常处理器返回429
+            answers = await qianwen_service.astream_response(question, priority=PRIORITY_INTERACTIVE,
+                                                             semantic_key=(question, ''))
+
+            async def events():
+                async for event in answers:
+                    yield answer_event(event, question)
+            return _stream(events(), stream_format, request)
+
+        response = await qianwen_service.agenerate_response(question, priority=PRIORITY_INTERACTIVE,
+                                                            semantic_key=(question, ''))
+
+        exclude = parse_exclude(data.get('exclude'), request.query_params.get('exclude'))
+        body, status = answer_response(question, response, exclude)
+        return JSONResponse(body, status_code=status)
+
+    except RateLimitExceeded:
+        # 交给应用的异常处理器返回429
+        raise
+    except Exception as e:
+        logger.error("处理问题时发生错误: %s", e)
+        return JSONResponse({"error": "处理请求时发生错误"}, status_code=500)
+
+
+@async_router.post('/api/problem-solving/solve')
+async def solve_problem(request: Request, data: dict = Depends(read_json_body)):
+    """解决编程问题（异步版本）"""
+    try:
+        # 推断语言需要扫描代码上下文，在线程池中执行，不阻塞事件循环
+        params, error = await run_in_threadpool(parse_solve_request, data)
+        if error:
+            body, status = error
+            return JSONResponse(body, status_code=status)
+
+        solver = request.app.state.services.problem_solver
+        stream_format = get_stream_format(data, request.headers.get('accept'))
+        if stream_format:
+            solutions = await solver.asolve_stream(**params)
+
+            async def events():
+                async for event in solutions:
+                    yield solution_event(event, params['problem_description'])
+            return _stream(events(), stream_format, request)
+
+        solution = await solver.asolve(**params)
+
+        exclude = parse_exclude(data.get('exclude'), request.query_params.get('exclude'))
+        return JSONResponse(solution_response(params['problem_description'], solution, exclude), status_code=200)
+
+    except RateLimitExceeded:
+        # 交给应用的异常处理器返回429
+        raise
+    except Exception as e:
+        logger.error("解决问题错误: %s", e)
+        return JSONResponse({"error": "处理请求时发生错误"}, status_code=500)
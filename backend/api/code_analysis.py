@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
 import logging
 import time
-from services.code_analyzer import CodeAnalyzer
-from models.response import AnalysisResponse
+from services.registry import get_services
+from models.response import AnalysisResponse, parse_exclude
 from utils.validators import validate_code_input
 
 logger = logging.getLogger(__name__)
@@ -14,12 +14,12 @@ def analyze_code():
     """分析代码并提供反馈"""
     request_id = f"req-{int(time.time())}"
     start_time = time.time()
-    logger.info(f"[{request_id}] 收到代码分析请求")
+    logger.info("[%s] 收到代码分析请求", request_id)
     
     try:
         data = request.get_json()
         if not data:
-            logger.warning(f"[{request_id}] 无效的请求数据格式")
+            logger.warning("[%s] 无效的请求数据格式", request_id)
             return jsonify({
                 "error": "无效的请求数据格式，请提供JSON数据",
                 "request_id": request_id
@@ -28,7 +28,7 @@ def analyze_code():
         # 验证输入
         validation_result = validate_code_input(data)
         if not validation_result['valid']:
-            logger.warning(f"[{request_id}] 输入验证失败: {validation_result['message']}")
+            logger.warning("[%s] 输入验证失败: %s", request_id, validation_result['message'])
             return jsonify({
                 "error": validation_result['message'],
                 "all_errors": validation_result.get('all_errors', [validation_result['message']]),
@@ -40,15 +40,15 @@ def analyze_code():
         context = data.get('context', '')
         filename = data.get('filename', '')
         
-        logger.info(f"[{request_id}] 分析{language}代码，长度: {len(code)}字符")
+        logger.info("[%s] 分析%s代码，长度: %s字符", request_id, language, len(code))
         
         # 分析代码
-        analyzer = CodeAnalyzer(max_workers=4)
+        analyzer = get_services().code_analyzer
         analysis_result = analyzer.analyze(code, language, context)
         
         # 检查分析结果中是否有错误
         if 'error' in analysis_result:
-            logger.warning(f"[{request_id}] 代码分析过程中发生错误: {analysis_result['error']}")
+            logger.warning("[%s] 代码分析过程中发生错误: %s", request_id, analysis_result['error'])
             return jsonify({
                 "warning": "代码分析过程中发生错误，结果可能不完整",
                 "error_details": analysis_result['error'],
@@ -67,17 +67,18 @@ def analyze_code():
         )
         
         elapsed_time = time.time() - start_time
-        logger.info(f"[{request_id}] 代码分析完成，耗时: {elapsed_time:.2f}秒")
+        logger.info("[%s] 代码分析完成，耗时: %.2f秒", request_id, elapsed_time)
         
+        exclude = parse_exclude(data.get('exclude'), request.args.get('exclude'))
         return jsonify({
-            "result": response.to_dict(),
+            "result": response.to_dict(exclude=exclude),
             "request_id": request_id,
             "processing_time": f"{elapsed_time:.2f}秒"
         }), 200
         
     except Exception as e:
         elapsed_time = time.time() - start_time
-        logger.error(f"[{request_id}] 代码分析错误: {str(e)}", exc_info=True)
+        logger.error("[%s] 代码分析错误: %s", request_id, e, exc_info=True)
         return jsonify({
             "error": "处理请求时发生错误",
             "error_details": str(e),
@@ -100,11 +101,86 @@ def analyze_complexity():
         language = data.get('language', 'python')
         
         # 分析代码复杂度
-        analyzer = CodeAnalyzer()
+        analyzer = get_services().code_analyzer
         complexity_result = analyzer.analyze_complexity(code, language)
         
         return jsonify(complexity_result), 200
         
     except Exception as e:
-        logger.error(f"代码复杂度分析错误: {str(e)}")
-        return jsonify({"error": "处理请求时发生错误"}), 500
\ No newline at end of file
+        logger.error("代码复杂度分析错误: %s", e)
+        return jsonify({"error": "处理请求时发生错误"}), 500
+
+@code_analysis_bp.route('/batch', methods=['POST'])
+def analyze_batch():
+    """批量分析多个文件或整个仓库
+    
+    请求体为JSON：{"files": [{"filename": "...", "code": "...", "language": "..."}], ...}，
+    language可省略，根据文件名推断；或为multipart/form-data，archive字段上传zip或tar压缩包。
+    可选参数max_concurrency（同时执行的任务数，不超过服务端上限）和summary_only（只返回每个文件的摘要）。
+    """
+    request_id = f"req-{int(time.time())}"
+    start_time = time.time()
+    logger.info("[%s] 收到批量代码分析请求", request_id)
+    
+    try:
+        batch_analyzer = get_services().batch_analyzer
+        
+        if 'archive' in request.files:
+            options = request.form
+            upload = request.files['archive']
+            archive_data = upload.read(batch_analyzer.max_upload_size + 1)
+            if len(archive_data) > batch_analyzer.max_upload_size:
+                logger.warning("[%s] 上传的压缩包过大", request_id)
+                return jsonify({
+                    "error": f"压缩包大小超过{batch_analyzer.max_upload_size // 1000000}MB",
+                    "request_id": request_id
+                }), 413
+        else:
+            options = request.get_json(silent=True)
+            if not options or not isinstance(options, dict):
+                logger.warning("[%s] 无效的请求数据格式", request_id)
+                return jsonify({
+                    "error": "无效的请求数据格式，请提供包含files的JSON数据或上传archive压缩包",
+                    "request_id": request_id
+                }), 400
+        
+        try:
+            max_concurrency = int(options.get('max_concurrency') or 0) or None
+        except (TypeError, ValueError):
+            max_concurrency = None
+        summary_only = str(options.get('summary_only', False)).lower() == 'true'
+        
+        if 'archive' in request.files:
+            result = batch_analyzer.analyze_archive(archive_data, max_concurrency, summary_only)
+        else:
+            result = batch_analyzer.analyze_files(options.get('files'), max_concurrency, summary_only)
+        
+        if not result['success']:
+            logger.warning("[%s] 批量分析请求无效: %s", request_id, result['error'])
+            return jsonify({
+                "error": result['error'],
+                "request_id": request_id
+            }), 400
+        
+        elapsed_time = time.time() - start_time
+        logger.info("[%s] 批量分析完成，%s个文件，耗时: %.2f秒", request_id, len(result['files']), elapsed_time)
+        
+        return jsonify({
+            "result": {
+                "files": result['files'],
+                "skipped": result['skipped'],
+                "aggregate": result['aggregate']
+            },
+            "request_id": request_id,
+            "processing_time": f"{elapsed_time:.2f}秒"
+        }), 200
+        
+    except Exception as e:
+        elapsed_time = time.time() - start_time
+        logger.error("[%s] 批量分析错误: %s", request_id, e, exc_info=True)
+        return jsonify({
+            "error": "处理请求时发生错误",
+            "error_details": str(e),
+            "request_id": request_id,
+            "processing_time": f"{elapsed_time:.2f}秒"
+        }), 500
\ No newline at end of file
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 import logging
-from services.suggestion_generator import SuggestionGenerator
-from models.response import SuggestionResponse
+from services.registry import get_services
+from models.response import SuggestionResponse, parse_exclude
 from utils.validators import validate_code_input
 
 logger = logging.getLogger(__name__)
@@ -24,7 +24,7 @@ def suggest_improvements():
         improvement_type = data.get('improvement_type', 'general')  # general, performance, readability, security
         
         # 生成建议
-        generator = SuggestionGenerator()
+        generator = get_services().suggestion_generator
         suggestions = generator.generate_suggestions(code, language, improvement_type)
         
         # 构建响应
@@ -35,10 +35,12 @@ def suggest_improvements():
             improvement_points=suggestions.get('improvement_points')
         )
         
-        return jsonify(response.to_dict()), 200
+        # 客户端可以通过exclude省略已经持有的original_code等字段
+        exclude = parse_exclude(data.get('exclude'), request.args.get('exclude'))
+        return jsonify(response.to_dict(exclude=exclude)), 200
         
     except Exception as e:
-        logger.error(f"生成代码建议错误: {str(e)}")
+        logger.error("生成代码建议错误: %s", e)
         return jsonify({"error": "处理请求时发生错误"}), 500
 
 @code_suggestion_bp.route('/examples', methods=['POST'])
@@ -55,11 +57,11 @@ def provide_examples():
             return jsonify({"error": "缺少必要参数 'concept'"}), 400
         
         # 生成示例
-        generator = SuggestionGenerator()
+        generator = get_services().suggestion_generator
         examples = generator.generate_examples(concept, language, context)
         
         return jsonify(examples), 200
         
     except Exception as e:
-        logger.error(f"生成代码示例错误: {str(e)}")
+        logger.error("生成代码示例错误: %s", e)
         return jsonify({"error": "处理请求时发生错误"}), 500
\ No newline at end of file
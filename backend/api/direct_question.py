@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 import logging
-from services.qianwen_service import QianwenService
-from models.response import SolutionResponse
+from services.rate_limiter import PRIORITY_INTERACTIVE, RateLimitExceeded
+from services.registry import get_services
+from models.response import SolutionResponse, parse_exclude
+from utils.streaming import get_stream_format, stream_response
 
 logger = logging.getLogger(__name__)
 
@@ -9,32 +11,88 @@ direct_question_bp = Blueprint('direct_question', __name__)
 
 @direct_question_bp.route('/ask', methods=['POST'])
 def ask_question():
-    """直接向千问API提问并获取回答"""
+    """直接向千问API提问并获取回答
+    
+    请求体中stream为true（或Accept: text/event-stream）时以SSE逐段返回回答，
+    stream为"ndjson"时以每行一个JSON对象的分块输出返回。
+    """
     try:
         data = request.get_json()
         
-        question = data.get('question')
-        
-        if not question:
-            return jsonify({"error": "缺少必要参数 'question'"}), 400
+        question, error = parse_question_request(data)
+        if error:
+            body, status = error
+            return jsonify(body), status
         
         # 调用千问API获取回答
-        qianwen_service = QianwenService()
-        response = qianwen_service.generate_response(question)
-        
-        if not response['success']:
-            return jsonify({"error": response.get('error', '调用千问API失败')}), 500
+        qianwen_service = get_services().qianwen_service
+        stream_format = get_stream_format(data, request.headers.get('Accept'))
+        if stream_format:
+            # 在开始流式输出之前取得限流配额，超出配额时由应用的错误处理器返回429
+            events = qianwen_service.stream_response(question, priority=PRIORITY_INTERACTIVE,
+                                                     semantic_key=(question, ''))
+            return stream_response(
+                (answer_event(event, question) for event in events),
+                stream_format,
+                getattr(g, 'request_id', None)
+            )
         
-        # 构建响应
-        solution_response = SolutionResponse(
-            problem=question,
-            explanation=response.get('content', ''),
-            solution_code='',  # 直接问答不需要代码
-            additional_resources=[]
-        )
+        response = qianwen_service.generate_response(question, priority=PRIORITY_INTERACTIVE,
+                                                     semantic_key=(question, ''))
         
-        return jsonify(solution_response.to_dict()), 200
+        exclude = parse_exclude(data.get('exclude'), request.args.get('exclude'))
+        body, status = answer_response(question, response, exclude)
+        return jsonify(body), status
         
+    except RateLimitExceeded:
+        # 交给应用的错误处理器返回429
+        raise
     except Exception as e:
-        logger.error(f"处理问题时发生错误: {str(e)}")
-        return jsonify({"error": "处理请求时发生错误"}), 500
\ No newline at end of file
+        logger.error("处理问题时发生错误: %s", e)
+        return jsonify({"error": "处理请求时发生错误"}), 500
+
+def parse_question_request(data):
+    """读取提问请求的参数，Flask路由和ASGI模式下的异步路由共用
+    
+    Args:
+        data (dict): 请求体
+        
+    Returns:
+        tuple: (问题, 错误)，缺少参数时问题为None，错误为(响应体, 状态码)
+    """
+    question = data.get('question')
+    if not question:
+        return None, ({"error": "缺少必要参数 'question'"}, 400)
+    return question, None
+
+def answer_response(question, response, exclude=None):
+    """把千问服务的回答转换为(响应体, 状态码)
+    
+    Args:
+        question (str): 问题
+        response (dict): generate_response的结果
+        exclude (set): 不返回的字段
+        
+    Returns:
+        tuple: (响应体, 状态码)
+    """
+    if not response['success']:
+        return {"error": response.get('error', '调用千问API失败')}, 500
+    return _answer(question, response).to_dict(exclude=exclude), 200
+
+def answer_event(event, question):
+    """把千问服务的一个流式事件转换为发送给客户端的(事件名称, 事件数据)"""
+    if event['event'] == 'delta':
+        return 'delta', {'content': event['content']}
+    if event['event'] == 'done':
+        return 'done', _answer(question, event['result']).to_dict()
+    return 'error', {'error': event['result'].get('error', '调用千问API失败')}
+
+def _answer(question, result):
+    """根据千问服务的回答构建响应"""
+    return SolutionResponse(
+        problem=question,
+        explanation=result.get('content', ''),
+        solution_code='',  # 直接问答不需要代码
+        additional_resources=[]
+    )
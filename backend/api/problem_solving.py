@@ -1,7 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 import logging
-from services.problem_solver import ProblemSolver
-from models.response import SolutionResponse
+from services.rate_limiter import RateLimitExceeded
+from services.registry import get_services
+from models.response import SolutionResponse, parse_exclude
+from utils.streaming import get_stream_format, stream_response
+from utils.validators import detect_language
 
 logger = logging.getLogger(__name__)
 
@@ -9,35 +12,41 @@ problem_solving_bp = Blueprint('problem_solving', __name__)
 
 @problem_solving_bp.route('/solve', methods=['POST'])
 def solve_problem():
-    """解决编程问题"""
+    """解决编程问题
+    
+    请求体中stream为true（或Accept: text/event-stream）时以SSE逐段返回大模型生成的内容，
+    stream为"ndjson"时以每行一个JSON对象的分块输出返回，最后的done事件包含完整的解决方案。
+    """
     try:
         data = request.get_json()
         
-        problem_description = data.get('problem_description')
-        code_context = data.get('code_context', '')
-        language = data.get('language', 'python')
-        use_qianwen = data.get('use_qianwen', False)
-        use_custom_api = data.get('use_custom_api', False)
-        
-        if not problem_description:
-            return jsonify({"error": "缺少必要参数 'problem_description'"}), 400
+        params, error = parse_solve_request(data)
+        if error:
+            body, status = error
+            return jsonify(body), status
         
         # 解决问题
-        solver = ProblemSolver()
-        solution = solver.solve(problem_description, code_context, language, use_qianwen, use_custom_api)
+        solver = get_services().problem_solver
+        stream_format = get_stream_format(data, request.headers.get('Accept'))
+        if stream_format:
+            # 在开始流式输出之前取得限流配额，超出配额时由应用的错误处理器返回429
+            events = solver.solve_stream(**params)
+            return stream_response(
+                (solution_event(event, params['problem_description']) for event in events),
+                stream_format,
+                getattr(g, 'request_id', None)
+            )
         
-        # 构建响应
-        response = SolutionResponse(
-            problem=problem_description,
-            solution_code=solution.get('solution_code'),
-            explanation=solution.get('explanation'),
-            additional_resources=solution.get('additional_resources')
-        )
+        solution = solver.solve(**params)
         
-        return jsonify(response.to_dict()), 200
+        exclude = parse_exclude(data.get('exclude'), request.args.get('exclude'))
+        return jsonify(solution_response(params['problem_description'], solution, exclude)), 200
         
+    except RateLimitExceeded:
+        # 交给应用的错误处理器返回429
+        raise
     except Exception as e:
-        logger.error(f"解决问题错误: {str(e)}")
+        logger.error("解决问题错误: %s", e)
         return jsonify({"error": "处理请求时发生错误"}), 500
 
 @problem_solving_bp.route('/explain', methods=['POST'])
@@ -54,11 +63,64 @@ def explain_concept():
             return jsonify({"error": "缺少必要参数 'concept'"}), 400
         
         # 解释概念
-        solver = ProblemSolver()
+        solver = get_services().problem_solver
         explanation = solver.explain_concept(concept, language, detail_level)
         
         return jsonify(explanation), 200
         
     except Exception as e:
-        logger.error(f"解释概念错误: {str(e)}")
-        return jsonify({"error": "处理请求时发生错误"}), 500
\ No newline at end of file
+        logger.error("解释概念错误: %s", e)
+        return jsonify({"error": "处理请求时发生错误"}), 500
+
+def parse_solve_request(data):
+    """读取解决问题请求的参数，Flask路由和ASGI模式下的异步路由共用
+    
+    未指定语言时根据代码上下文推断，代码上下文很长时推断需要一定时间，异步路由应在线程池中调用。
+    
+    Args:
+        data (dict): 请求体
+        
+    Returns:
+        tuple: (参数, 错误)，参数为传给ProblemSolver.solve的关键字参数；
+            缺少参数时参数为None，错误为(响应体, 状态码)
+    """
+    problem_description = data.get('problem_description')
+    if not problem_description:
+        return None, ({"error": "缺少必要参数 'problem_description'"}, 400)
+    
+    code_context = data.get('code_context', '')
+    return {
+        'problem_description': problem_description,
+        'code_context': code_context,
+        # 未指定语言时根据代码上下文推断
+        'language': data.get('language') or detect_language(code_context),
+        'use_qianwen': data.get('use_qianwen', False),
+        'use_custom_api': data.get('use_custom_api', False)
+    }, None
+
+def solution_response(problem_description, solution, exclude=None):
+    """把问题解决器的解决方案转换为响应体
+    
+    Args:
+        problem_description (str): 问题描述
+        solution (dict): 解决方案
+        exclude (set): 不返回的字段
+        
+    Returns:
+        dict: 响应体
+    """
+    response = SolutionResponse(
+        problem=problem_description,
+        solution_code=solution.get('solution_code'),
+        explanation=solution.get('explanation'),
+        additional_resources=solution.get('additional_resources')
+    )
+    return response.to_dict(exclude=exclude)
+
+def solution_event(event, problem_description):
+    """把问题解决器的一个流式事件转换为发送给客户端的(事件名称, 事件数据)"""
+    if event['event'] == 'delta':
+        return 'delta', {'content': event['content']}
+    if event['event'] == 'done':
+        return 'done', solution_response(problem_description, event['solution'])
+    return 'error', {'error': event['result'].get('error', '生成解决方案失败')}
@@ -1,89 +1,80 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, current_app, request, jsonify, g
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 import os
 import logging
 import time
-import json
-from logging.handlers import RotatingFileHandler
 import traceback
+from functools import partial
 
 # 导入API路由
 from api.code_analysis import code_analysis_bp
 from api.code_suggestion import code_suggestion_bp
 from api.problem_solving import problem_solving_bp
 from api.direct_question import direct_question_bp
+from services.http_client import get_pool_stats, warm_up_pool
+from services.registry import ServiceRegistry
+from services.rate_limiter import RateLimitExceeded, retry_after_header
+from services.resilience import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, get_retry_budget
+from services.semantic_cache import get_semantic_cache
+from services.single_flight import get_single_flight
+from utils.compression import ResponseCompressor
+from utils.json_provider import InstrumentedJSONProvider
+from utils.log_config import body_preview, configure_logging
+from utils.request_limits import RequestLimits
+from utils.metrics import CONTENT_TYPE, REQUEST_LATENCY, registry as metrics_registry
 
-# 创建日志目录
-log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-os.makedirs(log_dir, exist_ok=True)
-
-# 配置日志
-log_file = os.path.join(log_dir, 'app.log')
-log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] [%(name)s] - %(message)s')
-
-# 文件处理器 - 使用RotatingFileHandler进行日志轮转
-file_handler = RotatingFileHandler(log_file, maxBytes=10*1024*1024, backupCount=5)
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.INFO)
-
-# 控制台处理器
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
 
-# 配置根日志记录器
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
+def warm_up_upstreams(app):
+    """预热上游大模型服务的HTTP连接池，避免首个请求承担TCP/TLS握手开销
 
-logger = logging.getLogger(__name__)
+    由服务器启动时调用（python app.py和ASGI应用的lifespan），导入app时不执行，
+    测试、基准测试脚本和分析进程池的子进程不会向上游发出请求。
+    连接池按进程创建，需要在实际处理请求的进程中调用。
 
-app = Flask(__name__)
-CORS(app)  # 启用跨域资源共享
+    Args:
+        app (Flask): create_app创建的应用
 
-# 注册蓝图
-app.register_blueprint(code_analysis_bp, url_prefix='/api/code-analysis')
-app.register_blueprint(code_suggestion_bp, url_prefix='/api/code-suggestion')
-app.register_blueprint(problem_solving_bp, url_prefix='/api/problem-solving')
-app.register_blueprint(direct_question_bp, url_prefix='/api/direct-question')
+    Returns:
+        list: 预热线程列表，HTTP_POOL_WARMUP为false时为空
+    """
+    if os.getenv('HTTP_POOL_WARMUP', 'true').lower() != 'true':
+        return []
+    return warm_up_pool(
+        app.extensions['services'].upstream_urls(),
+        connections_per_host=int(os.getenv('HTTP_POOL_WARMUP_CONNECTIONS', '2'))
+    )
 
 # 请求前钩子 - 记录请求开始时间和生成请求ID
-@app.before_request
 def before_request():
     g.start_time = time.time()
     g.request_id = f"req-{int(time.time())}-{os.urandom(4).hex()}"
     
-    # 记录请求信息
-    request_data = ''
-    if request.is_json:
-        try:
-            request_data = json.dumps(request.get_json(), ensure_ascii=False)
-            if len(request_data) > 1000:  # 限制日志中请求数据的长度
-                request_data = request_data[:1000] + '... [截断]'
-        except Exception:
-            request_data = '[无法解析JSON]'
-    
-    logger.info(f"[{g.request_id}] 收到请求: {request.method} {request.path} - IP: {request.remote_addr}")
-    if request_data:
-        logger.debug(f"[{g.request_id}] 请求数据: {request_data}")
+    logger.info("[%s] 收到请求: %s %s - IP: %s", g.request_id, request.method, request.path, request.remote_addr)
+    # 超大的请求体在解析之前拒绝
+    current_app.extensions['request_limits'].enforce(request)
+    # 只在开启DEBUG级别时截取请求体，大请求不再为一条通常被丢弃的日志整体序列化
+    if request.is_json and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[%s] 请求数据: %s", g.request_id, body_preview(request))
 
 # 请求后钩子 - 记录响应时间
-@app.after_request
 def after_request(response):
     if hasattr(g, 'start_time'):
         elapsed_time = time.time() - g.start_time
         response.headers['X-Request-ID'] = g.request_id
         response.headers['X-Response-Time'] = f"{elapsed_time:.3f}s"
+        # 按路由模板而不是实际路径统计，避免路径参数产生大量标签
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed_time, method=request.method, route=route, status=response.status_code)
         
         # 记录响应信息
         status_code = response.status_code
         log_level = logging.WARNING if status_code >= 400 else logging.INFO
-        logger.log(log_level, f"[{g.request_id}] 响应: {status_code} - 耗时: {elapsed_time:.3f}秒")
+        logger.log(log_level, "[%s] 响应: %s - 耗时: %.3f秒", g.request_id, status_code, elapsed_time)
     
-    return response
+    return current_app.extensions['compressor'].compress(response, request.accept_encodings)
 
-@app.route('/', methods=['GET'])
 def index():
     """根路由，提供API信息"""
     return jsonify({
@@ -94,39 +85,118 @@ def index():
             "代码分析": "/api/code-analysis/analyze",
             "代码建议": "/api/code-suggestion/suggest",
             "问题解决": "/api/problem-solving/solve",
-            "直接提问": "/api/direct-question/ask"
+            "直接提问": "/api/direct-question/ask",
+            "指标": "/metrics"
         }
     })
 
-@app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
-    return jsonify({"status": "ok", "message": "服务正常运行"})
+    services = current_app.extensions['services']
+    single_flight = get_single_flight()
+    semantic_cache = get_semantic_cache()
+    return jsonify({
+        "status": "ok",
+        "message": "服务正常运行",
+        "http_pool": get_pool_stats(),
+        "analyzer": services.code_analyzer.stats(),
+        "single_flight": single_flight.stats() if single_flight else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "upstream": {
+            "qianwen": services.qianwen_service.retry_policy.stats(),
+            "custom": services.custom_api_service.retry_policy.stats(),
+            "retry_budget": get_retry_budget().stats(),
+            "router": services.provider_router.stats(),
+            "rate_limits": {
+                service.provider_name: service.rate_limiter.stats()
+                for service in (services.qianwen_service, services.custom_api_service)
+                if service.rate_limiter is not None
+            }
+        }
+    })
+
+# 熔断器状态在指标中的取值
+_BREAKER_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+def _component_metrics(services):
+    """导出时读取缓存、重试、熔断、限流和连接池等组件的统计信息"""
+    llm_services = (services.qianwen_service, services.custom_api_service)
+    families = []
+
+    caches = []
+    response_cache = services.qianwen_service.response_cache
+    if response_cache is not None:
+        caches.append(('response', response_cache.stats()))
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        caches.append(('semantic', semantic_cache.stats()))
+    unit_cache = services.code_analyzer.unit_cache
+    if unit_cache is not None:
+        caches.append(('analysis_unit', unit_cache.stats()))
+    families.append(('cache_hits_total', 'counter', '缓存命中次数',
+                     [({'cache': name}, stats['hits']) for name, stats in caches]))
+    families.append(('cache_misses_total', 'counter', '缓存未命中次数',
+                     [({'cache': name}, stats['misses']) for name, stats in caches]))
+    families.append(('cache_entries', 'gauge', '缓存条目数',
+                     [({'cache': name}, stats['entries']) for name, stats in caches]))
+
+    single_flight = get_single_flight()
+    if single_flight is not None:
+        stats = single_flight.stats()
+        families.append(('llm_coalesced_calls_total', 'counter', '合并到其他相同请求的大模型调用次数',
+                         [({}, stats['coalesced_calls'])]))
+
+    families.append(('circuit_breaker_state', 'gauge', '熔断器状态：0关闭，1半开，2打开', [
+        ({'upstream': service.provider_name}, _BREAKER_STATE_VALUES[service.retry_policy.breaker.state])
+        for service in llm_services
+    ]))
+    budget = get_retry_budget().stats()
+    families.append(('retry_budget_retries', 'gauge', '重试预算窗口内的重试次数', [({}, budget['retries'])]))
+    families.append(('retry_budget_rejected_total', 'counter', '因重试预算不足而放弃的重试次数',
+                     [({}, budget['rejected_retries'])]))
+
+    limiters = [(service.provider_name, service.rate_limiter.stats())
+                for service in llm_services if service.rate_limiter is not None]
+    families.append(('rate_limit_queued', 'gauge', '等待上游配额的请求数',
+                     [({'upstream': name}, stats['queued']) for name, stats in limiters]))
+    families.append(('rate_limit_rejected_total', 'counter', '超出上游配额被拒绝的请求数',
+                     [({'upstream': name}, stats['rejected']) for name, stats in limiters]))
+
+    pool = get_pool_stats()
+    families.append(('http_pool_checkouts_total', 'counter', '从连接池取出连接的次数', [({}, pool['checkouts'])]))
+    families.append(('http_pool_new_connections_total', 'counter', '新建的上游连接数',
+                     [({}, pool['new_connections'])]))
+    families.append(('http_pool_max_wait_seconds', 'gauge', '从连接池取出连接的最长等待时间（秒）',
+                     [({}, pool['max_wait_ms'] / 1000)]))
+    return families
+
+
+def metrics():
+    """以Prometheus文本格式导出各路由和各处理阶段的延迟直方图以及组件的统计信息"""
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
 
-@app.errorhandler(400)
 def bad_request(error):
     request_id = getattr(g, 'request_id', 'unknown')
-    logger.warning(f"[{request_id}] 错误的请求: {error}")
+    logger.warning("[%s] 错误的请求: %s", request_id, error)
     return jsonify({
         "error": "错误的请求",
         "message": str(error),
         "request_id": request_id
     }), 400
 
-@app.errorhandler(404)
 def not_found(error):
     request_id = getattr(g, 'request_id', 'unknown')
-    logger.warning(f"[{request_id}] 资源未找到: {request.path}")
+    logger.warning("[%s] 资源未找到: %s", request_id, request.path)
     return jsonify({
         "error": "资源未找到",
         "path": request.path,
         "request_id": request_id
     }), 404
 
-@app.errorhandler(405)
 def method_not_allowed(error):
     request_id = getattr(g, 'request_id', 'unknown')
-    logger.warning(f"[{request_id}] 方法不允许: {request.method} {request.path}")
+    logger.warning("[%s] 方法不允许: %s %s", request_id, request.method, request.path)
     return jsonify({
         "error": "方法不允许",
         "method": request.method,
@@ -134,22 +204,46 @@ def method_not_allowed(error):
         "request_id": request_id
     }), 405
 
-@app.errorhandler(500)
+def request_entity_too_large(error):
+    request_id = getattr(g, 'request_id', 'unknown')
+    logger.warning("[%s] 请求体过大: %s", request_id, error.description)
+    body = {
+        "error": "请求体过大",
+        "message": error.description,
+        "request_id": request_id
+    }
+    if getattr(error, 'limit', None) is not None:
+        body["limit"] = error.limit
+    if getattr(error, 'field', None):
+        body["field"] = error.field
+    return jsonify(body), 413
+
+def rate_limit_exceeded(error):
+    request_id = getattr(g, 'request_id', 'unknown')
+    logger.warning("[%s] 请求被限流: %s", request_id, error)
+    response = jsonify({
+        "error": "请求过多",
+        "message": str(error),
+        "retry_after": error.retry_after,
+        "request_id": request_id
+    })
+    response.headers['Retry-After'] = retry_after_header(error)
+    return response, 429
+
 def server_error(error):
     request_id = getattr(g, 'request_id', 'unknown')
-    logger.error(f"[{request_id}] 服务器错误: {error}")
-    logger.error(f"[{request_id}] 错误详情: {traceback.format_exc()}")
+    logger.error("[%s] 服务器错误: %s", request_id, error)
+    logger.error("[%s] 错误详情: %s", request_id, traceback.format_exc())
     return jsonify({
         "error": "服务器内部错误",
         "message": str(error),
         "request_id": request_id
     }), 500
 
-@app.errorhandler(Exception)
 def unhandled_exception(error):
     request_id = getattr(g, 'request_id', 'unknown')
-    logger.error(f"[{request_id}] 未处理的异常: {error}")
-    logger.error(f"[{request_id}] 异常详情: {traceback.format_exc()}")
+    logger.error("[%s] 未处理的异常: %s", request_id, error)
+    logger.error("[%s] 异常详情: %s", request_id, traceback.format_exc())
     return jsonify({
         "error": "服务器内部错误",
         "message": "发生了未处理的异常",
@@ -157,7 +251,59 @@ def unhandled_exception(error):
         "request_id": request_id
     }), 500
 
+def create_app():
+    """创建Flask应用
+
+    配置日志，创建服务容器，注册蓝图、请求钩子、错误处理器和指标采集函数。
+    请求体限制和响应压缩器保存在app.extensions中，ASGI应用与它共用。
+
+    Returns:
+        Flask: 应用实例
+    """
+    # 配置日志：经队列由后台线程写入logs/app.log和控制台
+    configure_logging(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs'))
+
+    app = Flask(__name__)
+    app.json = InstrumentedJSONProvider(app)  # 安装了orjson时用它序列化，并记录序列化的耗时
+    CORS(app)  # 启用跨域资源共享
+    app.extensions['compressor'] = ResponseCompressor.from_env()  # 按Accept-Encoding压缩较大的响应
+    app.extensions['request_limits'] = RequestLimits.from_env()  # 在路由读取请求体之前限制请求体和字段的大小
+
+    # 创建服务容器，所有请求共用同一组长生命周期的服务实例
+    services = ServiceRegistry()
+    services.init_app(app)
+
+    # 注册蓝图
+    app.register_blueprint(code_analysis_bp, url_prefix='/api/code-analysis')
+    app.register_blueprint(code_suggestion_bp, url_prefix='/api/code-suggestion')
+    app.register_blueprint(problem_solving_bp, url_prefix='/api/problem-solving')
+    app.register_blueprint(direct_question_bp, url_prefix='/api/direct-question')
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.add_url_rule('/', view_func=index, methods=['GET'])
+    app.add_url_rule('/api/health', view_func=health_check, methods=['GET'])
+    app.add_url_rule('/metrics', view_func=metrics, methods=['GET'])
+
+    app.register_error_handler(400, bad_request)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(405, method_not_allowed)
+    app.register_error_handler(RequestEntityTooLarge, request_entity_too_large)
+    app.register_error_handler(RateLimitExceeded, rate_limit_exceeded)
+    app.register_error_handler(500, server_error)
+    app.register_error_handler(Exception, unhandled_exception)
+
+    # 导出最近创建的应用的组件统计信息，替换之前的应用注册的采集函数
+    metrics_registry.register_collector(partial(_component_metrics, services), name='components')
+    return app
+
+# 以python app.py启动时，代码分析进程池以spawn方式启动的工作进程会以__mp_main__的名义重新执行本文件，
+# 工作进程只需要分析模块，不创建应用，也不重复配置日志和创建服务
+if __name__ != '__mp_main__':
+    app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
-    logger.info(f"启动服务器在 http://localhost:{port}")
+    logger.info("启动服务器在 http://localhost:%s", port)
+    warm_up_upstreams(app)
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""ASGI入口
+
+使用uvicorn启动：
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+调用大模型的接口（/api/direct-question/ask、/api/problem-solving/solve）由异步路由处理，
+上游请求通过共享的异步HTTP客户端发出，一个进程可以同时等待大量上游响应；
+其余接口交给原有的Flask应用，在线程池中执行。同步的Flask入口（python app.py）仍然可用。
+"""
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app import app as flask_app, warm_up_upstreams
+from api.async_routes import async_router
+from services.async_http_client import close_async_http_client
+from services.rate_limiter import RateLimitExceeded, retry_after_header
+from utils.request_limits import PayloadTooLarge
+from utils.metrics import REQUEST_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 每个工作进程启动时预热自己的连接池
+    warm_up_upstreams(flask_app)
+    yield
+    await close_async_http_client()
+
+
+app = FastAPI(title='AI代码助手API服务', lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+# 与Flask应用共用同一个服务容器，缓存和规则等状态在两条路径之间共享
+app.state.services = flask_app.extensions['services']
+# 异步路由读取请求体时使用与Flask应用相同的大小限制
+app.state.request_limits = flask_app.extensions['request_limits']
+app.include_router(async_router)
+app.mount('/', WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_WSGI_WORKERS', '10'))))
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, error: RateLimitExceeded):
+    """超出上游配额时返回429，与Flask应用的错误处理器一致"""
+    request_id = getattr(request.state, 'request_id', 'unknown')
+    logger.warning("[%s] 请求被限流: %s", request_id, error)
+    return JSONResponse({
+        "error": "请求过多",
+        "message": str(error),
+        "retry_after": error.retry_after,
+        "request_id": request_id
+    }, status_code=429, headers={'Retry-After': retry_after_header(error)})
+
+
+@app.exception_handler(PayloadTooLarge)
+async def payload_too_large(request: Request, error: PayloadTooLarge):
+    """请求体或字段超过上限时返回413，与Flask应用的错误处理器一致"""
+    request_id = getattr(request.state, 'request_id', 'unknown')
+    logger.warning("[%s] 请求体过大: %s", request_id, error.description)
+    body = {
+        "error": "请求体过大",
+        "message": error.description,
+        "request_id": request_id,
+        "limit": error.limit
+    }
+    if error.field:
+        body["field"] = error.field
+    return JSONResponse(body, status_code=413)
+
+
+@app.middleware('http')
+async def request_context(request: Request, call_next):
+    """为异步路由记录请求日志、请求耗时指标并设置请求ID和响应时间头（Flask路由由其自身的钩子处理）"""
+    start_time = time.time()
+    request.state.request_id = f"req-{int(start_time)}-{os.urandom(4).hex()}"
+    response = await call_next(request)
+    if 'X-Request-ID' not in response.headers:
+        elapsed_time = time.time() - start_time
+        response.headers['X-Request-ID'] = request.state.request_id
+        response.headers['X-Response-Time'] = f"{elapsed_time:.3f}s"
+        route = request.scope.get('route')
+        REQUEST_LATENCY.observe(elapsed_time, method=request.method, route=route.path if route else 'unmatched',
+                                status=response.status_code)
+        log_level = logging.WARNING if response.status_code >= 400 else logging.INFO
+        logger.log(log_level, "[%s] %s %s 响应: %s - 耗时: %.3f秒", request.state.request_id, request.method,
+                   request.url.path, response.status_code, elapsed_time)
+    return response
@@ -0,0 +1,10 @@
+"""性能基准测试
+
+在backend目录下运行：
+
+    python -m benchmarks.run_benchmarks            # 与基线比较，性能退化超过阈值时返回非0
+    python -m benchmarks.run_benchmarks --update-baseline
+
+代码分析器直接在进程内调用；HTTP接口通过Flask测试客户端调用，大模型服务指向本地的桩服务器，
+不消耗真实的API配额。
+"""
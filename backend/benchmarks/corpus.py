@@ -0,0 +1,188 @@
+"""基准测试使用的代码语料
+
+按固定的随机种子生成Python和JavaScript源码，大小从1KB到MAX_CODE_LENGTH，
+另外包含超长行、深层嵌套和超大文档字符串等病态输入。同一个种子每次生成相同的语料。
+"""
+import random
+from utils.validators import MAX_CODE_LENGTH
+
+# 常规语料的大小（字符数）
+CORPUS_SIZES = (1024, 10 * 1024, 50 * 1024, MAX_CODE_LENGTH)
+QUICK_CORPUS_SIZES = (1024, 10 * 1024)
+
+_PYTHON_FUNCTION = '''def {name}(items, threshold={number}):
+    """过滤并汇总{name}的输入"""
+    result = []
+    for index, item in enumerate(items):
+        if item is None or index % {mod} == 0:
+            continue
+        try:
+            value = int(item) * {number}
+        except (TypeError, ValueError) as e:
+            logger.warning(f"无法处理的输入: {{e}}")
+            continue
+        if value > threshold and value not in result:
+            result.append(value)
+    return sorted(result)
+
+
+'''
+
+_PYTHON_CLASS = '''class {cls}:
+    """{cls}的缓存包装"""
+
+    def __init__(self, size={number}):
+        self.size = size
+        self._items = {{}}
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def put(self, key, value):
+        if len(self._items) >= self.size:
+            self._items.pop(next(iter(self._items)))
+        self._items[key] = value
+
+
+'''
+
+_JAVASCRIPT_FUNCTION = '''function {name}(items, threshold = {number}) {{
+  // 过滤并汇总{name}的输入
+  const result = [];
+  for (let index = 0; index < items.length; index++) {{
+    const item = items[index];
+    if (item == null || index % {mod} === 0) {{
+      continue;
+    }}
+    const value = Number(item) * {number};
+    if (value > threshold && !result.includes(value)) {{
+      result.push(value);
+    }}
+  }}
+  return result.sort((a, b) => a - b);
+}}
+
+
+'''
+
+_JAVASCRIPT_CLASS = '''class {cls} {{
+  constructor(size = {number}) {{
+    this.size = size;
+    this.items = new Map();
+  }}
+
+  get(key, fallback = null) {{
+    return this.items.has(key) ? this.items.get(key) : fallback;
+  }}
+
+  put(key, value) {{
+    if (this.items.size >= this.size) {{
+      this.items.delete(this.items.keys().next().value);
+    }}
+    this.items.set(key, value);
+  }}
+}}
+
+
+'''
+
+_HEADERS = {
+    'python': 'import logging\nimport os\n\nlogger = logging.getLogger(__name__)\n\n\n',
+    'javascript': "'use strict';\n\nconst fs = require('fs');\n\n\n"
+}
+_TEMPLATES = {
+    'python': (_PYTHON_FUNCTION, _PYTHON_CLASS),
+    'javascript': (_JAVASCRIPT_FUNCTION, _JAVASCRIPT_CLASS)
+}
+
+
+def generate_source(language, size, seed=0):
+    """生成大约size个字符的源码，由函数和类交替组成
+
+    Args:
+        language (str): python或javascript
+        size (int): 目标大小（字符数），结果不超过该值
+        seed (int): 随机种子
+
+    Returns:
+        str: 源码
+    """
+    rng = random.Random(f'{language}:{size}:{seed}')
+    function_template, class_template = _TEMPLATES[language]
+    parts = [_HEADERS[language]]
+    total = len(parts[0])
+    index = 0
+    while True:
+        template = class_template if rng.random() < 0.3 else function_template
+        part = template.format(
+            name=f'process_{index}', cls=f'Cache{index}', number=rng.randint(1, 1000), mod=rng.randint(2, 9)
+        )
+        if total + len(part) > size:
+            break
+        parts.append(part)
+        total += len(part)
+        index += 1
+    return ''.join(parts)
+
+
+def _long_lines(language, size):
+    """每行几千个字符，例如压缩后的代码或很长的数据字面量"""
+    values = ', '.join(str(i) for i in range(1000))
+    line = f'DATA_{{index}} = [{values}]\n' if language == 'python' else f'const DATA_{{index}} = [{values}];\n'
+    count = max(1, size // len(line.format(index=0)))
+    return ''.join(line.format(index=i) for i in range(count))
+
+
+def _deep_nesting(language, depth=60):
+    """深层嵌套的条件语句（Python解释器限制语法块的嵌套层数，只生成到不超过限制的深度）"""
+    if language == 'python':
+        depth = min(depth, 90)
+        lines = ['def nested(value):']
+        for level in range(depth):
+            lines.append('    ' * (level + 1) + f'if value > {level}:')
+        lines.append('    ' * (depth + 1) + 'return value')
+        lines.append('    return None')
+        return '\n'.join(lines) + '\n'
+    opening = ''.join('  ' * level + f'if (value > {level}) {{\n' for level in range(depth))
+    closing = ''.join('  ' * level + '}\n' for level in reversed(range(depth)))
+    return f'function nested(value) {{\n{opening}{"  " * depth}return value;\n{closing}  return null;\n}}\n'
+
+
+def _huge_docstring(language, size):
+    """一个接近大小上限的文档字符串或块注释，其中的关键字不应被计入"""
+    sentence = '这个函数 if for while return import 处理输入 and 返回结果。\n'
+    text = sentence * max(1, (size - 200) // len(sentence))
+    if language == 'python':
+        return f'def documented():\n    """{text}"""\n    return None\n'
+    return f'/**\n{text}*/\nfunction documented() {{\n  return null;\n}}\n'
+
+
+def build_corpus(sizes=CORPUS_SIZES, languages=('python', 'javascript'), pathological=True, seed=0):
+    """构建基准测试语料
+
+    Args:
+        sizes (tuple): 常规语料的大小（字符数）
+        languages (tuple): 代码语言
+        pathological (bool): 是否包含病态输入
+        seed (int): 随机种子
+
+    Returns:
+        list: {'name', 'language', 'code'}字典列表
+    """
+    corpus = []
+    for language in languages:
+        for size in sizes:
+            corpus.append({
+                'name': f'{language}-{size // 1024}kb',
+                'language': language,
+                'code': generate_source(language, size, seed)
+            })
+        if pathological:
+            largest = max(sizes)
+            corpus.append({'name': f'{language}-long-lines', 'language': language,
+                           'code': _long_lines(language, largest)})
+            corpus.append({'name': f'{language}-deep-nesting', 'language': language,
+                           'code': _deep_nesting(language)})
+            corpus.append({'name': f'{language}-huge-docstring', 'language': language,
+                           'code': _huge_docstring(language, largest)})
+    return corpus
@@ -0,0 +1,262 @@
+"""按目标QPS回放请求组合的压测工具
+
+请求按固定间隔发出（开环），不等待前一个请求完成，延迟从计划发出的时刻开始计算，
+因此服务变慢时排队的时间也会计入延迟，不会被压测工具自身的并发上限掩盖。
+
+压测已经启动的服务（上游指向单独运行的桩服务器时，可以用--stub-url统计上游调用次数）：
+
+    python -m benchmarks.load_test --url http://localhost:5000 --qps 50 --duration 30 --stub-url http://127.0.0.1:8900
+
+或者在进程内启动桩服务器和应用，完全离线地比较缓存、连接池和并发相关的改动：
+
+    python -m benchmarks.load_test --self-host --qps 50 --duration 30 --stub-latency lognormal:0.8:0.5
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 允许直接以脚本方式运行
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from requests.adapters import HTTPAdapter
+from benchmarks.corpus import generate_source
+from benchmarks.run_benchmarks import percentile
+from benchmarks.stub_llm import StubLLMServer, stub_upstream
+
+logger = logging.getLogger(__name__)
+
+# 重复提问的问题池，用于测量响应缓存和请求合并的效果
+_REPEATED_QUESTIONS = [f'Python中如何实现第{i}种常见的排序算法？' for i in range(20)]
+
+
+def default_mix():
+    """默认的请求组合：以提问和问题求解为主，部分提问重复出现
+
+    Returns:
+        list: {'name', 'weight', 'method', 'path', 'body', 'repeat_ratio'}字典列表，
+            body中的{n}替换为请求序号，repeat_ratio比例的请求改用重复问题池中的问题
+    """
+    code = generate_source('python', 4096)
+    return [
+        {'name': 'ask', 'weight': 5, 'method': 'POST', 'path': '/api/direct-question/ask',
+         'body': {'question': '如何反转链表？(压测{n})'}, 'repeat_ratio': 0.3},
+        {'name': 'solve', 'weight': 3, 'method': 'POST', 'path': '/api/problem-solving/solve',
+         'body': {'problem_description': '去掉列表中的重复元素并排序 (压测{n})',
+                  'code_context': 'def solve(items):\n    return items\n', 'use_qianwen': True}},
+        {'name': 'analyze', 'weight': 2, 'method': 'POST', 'path': '/api/code-analysis/analyze',
+         'body': {'code': code, 'language': 'python'}}
+    ]
+
+
+def _render(value, n):
+    """把请求体中字符串的{n}替换为请求序号"""
+    if isinstance(value, str):
+        return value.replace('{n}', str(n))
+    if isinstance(value, dict):
+        return {key: _render(item, n) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item, n) for item in value]
+    return value
+
+
+def build_schedule(mix, total, seed=0):
+    """按权重生成请求序列
+
+    Args:
+        mix (list): 请求组合，见default_mix
+        total (int): 请求总数
+        seed (int): 随机种子
+
+    Returns:
+        list: (名称, 方法, 路径, 请求体)列表
+    """
+    rng = random.Random(seed)
+    weights = [entry.get('weight', 1) for entry in mix]
+    schedule = []
+    for n in range(total):
+        entry = rng.choices(mix, weights)[0]
+        body = _render(entry.get('body'), n)
+        if body and rng.random() < entry.get('repeat_ratio', 0):
+            body = dict(body, question=rng.choice(_REPEATED_QUESTIONS))
+        schedule.append((entry['name'], entry.get('method', 'POST'), entry['path'], body))
+    return schedule
+
+
+def _latency_stats(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0
+    }
+
+
+def run_load(base_url, mix, qps, duration, concurrency=64, timeout=60, seed=0):
+    """以目标QPS向服务发送请求
+
+    Args:
+        base_url (str): 服务的根地址
+        mix (list): 请求组合
+        qps (float): 每秒发出的请求数
+        duration (float): 持续时间（秒）
+        concurrency (int): 同时进行的请求数上限
+        timeout (float): 单个请求的超时时间（秒）
+        seed (int): 随机种子
+
+    Returns:
+        dict: 吞吐量、状态码分布、整体和各接口的延迟分位数
+    """
+    schedule = build_schedule(mix, max(1, int(qps * duration)), seed)
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+    records = []
+    lock = threading.Lock()
+
+    def send(name, method, path, body, planned):
+        try:
+            response = session.request(method, base_url + path, json=body, timeout=timeout)
+            status = response.status_code
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - planned
+        with lock:
+            records.append((name, status, latency))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as executor:
+        for i, (name, method, path, body) in enumerate(schedule):
+            planned = start + i / qps
+            delay = planned - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, name, method, path, body, planned)
+    elapsed = time.perf_counter() - start
+    session.close()
+
+    statuses = {}
+    by_endpoint = {}
+    for name, status, latency in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        by_endpoint.setdefault(name, []).append(latency)
+    successful = sum(count for status, count in statuses.items() if status == '200')
+    return {
+        'target_qps': qps,
+        'requests': len(records),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_per_s': round(successful / elapsed, 2) if elapsed else 0.0,
+        'statuses': statuses,
+        'latency': _latency_stats([latency for _, _, latency in records]),
+        'endpoints': {name: _latency_stats(latencies) for name, latencies in sorted(by_endpoint.items())}
+    }
+
+
+def _upstream_stats(stub_url):
+    """从单独运行的桩服务器读取上游调用统计"""
+    try:
+        return requests.get(stub_url.rstrip('/') + '/stats', timeout=5).json()
+    except requests.exceptions.RequestException as e:
+        logger.warning("无法读取桩服务器的统计信息: %s", e)
+        return None
+
+
+def _upstream_delta(before, after):
+    """两次统计之间各路径、各状态码的调用次数"""
+    if before is None or after is None:
+        return None
+    delta = {}
+    for path, statuses in after.items():
+        for status, count in statuses.items():
+            diff = count - before.get(path, {}).get(status, 0)
+            if diff:
+                delta.setdefault(path, {})[status] = diff
+    return delta
+
+
+def run_self_hosted(mix, qps, duration, concurrency=64, stub_options=None, disable_caches=False, seed=0):
+    """在进程内启动桩服务器和应用（多线程的WSGI服务器）并压测
+
+    Args:
+        mix (list): 请求组合
+        qps (float): 每秒发出的请求数
+        duration (float): 持续时间（秒）
+        concurrency (int): 同时进行的请求数上限
+        stub_options (dict): StubLLMServer的参数
+        disable_caches (bool): 是否关闭响应缓存、单元缓存和限流
+        seed (int): 随机种子
+
+    Returns:
+        dict: run_load的结果，另外包含upstream（桩服务器收到的调用次数）
+    """
+    from werkzeug.serving import make_server
+    from app import app
+
+    services = app.extensions['services']
+    with StubLLMServer(seed=seed, **(stub_options or {})) as stub, \
+            stub_upstream(services, stub.url, disable_caches=disable_caches):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, name='load-app', daemon=True)
+        thread.start()
+        try:
+            report = run_load(f'http://127.0.0.1:{server.server_port}', mix, qps, duration, concurrency, seed=seed)
+        finally:
+            server.shutdown()
+        report['upstream'] = stub.stats()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按目标QPS回放请求组合的压测工具')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='被压测服务的根地址，例如http://localhost:5000')
+    target.add_argument('--self-host', action='store_true', help='在进程内启动桩服务器和应用')
+    parser.add_argument('--qps', type=float, default=20, help='每秒发出的请求数')
+    parser.add_argument('--duration', type=float, default=10, help='持续时间（秒）')
+    parser.add_argument('--concurrency', type=int, default=64, help='同时进行的请求数上限')
+    parser.add_argument('--mix', help='请求组合的JSON文件，格式见default_mix')
+    parser.add_argument('--stub-url', help='单独运行的桩服务器地址，用于统计上游调用次数')
+    parser.add_argument('--stub-latency', default='lognormal:0.5:0.4', help='自托管时桩服务器的延迟分布')
+    parser.add_argument('--stub-error-rate', type=float, default=0.0, help='自托管时桩服务器返回500的比例')
+    parser.add_argument('--stub-rate-limit', type=float, default=0, help='自托管时桩服务器的每秒请求数上限')
+    parser.add_argument('--no-cache', action='store_true', help='自托管时关闭响应缓存、单元缓存和限流')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # 每个请求的日志会显著影响压测结果
+    logging.disable(logging.INFO)
+    if args.mix:
+        with open(args.mix, encoding='utf-8') as f:
+            mix = json.load(f)
+    else:
+        mix = default_mix()
+
+    if args.self_host:
+        report = run_self_hosted(mix, args.qps, args.duration, args.concurrency, {
+            'latency': args.stub_latency,
+            'error_rate': args.stub_error_rate,
+            'rate_limit': args.stub_rate_limit
+        }, disable_caches=args.no_cache, seed=args.seed)
+    else:
+        before = _upstream_stats(args.stub_url) if args.stub_url else None
+        report = run_load(args.url.rstrip('/'), mix, args.qps, args.duration, args.concurrency, seed=args.seed)
+        if args.stub_url:
+            report['upstream'] = _upstream_delta(before, _upstream_stats(args.stub_url))
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""代码分析器和HTTP接口的基准测试
+
+测量CodeAnalyzer.analyze在各语料上的吞吐量和p50/p99延迟，以及各接口通过Flask测试客户端
+调用时的延迟（大模型服务指向本地桩服务器）。结果与JSON基线比较，p50或p99比基线慢超过阈值时
+返回非0退出码，可以直接用于CI的性能门禁。
+
+    python -m benchmarks.run_benchmarks [--quick] [--update-baseline] [--threshold 0.3]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+# 允许直接以脚本方式运行
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import CORPUS_SIZES, QUICK_CORPUS_SIZES, build_corpus, generate_source
+from benchmarks.stub_llm import StubLLMServer, stub_upstream
+from services.analysis_executor import AnalysisExecutor, BACKEND_INLINE
+from services.code_analyzer import CodeAnalyzer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def percentile(samples, q):
+    """最近秩法计算分位数
+
+    Args:
+        samples (list): 样本
+        q (float): 分位，0到1之间
+
+    Returns:
+        float: 分位数，没有样本时为0
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def summarize(durations, elapsed, size=None):
+    """汇总一组耗时
+
+    Args:
+        durations (list): 每次调用的耗时（秒）
+        elapsed (float): 所有调用的总耗时（秒）
+        size (int): 每次处理的字符数，提供时计算每秒处理的MB数
+
+    Returns:
+        dict: 样本数、平均值、p50、p99（毫秒）和每秒调用数
+    """
+    stats = {
+        'samples': len(durations),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 3) if durations else 0.0,
+        'p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+        'throughput_per_s': round(len(durations) / elapsed, 2) if elapsed else 0.0
+    }
+    if size is not None and elapsed:
+        stats['mb_per_s'] = round(size * len(durations) / elapsed / 1e6, 3)
+    return stats
+
+
+def measure(fn, repeats, max_seconds, warmup=1, min_samples=5):
+    """重复调用fn并记录每次的耗时
+
+    达到repeats次或累计超过max_seconds秒（至少min_samples次）时停止。
+
+    Returns:
+        tuple: (耗时列表, 总耗时)
+    """
+    for _ in range(warmup):
+        fn(0)
+    durations = []
+    start = time.perf_counter()
+    for i in range(repeats):
+        call_start = time.perf_counter()
+        fn(i + 1)
+        durations.append(time.perf_counter() - call_start)
+        if len(durations) >= min_samples and time.perf_counter() - start > max_seconds:
+            break
+    return durations, time.perf_counter() - start
+
+
+def run_analyzer_benchmarks(corpus, repeats=50, max_seconds=2.0):
+    """测量CodeAnalyzer.analyze在每个语料上的延迟
+
+    使用内联执行器并关闭单元缓存，测量的是每次完整分析的CPU耗时。
+
+    Args:
+        corpus (list): build_corpus返回的语料
+        repeats (int): 每个语料的最大调用次数
+        max_seconds (float): 每个语料的最长测量时间（秒）
+
+    Returns:
+        dict: 语料名称到统计结果的映射
+    """
+    analyzer = CodeAnalyzer(max_workers=1, executor=AnalysisExecutor(backend=BACKEND_INLINE), incremental=False)
+    results = {}
+    for item in corpus:
+        code, language = item['code'], item['language']
+
+        def analyze(_):
+            result = analyzer.analyze(code, language)
+            if 'error' in result:
+                raise RuntimeError(f"{item['name']}分析失败: {result['error']}")
+
+        durations, elapsed = measure(analyze, repeats, max_seconds)
+        results[item['name']] = summarize(durations, elapsed, size=len(code))
+    return results
+
+
+def _endpoint_cases(code):
+    """接口测试用例：(名称, 方法, 路径, 根据序号生成请求体的函数)"""
+    return [
+        ('health', 'GET', '/api/health', None),
+        ('analyze', 'POST', '/api/code-analysis/analyze', lambda i: {'code': code, 'language': 'python'}),
+        ('complexity', 'POST', '/api/code-analysis/complexity', lambda i: {'code': code, 'language': 'python'}),
+        ('suggest', 'POST', '/api/code-suggestion/suggest', lambda i: {'code': code, 'language': 'python'}),
+        ('ask', 'POST', '/api/direct-question/ask', lambda i: {'question': f'如何反转链表？(基准测试{i})'}),
+        ('solve', 'POST', '/api/problem-solving/solve', lambda i: {
+            'problem_description': f'去掉列表中的重复元素并排序 (基准测试{i})',
+            'code_context': 'def solve(items):\n    return items\n',
+            'use_qianwen': True
+        })
+    ]
+
+
+def run_endpoint_benchmarks(repeats=50, max_seconds=2.0, code_size=10 * 1024, stub_latency=0.0):
+    """通过Flask测试客户端测量各接口的延迟
+
+    Args:
+        repeats (int): 每个接口的最大调用次数
+        max_seconds (float): 每个接口的最长测量时间（秒）
+        code_size (int): 代码分析类接口使用的代码大小（字符数）
+        stub_latency (float): 桩服务器每个请求的固定延迟（秒）
+
+    Returns:
+        dict: 接口名称到统计结果的映射
+    """
+    from app import app
+
+    client = app.test_client()
+    services = app.extensions['services']
+    code = generate_source('python', code_size)
+    results = {}
+    with StubLLMServer(latency=stub_latency) as stub, stub_upstream(services, stub.url):
+        for name, method, path, build_body in _endpoint_cases(code):
+
+            def call(i):
+                if method == 'GET':
+                    response = client.get(path)
+                else:
+                    response = client.post(path, json=build_body(i))
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}接口返回{response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+            durations, elapsed = measure(call, repeats, max_seconds)
+            results[name] = summarize(durations, elapsed)
+        results['_upstream_calls'] = stub.calls()
+    return results
+
+
+def compare_results(results, baseline, threshold=0.3, min_delta_ms=1.0):
+    """与基线比较，找出性能退化的测试项
+
+    p50或p99超过基线的(1 + threshold)倍、且绝对差值超过min_delta_ms时视为退化；
+    差值下限用于忽略亚毫秒级测试项的计时抖动。基线中没有的测试项不参与比较。
+
+    Args:
+        results (dict): 本次结果，{分组: {测试项: 统计结果}}
+        baseline (dict): 基线结果，格式相同
+        threshold (float): 允许变慢的比例
+        min_delta_ms (float): 视为退化的最小绝对差值（毫秒）
+
+    Returns:
+        list: 退化描述列表，没有退化时为空
+    """
+    regressions = []
+    for group, items in results.items():
+        for name, stats in items.items():
+            base = baseline.get(group, {}).get(name)
+            if name.startswith('_') or not base:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                current, previous = stats[metric], base[metric]
+                if current > previous * (1 + threshold) and current - previous > min_delta_ms:
+                    regressions.append(
+                        f"{group}/{name} {metric}: {previous:.3f} -> {current:.3f} "
+                        f"(+{(current / previous - 1) * 100 if previous else float('inf'):.0f}%)"
+                    )
+    return regressions
+
+
+def _print_results(results):
+    for group, items in results.items():
+        print(f"\n[{group}]")
+        print(f"{'名称':<28}{'样本':>6}{'p50(ms)':>12}{'p99(ms)':>12}{'次/秒':>12}")
+        for name, stats in items.items():
+            if name.startswith('_'):
+                print(f"{name:<28}{json.dumps(stats, ensure_ascii=False)}")
+                continue
+            print(f"{name:<28}{stats['samples']:>6}{stats['p50_ms']:>12.3f}{stats['p99_ms']:>12.3f}"
+                  f"{stats['throughput_per_s']:>12.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='代码分析器和HTTP接口的基准测试')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--output', help='把本次结果另外写入该文件')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--threshold', type=float, default=0.3, help='允许变慢的比例，默认0.3即30%%')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='视为退化的最小绝对差值（毫秒）')
+    parser.add_argument('--quick', action='store_true', help='只使用小语料并减少调用次数')
+    parser.add_argument('--only', choices=('analyzer', 'endpoints'), help='只运行一组测试')
+    parser.add_argument('--repeats', type=int, default=50, help='每个测试项的最大调用次数')
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='每个测试项的最长测量时间（秒）')
+    args = parser.parse_args(argv)
+
+    # 每个请求的日志会显著影响计时
+    logging.disable(logging.INFO)
+    repeats = min(args.repeats, 10) if args.quick else args.repeats
+    max_seconds = min(args.max_seconds, 0.5) if args.quick else args.max_seconds
+
+    results = {}
+    if args.only in (None, 'analyzer'):
+        corpus = build_corpus(QUICK_CORPUS_SIZES if args.quick else CORPUS_SIZES, pathological=not args.quick)
+        results['analyzer'] = run_analyzer_benchmarks(corpus, repeats, max_seconds)
+    if args.only in (None, 'endpoints'):
+        results['endpoints'] = run_endpoint_benchmarks(repeats, max_seconds)
+    _print_results(results)
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已写入基线: {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline.get('results', {}), args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n性能退化超过{args.threshold * 100:.0f}%（基线: {args.baseline}）：")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\n与基线相比没有超过{args.threshold * 100:.0f}%的性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
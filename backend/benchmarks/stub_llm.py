@@ -0,0 +1,303 @@
+"""本地的大模型桩服务器
+
+模拟千问API和自定义API的响应格式，用于在不消耗真实配额的情况下测试和压测调用大模型的接口。
+POST /custom返回自定义API的格式，其他路径返回千问API的格式；请求头包含X-DashScope-SSE: enable时
+按千问的SSE格式分段返回。延迟分布、错误率和每秒请求数上限（超出时返回429）都可以配置，
+GET /stats返回各路径和状态码的调用次数。
+
+也可以单独运行，再把QIANWEN_API_URL或CUSTOM_API_URL指向它：
+
+    python -m benchmarks.stub_llm --port 8900 --latency lognormal:0.8:0.5 --error-rate 0.01 --rate-limit 20
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 桩服务器返回的回答，包含代码块，使解决方案的解析逻辑也被执行
+STUB_ANSWER = """下面是修改后的代码：
+
+```python
+def solve(items):
+    return sorted(set(items))
+```
+
+先去重再排序，时间复杂度为O(n log n)。"""
+
+
+def parse_latency(spec):
+    """解析延迟分布
+
+    Args:
+        spec (str|float): 固定延迟秒数，或uniform:最小值:最大值、normal:均值:标准差、
+            lognormal:中位数:sigma
+
+    Returns:
+        callable: 接收random.Random、返回延迟秒数（不小于0）的函数
+
+    Raises:
+        ValueError: 无法识别的分布
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, params = str(spec).partition(':')
+    try:
+        if not params:
+            value = float(kind)
+            return lambda rng: value
+        values = [float(value) for value in params.split(':')]
+        if kind == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == 'normal':
+            mean, std = values
+            return lambda rng: max(0.0, rng.gauss(mean, std))
+        if kind == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"无法识别的延迟分布: {spec}")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """处理桩服务器的请求"""
+
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，不关闭Nagle算法时每个请求会多出约40毫秒的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.stub.stats())
+        else:
+            self._send_json(404, {'code': 'NotFound', 'message': self.path})
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        custom = self.path.rstrip('/').endswith('/custom')
+
+        retry_after = stub.admit()
+        if retry_after is not None:
+            stub.record_call(self.path, 429)
+            self._send_json(429, {'code': 'Throttling', 'message': '请求过多'},
+                            {'Retry-After': str(max(1, math.ceil(retry_after)))})
+            return
+        latency, failed = stub.sample()
+        time.sleep(latency)
+        if failed:
+            stub.record_call(self.path, 500)
+            self._send_json(500, {'code': 'InternalError', 'message': '桩服务器模拟的上游错误'})
+            return
+
+        stub.record_call(self.path, 200)
+        if custom:
+            self._send_json(200, {'content': STUB_ANSWER})
+        elif self.headers.get('X-DashScope-SSE') == 'enable':
+            self._stream()
+        else:
+            prompt = payload.get('input', {}).get('messages', [{}])[-1].get('content', '')
+            self._send_json(200, {
+                'output': {'text': STUB_ANSWER},
+                'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(STUB_ANSWER) // 4,
+                          'total_tokens': (len(prompt) + len(STUB_ANSWER)) // 4}
+            })
+
+    def _stream(self):
+        """按千问的SSE格式分段返回回答，每段之间等待chunk_interval秒"""
+        stub = self.server.stub
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        size = max(1, math.ceil(len(STUB_ANSWER) / stub.stream_chunks))
+        for start in range(0, len(STUB_ANSWER), size):
+            event = json.dumps({'output': {'text': STUB_ANSWER[start:start + size]}}, ensure_ascii=False)
+            data = f'data:{event}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+            if stub.chunk_interval > 0:
+                time.sleep(stub.chunk_interval)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format, *args):
+        # 请求日志会干扰计时，只在调试时输出
+        logger.debug(format % args)
+
+
+class StubLLMServer:
+    """在后台线程中运行的桩服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, rate_limit=0,
+                 stream_chunks=8, chunk_interval=0.0, seed=None):
+        """初始化桩服务器
+
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示由系统分配
+            latency (str|float): 首个字节前的延迟分布，见parse_latency
+            error_rate (float): 返回500的请求比例
+            rate_limit (float): 每秒请求数上限，超出时返回429和Retry-After，0表示不限制
+            stream_chunks (int): 流式响应的分段数
+            chunk_interval (float): 流式响应每段之间的间隔（秒）
+            seed (int): 随机种子，用于复现延迟和错误序列
+        """
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval
+        self._rng = random.Random(seed)
+        self._bucket = TokenBucket(rate_limit, max(1.0, rate_limit)) if rate_limit > 0 else None
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """桩服务器的根地址"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def admit(self):
+        """按每秒请求数上限放行请求
+
+        Returns:
+            float: 超出上限时为建议的重试等待时间（秒），放行时为None
+        """
+        if self._bucket is None:
+            return None
+        with self._lock:
+            wait = self._bucket.wait_time(1, time.monotonic())
+            if wait > 0:
+                return wait
+            self._bucket.take(1)
+            return None
+
+    def sample(self):
+        """抽取本次请求的延迟和是否失败"""
+        with self._lock:
+            return self.latency(self._rng), self._rng.random() < self.error_rate
+
+    def record_call(self, path, status):
+        """记录一次调用"""
+        with self._lock:
+            key = (path, status)
+            self._calls[key] = self._calls.get(key, 0) + 1
+
+    def calls(self):
+        """获取各路径的调用次数（包括失败和被限流的调用）"""
+        counts = {}
+        with self._lock:
+            for (path, _), count in self._calls.items():
+                counts[path] = counts.get(path, 0) + count
+        return counts
+
+    def stats(self):
+        """获取各路径按状态码统计的调用次数"""
+        stats = {}
+        with self._lock:
+            for (path, status), count in self._calls.items():
+                stats.setdefault(path, {})[str(status)] = count
+        return stats
+
+    def start(self):
+        """在后台线程中启动"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止并释放端口"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+@contextmanager
+def stub_upstream(services, url, disable_caches=True):
+    """把服务容器中的大模型服务指向桩服务器，退出时恢复
+
+    Args:
+        services (ServiceRegistry): 服务容器
+        url (str): 桩服务器的根地址
+        disable_caches (bool): 是否关闭响应缓存、代码分析的单元缓存和限流，
+            关闭后每次请求都执行完整的处理路径；压测缓存效果时应保留
+    """
+    llm_services = (services.qianwen_service, services.custom_api_service)
+    attributes = ('api_url', 'api_key', 'response_cache', 'semantic_cache', 'rate_limiter')
+    saved = [{name: getattr(service, name) for name in attributes} for service in llm_services]
+    unit_cache = services.code_analyzer.unit_cache
+    try:
+        for service, path in zip(llm_services, ('/qianwen', '/custom')):
+            service.api_url = url + path
+            service.api_key = 'benchmark'
+            if disable_caches:
+                service.response_cache = None
+                service.semantic_cache = None
+                service.rate_limiter = None
+        if disable_caches:
+            # 重复提交同一段代码时单元缓存总是命中
+            services.code_analyzer.unit_cache = None
+        yield
+    finally:
+        services.code_analyzer.unit_cache = unit_cache
+        for service, values in zip(llm_services, saved):
+            for name, value in values.items():
+                setattr(service, name, value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='模拟千问API和自定义API的本地桩服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', default='0', help='延迟分布，例如0.5、uniform:0.2:1、lognormal:0.8:0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的请求比例')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每秒请求数上限，超出时返回429')
+    parser.add_argument('--stream-chunks', type=int, default=8, help='流式响应的分段数')
+    parser.add_argument('--chunk-interval', type=float, default=0.05, help='流式响应每段之间的间隔（秒）')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = StubLLMServer(args.host, args.port, args.latency, args.error_rate, args.rate_limit,
+                           args.stream_chunks, args.chunk_interval, args.seed)
+    logger.info("桩服务器已启动: 千问API %s/qianwen，自定义API %s/custom，统计 %s/stats",
+                server.url, server.url, server.url)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,39 @@
+def parse_exclude(*values):
+    """解析客户端要求省略的响应字段
+    
+    每个值可以是字段名列表或逗号分隔的字符串，例如请求体中的exclude和查询参数?exclude=。
+    
+    Args:
+        *values: 字段名列表、逗号分隔的字符串或None
+        
+    Returns:
+        frozenset: 要省略的字段名
+    """
+    fields = set()
+    for value in values:
+        if isinstance(value, str):
+            value = value.split(',')
+        if isinstance(value, (list, tuple)):
+            fields.update(name.strip() for name in value if isinstance(name, str) and name.strip())
+    return frozenset(fields)
+
 class BaseResponse:
     """响应基类"""
     def __init__(self):
         pass
         
-    def to_dict(self):
-        """将响应对象转换为字典"""
-        return self.__dict__
+    def to_dict(self, exclude=None):
+        """将响应对象转换为字典
+        
+        Args:
+            exclude (set): 不返回的字段，例如客户端已经持有的original_code
+            
+        Returns:
+            dict: 响应字典
+        """
+        if not exclude:
+            return self.__dict__
+        return {name: value for name, value in self.__dict__.items() if name not in exclude}
 
 class AnalysisResponse(BaseResponse):
     """代码分析响应模型"""
@@ -0,0 +1,196 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+BACKEND_AUTO = 'auto'
+BACKEND_INLINE = 'inline'
+BACKEND_THREAD = 'thread'
+BACKEND_PROCESS = 'process'
+
+BACKENDS = (BACKEND_AUTO, BACKEND_INLINE, BACKEND_THREAD, BACKEND_PROCESS)
+
+
+def _init_worker():
+    """进程池工作进程的初始化函数：预先导入分析模块，第一个任务不再承担导入开销
+
+    工作进程只需要分析模块；应用的创建由app.py中的__mp_main__判断跳过。
+    """
+    import services.code_analyzer
+
+
+class AnalysisExecutor:
+    """代码分析执行器
+
+    在进程生命周期内复用线程池和进程池，按代码大小选择执行方式：
+    - inline: 在调用线程中直接执行，没有任何调度开销，适合小段代码
+    - thread: 提交到共享线程池，可限制同时进行的分析数量
+    - process: 提交到共享进程池，大段代码的分析可以利用多个CPU核心
+
+    auto模式下，代码长度达到process_threshold时使用进程池，否则直接执行。
+    线程池和进程池都在第一次使用时创建；fork出的子进程会重新创建自己的池。
+    """
+
+    def __init__(self, backend=BACKEND_AUTO, max_workers=4, process_threshold=100000,
+                 start_method='spawn'):
+        """初始化执行器
+
+        Args:
+            backend (str): 执行方式：auto、inline、thread或process
+            max_workers (int): 线程池和进程池的最大工作者数
+            process_threshold (int): auto模式下使用进程池的代码长度阈值（字符数）
+            start_method (str): 进程池的启动方式，默认spawn，避免在多线程进程中fork
+        """
+        if backend not in BACKENDS:
+            logger.warning("未知的分析执行方式%s，使用auto", backend)
+            backend = BACKEND_AUTO
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self.process_threshold = process_threshold
+        self.start_method = start_method
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread_pool = None
+        self._process_pool = None
+        self._runs = {BACKEND_INLINE: 0, BACKEND_THREAD: 0, BACKEND_PROCESS: 0}
+
+    def choose_backend(self, size):
+        """根据代码大小选择执行方式
+
+        Args:
+            size (int): 代码长度（字符数）
+
+        Returns:
+            str: inline、thread或process
+        """
+        if self.backend != BACKEND_AUTO:
+            return self.backend
+        if size >= self.process_threshold:
+            return BACKEND_PROCESS
+        return BACKEND_INLINE
+
+    def map(self, fn, items, size=0, max_concurrency=None):
+        """对一组任务执行分析函数，按顺序返回结果
+
+        同时提交到线程池或进程池的任务数不超过max_concurrency，
+        使单个请求不会占满共享的池。进程池异常退出时，剩余任务在当前线程中直接执行。
+
+        Args:
+            fn (callable): 分析函数，接受单个任务作为参数
+            items (list): 任务列表
+            size (int): 所有任务的代码总长度，用于选择执行方式
+            max_concurrency (int): 同时执行的最大任务数，默认为max_workers
+
+        Returns:
+            list: 与items一一对应的结果
+        """
+        backend = self.choose_backend(size)
+        with self._lock:
+            self._runs[backend] += len(items)
+
+        if backend == BACKEND_INLINE or not items:
+            return [fn(item) for item in items]
+
+        results = [None] * len(items)
+
+        pool = self._get_pools()[0 if backend == BACKEND_THREAD else 1]
+        limit = max(1, min(max_concurrency or self.max_workers, self.max_workers))
+        pending = {}
+        next_index = 0
+        try:
+            while next_index < len(items) or pending:
+                while next_index < len(items) and len(pending) < limit:
+                    pending[pool.submit(fn, items[next_index])] = next_index
+                    next_index += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        except BrokenProcessPool as e:
+            logger.warning("分析进程池异常退出，剩余任务改为直接执行: %s", e)
+            self._discard_process_pool()
+            for index in list(pending.values()) + list(range(next_index, len(items))):
+                results[index] = fn(items[index])
+        return results
+
+    def _get_pools(self):
+        """获取当前进程的线程池和进程池（按需创建）
+
+        Returns:
+            tuple: (thread_pool, process_pool)，未用到的池可能为None
+        """
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                # fork之后父进程的池在子进程中不可用
+                self._pid = pid
+                self._thread_pool = None
+                self._process_pool = None
+            if self.backend == BACKEND_THREAD and self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='analyzer'
+                )
+            if self.backend in (BACKEND_AUTO, BACKEND_PROCESS) and self._process_pool is None:
+                logger.info("创建代码分析进程池，工作进程数：%s", self.max_workers)
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+            return self._thread_pool, self._process_pool
+
+    def _discard_process_pool(self):
+        """丢弃已损坏的进程池，下次使用时重新创建"""
+        with self._lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        """关闭线程池和进程池
+
+        Args:
+            wait (bool): 是否等待正在执行的任务完成
+        """
+        with self._lock:
+            pools = (self._thread_pool, self._process_pool)
+            self._thread_pool = None
+            self._process_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait)
+
+    def stats(self):
+        """获取执行器配置和各执行方式的使用次数
+
+        Returns:
+            dict: 统计信息
+        """
+        return {
+            'backend': self.backend,
+            'max_workers': self.max_workers,
+            'process_threshold': self.process_threshold,
+            'runs': dict(self._runs)
+        }
+
+
+def create_analysis_executor(max_workers=None):
+    """根据环境变量创建代码分析执行器
+
+    Args:
+        max_workers (int): 最大工作者数，为None时读取ANALYZER_MAX_WORKERS
+
+    Returns:
+        AnalysisExecutor: 执行器
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv('ANALYZER_MAX_WORKERS', '4'))
+    return AnalysisExecutor(
+        backend=os.getenv('ANALYZER_EXECUTOR', BACKEND_AUTO).lower(),
+        max_workers=max_workers,
+        process_threshold=int(os.getenv('ANALYZER_PROCESS_THRESHOLD', '100000')),
+        start_method=os.getenv('ANALYZER_PROCESS_START_METHOD', 'spawn')
+    )
@@ -0,0 +1,556 @@
+import re
+from collections import Counter
+
+# 规则严重级别
+SEVERITY_INFO = 'info'
+SEVERITY_LOW = 'low'
+SEVERITY_MEDIUM = 'medium'
+SEVERITY_HIGH = 'high'
+
+class Rule:
+    """单条分析规则"""
+
+    __slots__ = ('rule_id', 'kind', 'pattern', 'lead', 'severity', 'message', 'ignore_case')
+
+    def __init__(self, rule_id, pattern, lead=None, severity=SEVERITY_INFO, message='', ignore_case=False):
+        """初始化规则
+
+        Args:
+            rule_id (str): 规则ID，例如python.function
+            pattern (str): 正则表达式
+            lead (str): 匹配可能的首字符集合，用于在扫描时快速跳过不可能匹配的位置；
+                为None表示首字符不确定
+            severity (str): 严重级别：info、low、medium、high
+            message (str): 规则命中时的提示信息
+            ignore_case (bool): 是否忽略大小写
+        """
+        self.rule_id = rule_id
+        # 规则类别为规则ID的最后一段，例如python.function的类别为function
+        self.kind = rule_id.rsplit('.', 1)[-1]
+        self.pattern = pattern
+        self.lead = lead
+        self.severity = severity
+        self.message = message
+        self.ignore_case = ignore_case
+
+    def __repr__(self):
+        return f"Rule({self.rule_id!r})"
+
+
+class RuleFamily:
+    """同一语言、同一类别的一组规则
+
+    所有规则在导入时合并编译为一个交替正则，扫描时对源码只遍历一次，
+    通过命名分组判断每个匹配属于哪条规则。当所有规则都声明了首字符集合时，
+    在正则开头加入前瞻断言，使正则引擎在不可能匹配的位置只检查一个字符。
+    """
+
+    def __init__(self, name, rules, flags=re.MULTILINE):
+        """编译规则族
+
+        Args:
+            name (str): 规则族名称，例如lexer、security、suggestion
+            rules (list): 规则列表
+            flags (int): 正则标志
+        """
+        self.name = name
+        self.rules = list(rules)
+        self._rules_by_group = {}
+        self._group_offsets = {}
+
+        parts = []
+        group_index = 0
+        for i, rule in enumerate(self.rules):
+            group_name = f"r{i}"
+            pattern = f"(?i:{rule.pattern})" if rule.ignore_case else rule.pattern
+            parts.append(f"(?P<{group_name}>{pattern})")
+            # 记录规则自身捕获分组在合并后正则中的位置，命名分组之后紧跟规则内部的分组
+            group_index += 1
+            inner_groups = re.compile(rule.pattern).groups
+            self._group_offsets[group_name] = (group_index, inner_groups)
+            group_index += inner_groups
+            self._rules_by_group[group_name] = rule
+        self._kinds_by_group = {group: rule.kind for group, rule in self._rules_by_group.items()}
+
+        # 空规则族不编译正则，避免空模式在每个位置都匹配
+        if not parts:
+            self.regex = None
+            return
+
+        pattern = '|'.join(parts)
+        if all(rule.lead for rule in self.rules):
+            leads = set()
+            for rule in self.rules:
+                leads.update(rule.lead.lower() + rule.lead.upper() if rule.ignore_case else rule.lead)
+            lead_class = ''.join(re.escape(c) for c in sorted(leads))
+            pattern = f"(?=[{lead_class}])(?:{pattern})"
+        self.regex = re.compile(pattern, flags)
+
+    def _finditer(self, text):
+        """遍历合并正则的所有匹配"""
+        if self.regex is None:
+            return iter(())
+        return self.regex.finditer(text)
+
+    def scan(self, text):
+        """扫描文本，逐个返回匹配结果
+
+        Args:
+            text (str): 要扫描的文本
+
+        Yields:
+            tuple: (rule, captures, match)，captures为该规则自身的捕获分组
+        """
+        rules_by_group = self._rules_by_group
+        group_offsets = self._group_offsets
+        for match in self._finditer(text):
+            group_name = match.lastgroup
+            start, count = group_offsets[group_name]
+            captures = match.groups()[start:start + count] if count else ()
+            yield rules_by_group[group_name], captures, match
+
+    def tokens(self, text):
+        """扫描文本，逐个返回匹配的规则类别和匹配对象，不提取捕获分组
+
+        Args:
+            text (str): 要扫描的文本
+
+        Yields:
+            tuple: (kind, match)
+        """
+        kinds = self._kinds_by_group
+        for match in self._finditer(text):
+            yield kinds[match.lastgroup], match
+
+    def captures(self, match):
+        """获取匹配对象中所属规则自身的捕获分组
+
+        Args:
+            match (re.Match): tokens或scan返回的匹配对象
+
+        Returns:
+            tuple: 捕获分组
+        """
+        start, count = self._group_offsets[match.lastgroup]
+        if count == 1:
+            return (match.group(start + 1),)
+        return match.groups()[start:start + count] if count else ()
+
+    def count(self, text):
+        """统计每条规则的命中次数
+
+        Args:
+            text (str): 要扫描的文本
+
+        Returns:
+            Counter: 规则ID到命中次数的映射
+        """
+        rules_by_group = self._rules_by_group
+        return Counter(rules_by_group[m.lastgroup].rule_id for m in self._finditer(text))
+
+    def find_rules(self, text):
+        """查找文本中出现的规则，所有规则均已命中时提前结束扫描
+
+        Args:
+            text (str): 要扫描的文本
+
+        Returns:
+            list: 命中的规则，按规则表中的顺序排列
+        """
+        found = set()
+        total = len(self.rules)
+        for match in self._finditer(text):
+            found.add(match.lastgroup)
+            if len(found) == total:
+                break
+        return [rule for group, rule in self._rules_by_group.items() if group in found]
+
+
+
+
+_IDENTIFIER = r'[a-zA-Z_$][a-zA-Z0-9_$]*'
+
+_IDENTIFIER_LEAD = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_$'
+
+# 常用的注释和字符串模式：(pattern, lead)
+_HASH_COMMENT = (r'#[^\n]*', '#')
+_SLASH_COMMENTS = (r'//[^\n]*|/\*[\s\S]*?\*/', '/')
+_TRIPLE_QUOTED = ('"""[\\s\\S]*?"""|' + "'''[\\s\\S]*?'''", '"\'')
+_DOUBLE_QUOTED = (r'"(?:[^"\\\n]|\\.)*"', '"')
+_SINGLE_QUOTED = (r"'(?:[^'\\\n]|\\.)*'", "'")
+_BACKTICK_QUOTED = (r'`(?:[^`\\]|\\.)*`', '`')
+
+# 没有函数关键字的语言：标识符后跟参数列表和代码块即视为函数定义。
+# 控制语句（if、for、while等）的关键字规则排在函数规则之前，不会被误认为函数；
+# 代码块的花括号只做前瞻，留给嵌套深度计算
+_C_STYLE_FUNCTION = (
+    rf'\b({_IDENTIFIER})\s*\([^;{{}}()]*\)\s*(?:const\s*)?(?:throws\s+[\w.,\s]+)?(?=\{{)',
+    _IDENTIFIER_LEAD
+)
+
+# 各语言的词法规格，用于生成词法扫描规则族
+#   comments/strings: (pattern, lead)列表
+#   nesting: 嵌套深度的计算方式，indent表示按缩进，brace表示按花括号
+#   keywords: 分支（condition）、循环（loop）、try和异常处理（exception）关键字
+#   function/class/import: (pattern, lead)列表，模式中第一个非空的捕获分组为名称
+#   extra: 额外的(kind, pattern, lead)规则
+#   ignore_case: 关键字是否忽略大小写
+LEXER_SPECS = {
+    'python': {
+        'comments': [_HASH_COMMENT],
+        'strings': [_TRIPLE_QUOTED, _DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'indent',
+        'keywords': {
+            'condition': ['if', 'elif'],
+            'loop': ['for', 'while'],
+            'try': ['try'],
+            'exception': ['except', 'finally']
+        },
+        'function': [(rf'\bdef\s+({_IDENTIFIER})\s*\(', 'd')],
+        'class': [(rf'\bclass\s+({_IDENTIFIER})\s*[\(:]', 'c')],
+        'import': [(r'\bfrom\s+([a-zA-Z_\.][a-zA-Z0-9_\.]*)\s+import\b|\bimport\s+([a-zA-Z_][a-zA-Z0-9_\.]*)', 'fi')],
+        # else只有作为语句（else:）时才计为分支，条件表达式中的else不计入
+        'extra': [('condition', r'\belse\s*:', 'e')]
+    },
+    'javascript': {
+        'comments': [_SLASH_COMMENTS],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED, _BACKTICK_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'else'],
+            'loop': ['for', 'while', 'do'],
+            'try': ['try'],
+            'exception': ['catch', 'finally']
+        },
+        'function': [
+            (rf'\bfunction\s*\*?\s*({_IDENTIFIER})\s*\(', 'f'),
+            (rf'\b(?:const|let|var)\s+({_IDENTIFIER})\s*=\s*(?:async\s*)?(?:\([^\)]*\)|{_IDENTIFIER})\s*=>', 'clv'),
+            # 对象字面量中的 name: function 形式，名称在冒号之前，由扫描器向前查找
+            (r':\s*function\b', ':')
+        ],
+        'class': [(rf'\bclass\s+({_IDENTIFIER})', 'c')],
+        'import': [
+            (r'\bimport\s+(?:[^;\'"\n]*?\bfrom\s*)?["\']([^"\'\n]+)["\']', 'i'),
+            (r'\brequire\s*\(\s*["\']([^"\'\n]+)["\']\s*\)', 'r')
+        ],
+        # 三元运算符计为分支，排除可选链(?.)和空值合并(??)
+        'extra': [('condition', r'\?(?![.?])', '?')]
+    },
+    'java': {
+        'comments': [_SLASH_COMMENTS],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'else', 'case'],
+            'loop': ['for', 'while', 'do'],
+            'try': ['try'],
+            'exception': ['catch', 'finally']
+        },
+        'function': [_C_STYLE_FUNCTION],
+        'class': [(rf'\b(?:class|interface|enum|record)\s+({_IDENTIFIER})', 'cier')],
+        'import': [(r'\bimport\s+(?:static\s+)?([\w.*]+)', 'i')]
+    },
+    'c': {
+        'comments': [_SLASH_COMMENTS],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'else', 'case'],
+            'loop': ['for', 'while', 'do'],
+            'try': [],
+            'exception': []
+        },
+        'function': [_C_STYLE_FUNCTION],
+        'class': [(rf'\bstruct\s+({_IDENTIFIER})\s*(?=\{{)', 's')],
+        'import': [(r'#\s*include\s*[<"]([^>"\n]+)[>"]', '#')]
+    },
+    'go': {
+        'comments': [_SLASH_COMMENTS],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED, _BACKTICK_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'else', 'case'],
+            'loop': ['for'],
+            'try': [],
+            'exception': ['recover']
+        },
+        'function': [(rf'\bfunc\s+(?:\([^)]*\)\s*)?({_IDENTIFIER})\s*[\[\(]', 'f')],
+        'class': [(rf'\btype\s+({_IDENTIFIER})\s+(?:struct|interface)\b', 't')],
+        'import': [(r'\bimport\s+(?:\(\s*)?(?:\w+\s+)?"([^"\n]+)"', 'i')]
+    },
+    'rust': {
+        'comments': [_SLASH_COMMENTS],
+        'strings': [_DOUBLE_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'else', 'match'],
+            'loop': ['for', 'while', 'loop'],
+            'try': [],
+            'exception': []
+        },
+        'function': [(rf'\bfn\s+({_IDENTIFIER})', 'f')],
+        'class': [(rf'\b(?:struct|enum|trait)\s+({_IDENTIFIER})', 'est')],
+        'import': [(r'\buse\s+([\w:]+)', 'u')]
+    },
+    'ruby': {
+        'comments': [_HASH_COMMENT],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'indent',
+        'keywords': {
+            'condition': ['if', 'elsif', 'else', 'unless', 'when'],
+            'loop': ['while', 'until', 'for', 'each', 'loop'],
+            'try': ['begin'],
+            'exception': ['rescue', 'ensure']
+        },
+        'function': [(rf'\bdef\s+(?:self\.)?({_IDENTIFIER}[?!=]?)', 'd')],
+        'class': [(rf'\b(?:class|module)\s+({_IDENTIFIER})', 'cm')],
+        'import': [(r'\brequire(?:_relative)?\s*\(?\s*["\']([^"\'\n]+)["\']', 'r')]
+    },
+    'perl': {
+        'comments': [_HASH_COMMENT],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'brace',
+        'keywords': {
+            'condition': ['if', 'elsif', 'else', 'unless'],
+            'loop': ['for', 'foreach', 'while', 'until'],
+            'try': ['eval'],
+            'exception': []
+        },
+        'function': [(rf'\bsub\s+({_IDENTIFIER})', 's')],
+        'class': [(r'\bpackage\s+([\w:]+)', 'p')],
+        'import': [(r'\b(?:use|require)\s+([\w:]+)', 'ru')]
+    },
+    'sql': {
+        'comments': [(r'--[^\n]*|/\*[\s\S]*?\*/', '-/')],
+        'strings': [_SINGLE_QUOTED],
+        'nesting': 'indent',
+        'keywords': {
+            'condition': ['when', 'if', 'else'],
+            'loop': ['loop', 'while'],
+            'try': [],
+            'exception': ['exception']
+        },
+        'function': [(rf'\bcreate\s+(?:or\s+replace\s+)?(?:function|procedure)\s+({_IDENTIFIER})', 'c')],
+        'class': [(rf'\bcreate\s+table\s+(?:if\s+not\s+exists\s+)?({_IDENTIFIER})', 'c')],
+        'import': [],
+        'ignore_case': True
+    },
+    'html': {
+        'comments': [(r'<!--[\s\S]*?-->', '<')],
+        'strings': [_DOUBLE_QUOTED],
+        'nesting': 'indent',
+        'keywords': {},
+        'function': [],
+        'class': [],
+        'import': [(r'<(?:script|link)\b[^>]*?\b(?:src|href)\s*=\s*["\']([^"\'>]+)["\']', '<')]
+    },
+    'css': {
+        'comments': [(r'/\*[\s\S]*?\*/', '/')],
+        'strings': [_DOUBLE_QUOTED, _SINGLE_QUOTED],
+        'nesting': 'brace',
+        'keywords': {},
+        'function': [],
+        'class': [],
+        'import': [(r'@import\s+(?:url\()?\s*["\']?([^"\'\)\s;]+)', '@')]
+    }
+}
+
+
+def _derive_spec(base, keywords=None, **overrides):
+    """基于已有语言的词法规格派生新规格，keywords中的条目覆盖基础规格的同名条目"""
+    spec = dict(LEXER_SPECS[base], **overrides)
+    spec['keywords'] = dict(LEXER_SPECS[base]['keywords'], **(keywords or {}))
+    return spec
+
+
+# 语法相近的语言复用同一份词法规格
+LEXER_SPECS['typescript'] = _derive_spec(
+    'javascript',
+    function=LEXER_SPECS['javascript']['function'] + [
+        # 类中带访问修饰符的方法
+        (rf'\b(?:public|private|protected|static|async)\s+({_IDENTIFIER})\s*\([^;{{}}()]*\)\s*(?::\s*[^{{;]+)?(?=\{{)', 'aps')
+    ],
+    **{'class': [(rf'\b(?:class|interface|enum)\s+({_IDENTIFIER})', 'cei')]}
+)
+LEXER_SPECS['cpp'] = _derive_spec(
+    'c',
+    keywords={'try': ['try'], 'exception': ['catch']},
+    **{'class': [(rf'\b(?:class|struct)\s+({_IDENTIFIER})\s*(?:final\s*)?(?=[:{{])', 'cs')]}
+)
+LEXER_SPECS['csharp'] = _derive_spec(
+    'java',
+    keywords={'loop': ['for', 'foreach', 'while', 'do']},
+    **{
+        'class': [(rf'\b(?:class|interface|struct|enum|record)\s+({_IDENTIFIER})', 'ceirs')],
+        'import': [(r'\busing\s+(?:static\s+)?([\w.]+)\s*;', 'u')]
+    }
+)
+LEXER_SPECS['kotlin'] = _derive_spec(
+    'java',
+    keywords={'condition': ['if', 'else', 'when']},
+    function=[(rf'\bfun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?({_IDENTIFIER})\s*\(', 'f')],
+    **{'class': [(rf'\b(?:class|interface|object)\s+({_IDENTIFIER})', 'cio')]}
+)
+LEXER_SPECS['swift'] = _derive_spec(
+    'java',
+    keywords={'condition': ['if', 'else', 'guard', 'case'], 'loop': ['for', 'while', 'repeat'], 'try': ['do']},
+    function=[(rf'\bfunc\s+({_IDENTIFIER})', 'f')],
+    **{
+        'class': [(rf'\b(?:class|struct|protocol|enum|extension)\s+({_IDENTIFIER})', 'ceps')],
+        'import': [(r'\bimport\s+([\w.]+)', 'i')]
+    }
+)
+LEXER_SPECS['scala'] = _derive_spec(
+    'java',
+    keywords={'condition': ['if', 'else', 'case']},
+    function=[(rf'\bdef\s+({_IDENTIFIER})', 'd')],
+    **{
+        'class': [(rf'\b(?:class|object|trait)\s+({_IDENTIFIER})', 'cot')],
+        'import': [(r'\bimport\s+([\w.]+)', 'i')]
+    }
+)
+LEXER_SPECS['php'] = _derive_spec(
+    'java',
+    keywords={'loop': ['for', 'foreach', 'while', 'do']},
+    comments=[_SLASH_COMMENTS, _HASH_COMMENT],
+    function=[(rf'\bfunction\s+&?({_IDENTIFIER})\s*\(', 'f')],
+    **{
+        'class': [(rf'\b(?:class|interface|trait)\s+({_IDENTIFIER})', 'cit')],
+        'import': [(r'\b(?:use|require|require_once|include|include_once)\b\s*\(?\s*["\']?([\w\\/.]+)', 'iru')]
+    }
+)
+
+
+def build_lexer_family(language, spec):
+    """根据词法规格生成词法扫描规则族
+
+    合并后的正则在同一位置按规则顺序尝试匹配：注释和字符串排在最前，
+    其中出现的关键字不会被计入；导入和类定义连同名称一起识别；
+    函数定义排在分支、循环等关键字之后，避免 if (...) { 被当作函数。
+
+    Args:
+        language (str): 代码语言
+        spec (dict): 词法规格
+
+    Returns:
+        RuleFamily: 词法扫描规则族
+    """
+    ignore_case = spec.get('ignore_case', False)
+    rules = []
+    for pattern, lead in spec['comments']:
+        rules.append(Rule(f'{language}.comment', pattern, lead=lead))
+    for pattern, lead in spec['strings']:
+        rules.append(Rule(f'{language}.string', pattern, lead=lead))
+    # 换行及下一行的缩进，第二个分组为下一行缩进后的首个字符，用于识别空行
+    rules.append(Rule(f'{language}.newline', r'\n([ \t]*)(?=([^ \t]?))', lead='\n'))
+    if spec['nesting'] == 'brace':
+        rules.append(Rule(f'{language}.brace_open', r'\{', lead='{'))
+        rules.append(Rule(f'{language}.brace_close', r'\}', lead='}'))
+    for kind in ('import', 'class'):
+        for pattern, lead in spec[kind]:
+            rules.append(Rule(f'{language}.{kind}', pattern, lead=lead, ignore_case=ignore_case))
+    for kind, words in spec['keywords'].items():
+        if words:
+            pattern = r'\b(?:' + '|'.join(words) + r')\b'
+            lead = ''.join(sorted({word[0] for word in words}))
+            rules.append(Rule(f'{language}.{kind}', pattern, lead=lead, ignore_case=ignore_case))
+    for pattern, lead in spec['function']:
+        rules.append(Rule(f'{language}.function', pattern, lead=lead, ignore_case=ignore_case))
+    for kind, pattern, lead in spec.get('extra', []):
+        rules.append(Rule(f'{language}.{kind}', pattern, lead=lead, ignore_case=ignore_case))
+    return RuleFamily('lexer', rules)
+
+
+def build_trivia_family(language, spec):
+    """根据词法规格生成只识别注释和字符串的规则族
+
+    用于已经通过语法树得到结构信息、只需要计算注释等文本指标的场景。
+
+    Args:
+        language (str): 代码语言
+        spec (dict): 词法规格
+
+    Returns:
+        RuleFamily: 注释和字符串规则族
+    """
+    rules = [Rule(f'{language}.comment', pattern, lead=lead) for pattern, lead in spec['comments']]
+    rules += [Rule(f'{language}.string', pattern, lead=lead) for pattern, lead in spec['strings']]
+    return RuleFamily('trivia', rules)
+
+
+# 各语言的规则表，键为语言，值为规则族名称到规则族的映射
+LANGUAGE_RULES = {
+    'python': {
+        'security': RuleFamily('security', [
+            Rule('python.hardcoded-password', r'password\s*=\s*["\'][^"\']+["\']', 'p',
+                 SEVERITY_HIGH, '可能存在硬编码的密码', ignore_case=True),
+            Rule('python.sql-injection', r'execute\(["\']\s*SELECT.*?%s', 'e',
+                 SEVERITY_HIGH, '可能存在SQL注入风险', ignore_case=True),
+            Rule('python.unsafe-deserialization', r'pickle\.loads|yaml\.load\(', 'py',
+                 SEVERITY_MEDIUM, '使用了可能不安全的反序列化方法')
+        ]),
+        'suggestion': RuleFamily('suggestion', [
+            Rule('python.broad-except', r'except:|except Exception:', 'e',
+                 SEVERITY_LOW, '避免捕获所有异常，应该捕获特定类型的异常'),
+            Rule('python.type-hints', r'def\s+\w+\([^)]*\)\s*->\s*\w+:', lead='d')
+        ])
+    },
+    'javascript': {
+        'security': RuleFamily('security', [
+            Rule('javascript.eval', r'\beval\(', 'e',
+                 SEVERITY_HIGH, '使用了不安全的eval()函数'),
+            Rule('javascript.xss', r'innerHTML|document\.write\(', 'id',
+                 SEVERITY_MEDIUM, '可能存在XSS风险'),
+            Rule('javascript.redos', r'RegExp\([^)]+\+', 'R',
+                 SEVERITY_MEDIUM, '使用了可能导致ReDoS攻击的正则表达式')
+        ]),
+        'suggestion': RuleFamily('suggestion', [
+            Rule('javascript.var', r'\bvar ', 'v',
+                 SEVERITY_LOW, '使用let和const替代var以避免变量提升问题'),
+            Rule('javascript.async', r'\basync\s', lead='a'),
+            Rule('javascript.promise-chain', r'then\(|catch\(', lead='tc')
+        ])
+    },
+    # 未单独配置规则的语言使用的通用规则
+    'generic': {
+        'security': RuleFamily('security', []),
+        'suggestion': RuleFamily('suggestion', [])
+    }
+}
+
+for _language, _spec in LEXER_SPECS.items():
+    LANGUAGE_RULES.setdefault(_language, {})['lexer'] = build_lexer_family(_language, _spec)
+    LANGUAGE_RULES[_language]['trivia'] = build_trivia_family(_language, _spec)
+# 未配置词法规格的语言按Python处理
+LANGUAGE_RULES['generic']['lexer'] = LANGUAGE_RULES['python']['lexer']
+LANGUAGE_RULES['generic']['trivia'] = LANGUAGE_RULES['python']['trivia']
+
+
+def get_rule_family(language, family):
+    """获取指定语言的规则族
+
+    未配置的语言或语言中没有的规则族使用通用规则。
+
+    Args:
+        language (str): 代码语言
+        family (str): 规则族名称：lexer、trivia、security或suggestion
+
+    Returns:
+        RuleFamily: 规则族
+    """
+    rules = LANGUAGE_RULES.get(language)
+    if rules is None or family not in rules:
+        rules = LANGUAGE_RULES['generic']
+    return rules[family]
+
+
+def get_lexer_spec(language):
+    """获取指定语言的词法规格，未配置的语言使用Python的规格
+
+    Args:
+        language (str): 代码语言
+
+    Returns:
+        dict: 词法规格
+    """
+    return LEXER_SPECS.get(language, LEXER_SPECS['python'])
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import os
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_loop = None
+
+
+def _create_client():
+    """根据环境变量创建带连接池的异步HTTP客户端"""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '1000')),
+        max_keepalive_connections=int(os.getenv('ASYNC_HTTP_MAX_KEEPALIVE', '100')),
+        keepalive_expiry=float(os.getenv('ASYNC_HTTP_KEEPALIVE_EXPIRY', '60'))
+    )
+    logger.info("创建异步HTTP客户端，最大连接数: %s", limits.max_connections)
+    return httpx.AsyncClient(limits=limits)
+
+
+def get_async_http_client():
+    """获取当前事件循环共享的异步HTTP客户端
+
+    ASGI模式下所有大模型服务共用同一个客户端及其连接池。等待上游响应时不占用线程，
+    同时进行的上游请求数只受ASYNC_HTTP_MAX_CONNECTIONS限制。客户端与创建它的
+    事件循环绑定，事件循环变化时（例如测试中）重新创建。
+
+    Returns:
+        httpx.AsyncClient: 共享的异步HTTP客户端
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = _create_client()
+        _client_loop = loop
+    return _client
+
+
+async def close_async_http_client():
+    """关闭共享的异步HTTP客户端，在ASGI应用关闭时调用"""
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
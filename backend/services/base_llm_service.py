@@ -0,0 +1,555 @@
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from services.async_http_client import get_async_http_client
+from services.http_client import get_http_session
+from services.prompt_builder import PromptBuilder
+from services.rate_limiter import PRIORITY_DEFAULT, estimate_tokens
+from services.response_cache import get_response_cache, make_cache_key
+from services.semantic_cache import get_semantic_cache
+from services.single_flight import get_single_flight, normalize_prompt
+from utils.metrics import UPSTREAM_LATENCY, stage_timer
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+async def aiter_events(events):
+    """把事件列表包装为异步生成器，与流式调用的返回值类型一致
+
+    Args:
+        events (list): 事件列表
+
+    Yields:
+        dict: 事件
+    """
+    for event in events:
+        yield event
+
+
+class LLMServiceError(Exception):
+    """大模型服务调用失败，result与generate_response返回的失败结果格式相同"""
+
+    def __init__(self, result):
+        super().__init__(result.get('error', ''))
+        self.result = result
+
+
+class BaseLLMService:
+    """大模型服务基类，封装各服务提供方共用的缓存、流式输出和问题求解逻辑
+
+    子类需要设置provider_name、display_name和model，并实现is_configured、
+    _not_configured_response和_call_api方法；支持增量输出的服务还应实现_stream_api。
+    调用上游API时应使用self.session，以复用进程内共享的连接池，
+    并通过self.retry_policy执行，以获得统一的退避重试、超时和熔断行为。
+    设置了self.rate_limiter时，每次上游调用前先按优先级排队取得配额，
+    超出配额且无法排队时generate_response和stream_response抛出RateLimitExceeded，
+    流式调用在开始输出之前抛出。
+
+    ASGI模式使用以a开头的异步方法（agenerate_response、astream_response等），
+    子类实现_acall_api和_astream_api并通过self.async_client调用上游API，
+    等待响应时不占用线程；未实现时退回到在线程池中执行同步方法。
+    """
+
+    provider_name = 'base'
+    # 生成的解决方案中显示的服务名称
+    display_name = '大模型'
+
+    def __init__(self):
+        """初始化服务基类"""
+        self.model = None
+        self.cache_enabled = os.getenv('ENABLE_RESPONSE_CACHE', 'true').lower() == 'true'
+        self.response_cache = get_response_cache() if self.cache_enabled else None
+        # 可选的语义缓存，精确匹配未命中时用于近似重复的提示词
+        self.semantic_cache = get_semantic_cache()
+        # 合并相同提示词的并发请求，只向上游发送一次
+        self.single_flight = get_single_flight()
+        # 上游调用的重试策略和限流器，由子类根据各自的环境变量创建
+        self.retry_policy = None
+        self.rate_limiter = None
+        # 按模型的token预算构建提示词，子类根据模型替换
+        self.prompt_builder = PromptBuilder()
+
+    @property
+    def session(self):
+        """进程内共享的HTTP会话（带连接池）"""
+        return get_http_session()
+
+    @property
+    def async_client(self):
+        """当前事件循环共享的异步HTTP客户端（带连接池）"""
+        return get_async_http_client()
+
+    def is_configured(self):
+        """检查服务是否已正确配置
+
+        Returns:
+            bool: 已配置返回True
+        """
+        raise NotImplementedError
+
+    def _not_configured_response(self):
+        """服务未配置时返回的结果
+
+        Returns:
+            dict: 失败结果
+        """
+        raise NotImplementedError
+
+    def _unavailable_response(self, error):
+        """熔断器打开、请求未发送到上游时返回的结果
+
+        Args:
+            error (CircuitOpenError): 熔断器抛出的异常
+
+        Returns:
+            dict: 失败结果
+        """
+        logger.warning("%s暂时不可用: %s", self.display_name, error)
+        return {
+            'success': False,
+            'error': str(error),
+            'content': f'{self.display_name}暂时不可用，请稍后再试。',
+            'retry_after': round(error.retry_after, 1)
+        }
+
+    def _call_api(self, prompt, max_tokens):
+        """执行实际的API调用
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+
+        Returns:
+            dict: API响应结果
+        """
+        raise NotImplementedError
+
+    def _stream_api(self, prompt, max_tokens):
+        """以流式方式执行API调用，逐个返回生成的文本片段
+
+        默认实现不支持增量输出：完整调用一次_call_api，把结果作为一个片段返回。
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+
+        Yields:
+            str: 新生成的文本片段
+
+        Raises:
+            LLMServiceError: API调用失败
+        """
+        result = self._call_api(prompt, max_tokens)
+        if not result.get('success'):
+            raise LLMServiceError(result)
+        yield result['content']
+
+    async def _acall_api(self, prompt, max_tokens):
+        """异步执行API调用，默认在线程池中执行_call_api
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+
+        Returns:
+            dict: API响应结果
+        """
+        return await asyncio.to_thread(self._call_api, prompt, max_tokens)
+
+    async def _astream_api(self, prompt, max_tokens):
+        """以异步流式方式执行API调用，默认把_acall_api的完整结果作为一个片段返回
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+
+        Yields:
+            str: 新生成的文本片段
+
+        Raises:
+            LLMServiceError: API调用失败
+        """
+        result = await self._acall_api(prompt, max_tokens)
+        if not result.get('success'):
+            raise LLMServiceError(result)
+        yield result['content']
+
+    def _observe_upstream(self, phase, seconds):
+        """记录一次上游调用的耗时
+
+        Args:
+            phase (str): ttfb（收到响应头或首个片段）或total（一次尝试或整个流式输出）
+            seconds (float): 耗时（秒）
+        """
+        UPSTREAM_LATENCY.observe(seconds, upstream=self.provider_name, phase=phase)
+
+    def _semantic_namespace(self, max_tokens):
+        """语义缓存的命名空间，只有服务提供方、模型和max_tokens都相同的提示词才会相互匹配"""
+        return f'{self.provider_name}:{self.model}:{max_tokens}'
+
+    def _lookup_cache(self, prompt, max_tokens, semantic_key=None):
+        """查询响应缓存，精确匹配未命中时再查询语义缓存
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            semantic_key (tuple): 语义缓存使用的(问题, 上下文)，为None时不查询语义缓存
+
+        Returns:
+            tuple: (缓存键, 缓存的结果)，未启用缓存时缓存键为None，未命中时结果为None
+        """
+        with stage_timer('cache_lookup'):
+            cache_key, cached = None, None
+            if self.response_cache is not None:
+                cache_key = make_cache_key(self.provider_name, self.model, prompt, max_tokens)
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.debug("%s响应缓存命中，key=%s...", self.provider_name, cache_key[:8])
+                    cached['cached'] = True
+                    return cache_key, cached
+            if self.semantic_cache is not None and semantic_key is not None:
+                question, context = semantic_key
+                cached, similarity = self.semantic_cache.get(self._semantic_namespace(max_tokens), question, context)
+                if cached is not None:
+                    logger.debug("%s语义缓存命中，相似度: %.3f", self.provider_name, similarity)
+                    cached['cached'] = True
+                    cached['semantic_similarity'] = round(similarity, 3)
+            return cache_key, cached
+
+    def _store_cache(self, cache_key, max_tokens, result, semantic_key=None):
+        """把成功的结果写入响应缓存和语义缓存，失败结果需要在下次请求时重试"""
+        if not result.get('success'):
+            return
+        if cache_key is not None:
+            self.response_cache.set(cache_key, result)
+        if self.semantic_cache is not None and semantic_key is not None:
+            question, context = semantic_key
+            self.semantic_cache.set(self._semantic_namespace(max_tokens), question, result, context)
+
+    def _flight_key(self, prompt, max_tokens):
+        """计算合并并发请求使用的键，提示词经过规范化，只有空白差异的请求视为相同"""
+        return make_cache_key(self.provider_name, self.model, normalize_prompt(prompt), max_tokens)
+
+    def _reserve_tokens(self, prompt, max_tokens):
+        """估算一次调用最多消耗的token数（提示词加最大生成数），用于向限流器申请配额"""
+        return estimate_tokens(prompt) + max_tokens
+
+    def _settle_tokens(self, reserved, result):
+        """根据上游返回的实际用量，把多预留的token归还给限流器"""
+        used = (result.get('usage') or {}).get('total_tokens')
+        if self.rate_limiter is not None and used is not None:
+            self.rate_limiter.refund(reserved - used)
+
+    def _settle_stream_tokens(self, max_tokens, chunks):
+        """流式调用没有上游返回的用量，按已生成内容的估算值归还预留的最大生成数中未用完的部分"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.refund(max_tokens - estimate_tokens(''.join(chunks)))
+
+    def _call_and_cache(self, prompt, max_tokens, cache_key, priority, semantic_key):
+        """取得限流配额后调用API，并缓存成功的响应"""
+        reserved = self._reserve_tokens(prompt, max_tokens)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(reserved, priority)
+        result = self._call_api(prompt, max_tokens)
+        self._settle_tokens(reserved, result)
+        self._store_cache(cache_key, max_tokens, result, semantic_key)
+        return result
+
+    def generate_response(self, prompt, max_tokens=2048, priority=PRIORITY_DEFAULT, semantic_key=None):
+        """调用大模型生成回答，命中缓存时直接返回缓存结果
+
+        缓存未命中时，相同提示词的并发请求只调用一次上游API，
+        其余请求等待并共享同一个结果（结果中coalesced为True）。
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            priority (int): 限流排队的优先级，见services.rate_limiter
+            semantic_key (tuple): (问题, 上下文)，提供时启用语义缓存：问题参与相似度比较，
+                上下文（语言、代码上下文等提示词中的其余部分）必须完全相同
+
+        Returns:
+            dict: 包含生成的回答和状态信息
+
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待
+        """
+        if not self.is_configured():
+            return self._not_configured_response()
+
+        cache_key, cached = self._lookup_cache(prompt, max_tokens, semantic_key)
+        if cached is not None:
+            return cached
+
+        if self.single_flight is None:
+            return self._call_and_cache(prompt, max_tokens, cache_key, priority, semantic_key)
+        result, shared = self.single_flight.do(
+            self._flight_key(prompt, max_tokens),
+            lambda: self._call_and_cache(prompt, max_tokens, cache_key, priority, semantic_key)
+        )
+        return dict(result, coalesced=True) if shared else result
+
+    def stream_response(self, prompt, max_tokens=2048, priority=PRIORITY_DEFAULT, semantic_key=None):
+        """以流式方式调用大模型，生成的文本片段一到达就返回给调用方
+
+        命中缓存时把缓存的完整回答作为一个片段返回；流式输出完整结束后，
+        拼接出的回答与generate_response的结果格式相同，并写入响应缓存。
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            priority (int): 限流排队的优先级
+            semantic_key (tuple): 语义缓存使用的(问题, 上下文)，见generate_response
+
+        Returns:
+            iterator: 事件的生成器，event为delta（包含content片段）、done（result为完整结果）
+                或error（result为失败结果）
+
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待；在返回生成器之前抛出，
+                调用方可以在开始流式输出之前返回429
+        """
+        if not self.is_configured():
+            return iter([{'event': 'error', 'result': self._not_configured_response()}])
+
+        cache_key, cached = self._lookup_cache(prompt, max_tokens, semantic_key)
+        if cached is not None:
+            return iter(self._cached_events(cached))
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._reserve_tokens(prompt, max_tokens), priority)
+        return self._stream_events(prompt, max_tokens, cache_key, semantic_key)
+
+    def _cached_events(self, cached):
+        """命中缓存时的流式事件：完整回答作为一个片段返回"""
+        return [{'event': 'delta', 'content': cached.get('content', '')}, {'event': 'done', 'result': cached}]
+
+    def _stream_events(self, prompt, max_tokens, cache_key, semantic_key):
+        """取得限流配额后流式调用API，逐个返回事件，结束后缓存完整的回答"""
+        start_time = time.time()
+        chunks = []
+        try:
+            for chunk in self._stream_api(prompt, max_tokens):
+                if chunk:
+                    chunks.append(chunk)
+                    yield {'event': 'delta', 'content': chunk}
+        except LLMServiceError as e:
+            yield {'event': 'error', 'result': e.result}
+            return
+        finally:
+            # 正常结束、上游出错或客户端断开导致生成器被关闭时都归还未用完的配额
+            self._settle_stream_tokens(max_tokens, chunks)
+
+        result = {
+            'success': True,
+            'content': ''.join(chunks),
+            'model': self.model,
+            'response_time': time.time() - start_time
+        }
+        self._store_cache(cache_key, max_tokens, result, semantic_key)
+        yield {'event': 'done', 'result': result}
+
+    def build_solution_prompt(self, problem_description, code_context='', language='python'):
+        """构建解决编程问题的提示词，超过模型的token预算时截断问题描述、代码上下文只保留与问题相关的部分
+
+        Args:
+            problem_description (str): 问题描述
+            code_context (str): 代码上下文，默认为空
+            language (str): 代码语言，默认为python
+
+        Returns:
+            str: 提示词
+        """
+        return self.prompt_builder.build_solution_prompt(problem_description, code_context, language)
+
+    @staticmethod
+    def solution_semantic_key(problem_description, code_context='', language='python'):
+        """解决问题请求的语义缓存键：问题描述参与相似度比较，语言和代码上下文必须完全相同"""
+        return problem_description, f'{language}\n{code_context}'
+
+    def parse_solution(self, response, language='python'):
+        """把大模型的回答转换为解决方案
+
+        Args:
+            response (dict): generate_response的结果
+            language (str): 代码语言
+
+        Returns:
+            dict: 包含解决方案代码、解释和额外资源的结果
+        """
+        if not response['success']:
+            return {
+                'solution_code': '# 生成解决方案时发生错误',
+                'explanation': response['content'],
+                'additional_resources': ['请检查系统配置或稍后再试']
+            }
+
+        # 简单处理返回的内容，实际项目中可能需要更复杂的解析
+        content = response['content']
+        solution_code = f'# {self.display_name}生成的解决方案\n'
+
+        # 尝试从内容中提取代码块
+        if '```' in content:
+            code_blocks = content.split('```')
+            if len(code_blocks) > 1:
+                # 提取第一个代码块作为解决方案代码
+                solution_code = code_blocks[1].strip()
+                if solution_code.startswith(language):
+                    solution_code = solution_code[len(language):].strip()
+
+        # 使用完整内容作为解释
+        return {
+            'solution_code': solution_code,
+            'explanation': content,
+            'additional_resources': [f'{self.display_name}提供的资源']
+        }
+
+    def solve_problem(self, problem_description, code_context='', language='python'):
+        """使用大模型解决编程问题
+
+        Args:
+            problem_description (str): 问题描述
+            code_context (str): 代码上下文，默认为空
+            language (str): 代码语言，默认为python
+
+        Returns:
+            dict: 包含解决方案代码、解释和额外资源的结果
+        """
+        prompt = self.build_solution_prompt(problem_description, code_context, language)
+        semantic_key = self.solution_semantic_key(problem_description, code_context, language)
+        return self.parse_solution(self.generate_response(prompt, semantic_key=semantic_key), language)
+
+    def solve_problem_stream(self, problem_description, code_context='', language='python'):
+        """以流式方式解决编程问题
+
+        Args:
+            problem_description (str): 问题描述
+            code_context (str): 代码上下文，默认为空
+            language (str): 代码语言，默认为python
+
+        Returns:
+            iterator: 与stream_response相同的事件，done事件的solution为解析后的解决方案
+
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待，在开始流式输出之前抛出
+        """
+        prompt = self.build_solution_prompt(problem_description, code_context, language)
+        semantic_key = self.solution_semantic_key(problem_description, code_context, language)
+        return self._solution_events(self.stream_response(prompt, semantic_key=semantic_key), language)
+
+    def _solution_events(self, events, language):
+        """在done事件中加入解析后的解决方案"""
+        for event in events:
+            if event['event'] == 'done':
+                event['solution'] = self.parse_solution(event['result'], language)
+            yield event
+
+    async def agenerate_response(self, prompt, max_tokens=2048, priority=PRIORITY_DEFAULT, semantic_key=None):
+        """generate_response的异步版本，缓存、合并并发请求和限流的逻辑相同
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            priority (int): 限流排队的优先级
+            semantic_key (tuple): 语义缓存使用的(问题, 上下文)，见generate_response
+
+        Returns:
+            dict: 包含生成的回答和状态信息
+
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待
+        """
+        if not self.is_configured():
+            return self._not_configured_response()
+
+        cache_key, cached = self._lookup_cache(prompt, max_tokens, semantic_key)
+        if cached is not None:
+            return cached
+
+        async def call_and_cache():
+            reserved = self._reserve_tokens(prompt, max_tokens)
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire(reserved, priority)
+            result = await self._acall_api(prompt, max_tokens)
+            self._settle_tokens(reserved, result)
+            self._store_cache(cache_key, max_tokens, result, semantic_key)
+            return result
+
+        if self.single_flight is None:
+            return await call_and_cache()
+        result, shared = await self.single_flight.ado(self._flight_key(prompt, max_tokens), call_and_cache)
+        return dict(result, coalesced=True) if shared else result
+
+    async def astream_response(self, prompt, max_tokens=2048, priority=PRIORITY_DEFAULT, semantic_key=None):
+        """stream_response的异步版本，事件格式相同
+
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            priority (int): 限流排队的优先级
+            semantic_key (tuple): 语义缓存使用的(问题, 上下文)，见generate_response
+
+        Returns:
+            async iterator: 事件的异步生成器，event为delta、done或error
+
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待，在返回生成器之前抛出
+        """
+        if not self.is_configured():
+            return aiter_events([{'event': 'error', 'result': self._not_configured_response()}])
+
+        cache_key, cached = self._lookup_cache(prompt, max_tokens, semantic_key)
+        if cached is not None:
+            return aiter_events(self._cached_events(cached))
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(self._reserve_tokens(prompt, max_tokens), priority)
+        return self._astream_events(prompt, max_tokens, cache_key, semantic_key)
+
+    async def _astream_events(self, prompt, max_tokens, cache_key, semantic_key):
+        """_stream_events的异步版本"""
+        start_time = time.time()
+        chunks = []
+        try:
+            async for chunk in self._astream_api(prompt, max_tokens):
+                if chunk:
+                    chunks.append(chunk)
+                    yield {'event': 'delta', 'content': chunk}
+        except LLMServiceError as e:
+            yield {'event': 'error', 'result': e.result}
+            return
+        finally:
+            self._settle_stream_tokens(max_tokens, chunks)
+
+        result = {
+            'success': True,
+            'content': ''.join(chunks),
+            'model': self.model,
+            'response_time': time.time() - start_time
+        }
+        self._store_cache(cache_key, max_tokens, result, semantic_key)
+        yield {'event': 'done', 'result': result}
+
+    async def asolve_problem(self, problem_description, code_context='', language='python'):
+        """solve_problem的异步版本，提示词在线程中构建，裁剪很长的代码上下文时不阻塞事件循环"""
+        prompt = await asyncio.to_thread(self.build_solution_prompt, problem_description, code_context, language)
+        semantic_key = self.solution_semantic_key(problem_description, code_context, language)
+        return self.parse_solution(await self.agenerate_response(prompt, semantic_key=semantic_key), language)
+
+    async def asolve_problem_stream(self, problem_description, code_context='', language='python'):
+        """solve_problem_stream的异步版本，返回事件的异步生成器"""
+        prompt = await asyncio.to_thread(self.build_solution_prompt, problem_description, code_context, language)
+        semantic_key = self.solution_semantic_key(problem_description, code_context, language)
+        return self._asolution_events(await self.astream_response(prompt, semantic_key=semantic_key), language)
+
+    async def _asolution_events(self, events, language):
+        """_solution_events的异步版本"""
+        async for event in events:
+            if event['event'] == 'done':
+                event['solution'] = self.parse_solution(event['result'], language)
+            yield event
\ No newline at end of file
@@ -0,0 +1,207 @@
+import logging
+import os
+import time
+from collections import Counter
+from utils.archive import ArchiveError, read_source_files
+from utils.validators import MAX_CODE_LENGTH, SUPPORTED_LANGUAGES, detect_language
+
+logger = logging.getLogger(__name__)
+
+# 仓库汇总中列出的最复杂文件数
+TOP_FILES = 10
+
+
+class BatchAnalyzer:
+    """批量代码分析器，一次请求分析整个仓库或多个文件
+
+    每个文件的分析复用CodeAnalyzer的单元缓存和共享执行器，代码总量较大时
+    在进程池中并行分析；单个请求同时执行的任务数受max_concurrency限制，
+    避免一个大仓库占满所有工作进程。
+    """
+
+    def __init__(self, code_analyzer, max_files=None, max_concurrency=None, max_total_size=None,
+                 max_upload_size=None):
+        """初始化批量代码分析器
+
+        Args:
+            code_analyzer (CodeAnalyzer): 代码分析器
+            max_files (int): 单个请求最多分析的文件数，为None时读取BATCH_MAX_FILES
+            max_concurrency (int): 单个请求同时执行的最大任务数，为None时读取BATCH_MAX_CONCURRENCY
+            max_total_size (int): 单个请求的代码总长度上限（字符数），为None时读取BATCH_MAX_TOTAL_SIZE
+            max_upload_size (int): 上传的压缩包大小上限（字节），为None时读取BATCH_MAX_UPLOAD_SIZE
+        """
+        logger.info("初始化批量代码分析器")
+        self.code_analyzer = code_analyzer
+        self.max_files = max_files or int(os.getenv('BATCH_MAX_FILES', '500'))
+        self.max_concurrency = max_concurrency or int(os.getenv('BATCH_MAX_CONCURRENCY', '4'))
+        self.max_total_size = max_total_size or int(os.getenv('BATCH_MAX_TOTAL_SIZE', '20000000'))
+        self.max_upload_size = max_upload_size or int(os.getenv('BATCH_MAX_UPLOAD_SIZE', '10000000'))
+
+    def analyze_archive(self, data, max_concurrency=None, summary_only=False):
+        """分析zip或tar压缩包中的所有源码文件
+
+        Args:
+            data (bytes): 压缩包内容
+            max_concurrency (int): 同时执行的最大任务数，不超过配置的上限
+            summary_only (bool): 是否只返回每个文件的摘要
+
+        Returns:
+            dict: 批量分析结果，格式同analyze_files
+        """
+        try:
+            files, skipped = read_source_files(data, self.max_files, self.max_total_size)
+        except ArchiveError as e:
+            logger.warning("读取压缩包失败: %s", e)
+            return {'success': False, 'error': str(e)}
+        return self.analyze_files(files, max_concurrency, summary_only, skipped)
+
+    def analyze_files(self, files, max_concurrency=None, summary_only=False, skipped=None):
+        """分析多个文件并汇总仓库级指标
+
+        Args:
+            files (list): 文件列表，每项包含filename、code，可选language（默认根据文件名推断）
+            max_concurrency (int): 同时执行的最大任务数，不超过配置的上限
+            summary_only (bool): 是否只返回每个文件的摘要，不返回完整分析结果
+            skipped (list): 已跳过的文件，会合并到结果中
+
+        Returns:
+            dict: 包含success、files（每个文件的结果）、skipped和aggregate（仓库级汇总）的结果
+        """
+        start_time = time.time()
+        if not isinstance(files, list) or not files:
+            return {'success': False, 'error': "请提供非空的files列表"}
+        if len(files) > self.max_files:
+            return {'success': False, 'error': f"单次最多分析{self.max_files}个文件"}
+
+        skipped = list(skipped or [])
+        entries = []
+        total_size = 0
+        for index, item in enumerate(files):
+            if not isinstance(item, dict):
+                skipped.append({'filename': f"files[{index}]", 'reason': '文件格式无效'})
+                continue
+            filename = item.get('filename') or f"files[{index}]"
+            code = item.get('code')
+            language = item.get('language') or detect_language(code, item.get('filename'))
+            if not isinstance(code, str) or not code.strip():
+                skipped.append({'filename': filename, 'reason': '代码内容为空'})
+            elif language not in SUPPORTED_LANGUAGES:
+                skipped.append({'filename': filename, 'reason': f"不支持的语言: {language}"})
+            elif len(code) > MAX_CODE_LENGTH:
+                skipped.append({'filename': filename, 'reason': f"代码长度超过{MAX_CODE_LENGTH // 1000}K字符"})
+            else:
+                entries.append((filename, code, language))
+                total_size += len(code)
+        if total_size > self.max_total_size:
+            return {'success': False, 'error': f"代码总长度超过{self.max_total_size // 1000000}M字符"}
+
+        concurrency = min(max_concurrency or self.max_concurrency, self.max_concurrency)
+        logger.info("批量分析%s个文件，跳过%s个，并发上限%s", len(entries), len(skipped), concurrency)
+        results = self.code_analyzer.analyze_many(
+            [(code, language) for _, code, language in entries], max_concurrency=concurrency
+        )
+
+        file_results = []
+        for (filename, code, language), result in zip(entries, results):
+            file_result = {
+                'filename': filename,
+                'language': language,
+                'success': 'error' not in result,
+                'summary': self._summarize(result)
+            }
+            if 'error' in result:
+                file_result['error'] = result['error']
+            elif not summary_only:
+                file_result['result'] = result
+            file_results.append(file_result)
+
+        elapsed_time = time.time() - start_time
+        logger.info("批量分析完成，耗时：%.2f秒", elapsed_time)
+        return {
+            'success': True,
+            'files': file_results,
+            'skipped': skipped,
+            'aggregate': self._aggregate(file_results, results, len(skipped))
+        }
+
+    def _summarize(self, result):
+        """提取单个文件分析结果的摘要
+
+        Args:
+            result (dict): CodeAnalyzer的分析结果
+
+        Returns:
+            dict: 文件摘要
+        """
+        structure = result.get('structure', {})
+        complexity = result.get('complexity', {})
+        quality = result.get('code_quality', {})
+        return {
+            'total_lines': structure.get('total_lines', 0),
+            'comment_lines': structure.get('comment_lines', 0),
+            'function_count': structure.get('function_count', 0),
+            'class_count': structure.get('class_count', 0),
+            'cyclomatic_complexity': complexity.get('cyclomatic_complexity', 0),
+            'max_nesting_depth': complexity.get('max_nesting_depth', 0),
+            'maintainability': quality.get('maintainability', 'unknown'),
+            'issue_count': len(result.get('potential_issues', [])) if 'error' not in result else 0
+        }
+
+    def _aggregate(self, file_results, results, skipped_count):
+        """汇总仓库级指标
+
+        Args:
+            file_results (list): 每个文件的结果
+            results (list): 与file_results一一对应的CodeAnalyzer分析结果
+            skipped_count (int): 跳过的文件数
+
+        Returns:
+            dict: 仓库级汇总
+        """
+        analyzed = [item for item in file_results if item['success']]
+        summaries = [item['summary'] for item in analyzed]
+        total_lines = sum(summary['total_lines'] for summary in summaries)
+        comment_lines = sum(summary['comment_lines'] for summary in summaries)
+        complexities = [summary['cyclomatic_complexity'] for summary in summaries]
+
+        languages = {}
+        for item in analyzed:
+            stats = languages.setdefault(item['language'], {'files': 0, 'lines': 0})
+            stats['files'] += 1
+            stats['lines'] += item['summary']['total_lines']
+
+        # 每个问题出现在多少个文件中
+        issues = Counter()
+        for item, result in zip(file_results, results):
+            if item['success']:
+                issues.update(set(result.get('potential_issues', [])))
+
+        most_complex = sorted(analyzed, key=lambda item: item['summary']['cyclomatic_complexity'], reverse=True)
+        return {
+            'file_count': len(file_results) + skipped_count,
+            'analyzed_files': len(analyzed),
+            'failed_files': len(file_results) - len(analyzed),
+            'skipped_files': skipped_count,
+            'languages': languages,
+            'total_lines': total_lines,
+            'comment_lines': comment_lines,
+            'comment_ratio': comment_lines / total_lines if total_lines > 0 else 0,
+            'function_count': sum(summary['function_count'] for summary in summaries),
+            'class_count': sum(summary['class_count'] for summary in summaries),
+            'average_complexity': sum(complexities) / len(complexities) if complexities else 0,
+            'max_complexity': max(complexities, default=0),
+            'max_nesting_depth': max((summary['max_nesting_depth'] for summary in summaries), default=0),
+            'maintainability': dict(Counter(summary['maintainability'] for summary in summaries)),
+            'issue_count': sum(summary['issue_count'] for summary in summaries),
+            'common_issues': [
+                {'issue': issue, 'files': count} for issue, count in issues.most_common(TOP_FILES)
+            ],
+            'most_complex_files': [
+                {
+                    'filename': item['filename'],
+                    'cyclomatic_complexity': item['summary']['cyclomatic_complexity'],
+                    'max_nesting_depth': item['summary']['max_nesting_depth']
+                }
+                for item in most_complex[:TOP_FILES]
+            ]
+        }
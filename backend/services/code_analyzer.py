@@ -1,39 +1,51 @@
 import logging
+import os
 import time
-import re
-from concurrent.futures import ThreadPoolExecutor
+from services.analysis_executor import AnalysisExecutor, BACKEND_INLINE, create_analysis_executor
+from services.analysis_rules import get_rule_family, SEVERITY_HIGH
+from services.code_scanner import scan_source
+from services.incremental_analysis import CodeUnit, get_unit_cache, merge_models, split_units, unit_key
+from services.python_ast_analyzer import build_python_model
+from utils.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
 class CodeAnalyzer:
     """代码分析器类，用于分析代码质量、复杂度和提供改进建议"""
     
-    def __init__(self, max_workers=4):
+    def __init__(self, max_workers=4, executor=None, python_ast=None, incremental=None):
         """初始化代码分析器
         
         Args:
-            max_workers (int): 并行分析的最大工作线程数
+            max_workers (int): 分析执行器的最大工作者数
+            executor (AnalysisExecutor): 分析执行器，为None时根据环境变量创建
+            python_ast (bool): Python代码是否使用语法树分析，为None时读取ANALYZER_PYTHON_AST
+            incremental (bool): 是否按顶层单元缓存分析结果，为None时读取ANALYZER_INCREMENTAL
         """
         logger.info("初始化代码分析器")
         self.max_workers = max_workers
-        self.language_patterns = {
-            'python': {
-                'comment': '#.*?$|"""[\\s\\S]*?"""|' + "'''[\\s\\S]*?'''",
-                'function': r'\s*def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(',
-                'class': r'\s*class\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*[\(\:]',
-                'import': r'\s*import\s+([a-zA-Z_][a-zA-Z0-9_\.]*)|\.\s*from\s+([a-zA-Z_][a-zA-Z0-9_\.]*)\s+import',
-                'exception': r'\s*except\s+|\s*try\s*:|\s*finally\s*:'
-            },
-            'javascript': {
-                'comment': r'\/\/.*?$|\/\*[\s\S]*?\*\/',
-                'function': r'function\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(|const\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*\([^\)]*\)\s*=>|([a-zA-Z_][a-zA-Z0-9_]*)\s*:\s*function',
-                'class': r'class\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*[\{\extends]',
-                'import': 'import\\s+.*?from\\s+["\'](.+?)["\']|require\\s*\\(["\'](.+?)["\']\\)',
-                'exception': r'try\s*{|catch\s*\(|finally\s*{'
-            },
-            # 可以添加更多语言的模式
-        }
-    
+        if python_ast is None:
+            python_ast = os.getenv('ANALYZER_PYTHON_AST', 'true').lower() == 'true'
+        self.python_ast = python_ast
+        if incremental is None:
+            incremental = os.getenv('ANALYZER_INCREMENTAL', 'true').lower() == 'true'
+        self.unit_cache = get_unit_cache() if incremental else None
+        self.executor = executor if executor is not None else create_analysis_executor(max_workers)
+        # 批量分析时每个任务包含的单元总长度（字符数）
+        self.chunk_size = int(os.getenv('ANALYZER_BATCH_CHUNK_SIZE', '65536'))
+
+    def __getstate__(self):
+        # 执行器和单元缓存持有锁和线程池，不能随任务传递到工作进程
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['unit_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        # 工作进程中的分析器直接在当前进程执行，不再创建进程池
+        self.__dict__.update(state)
+        self.executor = AnalysisExecutor(backend=BACKEND_INLINE)
+
     def analyze(self, code, language='python', context=''):
         """分析代码并提供反馈
         
@@ -46,113 +58,345 @@ class CodeAnalyzer:
             dict: 包含代码质量、建议、潜在问题和最佳实践的分析结果
         """
         start_time = time.time()
-        logger.info(f"开始分析{language}代码，长度：{len(code)}字符")
+        logger.info("开始分析%s代码，长度：%s字符", language, len(code))
         
         try:
-            # 使用线程池并行执行多个分析任务
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # 提交各种分析任务
-                complexity_future = executor.submit(self._analyze_complexity, code, language)
-                structure_future = executor.submit(self._analyze_structure, code, language)
-                quality_future = executor.submit(self._analyze_quality, code, language)
-                security_future = executor.submit(self._analyze_security, code, language)
-                
-                # 获取各个分析结果
-                complexity_result = complexity_future.result()
-                structure_result = structure_future.result()
-                quality_result = quality_future.result()
-                security_result = security_future.result()
-            
-            # 整合分析结果
-            result = {
-                'code_quality': quality_result,
-                'complexity': complexity_result,
-                'suggestions': self._generate_suggestions(code, language, quality_result, complexity_result),
-                'potential_issues': security_result.get('issues', []),
-                'best_practices': self._get_best_practices(language),
-                'structure': structure_result
-            }
+            with stage_timer('analyze_units'):
+                model, security_ids, suggestion_ids = self._analyze_units(code, language)
+            result = self._build_result(code, language, model, security_ids, suggestion_ids)
             
             elapsed_time = time.time() - start_time
-            logger.info(f"代码分析完成，耗时：{elapsed_time:.2f}秒")
+            logger.info("代码分析完成，耗时：%.2f秒", elapsed_time)
             
             return result
             
         except Exception as e:
-            logger.error(f"代码分析过程中发生错误: {str(e)}")
-            # 返回基本分析结果和错误信息
-            return {
-                'code_quality': {
-                    'maintainability': 'unknown',
-                    'readability': 'unknown',
-                    'efficiency': 'unknown'
-                },
-                'error': str(e),
-                'suggestions': ['代码分析过程中发生错误，请检查代码格式是否正确'],
-                'potential_issues': ['无法完成完整分析'],
-                'best_practices': self._get_best_practices(language)
-            }
+            logger.error("代码分析过程中发生错误: %s", e)
+            return self._error_result(language, str(e))
     
-    def _analyze_structure(self, code, language):
-        """分析代码结构
+    def analyze_many(self, sources, max_concurrency=None):
+        """批量分析多段代码
+        
+        所有代码的顶层单元一起查询单元缓存，未命中的单元按大小分组后由共享的执行器并行计算，
+        同时执行的分组数不超过max_concurrency。某段代码分析失败不影响其他代码。
+        
+        Args:
+            sources (list): (code, language)列表
+            max_concurrency (int): 同时执行的最大分组数，默认为执行器的max_workers
+            
+        Returns:
+            list: 与sources一一对应的分析结果，分析失败的位置为包含error的结果
+        """
+        start_time = time.time()
+        logger.info("开始批量分析%s段代码", len(sources))
+        
+        with stage_timer('analyze_units'):
+            records = self._analyze_sources(sources, max_concurrency)
+        results = []
+        for (code, language), (record, error) in zip(sources, records):
+            if error is not None:
+                results.append(self._error_result(language, error))
+                continue
+            try:
+                results.append(self._build_result(code, language, *record))
+            except Exception as e:
+                logger.error("代码分析过程中发生错误: %s", e)
+                results.append(self._error_result(language, str(e)))
+        
+        elapsed_time = time.time() - start_time
+        logger.info("批量分析完成，耗时：%.2f秒", elapsed_time)
+        return results
+    
+    def _error_result(self, language, error):
+        """分析失败时返回的基本分析结果和错误信息"""
+        return {
+            'code_quality': {
+                'maintainability': 'unknown',
+                'readability': 'unknown',
+                'efficiency': 'unknown'
+            },
+            'error': error,
+            'suggestions': ['代码分析过程中发生错误，请检查代码格式是否正确'],
+            'potential_issues': ['无法完成完整分析'],
+            'best_practices': self._get_best_practices(language)
+        }
+    
+    def _analyze_units(self, code, language):
+        """按顶层单元分析一段代码
         
         Args:
             code (str): 要分析的代码
             language (str): 代码语言
             
         Returns:
-            dict: 代码结构分析结果
+            tuple: (源码模型, 命中的安全规则ID集合, 命中的建议规则ID集合)
+            
+        Raises:
+            RuntimeError: 某个单元分析失败
+        """
+        record, error = self._analyze_sources([(code, language)])[0]
+        if error is not None:
+            raise RuntimeError(error)
+        return record
+    
+    def _analyze_sources(self, sources, max_concurrency=None):
+        """按顶层单元分析多段代码，未变化的单元直接复用缓存结果
+        
+        代码被切分为函数、类等顶层单元，以单元内容的哈希为键缓存每个单元的分析结果。
+        编辑后重新分析时只计算内容变化的单元，再把各单元的结果合并，
+        耗时与改动的大小而不是整个文件的大小相关。需要计算的单元按ANALYZER_BATCH_CHUNK_SIZE
+        分组，由共享的执行器按其总大小决定直接执行还是交给线程池、进程池。
+        
+        Args:
+            sources (list): (code, language)列表
+            max_concurrency (int): 同时执行的最大分组数
+            
+        Returns:
+            list: 每段代码的(分析结果, 错误信息)：分析结果为(源码模型, 命中的安全规则ID集合,
+                命中的建议规则ID集合)，错误信息为None；任何一个单元分析失败时分析结果为None
+        """
+        variant = 'ast' if self.python_ast else 'lexer'
+        all_units = []
+        all_records = []
+        errors = [None] * len(sources)
+        missing = []
+        for index, (code, language) in enumerate(sources):
+            if self.unit_cache is None:
+                units = [CodeUnit(code, 1, None)]
+                records = [None]
+            else:
+                units = split_units(code, language, variant)
+                records = self.unit_cache.get_many([unit.key for unit in units])
+            all_units.append(units)
+            all_records.append(records)
+            missing.extend((index, i) for i, record in enumerate(records) if record is None)
+        
+        if missing:
+            # 把需要计算的单元按大小分组，每组作为一个任务提交给执行器
+            chunks = []
+            chunk = []
+            chunk_size = 0
+            for index, i in missing:
+                text = all_units[index][i].text
+                chunk.append((text, sources[index][1]))
+                chunk_size += len(text)
+                if chunk_size >= self.chunk_size:
+                    chunks.append(chunk)
+                    chunk = []
+                    chunk_size = 0
+            if chunk:
+                chunks.append(chunk)
+            
+            total_size = sum(len(text) for chunk in chunks for text, _ in chunk)
+            computed = self.executor.map(
+                self._analyze_unit_batch, chunks, size=total_size, max_concurrency=max_concurrency
+            )
+            cache_items = []
+            for (index, i), (record, error) in zip(missing, (item for items in computed for item in items)):
+                if error is not None:
+                    errors[index] = errors[index] or error
+                    continue
+                all_records[index][i] = record
+                if self.unit_cache is not None:
+                    cache_items.append((all_units[index][i].key, record))
+            if cache_items:
+                self.unit_cache.set_many(cache_items)
+        logger.debug("%s段代码共%s个单元，重新分析%s个", len(sources), sum(map(len, all_units)), len(missing))
+        self._reanalyze_unsplittable(sources, all_units, all_records, errors, variant, max_concurrency)
+        
+        results = []
+        for (code, language), units, records, error in zip(sources, all_units, all_records, errors):
+            if error is not None:
+                results.append((None, error))
+                continue
+            if len(records) == 1:
+                model = records[0][0]
+            else:
+                model = merge_models([record[0] for record in records], [unit.start_line for unit in units], language)
+            security_ids = set()
+            suggestion_ids = set()
+            for _, unit_security_ids, unit_suggestion_ids in records:
+                security_ids.update(unit_security_ids)
+                suggestion_ids.update(unit_suggestion_ids)
+            results.append(((model, security_ids, suggestion_ids), None))
+        return results
+    
+    def _reanalyze_unsplittable(self, sources, all_units, all_records, errors, variant, max_concurrency=None):
+        """整体重新分析切分不可靠的Python代码
+        
+        切分规则只基于文本，Python代码可能在函数体中被切开。使用语法树分析时，
+        任何一个单元无法单独解析（回退到词法扫描）都说明切分不可靠，这时整段代码作为一个单元分析，
+        结果以整段代码的哈希缓存。词法扫描的指标逐单元累加，不受切分位置影响，不需要检查。
+        
+        Args:
+            sources (list): (code, language)列表
+            all_units (list): 每段代码的单元列表，需要整体分析的代码会被替换为一个单元
+            all_records (list): 每段代码各单元的分析结果，与all_units同步替换
+            errors (list): 每段代码的错误信息，已失败的代码不再重新分析，重新分析失败时写入
+            variant (str): 参与缓存键计算的配置
+            max_concurrency (int): 同时执行的最大分组数
+        """
+        if not self.python_ast or self.unit_cache is None:
+            return
+        indexes = [
+            index for index, ((code, language), records) in enumerate(zip(sources, all_records))
+            if errors[index] is None and language == 'python' and len(records) > 1
+            and any(record[0].backend != 'ast' for record in records)
+        ]
+        if not indexes:
+            return
+        
+        units = [CodeUnit(sources[index][0], 1, unit_key(sources[index][0], 'python', variant)) for index in indexes]
+        records = self.unit_cache.get_many([unit.key for unit in units])
+        missing = [i for i, record in enumerate(records) if record is None]
+        if missing:
+            logger.debug("%s段Python代码的单元无法单独解析，整体重新分析", len(missing))
+            computed = self.executor.map(
+                self._analyze_unit_batch, [[(units[i].text, 'python')] for i in missing],
+                size=sum(len(units[i].text) for i in missing), max_concurrency=max_concurrency
+            )
+            for i, ((record, error),) in zip(missing, computed):
+                records[i] = record
+                errors[indexes[i]] = error
+            self.unit_cache.set_many([(units[i].key, records[i]) for i in missing if records[i] is not None])
+        for index, unit, record in zip(indexes, units, records):
+            all_units[index] = [unit]
+            all_records[index] = [record]
+    
+    def _analyze_unit_batch(self, items):
+        """分析一组单元
+        
+        Args:
+            items (list): (单元源码, 代码语言)列表
+            
+        Returns:
+            list: 每个单元的(分析结果, 错误信息)：分析结果为(源码模型, 安全规则ID元组, 建议规则ID元组)，
+                错误信息为None；分析失败的单元为(None, 错误信息)，失败结果不写入单元缓存
+        """
+        results = []
+        for text, language in items:
+            try:
+                results.append(((
+                    self._build_model(text, language),
+                    tuple(rule.rule_id for rule in get_rule_family(language, 'security').find_rules(text)),
+                    tuple(rule.rule_id for rule in get_rule_family(language, 'suggestion').find_rules(text))
+                ), None))
+            except Exception as e:
+                logger.error("分析%s代码单元时发生错误: %s", language, e)
+                results.append((None, str(e)))
+        return results
+    
+    def _build_result(self, code, language, model, security_ids, suggestion_ids):
+        """根据源码模型和命中的规则生成完整的分析结果
+        
+        Args:
+            code (str): 要分析的代码
+            language (str): 代码语言
+            model (SourceModel): 源码模型
+            security_ids (set): 命中的安全规则ID
+            suggestion_ids (set): 命中的建议规则ID
+            
+        Returns:
+            dict: 分析结果
+        """
+        with stage_timer('analyze_complexity'):
+            complexity_result = self._analyze_complexity(code, language, model)
+        with stage_timer('analyze_structure'):
+            structure_result = self._analyze_structure(code, language, model)
+        with stage_timer('analyze_quality'):
+            quality_result = self._analyze_quality(code, language, model)
+        with stage_timer('analyze_security'):
+            security_result = self._security_report(language, security_ids)
+        with stage_timer('analyze_suggestions'):
+            suggestions = self._generate_suggestions(code, language, quality_result, complexity_result, suggestion_ids)
+        
+        # 整合分析结果
+        return {
+            'code_quality': quality_result,
+            'complexity': complexity_result,
+            'suggestions': suggestions,
+            'potential_issues': security_result.get('issues', []),
+            'best_practices': self._get_best_practices(language),
+            'structure': structure_result
+        }
+    
+    def stats(self):
+        """获取执行器和单元缓存的统计信息
+        
+        Returns:
+            dict: 统计信息
         """
-        patterns = self.language_patterns.get(language, self.language_patterns['python'])
+        stats = self.executor.stats()
+        stats['unit_cache'] = self.unit_cache.stats() if self.unit_cache is not None else None
+        return stats
+    
+    def _build_model(self, code, language):
+        """构建源码模型
+        
+        Python代码优先使用语法树，存在语法错误时回退到词法扫描。
         
-        # 提取函数和类
-        functions = re.findall(patterns['function'], code, re.MULTILINE)
-        classes = re.findall(patterns['class'], code, re.MULTILINE)
-        imports = re.findall(patterns['import'], code, re.MULTILINE)
+        Args:
+            code (str): 要分析的代码
+            language (str): 代码语言
+            
+        Returns:
+            SourceModel: 源码模型
+        """
+        if language == 'python' and self.python_ast:
+            model = build_python_model(code)
+            if model is not None:
+                return model
+        return scan_source(code, language)
+    
+    def _analyze_structure(self, code, language, model=None):
+        """分析代码结构
         
-        # 计算代码行数和注释行数
-        total_lines = len(code.split('\n'))
-        comments = re.findall(patterns['comment'], code, re.MULTILINE)
-        comment_lines = sum(c.count('\n') + 1 for c in comments)
+        Args:
+            code (str): 要分析的代码
+            language (str): 代码语言
+            model (SourceModel): 已构建的源码模型，为None时重新扫描
+            
+        Returns:
+            dict: 代码结构分析结果
+        """
+        if model is None:
+            model = self._build_model(code, language)
         
         # 计算注释比例
-        comment_ratio = comment_lines / total_lines if total_lines > 0 else 0
+        total_lines = model.line_count
+        comment_ratio = model.comment_lines / total_lines if total_lines > 0 else 0
         
         return {
             'total_lines': total_lines,
-            'comment_lines': comment_lines,
+            'comment_lines': model.comment_lines,
             'comment_ratio': comment_ratio,
-            'function_count': len(functions),
-            'class_count': len(classes),
-            'import_count': len(imports),
-            'functions': functions[:10],  # 限制返回数量
-            'classes': classes[:5]        # 限制返回数量
+            'function_count': len(model.functions),
+            'class_count': len(model.classes),
+            'import_count': len(model.imports),
+            'functions': model.functions[:10],  # 限制返回数量
+            'classes': model.classes[:5]        # 限制返回数量
         }
     
-    def _analyze_quality(self, code, language):
+    def _analyze_quality(self, code, language, model=None):
         """分析代码质量
         
         Args:
             code (str): 要分析的代码
             language (str): 代码语言
+            model (SourceModel): 已构建的源码模型，为None时重新扫描
             
         Returns:
             dict: 代码质量分析结果
         """
-        patterns = self.language_patterns.get(language, self.language_patterns['python'])
-        
-        # 分析注释比例
-        structure = self._analyze_structure(code, language)
-        comment_ratio = structure['comment_ratio']
+        if model is None:
+            model = self._build_model(code, language)
         
-        # 分析异常处理
-        exceptions = re.findall(patterns['exception'], code, re.MULTILINE)
-        has_exception_handling = len(exceptions) > 0
+        # 分析注释比例和异常处理
+        comment_ratio = model.comment_lines / model.line_count if model.line_count > 0 else 0
+        has_exception_handling = model.counts['try'] + model.counts['exception'] > 0
         
         # 分析代码行长度
-        lines = code.split('\n')
-        long_lines = sum(1 for line in lines if len(line.strip()) > 100)
-        long_line_ratio = long_lines / len(lines) if lines else 0
+        long_line_ratio = model.long_lines / model.line_count if model.line_count > 0 else 0
         
         # 评估可维护性
         if comment_ratio >= 0.2 and has_exception_handling and long_line_ratio < 0.1:
@@ -188,51 +432,36 @@ class CodeAnalyzer:
             }
         }
     
-    def _analyze_security(self, code, language):
-        """分析代码安全性
+    def _security_report(self, language, rule_ids):
+        """根据命中的安全规则生成安全性分析结果
         
         Args:
-            code (str): 要分析的代码
             language (str): 代码语言
+            rule_ids (set): 命中的安全规则ID
             
         Returns:
             dict: 代码安全性分析结果
         """
-        issues = []
+        rules = [rule for rule in get_rule_family(language, 'security').rules if rule.rule_id in rule_ids]
+        issues = [rule.message for rule in rules]
         
-        # 检查常见安全问题（示例）
-        if language == 'python':
-            # 检查硬编码密码
-            if re.search(r'password\s*=\s*["\'][^"\'\']+["\']', code, re.IGNORECASE):
-                issues.append('可能存在硬编码的密码')
-            
-            # 检查SQL注入风险
-            if re.search(r'execute\(["\']\s*SELECT.*?\%s', code, re.IGNORECASE):
-                issues.append('可能存在SQL注入风险')
-                
-            # 检查不安全的反序列化
-            if 'pickle.loads' in code or 'yaml.load(' in code:
-                issues.append('使用了可能不安全的反序列化方法')
-        
-        elif language == 'javascript':
-            # 检查eval使用
-            if 'eval(' in code:
-                issues.append('使用了不安全的eval()函数')
-                
-            # 检查XSS风险
-            if 'innerHTML' in code or 'document.write(' in code:
-                issues.append('可能存在XSS风险')
-                
-            # 检查不安全的正则表达式
-            if re.search(r'RegExp\([^)]+\+', code):
-                issues.append('使用了可能导致ReDoS攻击的正则表达式')
+        if len(issues) > 2 or any(rule.severity == SEVERITY_HIGH for rule in rules):
+            risk_level = 'high'
+        elif issues:
+            risk_level = 'medium'
+        else:
+            risk_level = 'low'
         
         return {
             'issues': issues,
-            'risk_level': 'high' if len(issues) > 2 else 'medium' if len(issues) > 0 else 'low'
+            'findings': [
+                {'rule_id': rule.rule_id, 'severity': rule.severity, 'message': rule.message}
+                for rule in rules
+            ],
+            'risk_level': risk_level
         }
     
-    def _generate_suggestions(self, code, language, quality_result, complexity_result):
+    def _generate_suggestions(self, code, language, quality_result, complexity_result, found=None):
         """生成代码改进建议
         
         Args:
@@ -240,6 +469,7 @@ class CodeAnalyzer:
             language (str): 代码语言
             quality_result (dict): 质量分析结果
             complexity_result (dict): 复杂度分析结果
+            found (set): 已命中的建议规则ID，为None时扫描代码
             
         Returns:
             list: 改进建议列表
@@ -265,19 +495,21 @@ class CodeAnalyzer:
         if complexity_result.get('max_nesting_depth', 0) > 3:
             suggestions.append('减少代码嵌套层级，过深的嵌套会降低代码可读性')
         
-        # 语言特定建议
+        # 语言特定建议，所有建议规则在一次扫描中完成
+        if found is None:
+            found = {rule.rule_id for rule in get_rule_family(language, 'suggestion').find_rules(code)}
         if language == 'python':
-            if 'except:' in code or 'except Exception:' in code:
+            if 'python.broad-except' in found:
                 suggestions.append('避免捕获所有异常，应该捕获特定类型的异常')
                 
-            if not re.search(r'def\s+\w+\([^)]*\)\s*->\s*\w+:', code):
+            if 'python.type-hints' not in found:
                 suggestions.append('考虑使用类型提示增强代码可读性和可维护性')
         
         elif language == 'javascript':
-            if 'var ' in code:
+            if 'javascript.var' in found:
                 suggestions.append('使用let和const替代var以避免变量提升问题')
                 
-            if not re.search(r'\s+async\s+', code) and ('then(' in code or 'catch(' in code):
+            if 'javascript.async' not in found and 'javascript.promise-chain' in found:
                 suggestions.append('考虑使用async/await替代Promise链以提高代码可读性')
         
         return suggestions
@@ -320,70 +552,29 @@ class CodeAnalyzer:
         
         return common_practices + language_specific.get(language, [])
     
-    def _analyze_complexity(self, code, language='python'):
+    def _analyze_complexity(self, code, language='python', model=None):
         """分析代码复杂度
         
         Args:
             code (str): 要分析的代码
             language (str): 代码语言
+            model (SourceModel): 已构建的源码模型，为None时重新扫描
             
         Returns:
             dict: 代码复杂度分析结果
         """
-        # 计算圈复杂度（简化版）
-        patterns = self.language_patterns.get(language, self.language_patterns['python'])
+        if model is None:
+            model = self._build_model(code, language)
         
-        # 分析条件语句和循环
-        if language == 'python':
-            # 计算条件分支和循环
-            if_count = len(re.findall(r'\s+if\s+|\s+elif\s+|\s+else\s*:', code, re.MULTILINE))
-            loop_count = len(re.findall(r'\s+for\s+|\s+while\s+', code, re.MULTILINE))
-            try_count = len(re.findall(r'\s+try\s*:', code, re.MULTILINE))
-            
-            # 计算函数数量
-            function_count = len(re.findall(patterns['function'], code, re.MULTILINE))
-            
-            # 估算圈复杂度
-            cyclomatic_complexity = 1 + if_count + loop_count + try_count
-            
-        elif language == 'javascript':
-            # 计算条件分支和循环
-            if_count = len(re.findall(r'\s+if\s*\(|\s+else\s+|\s+else\s+if\s*\(|\?', code, re.MULTILINE))
-            loop_count = len(re.findall(r'\s+for\s*\(|\s+while\s*\(|\s+do\s*\{', code, re.MULTILINE))
-            try_count = len(re.findall(r'\s+try\s*\{', code, re.MULTILINE))
-            
-            # 计算函数数量
-            function_count = len(re.findall(patterns['function'], code, re.MULTILINE))
-            
-            # 估算圈复杂度
+        # 分支、循环和try的数量
+        if_count = model.counts['condition']
+        loop_count = model.counts['loop']
+        try_count = model.counts['try']
+        
+        # 语法树模型直接给出圈复杂度，词法扫描时根据关键字数量估算
+        cyclomatic_complexity = model.cyclomatic_complexity
+        if cyclomatic_complexity is None:
             cyclomatic_complexity = 1 + if_count + loop_count + try_count
-            
-        else:
-            # 默认简单估算
-            if_count = len(re.findall(r'if|else', code, re.IGNORECASE))
-            loop_count = len(re.findall(r'for|while|do', code, re.IGNORECASE))
-            cyclomatic_complexity = 1 + if_count + loop_count
-            function_count = 0
-        
-        # 计算嵌套深度
-        lines = code.split('\n')
-        max_indent = 0
-        current_indent = 0
-        
-        for line in lines:
-            if line.strip() == '':
-                continue
-                
-            # 计算缩进级别
-            indent = len(line) - len(line.lstrip())
-            if language == 'python':
-                # Python使用缩进表示代码块
-                current_indent = indent // 4  # 假设使用4个空格的缩进
-            else:
-                # 其他语言通过花括号计数
-                current_indent += line.count('{') - line.count('}')
-                
-            max_indent = max(max_indent, current_indent)
         
         # 评估复杂度级别
         if cyclomatic_complexity <= 5:
@@ -396,10 +587,10 @@ class CodeAnalyzer:
         return {
             'cyclomatic_complexity': cyclomatic_complexity,
             'complexity_level': complexity_level,
-            'max_nesting_depth': max_indent,
+            'max_nesting_depth': model.max_nesting,
             'condition_count': if_count,
             'loop_count': loop_count,
-            'function_count': function_count
+            'function_count': len(model.functions)
         }
         
     def analyze_complexity(self, code, language='python'):
@@ -412,19 +603,46 @@ class CodeAnalyzer:
         Returns:
             dict: 包含循环复杂度、认知复杂度等指标的分析结果
         """
-        logger.info(f"分析{language}代码复杂度")
-        
-        # 这里实现代码复杂度分析逻辑
-        # 实际项目中可能会使用专门的复杂度分析工具
+        logger.info("分析%s代码复杂度", language)
+        
+        # Python代码由语法树给出每个函数的圈复杂度、认知复杂度和嵌套深度；
+        # 其他语言（或存在语法错误的Python代码）只提供整体指标，认知复杂度为None
+        model = self._analyze_units(code, language)[0]
+        complexity = self._analyze_complexity(code, language, model)
+        functions = sorted(
+            model.function_metrics,
+            key=lambda item: (item['cyclomatic_complexity'], item['cognitive_complexity']),
+            reverse=True
+        )
+        
+        # 有函数级指标时按最复杂的函数评级，否则按整体圈复杂度评级
+        worst = functions[0]['cyclomatic_complexity'] if functions else complexity['cyclomatic_complexity']
+        if worst <= 5:
+            complexity_rating = 'low'
+        elif worst <= 10:
+            complexity_rating = 'medium'
+        else:
+            complexity_rating = 'high'
+        
+        recommendations = []
+        complex_functions = [item['name'] for item in functions if item['cyclomatic_complexity'] > 10]
+        if complex_functions:
+            recommendations.append(f"考虑将复杂的函数拆分为更小的函数：{', '.join(complex_functions[:5])}")
+        elif not functions and complexity_rating == 'high':
+            recommendations.append('考虑将复杂的函数拆分为更小的函数')
+        hard_to_read = [item['name'] for item in functions if item['cognitive_complexity'] > 15]
+        if hard_to_read:
+            recommendations.append(f"降低函数的认知复杂度：{', '.join(hard_to_read[:5])}")
+        if model.max_nesting > 3:
+            recommendations.append('减少嵌套层级以降低认知复杂度')
         
-        # 示例返回结果
         return {
-            'cyclomatic_complexity': 5,
-            'cognitive_complexity': 7,
-            'lines_of_code': len(code.split('\n')),
-            'complexity_rating': 'medium',
-            'recommendations': [
-                '考虑将复杂的函数拆分为更小的函数',
-                '减少嵌套层级以降低认知复杂度'
-            ]
+            'cyclomatic_complexity': complexity['cyclomatic_complexity'],
+            'cognitive_complexity': model.cognitive_complexity,
+            'lines_of_code': model.line_count,
+            'complexity_rating': complexity_rating,
+            'max_nesting_depth': model.max_nesting,
+            'functions': functions[:20],  # 限制返回数量
+            'backend': model.backend,
+            'recommendations': recommendations
         }
\ No newline at end of file
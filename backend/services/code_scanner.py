@@ -0,0 +1,201 @@
+import re
+from collections import Counter
+from services.analysis_rules import get_lexer_spec, get_rule_family
+
+# 超过该长度（去除首尾空白后）的代码行视为过长
+LONG_LINE_LENGTH = 100
+
+# 向前查找 name: function 形式中的函数名
+_TRAILING_IDENTIFIER = re.compile(r'([a-zA-Z_$][a-zA-Z0-9_$]*)\s*$')
+
+# 第一行的缩进（其余行的缩进由换行规则捕获）
+_LEADING_INDENT = re.compile(r'([ \t]*)(?=([^ \t]?))')
+
+# 去除首尾空白后可能超过LONG_LINE_LENGTH的行
+_LONG_LINE_CANDIDATE = re.compile(r'^[ \t]*\S[^\n]{%d,}' % LONG_LINE_LENGTH, re.MULTILINE)
+
+# 缩进后出现这些字符（或到达文本末尾）的行视为空行，不参与嵌套深度计算
+_BLANK_LINE_STARTS = ('', '\n', '\r')
+
+
+class SourceModel:
+    """一次词法扫描得到的源码模型，代码分析器的各项指标都基于该模型计算"""
+
+    __slots__ = (
+        'language', 'backend', 'line_count', 'comment_lines', 'long_lines', 'max_nesting',
+        'functions', 'classes', 'imports', 'counts', 'function_metrics',
+        'cyclomatic_complexity', 'cognitive_complexity'
+    )
+
+    def __init__(self, language):
+        """初始化空的源码模型
+
+        Args:
+            language (str): 代码语言
+        """
+        self.language = language
+        # 构建模型的方式：lexer（词法扫描）或ast（Python语法树）
+        self.backend = 'lexer'
+        self.line_count = 1
+        self.comment_lines = 0
+        self.long_lines = 0
+        self.max_nesting = 0
+        self.functions = []
+        self.classes = []
+        self.imports = []
+        # 分支、循环、try和异常处理关键字的数量
+        self.counts = Counter()
+        # 每个函数的复杂度指标和整体的圈复杂度、认知复杂度，只有语法树模型提供
+        self.function_metrics = []
+        self.cyclomatic_complexity = None
+        self.cognitive_complexity = None
+
+
+def scan_source(code, language='python'):
+    """对源码做一次词法扫描，构建源码模型
+
+    注释和字符串作为独立的词法单元被跳过，其中出现的关键字不会被计入；
+    行数、注释行、过长的行和嵌套深度都在同一次扫描中根据换行和花括号计算。
+
+    Args:
+        code (str): 要分析的代码
+        language (str): 代码语言
+
+    Returns:
+        SourceModel: 源码模型
+    """
+    model = SourceModel(language)
+    spec = get_lexer_spec(language)
+    indent_nesting = spec['nesting'] == 'indent'
+    counts = model.counts
+
+    line = 1
+    line_start = 0
+    last_comment_line = 0
+    long_lines = 0
+    depth = 0
+    max_depth = 0
+    indent_stack = []
+
+    if indent_nesting:
+        indent, first_char = _LEADING_INDENT.match(code).groups()
+        if first_char not in _BLANK_LINE_STARTS:
+            indent_stack.append(len(indent.expandtabs(4)))
+
+    family = get_rule_family(language, 'lexer')
+    for kind, match in family.tokens(code):
+        if kind == 'newline':
+            start = match.start()
+            if start - line_start > LONG_LINE_LENGTH and len(code[line_start:start].strip()) > LONG_LINE_LENGTH:
+                long_lines += 1
+            line += 1
+            line_start = start + 1
+            if indent_nesting:
+                indent, first_char = family.captures(match)
+                if first_char in _BLANK_LINE_STARTS:
+                    continue
+                # 用缩进栈计算相对嵌套层级，不依赖具体的缩进宽度
+                width = len(indent.expandtabs(4))
+                while indent_stack and width < indent_stack[-1]:
+                    indent_stack.pop()
+                if not indent_stack or width > indent_stack[-1]:
+                    indent_stack.append(width)
+                if len(indent_stack) - 1 > max_depth:
+                    max_depth = len(indent_stack) - 1
+            continue
+
+        if kind == 'brace_open':
+            depth += 1
+            if depth > max_depth:
+                max_depth = depth
+            continue
+        if kind == 'brace_close':
+            if depth > 0:
+                depth -= 1
+            continue
+
+        if kind == 'comment' or kind == 'string':
+            start = match.start()
+            text = match.group()
+            newlines = text.count('\n')
+            is_comment = kind == 'comment'
+            # 独占一行的三引号字符串是文档字符串，按注释计算
+            if not is_comment and text[0] * 3 == text[:3] and not code[line_start:start].strip():
+                is_comment = True
+            if is_comment:
+                first_line = line + 1 if line == last_comment_line else line
+                model.comment_lines += line + newlines - first_line + 1
+                last_comment_line = line + newlines
+            if newlines:
+                # 跨行的注释和字符串：逐行检查长度，并推进行号
+                lines = code[line_start:match.end()].split('\n')
+                long_lines += sum(1 for text_line in lines[:-1] if len(text_line.strip()) > LONG_LINE_LENGTH)
+                line += newlines
+                line_start = start + text.rindex('\n') + 1
+            continue
+
+        if kind in ('function', 'class', 'import'):
+            name = next((capture for capture in family.captures(match) if capture), '')
+            if not name and kind == 'function':
+                preceding = _TRAILING_IDENTIFIER.search(code, max(0, match.start() - 100), match.start())
+                name = preceding.group(1) if preceding else ''
+            if kind == 'function':
+                model.functions.append(name)
+            elif kind == 'class':
+                model.classes.append(name)
+            else:
+                model.imports.append(name)
+            continue
+
+        counts[kind] += 1
+
+    # 最后一行
+    if len(code) - line_start > LONG_LINE_LENGTH and len(code[line_start:].strip()) > LONG_LINE_LENGTH:
+        long_lines += 1
+
+    model.line_count = line
+    model.long_lines = long_lines
+    model.max_nesting = max_depth
+    return model
+
+
+def scan_text_metrics(code, language='python'):
+    """只扫描注释和字符串，计算行数、注释行和过长的行
+
+    结构和复杂度信息由其他方式（例如Python语法树）提供时使用，
+    扫描的词法单元比scan_source少得多。
+
+    Args:
+        code (str): 要分析的代码
+        language (str): 代码语言
+
+    Returns:
+        SourceModel: 只包含文本指标的源码模型
+    """
+    model = SourceModel(language)
+    line = 1
+    position = 0
+    last_comment_line = 0
+
+    for kind, match in get_rule_family(language, 'trivia').tokens(code):
+        start = match.start()
+        line += code.count('\n', position, start)
+        text = match.group()
+        newlines = text.count('\n')
+        is_comment = kind == 'comment'
+        # 独占一行的三引号字符串是文档字符串，按注释计算
+        if not is_comment and text[0] * 3 == text[:3]:
+            is_comment = not code[code.rfind('\n', 0, start) + 1:start].strip()
+        if is_comment:
+            first_line = line + 1 if line == last_comment_line else line
+            model.comment_lines += line + newlines - first_line + 1
+            last_comment_line = line + newlines
+        line += newlines
+        position = match.end()
+
+    model.line_count = code.count('\n') + 1
+    model.long_lines = sum(
+        1 for match in _LONG_LINE_CANDIDATE.finditer(code)
+        if len(match.group().strip()) > LONG_LINE_LENGTH
+    )
+    return model
@@ -1,42 +1,65 @@
 import logging
+import httpx
 import requests
 import os
+import time
 from dotenv import load_dotenv
+from services.base_llm_service import BaseLLMService
+from services.prompt_builder import PromptBuilder
+from services.rate_limiter import get_rate_limiter
+from services.resilience import CircuitOpenError, RetryPolicy
 
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class CustomAPIService:
+class CustomAPIService(BaseLLMService):
     """自定义API服务类，用于与您的自定义API通信"""
     
+    provider_name = 'custom'
+    display_name = '自定义API'
+    
     def __init__(self):
         """初始化自定义API服务"""
+        super().__init__()
         self.api_key = os.getenv('CUSTOM_API_KEY')
         self.api_url = os.getenv('CUSTOM_API_URL')
         self.model = os.getenv('CUSTOM_API_MODEL', 'default-model')
+        self.prompt_builder = PromptBuilder.for_model(self.model, 'CUSTOM_API')
+        self.retry_policy = RetryPolicy.from_env('CUSTOM_API', self.display_name, attempt_timeout=30, max_attempts=2)
+        # 默认不限流，设置CUSTOM_API_RATE_LIMIT_RPS或CUSTOM_API_RATE_LIMIT_TPM后启用
+        self.rate_limiter = get_rate_limiter(self.provider_name, self.model, 'CUSTOM_API')
         
         if not self.api_key or not self.api_url:
             logger.warning("未设置CUSTOM_API_KEY或CUSTOM_API_URL环境变量，自定义API将无法正常工作")
     
-    def generate_response(self, prompt, max_tokens=2048):
-        """调用自定义API生成回答
+    def is_configured(self):
+        """检查自定义API密钥和URL是否已配置"""
+        return bool(self.api_key and self.api_url)
+    
+    def _not_configured_response(self):
+        """自定义API未配置时返回的结果"""
+        return {
+            'success': False,
+            'error': '未配置自定义API密钥或URL',
+            'content': '系统未正确配置自定义API，请联系管理员设置CUSTOM_API_KEY和CUSTOM_API_URL环境变量。'
+        }
+    
+    def _call_api(self, prompt, max_tokens):
+        """执行实际的API调用"""
+        return self._call_custom_api(prompt, max_tokens)
+    
+    def _build_request(self, prompt, max_tokens):
+        """构建自定义API的请求头和请求体
         
         Args:
             prompt (str): 提问内容
             max_tokens (int): 最大生成token数
             
         Returns:
-            dict: 包含生成的回答和状态信息
+            tuple: (headers, payload)
         """
-        if not self.api_key or not self.api_url:
-            return {
-                'success': False,
-                'error': '未配置自定义API密钥或URL',
-                'content': '系统未正确配置自定义API，请联系管理员设置CUSTOM_API_KEY和CUSTOM_API_URL环境变量。'
-            }
-        
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
@@ -48,95 +71,88 @@ class CustomAPIService:
             'prompt': prompt,
             'max_tokens': max_tokens
         }
+        return headers, payload
+    
+    def _parse_result(self, result):
+        """解析自定义API的响应
         
-        try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+        Args:
+            result (dict): 响应JSON
             
-            # 根据您的API响应格式调整解析逻辑
-            if 'content' in result:
-                return {
-                    'success': True,
-                    'content': result['content']
-                }
-            else:
-                logger.error(f"自定义API返回了意外的响应格式: {result}")
-                return {
-                    'success': False,
-                    'error': '自定义API返回了意外的响应格式',
-                    'content': '处理请求时发生错误，请稍后再试。'
-                }
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"调用自定义API时发生错误: {str(e)}")
+        Returns:
+            dict: API响应结果
+        """
+        # 根据您的API响应格式调整解析逻辑
+        if 'content' in result:
             return {
-                'success': False,
-                'error': f'API请求错误: {str(e)}',
-                'content': '连接自定义API时发生错误，请稍后再试。'
+                'success': True,
+                'content': result['content']
             }
+        logger.error("自定义API返回了意外的响应格式: %s", result)
+        return {
+            'success': False,
+            'error': '自定义API返回了意外的响应格式',
+            'content': '处理请求时发生错误，请稍后再试。'
+        }
     
-    def solve_problem(self, problem_description, code_context='', language='python'):
-        """使用自定义API解决编程问题
+    def _request_error_response(self, error):
+        """自定义API请求失败时返回的结果"""
+        logger.error("调用自定义API时发生错误: %s", error)
+        return {
+            'success': False,
+            'error': f'API请求错误: {str(error)}',
+            'content': '连接自定义API时发生错误，请稍后再试。'
+        }
+    
+    def _call_custom_api(self, prompt, max_tokens):
+        """执行实际的自定义API调用
         
         Args:
-            problem_description (str): 问题描述
-            code_context (str): 代码上下文，默认为空
-            language (str): 代码语言，默认为python
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
             
         Returns:
-            dict: 包含解决方案代码、解释和额外资源的结果
+            dict: API响应结果
         """
-        # 构建提示词
-        prompt = f"""请解决以下{language}编程问题：
-
-问题描述：
-{problem_description}
-
-"""
-        
-        if code_context:
-            prompt += f"代码上下文：\n```{language}\n{code_context}\n```\n\n"
-        
-        prompt += """请提供以下格式的回答：
-1. 解决方案代码
-2. 详细解释
-3. 相关资源或参考链接
-
-请确保代码可以直接运行，并提供清晰的注释。"""
+        headers, payload = self._build_request(prompt, max_tokens)
         
-        # 调用自定义API
-        response = self.generate_response(prompt)
-        
-        if not response['success']:
-            return {
-                'solution_code': '# 生成解决方案时发生错误',
-                'explanation': response['content'],
-                'additional_resources': ['请检查系统配置或稍后再试']
-            }
-        
-        # 处理返回的内容
-        content = response['content']
+        def attempt(timeout):
+            start_time = time.time()
+            response = self.session.post(self.api_url, headers=headers, json=payload, timeout=timeout)
+            self._observe_upstream('ttfb', response.elapsed.total_seconds())
+            self._observe_upstream('total', time.time() - start_time)
+            response.raise_for_status()
+            return self._parse_result(response.json())
         
-        # 提取解决方案代码、解释和资源
-        solution_code = '# 自定义API生成的解决方案\n'
-        explanation = '自定义API的解释：\n'
-        additional_resources = ['自定义API提供的资源']
+        try:
+            return self.retry_policy.call(attempt)
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
+        except requests.exceptions.RequestException as e:
+            return self._request_error_response(e)
+    
+    async def _acall_api(self, prompt, max_tokens):
+        """使用异步HTTP客户端调用自定义API
         
-        # 尝试从内容中提取代码块
-        if '```' in content:
-            code_blocks = content.split('```')
-            if len(code_blocks) > 1:
-                # 提取第一个代码块作为解决方案代码
-                solution_code = code_blocks[1].strip()
-                if solution_code.startswith(language):
-                    solution_code = solution_code[len(language):].strip()
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            
+        Returns:
+            dict: API响应结果
+        """
+        headers, payload = self._build_request(prompt, max_tokens)
         
-        # 使用完整内容作为解释
-        explanation = content
+        async def attempt(timeout):
+            start_time = time.time()
+            response = await self.async_client.post(self.api_url, headers=headers, json=payload, timeout=timeout)
+            self._observe_upstream('total', time.time() - start_time)
+            response.raise_for_status()
+            return self._parse_result(response.json())
         
-        return {
-            'solution_code': solution_code,
-            'explanation': explanation,
-            'additional_resources': additional_resources
-        }
\ No newline at end of file
+        try:
+            return await self.retry_policy.acall(attempt)
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
+        except httpx.HTTPError as e:
+            return self._request_error_response(e)
\ No newline at end of file
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_expires_at ON responses (expires_at);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+class DiskResponseCache:
+    """基于SQLite（WAL模式）的磁盘响应缓存
+
+    同一台机器上的所有工作进程共享同一个数据库文件，缓存内容在进程重启和
+    重新部署后依然有效。过期清理和容量淘汰由后台线程定期执行，多个进程之间
+    通过meta表中的时间戳协调，同一时间段内只有一个进程执行压缩。
+    """
+
+    # 访问时间的更新间隔（秒），避免每次命中都产生一次写操作
+    ACCESS_TOUCH_INTERVAL = 60
+
+    def __init__(self, path, ttl=86400, max_bytes=512 * 1024 * 1024, compaction_interval=300):
+        """初始化磁盘缓存
+
+        Args:
+            path (str): SQLite数据库文件路径
+            ttl (float): 缓存条目的存活时间（秒），小于等于0表示永不过期
+            max_bytes (int): 缓存值的总字节数上限
+            compaction_interval (float): 后台压缩的执行间隔（秒）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compaction_interval = compaction_interval
+        self._local = threading.local()
+        self._maintenance_requested = False
+        self._maintenance_thread = None
+        self._maintenance_pid = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        """获取当前线程的数据库连接
+
+        SQLite连接不能跨线程或跨fork共享，因此按线程缓存连接，
+        并在检测到进程号变化（例如gunicorn预派生工作进程）时重新连接。
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        if self._maintenance_requested and self._maintenance_pid != os.getpid():
+            # fork出的子进程不会继承父进程的线程，需要重新启动后台压缩线程
+            self.start_background_maintenance()
+
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """读取缓存值
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            tuple: (value, remaining_ttl)，未命中或已过期时返回(None, None)；
+                remaining_ttl为None表示永不过期
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at, accessed_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None, None
+
+            value, expires_at, accessed_at = row
+            if expires_at is not None and expires_at <= now:
+                return None, None
+
+            if now - accessed_at > self.ACCESS_TOUCH_INTERVAL:
+                conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+
+            remaining_ttl = expires_at - now if expires_at is not None else None
+            return json.loads(value), remaining_ttl
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("读取磁盘缓存失败: %s", e)
+            return None, None
+
+    def set(self, key, value):
+        """写入缓存值
+
+        Args:
+            key (str): 缓存键
+            value (dict): 要缓存的响应
+        """
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl > 0 else None
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+            self._connect().execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, created_at, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, data, len(data.encode('utf-8')), now, expires_at, now)
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("写入磁盘缓存失败: %s", e)
+
+    def clear(self):
+        """清空缓存"""
+        self._connect().execute('DELETE FROM responses')
+
+    def stats(self):
+        """获取磁盘缓存统计信息
+
+        Returns:
+            dict: 包含条目数和字节数的统计信息
+        """
+        try:
+            count, total = self._connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+            return {'entries': count, 'bytes': total, 'path': self.path}
+        except sqlite3.Error as e:
+            logger.warning("读取磁盘缓存统计信息失败: %s", e)
+            return {'entries': 0, 'bytes': 0, 'path': self.path}
+
+    def compact(self, force=False):
+        """清理过期条目并按LRU淘汰超出容量的条目
+
+        Args:
+            force (bool): 为True时忽略其他进程最近的压缩记录，立即执行
+
+        Returns:
+            int: 被删除的条目数，未执行时返回0
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT value FROM meta WHERE name = 'last_compaction'").fetchone()
+            if not force and row is not None and now - row[0] < self.compaction_interval:
+                conn.execute('ROLLBACK')
+                return 0
+
+            removed = conn.execute(
+                'DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,)
+            ).rowcount
+
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute(
+                    'SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100'
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    total -= size
+                    removed += 1
+
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('last_compaction', ?)", (now,))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.warning("压缩磁盘缓存失败: %s", e)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            return 0
+
+        try:
+            # 将WAL文件中的内容合并回主数据库，避免WAL文件无限增长
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as e:
+            logger.debug("WAL检查点执行失败: %s", e)
+
+        if removed:
+            logger.info("磁盘缓存压缩完成，删除%s个条目", removed)
+        return removed
+
+    def start_background_maintenance(self):
+        """启动后台压缩线程（每个进程一个，fork后会自动在子进程中重新启动）"""
+        with self._lock:
+            self._maintenance_requested = True
+            if self._maintenance_thread is not None and self._maintenance_pid == os.getpid():
+                return
+            self._stop_event = threading.Event()
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, name='disk-cache-maintenance', daemon=True
+            )
+            self._maintenance_pid = os.getpid()
+            self._maintenance_thread.start()
+
+    def stop_background_maintenance(self):
+        """停止后台压缩线程"""
+        with self._lock:
+            self._maintenance_requested = False
+            self._maintenance_thread = None
+        self._stop_event.set()
+
+    def _maintenance_loop(self):
+        """后台压缩线程主循环"""
+        while not self._stop_event.wait(self.compaction_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error("磁盘缓存后台维护出错: %s", e)
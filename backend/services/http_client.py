@@ -0,0 +1,234 @@
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from utils.metrics import UPSTREAM_LATENCY
+
+logger = logging.getLogger(__name__)
+
+class PoolStats:
+    """连接池统计信息（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.connect_time_total = 0.0
+
+    def record_checkout(self, wait_time):
+        """记录一次从连接池取出连接"""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def record_connect(self, connect_time):
+        """记录一次新建TCP/TLS连接"""
+        with self._lock:
+            self.connects += 1
+            self.connect_time_total += connect_time
+
+    def snapshot(self):
+        """获取统计信息快照
+
+        Returns:
+            dict: 取出次数、新建连接数、复用率和等待时间等统计信息
+        """
+        with self._lock:
+            reused = max(self.checkouts - self.connects, 0)
+            return {
+                'checkouts': self.checkouts,
+                'new_connections': self.connects,
+                'reused_connections': reused,
+                'reuse_rate': reused / self.checkouts if self.checkouts else 0.0,
+                'avg_wait_ms': self.wait_time_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                'max_wait_ms': self.wait_time_max * 1000,
+                'avg_connect_ms': self.connect_time_total / self.connects * 1000 if self.connects else 0.0
+            }
+
+    def reset(self):
+        """重置统计信息"""
+        with self._lock:
+            self.checkouts = 0
+            self.connects = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+            self.connect_time_total = 0.0
+
+
+pool_stats = PoolStats()
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    """记录建连次数和耗时的HTTP连接"""
+
+    def connect(self):
+        start_time = time.perf_counter()
+        super().connect()
+        connect_time = time.perf_counter() - start_time
+        pool_stats.record_connect(connect_time)
+        UPSTREAM_LATENCY.observe(connect_time, upstream=self.host, phase='connect')
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    """记录建连次数和耗时的HTTPS连接（包括TLS握手）"""
+
+    def connect(self):
+        start_time = time.perf_counter()
+        super().connect()
+        connect_time = time.perf_counter() - start_time
+        pool_stats.record_connect(connect_time)
+        UPSTREAM_LATENCY.observe(connect_time, upstream=self.host, phase='connect')
+
+
+class _InstrumentedHTTPConnectionPool(HTTPConnectionPool):
+    """记录取连接等待时间的HTTP连接池"""
+
+    ConnectionCls = _CountingHTTPConnection
+
+    def _get_conn(self, timeout=None):
+        start_time = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        pool_stats.record_checkout(time.perf_counter() - start_time)
+        return conn
+
+
+class _InstrumentedHTTPSConnectionPool(HTTPSConnectionPool):
+    """记录取连接等待时间的HTTPS连接池"""
+
+    ConnectionCls = _CountingHTTPSConnection
+
+    def _get_conn(self, timeout=None):
+        start_time = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        pool_stats.record_checkout(time.perf_counter() - start_time)
+        return conn
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """使用带统计功能的连接池并开启TCP keep-alive的适配器"""
+
+    def __init__(self, tcp_keepalive=True, keepalive_idle=60, **kwargs):
+        self.tcp_keepalive = tcp_keepalive
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.tcp_keepalive:
+            socket_options = list(HTTPConnection.default_socket_options)
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle))
+            pool_kwargs['socket_options'] = socket_options
+
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _InstrumentedHTTPConnectionPool,
+            'https': _InstrumentedHTTPSConnectionPool
+        }
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _create_session():
+    """根据环境变量创建带连接池的会话"""
+    pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+    adapter = PooledHTTPAdapter(
+        pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', '10')),
+        pool_maxsize=pool_maxsize,
+        pool_block=os.getenv('HTTP_POOL_BLOCK', 'false').lower() == 'true',
+        tcp_keepalive=os.getenv('HTTP_TCP_KEEPALIVE', 'true').lower() == 'true',
+        keepalive_idle=int(os.getenv('HTTP_TCP_KEEPIDLE', '60')),
+        max_retries=0  # 重试由服务层控制
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    logger.info("创建HTTP连接池，每个主机最大连接数: %s", pool_maxsize)
+    return session
+
+
+def get_http_session():
+    """获取进程内共享的HTTP会话
+
+    所有大模型服务共用同一个会话及其连接池，复用到同一主机的TCP/TLS连接。
+    连接池配置从环境变量读取：HTTP_POOL_CONNECTIONS（缓存的主机连接池数量）、
+    HTTP_POOL_MAXSIZE（每个主机的最大连接数）、HTTP_POOL_BLOCK（连接耗尽时是否等待）、
+    HTTP_TCP_KEEPALIVE和HTTP_TCP_KEEPIDLE。fork出的子进程会重新创建会话，
+    避免多个进程共用同一个socket。
+
+    Returns:
+        requests.Session: 共享的HTTP会话
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = _create_session()
+                _session_pid = os.getpid()
+    return _session
+
+
+def get_pool_stats():
+    """获取连接池统计信息
+
+    Returns:
+        dict: 连接复用率、等待时间等统计信息
+    """
+    return pool_stats.snapshot()
+
+
+def warm_up_pool(urls, connections_per_host=1, timeout=5, background=True):
+    """预热连接池，提前建立到各个上游主机的TCP/TLS连接
+
+    Args:
+        urls (list): 需要预热的URL列表，只使用其中的协议和主机部分
+        connections_per_host (int): 每个主机预先建立的连接数
+        timeout (float): 预热请求的超时时间（秒）
+        background (bool): 是否在后台线程中执行
+
+    Returns:
+        list: 后台执行时返回预热线程列表，否则返回空列表
+    """
+    origins = []
+    for url in urls:
+        if not url:
+            continue
+        parts = urlsplit(url)
+        if parts.scheme in ('http', 'https') and parts.netloc:
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            if origin not in origins:
+                origins.append(origin)
+
+    def warm(origin):
+        try:
+            get_http_session().head(origin, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            logger.debug("预热连接失败 %s: %s", origin, e)
+
+    threads = []
+    for origin in origins:
+        logger.info("预热HTTP连接池: %s", origin)
+        for _ in range(connections_per_host):
+            thread = threading.Thread(target=warm, args=(origin,), name='http-pool-warmup', daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    if not background:
+        for thread in threads:
+            thread.join()
+        return []
+    return threads
@@ -0,0 +1,280 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from services.analysis_rules import get_rule_family
+from services.code_scanner import SourceModel
+
+logger = logging.getLogger(__name__)
+
+# 空行之后的非空行是候选的单元边界，分组为该行的缩进和内容
+_UNIT_BREAK = re.compile(r'\n[ \t]*\n(?=([ \t]*)(\S[^\n]*))')
+
+# 以这些内容开头的行是上一个语句的延续（else、except、闭合括号、链式调用等），不能作为边界
+_CONTINUATION = re.compile(r'(?:else|elif|except|finally|catch|end|rescue|ensure|when|case)\b|[)\]}.,:?&|+\-*/=<>]')
+
+# Python注释行和空行之后的第一行代码，分组为该行的缩进和内容
+_AFTER_PYTHON_COMMENTS = re.compile(r'(?:[ \t]*(?:#[^\n]*)?\n)*([ \t]*)(\S[^\n]*)')
+
+# 第一个非空行的缩进作为顶层单元的缩进
+_FIRST_INDENT = re.compile(r'(?:[ \t]*\r?\n)*([ \t]*)')
+
+# 去除注释和字符串之后仍出现这些字符，说明单元内有未闭合的字符串或块注释，边界落在了它们内部
+_UNCLOSED_TRIVIA = re.compile(r'["\'`]|/\*')
+
+
+class CodeUnit:
+    """源码中的一个顶层单元（函数、类或它们之间的顶层代码）"""
+
+    __slots__ = ('text', 'start_line', 'key')
+
+    def __init__(self, text, start_line, key):
+        self.text = text
+        # 单元第一行在整个源码中的行号（从1开始）
+        self.start_line = start_line
+        # 单元内容的哈希，作为单元结果的缓存键
+        self.key = key
+
+
+def _is_balanced(text, language):
+    """检查单元内的括号是否成对、字符串和块注释是否都已闭合
+
+    字符串和注释由词法规则识别后去除，其中的括号和引号不参与检查。
+    """
+    parts = []
+    position = 0
+    for _, match in get_rule_family(language, 'trivia').tokens(text):
+        parts.append(text[position:match.start()])
+        position = match.end()
+    parts.append(text[position:])
+    code = ''.join(parts)
+    if code.count('(') != code.count(')') or code.count('[') != code.count(']') \
+            or code.count('{') != code.count('}'):
+        return False
+    return _UNCLOSED_TRIVIA.search(code) is None
+
+
+def unit_key(text, language, variant=''):
+    """计算单元结果的缓存键
+
+    Args:
+        text (str): 单元源码
+        language (str): 代码语言
+        variant (str): 影响分析结果的其他配置，例如是否使用语法树
+
+    Returns:
+        bytes: 缓存键
+    """
+    return _unit_key(text, f"{language}\0{variant}\0".encode('utf-8'))
+
+
+def _unit_key(text, prefix):
+    return hashlib.blake2b(prefix + text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def _is_python_boundary(code, match, base_indent):
+    """检查Python代码中的候选边界：注释之后的代码行仍需与第一行缩进相同，装饰器不能与被装饰的定义分开"""
+    before = code[:match.start()]
+    last_line = before[before.rfind('\n') + 1:]
+    if last_line.startswith(base_indent + '@'):
+        return False
+    indent, line = match.groups()
+    if not line.startswith('#'):
+        return True
+    # 顶格的注释可能位于函数体中间，看注释之后的第一行代码
+    following = _AFTER_PYTHON_COMMENTS.match(code, match.end())
+    return following is not None and following.group(1) == base_indent \
+        and not _CONTINUATION.match(following.group(2))
+
+
+def split_units(code, language, variant=''):
+    """把源码切分为顶层单元
+
+    边界是空行之后、与第一行缩进相同、且不是上一个语句延续的行；
+    去除字符串和注释后括号不成对、或者有未闭合的字符串和块注释的单元与下一个单元合并。
+    这只是基于词法规则的启发式判断：词法规则无法识别的写法（例如字符串中转义的三引号）
+    仍可能使边界落在函数体或字符串内部，调用方需要确认每个单元都能单独解析，否则应整体分析。
+
+    Args:
+        code (str): 要分析的代码
+        language (str): 代码语言
+        variant (str): 参与缓存键计算的配置
+
+    Returns:
+        list: CodeUnit列表，按在源码中的顺序排列
+    """
+    base_indent = _FIRST_INDENT.match(code).group(1)
+    starts = [0]
+    for match in _UNIT_BREAK.finditer(code):
+        indent, line = match.groups()
+        if indent != base_indent or _CONTINUATION.match(line):
+            continue
+        if language == 'python' and not _is_python_boundary(code, match, base_indent):
+            continue
+        starts.append(match.end())
+    starts.append(len(code))
+
+    units = []
+    line = 1
+    unit_start = 0
+    prefix = f"{language}\0{variant}\0".encode('utf-8')
+    for end in starts[1:]:
+        text = code[unit_start:end]
+        if end < len(code) and not _is_balanced(text, language):
+            continue
+        units.append(CodeUnit(text, line, _unit_key(text, prefix)))
+        line += text.count('\n')
+        unit_start = end
+    return units
+
+
+def merge_models(models, start_lines, language):
+    """把各单元的源码模型合并为整个源码的模型
+
+    行数、注释、关键字数量等指标逐单元累加；嵌套深度取最大值；
+    函数级指标的行号换算为在整个源码中的行号。缓存中的模型不会被修改。
+
+    Args:
+        models (list): 各单元的SourceModel
+        start_lines (list): 各单元第一行的行号
+        language (str): 代码语言
+
+    Returns:
+        SourceModel: 合并后的源码模型
+    """
+    merged = SourceModel(language)
+    counts = merged.counts
+    function_metrics = merged.function_metrics
+    backends = set()
+    line_count = 1
+    comment_lines = 0
+    long_lines = 0
+    max_nesting = 0
+    cyclomatic = 1
+    cognitive = 0
+
+    for model, start_line in zip(models, start_lines):
+        backends.add(model.backend)
+        # 相邻单元在边界行上重叠一行（上一单元末尾换行之后的空行）
+        line_count += model.line_count - 1
+        comment_lines += model.comment_lines
+        long_lines += model.long_lines
+        if model.max_nesting > max_nesting:
+            max_nesting = model.max_nesting
+        merged.functions += model.functions
+        merged.classes += model.classes
+        merged.imports += model.imports
+        for kind, count in model.counts.items():
+            counts[kind] += count
+        for metrics in model.function_metrics:
+            function_metrics.append(dict(metrics, lineno=metrics['lineno'] + start_line - 1))
+        if model.cyclomatic_complexity is not None:
+            cyclomatic += model.cyclomatic_complexity - 1
+            cognitive += model.cognitive_complexity
+
+    merged.line_count = line_count
+    merged.comment_lines = comment_lines
+    merged.long_lines = long_lines
+    merged.max_nesting = max_nesting
+    # 所有单元都来自语法树时才有整体的圈复杂度和认知复杂度
+    if backends == {'ast'}:
+        merged.backend = 'ast'
+        merged.cyclomatic_complexity = cyclomatic
+        merged.cognitive_complexity = cognitive
+    return merged
+
+
+class UnitResultCache:
+    """线程安全的单元分析结果缓存，按LRU淘汰"""
+
+    def __init__(self, max_entries=4096):
+        """初始化单元结果缓存
+
+        Args:
+            max_entries (int): 最大缓存单元数
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_many(self, keys):
+        """批量读取缓存结果
+
+        Args:
+            keys (list): 缓存键列表
+
+        Returns:
+            list: 与keys一一对应的结果，未命中的位置为None
+        """
+        results = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self._misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                results.append(value)
+        return results
+
+    def set_many(self, items):
+        """批量写入缓存结果
+
+        Args:
+            items (list): (key, value)列表
+        """
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """获取缓存统计信息
+
+        Returns:
+            dict: 统计信息
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / total if total else 0.0
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_unit_cache = None
+_unit_cache_lock = threading.Lock()
+
+
+def get_unit_cache():
+    """获取进程内共享的单元结果缓存
+
+    Returns:
+        UnitResultCache: 单元结果缓存
+    """
+    global _unit_cache
+    if _unit_cache is None:
+        with _unit_cache_lock:
+            if _unit_cache is None:
+                _unit_cache = UnitResultCache(
+                    max_entries=int(os.getenv('ANALYZER_UNIT_CACHE_SIZE', '4096'))
+                )
+    return _unit_cache
@@ -1,21 +1,33 @@
 import logging
+from services.base_llm_service import aiter_events
 from services.qianwen_service import QianwenService
 from services.custom_api_service import CustomAPIService
+from services.provider_router import ProviderRouter
 
 logger = logging.getLogger(__name__)
 
 class ProblemSolver:
     """问题解决器类，用于解决编程问题和解释编程概念"""
     
-    def __init__(self):
-        """初始化问题解决器"""
+    def __init__(self, qianwen_service=None, custom_api_service=None, router=None):
+        """初始化问题解决器
+        
+        Args:
+            qianwen_service (QianwenService): 千问服务实例，默认新建
+            custom_api_service (CustomAPIService): 自定义API服务实例，默认新建
+            router (ProviderRouter): 大模型服务路由器，默认根据环境变量新建
+        """
         logger.info("初始化问题解决器")
-        self.qianwen_service = QianwenService()
-        self.custom_api_service = CustomAPIService()
+        self.qianwen_service = qianwen_service or QianwenService()
+        self.custom_api_service = custom_api_service or CustomAPIService()
+        self.router = router or ProviderRouter.from_env([self.qianwen_service, self.custom_api_service])
     
     def solve(self, problem_description, code_context='', language='python', use_qianwen=False, use_custom_api=False):
         """解决编程问题
         
+        use_qianwen或use_custom_api指定的服务健康时优先使用；它失败、熔断或明显变慢时，
+        由路由器改用或对冲到另一个已配置的服务。
+        
         Args:
             problem_description (str): 问题描述
             code_context (str): 代码上下文，默认为空
@@ -26,17 +38,91 @@ class ProblemSolver:
         Returns:
             dict: 包含解决方案代码、解释和额外资源的结果
         """
-        logger.info(f"解决{language}编程问题，使用千问API: {use_qianwen}，使用自定义API: {use_custom_api}")
+        logger.info("解决%s编程问题，使用千问API: %s，使用自定义API: %s", language, use_qianwen, use_custom_api)
         
+        service = self._select_service(use_qianwen, use_custom_api)
+        if service is not None:
+            service, response = self.router.generate(
+                self._solution_prompt(problem_description, code_context, language),
+                preferred=service,
+                semantic_key=service.solution_semantic_key(problem_description, code_context, language)
+            )
+            return service.parse_solution(response, language)
+        return self._default_solution(problem_description, language)
+    
+    def solve_stream(self, problem_description, code_context='', language='python', use_qianwen=False,
+                     use_custom_api=False):
+        """以流式方式解决编程问题，大模型生成的内容逐段返回
+        
+        Args:
+            problem_description (str): 问题描述
+            code_context (str): 代码上下文，默认为空
+            language (str): 代码语言，默认为python
+            use_qianwen (bool): 是否使用千问API，默认为False
+            use_custom_api (bool): 是否使用自定义API，默认为False
+            
+        Returns:
+            iterator: 事件的生成器，event为delta、done或error，done事件的solution为完整的解决方案
+            
+        Raises:
+            RateLimitExceeded: 超出上游配额且无法排队等待，在开始流式输出之前抛出
+        """
+        logger.info("流式解决%s编程问题，使用千问API: %s，使用自定义API: %s", language, use_qianwen, use_custom_api)
+        
+        service = self._select_service(use_qianwen, use_custom_api)
+        if service is not None:
+            # 流式输出开始后无法再切换服务，只在开始前选择最健康的服务
+            service = self.router.select(preferred=service)
+            return service.solve_problem_stream(problem_description, code_context, language)
+        return iter([self._default_solution_event(problem_description, language)])
+    
+    async def asolve(self, problem_description, code_context='', language='python', use_qianwen=False,
+                     use_custom_api=False):
+        """solve的异步版本，大模型调用期间不占用线程"""
+        logger.info("异步解决%s编程问题，使用千问API: %s，使用自定义API: %s", language, use_qianwen, use_custom_api)
+        
+        service = self._select_service(use_qianwen, use_custom_api)
+        if service is not None:
+            service, response = await self.router.agenerate(
+                self._solution_prompt(problem_description, code_context, language),
+                preferred=service,
+                semantic_key=service.solution_semantic_key(problem_description, code_context, language)
+            )
+            return service.parse_solution(response, language)
+        return self._default_solution(problem_description, language)
+    
+    async def asolve_stream(self, problem_description, code_context='', language='python', use_qianwen=False,
+                            use_custom_api=False):
+        """solve_stream的异步版本，返回事件的异步生成器"""
+        logger.info("异步流式解决%s编程问题，使用千问API: %s，使用自定义API: %s", language, use_qianwen, use_custom_api)
+        
+        service = self._select_service(use_qianwen, use_custom_api)
+        if service is not None:
+            service = self.router.select(preferred=service)
+            return await service.asolve_problem_stream(problem_description, code_context, language)
+        return aiter_events([self._default_solution_event(problem_description, language)])
+    
+    def _solution_prompt(self, problem_description, code_context, language):
+        """返回按路由器最终选择的服务构建提示词的函数，代码上下文按该服务模型的token预算裁剪"""
+        return lambda service: service.build_solution_prompt(problem_description, code_context, language)
+    
+    def _select_service(self, use_qianwen, use_custom_api):
+        """根据请求参数选择大模型服务，都未选择时返回None"""
         # 如果选择使用千问API
         if use_qianwen:
-            return self.qianwen_service.solve_problem(problem_description, code_context, language)
-            
+            return self.qianwen_service
         # 如果选择使用自定义API
         if use_custom_api:
-            return self.custom_api_service.solve_problem(problem_description, code_context, language)
-        
-        # 默认解决方案逻辑
+            return self.custom_api_service
+        return None
+    
+    def _default_solution_event(self, problem_description, language):
+        """未使用大模型时流式输出的done事件"""
+        solution = self._default_solution(problem_description, language)
+        return {'event': 'done', 'result': {'success': True, 'content': solution['explanation']}, 'solution': solution}
+    
+    def _default_solution(self, problem_description, language):
+        """未使用大模型时的默认解决方案"""
         return {
             'solution_code': f"# {problem_description}的解决方案\n# 这里是解决方案代码",
             'explanation': f"这个解决方案通过以下步骤解决了问题：\n1. 分析问题\n2. 设计解决方案\n3. 实现代码",
@@ -57,7 +143,7 @@ class ProblemSolver:
         Returns:
             dict: 包含概念解释、示例和资源的结果
         """
-        logger.info(f"解释{concept}概念，详细程度为{detail_level}")
+        logger.info("解释%s概念，详细程度为%s", concept, detail_level)
         
         # 这里实现概念解释逻辑
         # 实际项目中可能会有预定义的解释库或使用AI生成
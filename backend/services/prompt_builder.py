@@ -0,0 +1,275 @@
+import logging
+import os
+import re
+from services.code_scanner import scan_source
+from services.incremental_analysis import split_units
+from services.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 各模型提示词的token预算（上下文窗口减去默认的2048个生成token，再留出余量）
+MODEL_PROMPT_TOKENS = {
+    'qwen-turbo': 6000,
+    'qwen-plus': 28000,
+    'qwen-max': 6000,
+    'qwen-long': 28000
+}
+# 未列出的模型使用的预算
+DEFAULT_PROMPT_TOKENS = 6000
+
+# 标识符
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# 问题描述中提到的行号，例如“第12行”、“line 12”或堆栈中的“line 12,”
+_LINE_REFERENCE = re.compile(r'(?:\bline\s*|第\s*)(\d+)', re.IGNORECASE)
+
+# 省略标记使用的注释语法，未列出的语言使用//
+_COMMENT_FORMATS = {
+    'python': '# {}',
+    'ruby': '# {}',
+    'perl': '# {}',
+    'sql': '-- {}',
+    'html': '<!-- {} -->',
+    'css': '/* {} */'
+}
+
+# 单元相关性的权重
+_SCORE_LINE = 100  # 包含问题中提到的行号（出错位置所在的函数）
+_SCORE_DEFINES = 50  # 定义了问题中提到的函数或类
+_SCORE_REFERENCED = 20  # 定义了上述单元引用的符号
+_SCORE_IMPORTS = 5  # 导入语句，帮助模型理解依赖
+
+
+class _Candidate:
+    """上下文中的一个候选单元及其相关性"""
+
+    __slots__ = ('index', 'unit', 'tokens', 'defines', 'identifiers', 'score')
+
+    def __init__(self, index, unit, language):
+        self.index = index
+        self.unit = unit
+        self.tokens = estimate_tokens(unit.text)
+        model = scan_source(unit.text, language)
+        self.defines = {name for name in model.functions + model.classes if name}
+        self.identifiers = set(_IDENTIFIER.findall(unit.text))
+        self.score = _SCORE_IMPORTS if model.imports else 0
+
+    @property
+    def end_line(self):
+        return self.unit.start_line + self.unit.text.count('\n')
+
+
+def _omission_marker(language, lines):
+    """省略了若干行的标记，使用该语言的注释语法"""
+    return _COMMENT_FORMATS.get(language, '// {}').format(f'... 省略了{lines}行 ...')
+
+
+def _score_candidates(candidates, query):
+    """按与问题的相关性给候选单元打分
+
+    包含问题中提到的行号、或定义了问题中提到的函数和类的单元最相关；
+    这些单元调用或引用的符号所在的单元次之；其余按与问题共有的标识符数量排序。
+    """
+    identifiers = set(_IDENTIFIER.findall(query))
+    lines = {int(line) for line in _LINE_REFERENCE.findall(query)}
+    anchors = set()
+    for candidate in candidates:
+        if any(candidate.unit.start_line <= line <= candidate.end_line for line in lines):
+            candidate.score += _SCORE_LINE
+        matched = candidate.defines & identifiers
+        if matched:
+            candidate.score += _SCORE_DEFINES * len(matched)
+        if candidate.score >= _SCORE_DEFINES:
+            anchors.add(candidate.index)
+        candidate.score += len(candidate.identifiers & identifiers)
+
+    # 相关单元引用的符号
+    referenced = set()
+    for candidate in candidates:
+        if candidate.index in anchors:
+            referenced |= candidate.identifiers - candidate.defines
+    for candidate in candidates:
+        if candidate.index not in anchors and candidate.defines & referenced:
+            candidate.score += _SCORE_REFERENCED
+
+
+def _truncate_lines(text, budget):
+    """保留文本开头不超过预算的若干行"""
+    kept = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        tokens = estimate_tokens(line)
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+    return ''.join(kept)
+
+
+def fit_context(code_context, query, language='python', budget=DEFAULT_PROMPT_TOKENS):
+    """把代码上下文裁剪到token预算以内
+
+    不超过预算时原样返回；否则按顶层单元（函数、类和它们之间的代码）切分源码，
+    优先保留出错位置所在的函数、问题中提到的函数和类以及它们引用的符号，与问题无关的单元被丢弃。
+    保留的单元按原来的顺序排列，省略的部分用一行注释标记省略的行数。
+
+    Args:
+        code_context (str): 代码上下文
+        query (str): 问题描述，用于判断哪些代码与问题相关
+        language (str): 代码语言
+        budget (int): 代码上下文可用的token数
+
+    Returns:
+        str: 裁剪后的代码上下文，预算不足以放下任何代码时返回空字符串
+    """
+    if estimate_tokens(code_context) <= budget:
+        return code_context
+    if budget <= 0:
+        return ''
+
+    candidates = [_Candidate(index, unit, language) for index, unit in enumerate(split_units(code_context, language))]
+    _score_candidates(candidates, query)
+
+    # 省略标记本身也占用预算
+    marker_tokens = estimate_tokens(_omission_marker(language, 99999)) + 1
+    # 有相关单元时丢弃完全无关的单元，否则按顺序保留开头的单元
+    relevant = [candidate for candidate in candidates if candidate.score > 0] or candidates
+    selected = set()
+    used = 0
+    for candidate in sorted(relevant, key=lambda candidate: (-candidate.score, candidate.index)):
+        cost = candidate.tokens + marker_tokens
+        if used + cost <= budget:
+            selected.add(candidate.index)
+            used += cost
+
+    parts = []
+    omitted = 0
+    for candidate in candidates:
+        if candidate.index in selected:
+            if omitted:
+                parts.append(_omission_marker(language, omitted) + '\n')
+                omitted = 0
+            text = candidate.unit.text
+            parts.append(text if text.endswith('\n') else text + '\n')
+        else:
+            omitted += candidate.unit.text.count('\n') + (0 if candidate.unit.text.endswith('\n') else 1)
+    if not selected:
+        # 单个最相关的单元就超过了预算，只保留它的开头
+        best = max(candidates, key=lambda candidate: (candidate.score, -candidate.index))
+        head = _truncate_lines(best.unit.text, budget - 2 * marker_tokens)
+        if best.unit.start_line > 1:
+            parts.append(_omission_marker(language, best.unit.start_line - 1) + '\n')
+        parts.append(head)
+        omitted = code_context.count('\n') + 1 - (best.unit.start_line - 1) - head.count('\n')
+    if omitted > 0:
+        parts.append(_omission_marker(language, omitted) + '\n')
+
+    logger.info("代码上下文约%s个token，超过预算%s，保留%s/%s个单元",
+                estimate_tokens(code_context), budget, len(selected), len(candidates))
+    return ''.join(parts).rstrip('\n')
+
+
+def fit_text(text, budget):
+    """把文本裁剪到token预算以内
+
+    不超过预算时原样返回；否则保留开头尽可能多的字符，末尾追加一行省略标记。
+
+    Args:
+        text (str): 文本，例如问题描述
+        budget (int): 文本可用的token数
+
+    Returns:
+        str: 裁剪后的文本，预算不足以放下省略标记时返回空字符串
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    # 省略标记本身也占用预算
+    budget -= estimate_tokens(f'\n... 省略了{len(text)}个字符 ...')
+    if budget <= 0:
+        return ''
+    # estimate_tokens随前缀长度单调不减，二分查找不超过预算的最长前缀
+    low, high = 0, min(len(text), budget * 4)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + f'\n... 省略了{len(text) - low}个字符 ...'
+
+
+class PromptBuilder:
+    """构建提示词并把代码上下文控制在模型的token预算以内"""
+
+    def __init__(self, max_prompt_tokens=DEFAULT_PROMPT_TOKENS):
+        """初始化提示词构建器
+
+        Args:
+            max_prompt_tokens (int): 提示词的token预算，小于等于0表示不限制
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+
+    @classmethod
+    def for_model(cls, model, prefix):
+        """根据模型和环境变量创建提示词构建器
+
+        读取 {prefix}_MAX_PROMPT_TOKENS，未设置时使用MODEL_PROMPT_TOKENS中该模型的预算。
+
+        Args:
+            model (str): 模型名称
+            prefix (str): 环境变量前缀，例如QIANWEN
+
+        Returns:
+            PromptBuilder: 提示词构建器
+        """
+        default = MODEL_PROMPT_TOKENS.get(model, DEFAULT_PROMPT_TOKENS)
+        return cls(int(os.getenv(f'{prefix}_MAX_PROMPT_TOKENS', str(default))))
+
+    def build_solution_prompt(self, problem_description, code_context='', language='python'):
+        """构建解决编程问题的提示词
+
+        问题描述和代码上下文都计入预算：有代码上下文时问题描述最多使用一半的预算，
+        超出的部分被截断；代码上下文使用剩余的预算，只保留与问题最相关的部分，见fit_context。
+
+        Args:
+            problem_description (str): 问题描述
+            code_context (str): 代码上下文，默认为空
+            language (str): 代码语言，默认为python
+
+        Returns:
+            str: 提示词
+        """
+        footer = """请提供以下格式的回答：
+1. 解决方案代码
+2. 详细解释
+3. 相关资源或参考链接
+
+请确保代码可以直接运行，并提供清晰的注释。"""
+        description = problem_description
+
+        if self.max_prompt_tokens > 0:
+            context_wrapper = f"代码上下文：\n```{language}\n\n```\n\n" if code_context else ''
+            budget = self.max_prompt_tokens - estimate_tokens(
+                self._solution_header('', language) + context_wrapper + footer
+            )
+            # 为代码上下文留出至少一半的预算
+            description = fit_text(problem_description, budget // 2 if code_context else budget)
+            if description != problem_description:
+                logger.info("问题描述约%s个token，超过预算，已截断", estimate_tokens(problem_description))
+            if code_context:
+                budget -= estimate_tokens(description)
+                code_context = fit_context(code_context, problem_description, language, budget)
+
+        prompt = self._solution_header(description, language)
+        if code_context:
+            prompt += f"代码上下文：\n```{language}\n{code_context}\n```\n\n"
+        return prompt + footer
+
+    @staticmethod
+    def _solution_header(problem_description, language):
+        """解决编程问题的提示词开头"""
+        return f"""请解决以下{language}编程问题：
+
+问题描述：
+{problem_description}
+
+"""
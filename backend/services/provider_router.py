@@ -0,0 +1,403 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from services.rate_limiter import PRIORITY_BATCH, PRIORITY_DEFAULT
+from services.resilience import STATE_OPEN, RetryBudget
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """记录一个服务提供方最近若干次调用的延迟和成败，计算延迟分位数和错误率"""
+
+    def __init__(self, window=200):
+        """初始化统计
+
+        Args:
+            window (int): 保留的最近调用次数
+        """
+        self._samples = deque(maxlen=window)  # (延迟, 是否成功)
+        self._lock = threading.Lock()
+
+    def record(self, latency, success):
+        """记录一次调用
+
+        Args:
+            latency (float): 调用耗时（秒）
+            success (bool): 是否成功
+        """
+        with self._lock:
+            self._samples.append((latency, success))
+
+    def percentile(self, q, min_samples=1):
+        """计算成功调用延迟的分位数
+
+        Args:
+            q (float): 分位，0到1之间，例如0.95
+            min_samples (int): 成功调用少于该数量时认为数据不足
+
+        Returns:
+            float: 延迟（秒），数据不足时返回None
+        """
+        with self._lock:
+            latencies = sorted(latency for latency, success in self._samples if success)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self):
+        """最近调用的错误率，没有调用记录时为0"""
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, success in self._samples if not success) / len(self._samples)
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 调用数、错误率以及p50/p95/p99延迟
+        """
+        with self._lock:
+            count = len(self._samples)
+        return {
+            'calls': count,
+            'error_rate': round(self.error_rate(), 3),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99)
+        }
+
+
+class ProviderRouter:
+    """在多个大模型服务之间选择和对冲请求
+
+    根据每个服务最近的延迟和错误率选择最健康的服务作为主服务；主服务失败时立即改用下一个服务。
+    主服务在自身p95延迟内没有返回时，再向另一个服务发送一次对冲请求，采用先返回的成功结果。
+    对冲请求受进程级预算限制（默认不超过请求数的10%），不会成倍增加调用成本；它们以PRIORITY_BATCH排队，
+    上游配额紧张时最先被拒绝，不会挤占正常请求的配额。
+
+    同步调用时，不可能对冲的请求（没有备用服务、未开启对冲或延迟样本不足）在调用方线程中依次调用主服务
+    和备用服务；可能对冲的请求由一个新线程立即调用主服务，调用方线程等待并计时，
+    这样主服务的调用数不受线程池大小限制，对冲计时也不包含排队时间。只有对冲和故障转移使用线程池。
+    """
+
+    def __init__(self, services, hedge_enabled=True, hedge_ratio=0.1, min_samples=20, min_hedge_delay=0.1,
+                 max_error_rate=0.5, window=200, max_workers=8):
+        """初始化路由器
+
+        Args:
+            services (list): 大模型服务列表（BaseLLMService的子类实例）
+            hedge_enabled (bool): 是否发送对冲请求
+            hedge_ratio (float): 对冲请求数占请求数的比例上限
+            min_samples (int): 计算p95所需的最少成功调用数，不足时不对冲
+            min_hedge_delay (float): 发送对冲请求前的最短等待时间（秒）
+            max_error_rate (float): 错误率超过该值的服务视为不健康
+            window (int): 每个服务保留的最近调用次数
+            max_workers (int): 同步调用中对冲和故障转移请求使用的线程池大小
+        """
+        self.services = list(services)
+        self.hedge_enabled = hedge_enabled
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self.max_error_rate = max_error_rate
+        self.trackers = {service.provider_name: LatencyTracker(window) for service in self.services}
+        self.hedge_budget = RetryBudget(ratio=hedge_ratio, min_retries=0, window=60)
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._counts = {'hedges': 0, 'hedge_wins': 0, 'failovers': 0}
+        self._counts_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, services):
+        """根据环境变量创建路由器
+
+        Args:
+            services (list): 大模型服务列表
+
+        Returns:
+            ProviderRouter: 路由器
+        """
+        return cls(
+            services,
+            hedge_enabled=os.getenv('LLM_HEDGE_ENABLED', 'true').lower() == 'true',
+            hedge_ratio=float(os.getenv('LLM_HEDGE_BUDGET_RATIO', '0.1')),
+            min_samples=int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20')),
+            min_hedge_delay=float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.1')),
+            max_error_rate=float(os.getenv('LLM_ROUTER_MAX_ERROR_RATE', '0.5')),
+            max_workers=int(os.getenv('LLM_HEDGE_MAX_WORKERS', '8'))
+        )
+
+    @property
+    def executor(self):
+        """同步调用中对冲和故障转移请求使用的线程池，首次使用时创建"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                        thread_name_prefix='llm-router')
+        return self._executor
+
+    def _is_healthy(self, service):
+        """熔断器未打开且最近的错误率不高"""
+        breaker = getattr(service.retry_policy, 'breaker', None)
+        if breaker is not None and breaker.state == STATE_OPEN:
+            return False
+        return self.trackers[service.provider_name].error_rate() <= self.max_error_rate
+
+    def rank(self, preferred=None):
+        """按健康程度对已配置的服务排序
+
+        健康的服务排在前面，调用方指定的服务健康时排在第一位，其余按错误率和p50延迟排序；
+        还没有调用记录的服务延迟视为0，使其有机会被选中。
+
+        Args:
+            preferred (BaseLLMService): 调用方指定的服务，可以为None
+
+        Returns:
+            list: 服务列表，没有已配置的服务时只包含preferred（如果有）
+        """
+        available = [service for service in self.services if service.is_configured()]
+        if not available:
+            return [preferred] if preferred is not None else []
+
+        def score(service):
+            tracker = self.trackers[service.provider_name]
+            return (
+                not self._is_healthy(service),
+                service is not preferred,
+                round(tracker.error_rate(), 1),
+                tracker.percentile(0.5) or 0.0
+            )
+
+        return sorted(available, key=score)
+
+    def select(self, preferred=None):
+        """选择最健康的服务，用于无法对冲的流式调用
+
+        Args:
+            preferred (BaseLLMService): 调用方指定的服务
+
+        Returns:
+            BaseLLMService: 服务，没有可用服务时返回None
+        """
+        ranked = self.rank(preferred)
+        return ranked[0] if ranked else None
+
+    def hedge_delay(self, service):
+        """发送对冲请求前等待主服务的时间：主服务的p95延迟，数据不足时返回None（不对冲）"""
+        p95 = self.trackers[service.provider_name].percentile(0.95, self.min_samples)
+        return None if p95 is None else max(self.min_hedge_delay, p95)
+
+    def _record(self, service, result, error, elapsed):
+        """记录一次调用的延迟和成败，缓存命中和共享其他请求的结果不计入延迟"""
+        if error is None and (result.get('cached') or result.get('coalesced')):
+            return
+        success = error is None and bool(result.get('success'))
+        self.trackers[service.provider_name].record(elapsed, success)
+
+    def _call(self, service, prompt, max_tokens, priority, semantic_key=None):
+        """调用一个服务并记录结果
+
+        Args:
+            prompt (str或callable): 提示词，或接收服务、返回该服务提示词的函数
+
+        Returns:
+            tuple: (结果, 异常)，两者之一为None
+        """
+        start_time = time.time()
+        try:
+            if callable(prompt):
+                prompt = prompt(service)
+            result = service.generate_response(prompt, max_tokens, priority=priority, semantic_key=semantic_key)
+        except Exception as e:
+            self._record(service, None, e, time.time() - start_time)
+            return None, e
+        self._record(service, result, None, time.time() - start_time)
+        return result, None
+
+    async def _acall(self, service, prompt, max_tokens, priority, semantic_key=None):
+        """_call的异步版本"""
+        start_time = time.time()
+        try:
+            if callable(prompt):
+                # 构建提示词时可能要裁剪很长的代码上下文，在线程中执行，不阻塞事件循环
+                prompt = await asyncio.to_thread(prompt, service)
+            result = await service.agenerate_response(prompt, max_tokens, priority=priority,
+                                                     semantic_key=semantic_key)
+        except Exception as e:
+            self._record(service, None, e, time.time() - start_time)
+            return None, e
+        self._record(service, result, None, time.time() - start_time)
+        return result, None
+
+    def _next_timeout(self, primary, backups, hedged):
+        """计算等待正在进行的调用的时间，None表示一直等到有调用完成"""
+        if hedged or not backups or not self.hedge_enabled:
+            return None
+        return self.hedge_delay(primary)
+
+    def _start_hedge(self, primary, backups):
+        """判断是否发送对冲请求，返回对冲使用的服务，预算不足时返回None"""
+        if not self.hedge_budget.try_acquire():
+            logger.info("%s超过p95延迟仍未返回，但对冲预算已用完", primary.provider_name)
+            return None
+        hedge = backups.pop(0)
+        self._count('hedges')
+        logger.info("%s超过p95延迟仍未返回，向%s发送对冲请求", primary.provider_name, hedge.provider_name)
+        return hedge
+
+    def _count(self, name):
+        """累加统计计数"""
+        with self._counts_lock:
+            self._counts[name] += 1
+
+    def _finish(self, service, primary, result):
+        """记录获胜的服务并返回结果"""
+        if service is not primary:
+            self._count('hedge_wins')
+        return service, result
+
+    def _failover(self, failed, service):
+        """记录一次故障转移"""
+        self._count('failovers')
+        logger.warning("%s调用失败，改用%s", failed.provider_name, service.provider_name)
+
+    def _spawn(self, *args):
+        """在新线程中执行_call，返回其Future；主服务调用不占用线程池，也不会在线程池中排队"""
+        future = Future()
+
+        def run():
+            future.set_result(self._call(*args))
+
+        threading.Thread(target=run, name='llm-router-primary', daemon=True).start()
+        return future
+
+    def _generate_inline(self, primary, backups, prompt, max_tokens, priority, semantic_key):
+        """在调用方线程中依次调用主服务和备用服务，用于不可能对冲的请求"""
+        first_failure = None
+        for service in [primary] + backups:
+            if first_failure is not None:
+                self._failover(first_failure[0], service)
+            result, error = self._call(service, prompt, max_tokens, priority, semantic_key)
+            if error is None and result.get('success'):
+                return self._finish(service, primary, result)
+            if first_failure is None:
+                first_failure = (service, result, error)
+        service, result, error = first_failure
+        if error is not None:
+            raise error
+        return service, result
+
+    def generate(self, prompt, max_tokens=2048, preferred=None, priority=PRIORITY_DEFAULT, semantic_key=None):
+        """把请求路由到最健康的服务，必要时对冲或改用其他服务
+
+        Args:
+            prompt (str或callable): 提问内容，或接收服务、返回该服务提示词的函数（各服务的token预算不同）
+            max_tokens (int): 最大生成token数
+            preferred (BaseLLMService): 调用方指定的服务，健康时优先使用
+            priority (int): 限流排队的优先级
+            semantic_key (tuple): 语义缓存使用的(问题, 上下文)，见BaseLLMService.generate_response
+
+        Returns:
+            tuple: (给出结果的服务, 结果)，所有服务都失败时返回主服务的失败结果
+
+        Raises:
+            Exception: 所有服务都抛出异常时（例如都被限流），抛出主服务的异常
+        """
+        backups = self.rank(preferred)
+        primary = backups.pop(0)
+        self.hedge_budget.record_request()
+        if self._next_timeout(primary, backups, False) is None:
+            return self._generate_inline(primary, backups, prompt, max_tokens, priority, semantic_key)
+        pending = {self._spawn(primary, prompt, max_tokens, priority, semantic_key): primary}
+        hedged = False
+        first_failure = None
+
+        while pending:
+            done, _ = wait(pending, timeout=self._next_timeout(primary, backups, hedged),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                hedge = self._start_hedge(primary, backups)
+                if hedge is not None:
+                    pending[self.executor.submit(self._call, hedge, prompt, max_tokens, PRIORITY_BATCH,
+                                                 semantic_key)] = hedge
+                continue
+
+            for future in done:
+                service = pending.pop(future)
+                result, error = future.result()
+                if error is None and result.get('success'):
+                    return self._finish(service, primary, result)
+                if first_failure is None:
+                    first_failure = (service, result, error)
+            if not pending and backups:
+                service = backups.pop(0)
+                self._failover(first_failure[0], service)
+                pending[self.executor.submit(self._call, service, prompt, max_tokens, priority, semantic_key)] = service
+
+        service, result, error = first_failure
+        if error is not None:
+            raise error
+        return service, result
+
+    async def agenerate(self, prompt, max_tokens=2048, preferred=None, priority=PRIORITY_DEFAULT,
+                        semantic_key=None):
+        """generate的异步版本，对冲请求在同一个事件循环中并发等待
+
+        先返回的成功结果被采用后，仍在进行的调用会被取消。
+        """
+        backups = self.rank(preferred)
+        primary = backups.pop(0)
+        self.hedge_budget.record_request()
+        pending = {asyncio.ensure_future(self._acall(primary, prompt, max_tokens, priority, semantic_key)): primary}
+        hedged = False
+        first_failure = None
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self._next_timeout(primary, backups, hedged),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    hedge = self._start_hedge(primary, backups)
+                    if hedge is not None:
+                        pending[asyncio.ensure_future(
+                            self._acall(hedge, prompt, max_tokens, PRIORITY_BATCH, semantic_key))] = hedge
+                    continue
+
+                for task in done:
+                    service = pending.pop(task)
+                    result, error = task.result()
+                    if error is None and result.get('success'):
+                        return self._finish(service, primary, result)
+                    if first_failure is None:
+                        first_failure = (service, result, error)
+                if not pending and backups:
+                    service = backups.pop(0)
+                    self._failover(first_failure[0], service)
+                    pending[asyncio.ensure_future(self._acall(service, prompt, max_tokens, priority, semantic_key))] = service
+        finally:
+            for task in pending:
+                task.cancel()
+
+        service, result, error = first_failure
+        if error is not None:
+            raise error
+        return service, result
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 每个服务的延迟和错误率，以及对冲请求、对冲获胜和故障转移的次数
+        """
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return dict(counts, providers={name: tracker.stats() for name, tracker in self.trackers.items()})
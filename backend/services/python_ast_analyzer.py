@@ -0,0 +1,280 @@
+import ast
+import logging
+import re
+import textwrap
+from services.code_scanner import scan_text_metrics
+
+logger = logging.getLogger(__name__)
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_LOOP_NODES = (ast.For, ast.AsyncFor, ast.While)
+_TRY_NODES = (ast.Try, ast.TryStar) if hasattr(ast, 'TryStar') else (ast.Try,)
+_WITH_NODES = (ast.With, ast.AsyncWith)
+_MATCH_NODE = getattr(ast, 'Match', None)
+_COMPREHENSION_NODES = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+# 复合语句中包含子语句块的字段，其余字段都是表达式
+_BLOCK_FIELDS = frozenset(('body', 'orelse', 'handlers', 'finalbody', 'cases'))
+
+# 条件表达式、布尔运算和推导式都必须包含这些关键字之一，
+# 表达式所在的源码行中没有这些关键字时不需要遍历其子节点
+_EXPRESSION_KEYWORDS = re.compile(r'\b(?:if|and|or|for)\b')
+
+# 第一个非空行带有缩进，说明代码是截取的片段，需要先去除公共缩进
+_INDENTED_SOURCE = re.compile(r'(?:[ \t]*\r?\n)*[ \t]+\S')
+
+
+class _Frame:
+    """一个函数（或模块顶层代码）的复杂度累计"""
+
+    __slots__ = ('name', 'lineno', 'depth', 'cyclomatic', 'cognitive', 'max_nesting')
+
+    def __init__(self, name, lineno, depth):
+        self.name = name
+        self.lineno = lineno
+        # 函数体所在的嵌套层级，用于计算函数内部的相对嵌套深度
+        self.depth = depth
+        self.cyclomatic = 1
+        self.cognitive = 0
+        self.max_nesting = 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'lineno': self.lineno,
+            'cyclomatic_complexity': self.cyclomatic,
+            'cognitive_complexity': self.cognitive,
+            'max_nesting_depth': self.max_nesting
+        }
+
+
+class _ComplexityWalker:
+    """对Python语法树做一次遍历，同时统计结构、圈复杂度、认知复杂度和嵌套深度
+
+    - 圈复杂度：1 + 分支（if/elif、条件表达式、推导式中的if、match的每个case）
+      + 循环（for/while、推导式中的for）+ except子句 + 布尔运算符
+    - 认知复杂度：参考SonarSource的定义，分支、循环和except按所在的嵌套层级加权，
+      elif、else和布尔运算符序列各计1
+    - 嵌套深度：语句所在的代码块层级，与缩进宽度无关
+    """
+
+    def __init__(self, model, lines):
+        self.model = model
+        self.lines = lines
+        self.counts = model.counts
+        self.frames = [_Frame('<module>', 1, 0)]
+        self.function_frames = []
+        self.max_depth = 0
+
+    def walk(self, tree):
+        """遍历模块并把结果写入源码模型"""
+        self.block(tree.body, 0, 0)
+        module = self.frames[0]
+        self.model.max_nesting = self.max_depth
+        self.model.function_metrics = [frame.to_dict() for frame in self.function_frames]
+        self.model.cyclomatic_complexity = module.cyclomatic + sum(
+            frame.cyclomatic - 1 for frame in self.function_frames
+        )
+        self.model.cognitive_complexity = module.cognitive + sum(frame.cognitive for frame in self.function_frames)
+
+    def block(self, body, depth, nesting):
+        """遍历语句块
+
+        Args:
+            body (list): 语句列表
+            depth (int): 语句所在的代码块层级
+            nesting (int): 当前函数内用于认知复杂度加权的嵌套层级
+        """
+        for node in body:
+            self.statement(node, depth, nesting)
+
+    def statement(self, node, depth, nesting):
+        """遍历单条语句"""
+        if depth > self.max_depth:
+            self.max_depth = depth
+        frame = self.frames[-1]
+        if depth - frame.depth > frame.max_nesting:
+            frame.max_nesting = depth - frame.depth
+
+        if isinstance(node, _FUNCTION_NODES):
+            self.model.functions.append(node.name)
+            self.expressions(node, nesting)
+            # 每个函数单独计算复杂度，嵌套层级从函数体重新开始
+            function_frame = _Frame(node.name, node.lineno, depth + 1)
+            self.function_frames.append(function_frame)
+            self.frames.append(function_frame)
+            self.block(node.body, depth + 1, 0)
+            self.frames.pop()
+            return
+
+        if isinstance(node, ast.ClassDef):
+            self.model.classes.append(node.name)
+            self.expressions(node, nesting)
+            self.block(node.body, depth + 1, nesting)
+            return
+
+        if isinstance(node, ast.If):
+            self.counts['condition'] += 1
+            frame.cyclomatic += 1
+            frame.cognitive += 1 + nesting
+            self._if_chain(node, depth, nesting, frame)
+            return
+
+        if isinstance(node, _LOOP_NODES):
+            self.counts['loop'] += 1
+            frame.cyclomatic += 1
+            frame.cognitive += 1 + nesting
+            self.expressions(node, nesting)
+            self.block(node.body, depth + 1, nesting + 1)
+            if node.orelse:
+                frame.cognitive += 1
+                self.block(node.orelse, depth + 1, nesting + 1)
+            return
+
+        if isinstance(node, _TRY_NODES):
+            self.counts['try'] += 1
+            self.block(node.body, depth + 1, nesting)
+            for handler in node.handlers:
+                self.counts['exception'] += 1
+                frame.cyclomatic += 1
+                frame.cognitive += 1 + nesting
+                if handler.type is not None:
+                    self.expression(handler.type, nesting)
+                self.block(handler.body, depth + 1, nesting + 1)
+            self.block(node.orelse, depth + 1, nesting)
+            if node.finalbody:
+                self.counts['exception'] += 1
+                self.block(node.finalbody, depth + 1, nesting)
+            return
+
+        if isinstance(node, _WITH_NODES):
+            self.expressions(node, nesting)
+            self.block(node.body, depth + 1, nesting)
+            return
+
+        if _MATCH_NODE is not None and isinstance(node, _MATCH_NODE):
+            self.counts['condition'] += len(node.cases)
+            frame.cyclomatic += len(node.cases)
+            frame.cognitive += 1 + nesting
+            self.expression(node.subject, nesting)
+            for case in node.cases:
+                if case.guard is not None:
+                    self.expression(case.guard, nesting)
+                self.block(case.body, depth + 1, nesting + 1)
+            return
+
+        if isinstance(node, ast.Import):
+            self.model.imports.append(node.names[0].name)
+            return
+        if isinstance(node, ast.ImportFrom):
+            self.model.imports.append('.' * node.level + (node.module or ''))
+            return
+
+        self.expression(node, nesting)
+
+    def _if_chain(self, node, depth, nesting, frame):
+        """遍历if语句及其elif、else分支"""
+        while True:
+            self.expression(node.test, nesting)
+            self.block(node.body, depth + 1, nesting + 1)
+            orelse = node.orelse
+            if not orelse:
+                return
+            # elif在语法树中是else中唯一的If节点，且与外层if位于同一列
+            if len(orelse) == 1 and isinstance(orelse[0], ast.If) and orelse[0].col_offset == node.col_offset:
+                node = orelse[0]
+                self.counts['condition'] += 1
+                frame.cyclomatic += 1
+                frame.cognitive += 1
+                continue
+            self.counts['condition'] += 1
+            frame.cognitive += 1
+            self.block(orelse, depth + 1, nesting + 1)
+            return
+
+    def expressions(self, node, nesting):
+        """遍历复合语句中除子语句块以外的表达式（条件、装饰器、默认参数等）"""
+        for field in node._fields:
+            if field in _BLOCK_FIELDS:
+                continue
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        self.expression(item, nesting)
+            elif isinstance(value, ast.AST):
+                self.expression(value, nesting)
+
+    def _may_branch(self, node):
+        """根据节点对应的源码文本判断其中是否可能包含分支，不包含时可以跳过整个子树"""
+        lineno = getattr(node, 'lineno', None)
+        if lineno is None:
+            return True
+        if node.end_lineno == lineno:
+            line = self.lines[lineno - 1]
+            # 列偏移量按UTF-8字节计算，只有纯ASCII行可以直接切片
+            text = line[node.col_offset:node.end_col_offset] if line.isascii() else line
+        else:
+            text = '\n'.join(self.lines[lineno - 1:node.end_lineno])
+        return _EXPRESSION_KEYWORDS.search(text) is not None
+
+    def expression(self, node, nesting):
+        """遍历表达式，统计条件表达式、布尔运算符和推导式"""
+        frame = self.frames[-1]
+        counts = self.counts
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if not self._may_branch(node):
+                continue
+            if isinstance(node, ast.BoolOp):
+                frame.cyclomatic += len(node.values) - 1
+                frame.cognitive += 1
+            elif isinstance(node, ast.IfExp):
+                counts['condition'] += 1
+                frame.cyclomatic += 1
+                frame.cognitive += 1 + nesting
+            elif isinstance(node, _COMPREHENSION_NODES):
+                for generator in node.generators:
+                    counts['loop'] += 1
+                    counts['condition'] += len(generator.ifs)
+                    frame.cyclomatic += 1 + len(generator.ifs)
+                    frame.cognitive += 1 + nesting
+            stack.extend(ast.iter_child_nodes(node))
+
+def build_python_model(code):
+    """使用Python语法树构建源码模型
+
+    函数、类、导入、分支和循环的统计以及嵌套深度来自语法树，
+    不会受到字符串、注释和缩进宽度的影响；注释和过长的行仍由文本扫描得到。
+    代码整体带有缩进（例如从类中截取的片段）时会先去除公共缩进，CRLF和CR换行符统一为LF。
+
+    Args:
+        code (str): Python代码
+
+    Returns:
+        SourceModel: 源码模型；代码存在语法错误时返回None
+    """
+    # ast把\r\n和单独的\r都当作换行，统一换行符后行号才能与文本行对应
+    if '\r' in code:
+        code = code.replace('\r\n', '\n').replace('\r', '\n')
+    if _INDENTED_SOURCE.match(code):
+        code = textwrap.dedent(code)
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        logger.debug("Python代码解析失败，使用词法扫描: %s", e)
+        return None
+
+    model = scan_text_metrics(code, 'python')
+    model.backend = 'ast'
+    try:
+        _ComplexityWalker(model, code.split('\n')).walk(tree)
+    except RecursionError:
+        logger.debug("Python语法树嵌套过深，使用词法扫描")
+        return None
+    except Exception:
+        # 遍历语法树的意外错误不应使整个分析失败，改用词法扫描
+        logger.warning("遍历Python语法树时发生错误，使用词法扫描", exc_info=True)
+        return None
+    return model
@@ -1,56 +1,68 @@
 import logging
+import httpx
 import requests
 import os
 import json
 import time
-from functools import lru_cache
 from dotenv import load_dotenv
+from services.base_llm_service import BaseLLMService, LLMServiceError
+from services.prompt_builder import PromptBuilder
+from services.rate_limiter import get_rate_limiter
+from services.resilience import CircuitOpenError, RetryPolicy
 
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class QianwenService:
+class QianwenService(BaseLLMService):
     """阿里云千问API服务类，用于与千问大模型API通信"""
     
+    provider_name = 'qianwen'
+    display_name = '千问AI'
+    
     def __init__(self):
         """初始化千问服务"""
+        super().__init__()
         self.api_key = os.getenv('QIANWEN_API_KEY','************')
         self.api_url = os.getenv('QIANWEN_API_URL', 'https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation')
         self.model = os.getenv('QIANWEN_MODEL', 'qwen-turbo')
-        self.request_timeout = int(os.getenv('QIANWEN_TIMEOUT', '30'))
-        self.max_retries = int(os.getenv('QIANWEN_MAX_RETRIES', '3'))
-        self.retry_delay = int(os.getenv('QIANWEN_RETRY_DELAY', '2'))
-        self.cache_enabled = os.getenv('ENABLE_RESPONSE_CACHE', 'true').lower() == 'true'
+        self.prompt_builder = PromptBuilder.for_model(self.model, 'QIANWEN')
+        self.retry_policy = RetryPolicy.from_env('QIANWEN', self.display_name, attempt_timeout=30, max_attempts=3)
+        # 默认值与Dashscope的调用限制一致，账号配额不同时通过环境变量调整
+        self.rate_limiter = get_rate_limiter(
+            self.provider_name, self.model, 'QIANWEN', requests_per_second=20, tokens_per_minute=1000000
+        )
         
         if not self.api_key:
             logger.warning("未设置QIANWEN_API_KEY环境变量，千问API将无法正常工作")
     
-    @lru_cache(maxsize=100)
-    def _cached_generate_response(self, prompt_hash, max_tokens):
-        """带缓存的响应生成（内部方法）
-        
-        Args:
-            prompt_hash (str): 提问内容的哈希值，用于缓存键
-            max_tokens (int): 最大生成token数
-            
-        Returns:
-            dict: 包含生成的回答和状态信息
-        """
-        # 此方法由generate_response调用，实现实际的API调用逻辑
-        logger.debug(f"缓存未命中，调用千问API生成回答，prompt_hash={prompt_hash[:8]}...")
-        return self._call_qianwen_api(prompt_hash, max_tokens)
+    def is_configured(self):
+        """检查千问API密钥是否已配置"""
+        return bool(self.api_key)
     
-    def _call_qianwen_api(self, prompt, max_tokens):
-        """执行实际的千问API调用
+    def _not_configured_response(self):
+        """千问API未配置时返回的结果"""
+        logger.error("未配置千问API密钥，无法处理请求")
+        return {
+            'success': False,
+            'error': '未配置千问API密钥',
+            'content': '系统未正确配置千问API，请联系管理员设置QIANWEN_API_KEY环境变量。'
+        }
+    
+    def _call_api(self, prompt, max_tokens):
+        """执行实际的API调用"""
+        return self._call_qianwen_api(prompt, max_tokens)
+    
+    def _build_request(self, prompt, max_tokens):
+        """构建千问API的请求头和请求体
         
         Args:
             prompt (str): 提问内容
             max_tokens (int): 最大生成token数
             
         Returns:
-            dict: API响应结果
+            tuple: (headers, payload)
         """
         headers = {
             'Authorization': f'Bearer {self.api_key}',
@@ -72,151 +84,293 @@ class QianwenService:
                 'max_tokens': max_tokens
             }
         }
+        return headers, payload
+    
+    def _parse_result(self, result, elapsed_time):
+        """解析千问API的完整响应
         
-        for attempt in range(self.max_retries):
-            try:
-                logger.info(f"调用千问API (尝试 {attempt+1}/{self.max_retries})")
-                start_time = time.time()
-                response = requests.post(
-                    self.api_url, 
-                    headers=headers, 
-                    json=payload,
-                    timeout=self.request_timeout
-                )
-                elapsed_time = time.time() - start_time
-                logger.info(f"千问API响应时间: {elapsed_time:.2f}秒")
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # 解析千问API的响应
-                if 'output' in result and 'text' in result['output']:
-                    return {
-                        'success': True,
-                        'content': result['output']['text'],
-                        'model': self.model,
-                        'response_time': elapsed_time
-                    }
-                else:
-                    logger.error(f"千问API返回了意外的响应格式: {json.dumps(result, ensure_ascii=False)}")
-                    return {
-                        'success': False,
-                        'error': '千问API返回了意外的响应格式',
-                        'content': '处理请求时发生错误，请稍后再试。',
-                        'raw_response': result
-                    }
-                    
-            except requests.exceptions.Timeout:
-                logger.warning(f"千问API请求超时 (尝试 {attempt+1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                return {
-                    'success': False,
-                    'error': 'API请求超时',
-                    'content': '连接千问API时超时，请稍后再试。'
-                }
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"调用千问API时发生错误: {str(e)}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                return {
-                    'success': False,
-                    'error': f'API请求错误: {str(e)}',
-                    'content': '连接千问API时发生错误，请稍后再试。'
-                }
+        Args:
+            result (dict): 响应JSON
+            elapsed_time (float): 响应时间（秒）
+            
+        Returns:
+            dict: API响应结果
+        """
+        if 'output' in result and 'text' in result['output']:
+            response = {
+                'success': True,
+                'content': result['output']['text'],
+                'model': self.model,
+                'response_time': elapsed_time
+            }
+            # 实际的token用量，限流器据此归还多预留的配额
+            if 'usage' in result:
+                response['usage'] = result['usage']
+            return response
+        logger.error("千问API返回了意外的响应格式: %s", json.dumps(result, ensure_ascii=False))
+        return {
+            'success': False,
+            'error': '千问API返回了意外的响应格式',
+            'content': '处理请求时发生错误，请稍后再试。',
+            'raw_response': result
+        }
     
-    def generate_response(self, prompt, max_tokens=2048):
-        """调用千问API生成回答
+    def _parse_stream_line(self, line):
+        """解析千问流式响应中的一行
+        
+        Args:
+            line (str): SSE响应中的一行
+            
+        Returns:
+            str: 新生成的文本片段，不是数据行时返回None
+            
+        Raises:
+            LLMServiceError: 上游返回了错误事件
+            ValueError: 数据行不是合法的JSON
+        """
+        if not line or not line.startswith('data:'):
+            return None
+        data = json.loads(line[5:])
+        output = data.get('output')
+        if output is None:
+            logger.error("千问流式API返回错误: %s", line[5:])
+            raise LLMServiceError({
+                'success': False,
+                'error': f"千问API返回错误: {data.get('message', data.get('code', ''))}",
+                'content': '处理请求时发生错误，请稍后再试。'
+            })
+        return output.get('text')
+    
+    def _build_stream_request(self, prompt, max_tokens):
+        """构建千问流式API的请求头和请求体"""
+        headers, payload = self._build_request(prompt, max_tokens)
+        headers['Accept'] = 'text/event-stream'
+        headers['X-DashScope-SSE'] = 'enable'
+        # 每个事件只包含新生成的文本，而不是截至目前的完整回答
+        payload['parameters']['incremental_output'] = True
+        return headers, payload
+    
+    def _timeout_response(self):
+        """千问API请求超时时返回的结果"""
+        return {
+            'success': False,
+            'error': 'API请求超时',
+            'content': '连接千问API时超时，请稍后再试。'
+        }
+    
+    def _request_error_response(self, error):
+        """千问API请求失败时返回的结果"""
+        logger.error("调用千问API时发生错误: %s", error)
+        return {
+            'success': False,
+            'error': f'API请求错误: {str(error)}',
+            'content': '连接千问API时发生错误，请稍后再试。'
+        }
+    
+    def _call_qianwen_api(self, prompt, max_tokens):
+        """执行实际的千问API调用
+        
+        超时、连接错误和429/5xx响应按self.retry_policy退避重试，
+        熔断器打开时不发送请求，直接返回失败结果。
         
         Args:
             prompt (str): 提问内容
             max_tokens (int): 最大生成token数
             
         Returns:
-            dict: 包含生成的回答和状态信息
+            dict: API响应结果
         """
-        if not self.api_key:
-            logger.error("未配置千问API密钥，无法处理请求")
-            return {
-                'success': False,
-                'error': '未配置千问API密钥',
-                'content': '系统未正确配置千问API，请联系管理员设置QIANWEN_API_KEY环境变量。'
-            }
+        headers, payload = self._build_request(prompt, max_tokens)
         
-        # 使用缓存机制（如果启用）
-        if self.cache_enabled:
-            # 创建提示词的哈希值作为缓存键
-            # 注意：在实际应用中，可能需要更复杂的缓存键生成策略
-            prompt_hash = str(hash(prompt))
-            return self._cached_generate_response(prompt_hash, max_tokens)
-        else:
-            return self._call_qianwen_api(prompt, max_tokens)
+        def attempt(timeout):
+            logger.info("调用千问API (超时 %.1f秒)", timeout)
+            start_time = time.time()
+            response = self.session.post(
+                self.api_url, 
+                headers=headers, 
+                json=payload,
+                timeout=timeout
+            )
+            elapsed_time = time.time() - start_time
+            logger.info("千问API响应时间: %.2f秒", elapsed_time)
+            # requests的elapsed是从发送请求到解析完响应头的时间
+            self._observe_upstream('ttfb', response.elapsed.total_seconds())
+            self._observe_upstream('total', elapsed_time)
+            
+            response.raise_for_status()
+            return self._parse_result(response.json(), elapsed_time)
+        
+        try:
+            return self.retry_policy.call(attempt)
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
+        except requests.exceptions.Timeout:
+            logger.warning("千问API请求超时")
+            return self._timeout_response()
+        except requests.exceptions.RequestException as e:
+            return self._request_error_response(e)
     
-    def solve_problem(self, problem_description, code_context='', language='python'):
-        """使用千问API解决编程问题
+    def _stream_api(self, prompt, max_tokens):
+        """以SSE方式调用千问API，逐个返回增量生成的文本
+        
+        建立连接失败或超时时按self.retry_policy重试；开始输出后发生的错误不再重试，
+        因为已经返回给调用方的片段无法撤回。
         
         Args:
-            problem_description (str): 问题描述
-            code_context (str): 代码上下文，默认为空
-            language (str): 代码语言，默认为python
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
             
-        Returns:
-            dict: 包含解决方案代码、解释和额外资源的结果
+        Yields:
+            str: 新生成的文本片段
+            
+        Raises:
+            LLMServiceError: API调用失败
         """
-        # 构建提示词
-        prompt = f"""请解决以下{language}编程问题：
-
-问题描述：
-{problem_description}
-
-"""
+        headers, payload = self._build_stream_request(prompt, max_tokens)
         
-        if code_context:
-            prompt += f"代码上下文：\n```{language}\n{code_context}\n```\n\n"
+        def connect(timeout):
+            logger.info("调用千问流式API (超时 %.1f秒)", timeout)
+            response = self.session.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                stream=True
+            )
+            if not response.ok:
+                response.close()
+            response.raise_for_status()
+            return response
         
-        prompt += """请提供以下格式的回答：
-1. 解决方案代码
-2. 详细解释
-3. 相关资源或参考链接
-
-请确保代码可以直接运行，并提供清晰的注释。"""
+        start_time = time.time()
+        try:
+            response = self.retry_policy.call(connect)
+        except CircuitOpenError as e:
+            raise LLMServiceError(self._unavailable_response(e))
+        except requests.exceptions.Timeout:
+            logger.warning("千问流式API请求超时")
+            raise LLMServiceError(self._timeout_response())
+        except requests.exceptions.RequestException as e:
+            raise LLMServiceError(self._request_error_response(e))
         
-        # 调用千问API
-        response = self.generate_response(prompt)
+        # SSE响应通常不声明字符集，requests会默认按ISO-8859-1解码
+        response.encoding = 'utf-8'
+        first_chunk = True
+        with response:
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    text = self._parse_stream_line(line)
+                    if text:
+                        if first_chunk:
+                            logger.info("千问流式API首个片段耗时: %.2f秒", time.time() - start_time)
+                            self._observe_upstream('ttfb', time.time() - start_time)
+                            first_chunk = False
+                        yield text
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error("读取千问流式API响应时发生错误: %s", e)
+                raise LLMServiceError({
+                    'success': False,
+                    'error': f'API响应中断: {str(e)}',
+                    'content': '接收千问API的回答时发生错误，请稍后再试。'
+                })
+        logger.info("千问流式API响应时间: %.2f秒", time.time() - start_time)
+        self._observe_upstream('total', time.time() - start_time)
+    
+    async def _acall_api(self, prompt, max_tokens):
+        """使用异步HTTP客户端调用千问API，重试等待期间不占用线程
         
-        if not response['success']:
-            return {
-                'solution_code': '# 生成解决方案时发生错误',
-                'explanation': response['content'],
-                'additional_resources': ['请检查系统配置或稍后再试']
-            }
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            
+        Returns:
+            dict: API响应结果
+        """
+        headers, payload = self._build_request(prompt, max_tokens)
+        
+        async def attempt(timeout):
+            logger.info("异步调用千问API (超时 %.1f秒)", timeout)
+            start_time = time.time()
+            response = await self.async_client.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            )
+            elapsed_time = time.time() - start_time
+            logger.info("千问API响应时间: %.2f秒", elapsed_time)
+            self._observe_upstream('total', elapsed_time)
+            
+            response.raise_for_status()
+            return self._parse_result(response.json(), elapsed_time)
         
-        # 简单处理返回的内容，实际项目中可能需要更复杂的解析
-        content = response['content']
+        try:
+            return await self.retry_policy.acall(attempt)
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
+        except httpx.TimeoutException:
+            logger.warning("千问API请求超时")
+            return self._timeout_response()
+        except httpx.HTTPError as e:
+            return self._request_error_response(e)
+    
+    async def _astream_api(self, prompt, max_tokens):
+        """以SSE方式异步调用千问API，逐个返回增量生成的文本
+        
+        与_stream_api相同，只在开始输出之前重试。
         
-        # 提取解决方案代码、解释和资源
-        # 这里使用简单的分割方法，实际项目中可能需要更复杂的解析
-        solution_code = '# 千问AI生成的解决方案\n'
-        explanation = '千问AI的解释：\n'
-        additional_resources = ['千问AI提供的资源']
+        Args:
+            prompt (str): 提问内容
+            max_tokens (int): 最大生成token数
+            
+        Yields:
+            str: 新生成的文本片段
+            
+        Raises:
+            LLMServiceError: API调用失败
+        """
+        headers, payload = self._build_stream_request(prompt, max_tokens)
         
-        # 尝试从内容中提取代码块
-        if '```' in content:
-            code_blocks = content.split('```')
-            if len(code_blocks) > 1:
-                # 提取第一个代码块作为解决方案代码
-                solution_code = code_blocks[1].strip()
-                if solution_code.startswith(language):
-                    solution_code = solution_code[len(language):].strip()
+        async def connect(timeout):
+            logger.info("异步调用千问流式API (超时 %.1f秒)", timeout)
+            request = self.async_client.build_request(
+                'POST', self.api_url, headers=headers, json=payload, timeout=timeout
+            )
+            response = await self.async_client.send(request, stream=True)
+            if response.is_error:
+                await response.aclose()
+            response.raise_for_status()
+            return response
         
-        # 使用完整内容作为解释
-        explanation = content
+        start_time = time.time()
+        try:
+            response = await self.retry_policy.acall(connect)
+        except CircuitOpenError as e:
+            raise LLMServiceError(self._unavailable_response(e))
+        except httpx.TimeoutException:
+            logger.warning("千问流式API请求超时")
+            raise LLMServiceError(self._timeout_response())
+        except httpx.HTTPError as e:
+            raise LLMServiceError(self._request_error_response(e))
         
-        return {
-            'solution_code': solution_code,
-            'explanation': explanation,
-            'additional_resources': additional_resources
-        }
\ No newline at end of file
+        first_chunk = True
+        try:
+            async for line in response.aiter_lines():
+                text = self._parse_stream_line(line)
+                if text:
+                    if first_chunk:
+                        logger.info("千问流式API首个片段耗时: %.2f秒", time.time() - start_time)
+                        self._observe_upstream('ttfb', time.time() - start_time)
+                        first_chunk = False
+                    yield text
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error("读取千问流式API响应时发生错误: %s", e)
+            raise LLMServiceError({
+                'success': False,
+                'error': f'API响应中断: {str(e)}',
+                'content': '接收千问API的回答时发生错误，请稍后再试。'
+            })
+        finally:
+            await response.aclose()
+        logger.info("千问流式API响应时间: %.2f秒", time.time() - start_time)
+        self._observe_upstream('total', time.time() - start_time)
\ No newline at end of file
@@ -0,0 +1,329 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 优先级，数值越小越先获得配额
+PRIORITY_INTERACTIVE = 0  # 用户正在等待的交互式请求，例如/ask
+PRIORITY_DEFAULT = 1
+PRIORITY_BATCH = 2  # 批量和推测性的请求（例如对冲请求），配额紧张时最先被拒绝
+
+# 非队首的异步等待方检查队列的间隔（秒）
+_ASYNC_POLL_INTERVAL = 0.01
+
+
+class RateLimitExceeded(Exception):
+    """请求超出上游配额且无法在限定时间内排队等到配额，应返回429"""
+
+    def __init__(self, name, retry_after, reason):
+        super().__init__(f"{name}请求过多（{reason}），请{retry_after:.1f}秒后重试")
+        self.name = name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数
+
+    中文等非ASCII字符大约每个字符一个token，英文和代码大约每4个字符一个token。
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    # 编码时忽略非ASCII字符，长度差即为非ASCII字符数，不需要逐字符遍历
+    non_ascii = len(text) - len(text.encode('ascii', 'ignore'))
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+class TokenBucket:
+    """令牌桶，按固定速率补充令牌，最多积累capacity个（不加锁，由调用方保证互斥）"""
+
+    def __init__(self, rate, capacity):
+        """初始化令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数
+            capacity (float): 令牌数上限，即允许的突发量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        """按经过的时间补充令牌"""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """计算令牌数达到amount还需等待的时间（秒）"""
+        self._refill(now)
+        return max(0.0, min(amount, self.capacity) - self.tokens) / self.rate
+
+    def take(self, amount):
+        """取出令牌（调用前应确认wait_time为0）"""
+        self.tokens -= min(amount, self.capacity)
+
+    def put(self, amount):
+        """归还令牌，例如实际消耗少于预估时"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Waiter:
+    """等待配额的请求"""
+
+    __slots__ = ('priority', 'seq', 'tokens', 'evicted')
+
+    def __init__(self, priority, seq, tokens):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.evicted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimiter:
+    """上游配额的准入控制：每秒请求数和每分钟token数两个令牌桶
+
+    请求按优先级和到达顺序排队，只有队首的请求可以取走配额。队列已满时，
+    新请求的优先级高于队列中最低的优先级则挤掉后者，否则直接拒绝；
+    预计排队时间超过max_wait的请求也会直接拒绝，而不是等到超时。
+    """
+
+    def __init__(self, name, requests_per_second=0, tokens_per_minute=0, max_queue=100, max_wait=10):
+        """初始化限流器
+
+        Args:
+            name (str): 名称，用于日志和错误信息
+            requests_per_second (float): 每秒请求数上限，0表示不限制
+            tokens_per_minute (float): 每分钟token数上限，0表示不限制
+            max_queue (int): 排队等待的请求数上限
+            max_wait (float): 排队等待时间上限（秒）
+        """
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._request_bucket = TokenBucket(requests_per_second, max(1.0, requests_per_second)) \
+            if requests_per_second > 0 else None
+        self._token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute) \
+            if tokens_per_minute > 0 else None
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._admitted = 0
+        self._rejected = 0
+        self._evicted = 0
+
+    def _buckets(self, tokens):
+        """返回(令牌桶, 本次请求需要的令牌数)列表"""
+        buckets = []
+        if self._request_bucket is not None:
+            buckets.append((self._request_bucket, 1))
+        if self._token_bucket is not None:
+            buckets.append((self._token_bucket, tokens))
+        return buckets
+
+    def _estimate_wait(self, tokens, priority, now):
+        """估算新请求需要等待的时间，只计算排在它前面（优先级不低于它）的请求（需持有锁）"""
+        ahead = [waiter for waiter in self._queue if waiter.priority <= priority]
+        wait = 0.0
+        for bucket, amount in self._buckets(tokens):
+            if bucket is self._request_bucket:
+                queued = len(ahead)
+            else:
+                queued = sum(min(waiter.tokens, bucket.capacity) for waiter in ahead)
+            bucket.wait_time(0, now)  # 只补充令牌
+            wait = max(wait, (queued + min(amount, bucket.capacity) - bucket.tokens) / bucket.rate)
+        return wait
+
+    def _reject(self, retry_after, reason):
+        """记录并抛出拒绝（需持有锁）"""
+        self._rejected += 1
+        logger.warning("%s限流拒绝请求: %s，排队%s个", self.name, reason, len(self._queue))
+        raise RateLimitExceeded(self.name, max(1.0, retry_after), reason)
+
+    def _enqueue(self, tokens, priority, now):
+        """把请求加入等待队列，队列已满或预计等待过久时拒绝（需持有锁）"""
+        estimated_wait = self._estimate_wait(tokens, priority, now)
+        if estimated_wait > self.max_wait:
+            self._reject(estimated_wait, '预计排队时间过长')
+        if len(self._queue) >= self.max_queue:
+            lowest = max(self._queue) if self._queue else None
+            if lowest is None or lowest.priority <= priority:
+                self._reject(estimated_wait, '等待队列已满')
+            # 挤掉优先级最低、到达最晚的请求
+            lowest.evicted = True
+            self._queue.remove(lowest)
+            heapq.heapify(self._queue)
+            self._evicted += 1
+            self._cond.notify_all()
+        waiter = _Waiter(priority, next(self._seq), tokens)
+        heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _try_acquire(self, waiter, now):
+        """尝试为请求取走配额（需持有锁）
+
+        Returns:
+            float: 0表示已取得配额；否则为队首请求还需等待的时间，非队首请求返回None
+        """
+        if waiter.evicted:
+            self._reject(self._estimate_wait(waiter.tokens, waiter.priority, now), '被更高优先级的请求挤出队列')
+        if self._queue[0] is not waiter:
+            return None
+        buckets = self._buckets(waiter.tokens)
+        wait = max((bucket.wait_time(amount, now) for bucket, amount in buckets), default=0.0)
+        if wait > 0:
+            return wait
+        for bucket, amount in buckets:
+            bucket.take(amount)
+        heapq.heappop(self._queue)
+        self._admitted += 1
+        # 让下一个请求成为队首
+        self._cond.notify_all()
+        return 0.0
+
+    def _leave(self, waiter):
+        """请求放弃等待时移出队列（需持有锁）"""
+        if not waiter.evicted and waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def acquire(self, tokens=0, priority=PRIORITY_DEFAULT):
+        """等待并取得一次请求的配额
+
+        Args:
+            tokens (int): 本次请求预计消耗的token数
+            priority (int): 优先级，数值越小越优先
+
+        Raises:
+            RateLimitExceeded: 队列已满、被挤出队列或等待超过max_wait
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            waiter = self._enqueue(tokens, priority, time.monotonic())
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_acquire(waiter, now)
+                    if wait == 0:
+                        return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._reject(self._estimate_wait(tokens, priority, now), '排队等待超时')
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            except BaseException:
+                self._leave(waiter)
+                raise
+
+    async def aacquire(self, tokens=0, priority=PRIORITY_DEFAULT):
+        """acquire的异步版本，等待期间不占用线程
+
+        Args:
+            tokens (int): 本次请求预计消耗的token数
+            priority (int): 优先级，数值越小越优先
+
+        Raises:
+            RateLimitExceeded: 队列已满、被挤出队列或等待超过max_wait
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            waiter = self._enqueue(tokens, priority, time.monotonic())
+        try:
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    wait = self._try_acquire(waiter, now)
+                    if wait == 0:
+                        return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._reject(self._estimate_wait(tokens, priority, now), '排队等待超时')
+                await asyncio.sleep(min(_ASYNC_POLL_INTERVAL if wait is None else wait, remaining))
+        except BaseException:
+            with self._cond:
+                self._leave(waiter)
+            raise
+
+    def refund(self, tokens):
+        """归还预估多出的token，例如上游返回的实际用量少于预估时
+
+        Args:
+            tokens (int): 归还的token数
+        """
+        if self._token_bucket is None or tokens <= 0:
+            return
+        with self._cond:
+            self._token_bucket.put(tokens)
+            self._cond.notify_all()
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 排队中的请求数，以及放行、拒绝和挤出的请求总数
+        """
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'evicted': self._evicted
+            }
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, model, prefix, requests_per_second=0, tokens_per_minute=0):
+    """获取某个服务提供方和模型共享的限流器
+
+    读取 {prefix}_RATE_LIMIT_RPS 和 {prefix}_RATE_LIMIT_TPM，以及所有限流器共用的
+    RATE_LIMIT_MAX_QUEUE 和 RATE_LIMIT_MAX_WAIT。
+
+    Args:
+        provider (str): 服务提供方名称
+        model (str): 模型名称
+        prefix (str): 环境变量前缀，例如QIANWEN
+        requests_per_second (float): 未设置环境变量时的每秒请求数上限
+        tokens_per_minute (float): 未设置环境变量时的每分钟token数上限
+
+    Returns:
+        RateLimiter: 限流器，两个上限都为0时返回None
+    """
+    requests_per_second = float(os.getenv(f'{prefix}_RATE_LIMIT_RPS', str(requests_per_second)))
+    tokens_per_minute = float(os.getenv(f'{prefix}_RATE_LIMIT_TPM', str(tokens_per_minute)))
+    if requests_per_second <= 0 and tokens_per_minute <= 0:
+        return None
+    key = (provider, model)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = _rate_limiters[key] = RateLimiter(
+                f'{provider}/{model}',
+                requests_per_second=requests_per_second,
+                tokens_per_minute=tokens_per_minute,
+                max_queue=int(os.getenv('RATE_LIMIT_MAX_QUEUE', '100')),
+                max_wait=float(os.getenv('RATE_LIMIT_MAX_WAIT', '10'))
+            )
+        return limiter
+
+
+def retry_after_header(error):
+    """计算Retry-After响应头的值（整数秒，向上取整）"""
+    return str(math.ceil(error.retry_after))
@@ -0,0 +1,64 @@
+import logging
+import os
+from flask import current_app
+from services.batch_analyzer import BatchAnalyzer
+from services.code_analyzer import CodeAnalyzer
+from services.custom_api_service import CustomAPIService
+from services.problem_solver import ProblemSolver
+from services.provider_router import ProviderRouter
+from services.qianwen_service import QianwenService
+from services.suggestion_generator import SuggestionGenerator
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """应用级服务容器
+
+    在应用启动时创建一次所有服务实例，并在整个进程生命周期内复用，
+    使缓存、连接池和预编译的规则等状态可以跨请求保留。
+    容器中的服务都是线程安全的，可以被多个请求线程同时使用。
+    """
+
+    def __init__(self):
+        """创建所有服务实例"""
+        logger.info("初始化服务容器")
+        self.qianwen_service = QianwenService()
+        self.custom_api_service = CustomAPIService()
+        self.code_analyzer = CodeAnalyzer(max_workers=int(os.getenv('ANALYZER_MAX_WORKERS', '4')))
+        self.batch_analyzer = BatchAnalyzer(self.code_analyzer)
+        self.suggestion_generator = SuggestionGenerator()
+        self.provider_router = ProviderRouter.from_env([self.qianwen_service, self.custom_api_service])
+        self.problem_solver = ProblemSolver(
+            qianwen_service=self.qianwen_service,
+            custom_api_service=self.custom_api_service,
+            router=self.provider_router
+        )
+
+    def init_app(self, app):
+        """将服务容器注册到Flask应用
+
+        Args:
+            app (Flask): Flask应用实例
+        """
+        app.extensions['services'] = self
+
+    def upstream_urls(self):
+        """获取已配置的上游大模型服务URL，用于预热连接池
+
+        Returns:
+            list: URL列表
+        """
+        return [
+            service.api_url
+            for service in (self.qianwen_service, self.custom_api_service)
+            if service.is_configured()
+        ]
+
+
+def get_services():
+    """获取当前应用的服务容器（需在请求或应用上下文中调用）
+
+    Returns:
+        ServiceRegistry: 服务容器
+    """
+    return current_app.extensions['services']
@@ -0,0 +1,486 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+import httpx
+import requests
+from utils.metrics import UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# 表示上游过载或暂时不可用、值得重试的HTTP状态码
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发送到上游"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name}熔断器已打开，{retry_after:.1f}秒后重新尝试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_retryable_error(error):
+    """判断上游调用的异常是否值得重试
+
+    超时、连接错误和表示上游过载的状态码（429、5xx）值得重试，并计入熔断器的失败次数；
+    其余错误（例如400、401）说明上游能够正常响应，重试也不会成功。
+
+    Args:
+        error (Exception): requests或httpx抛出的异常
+
+    Returns:
+        bool: 是否值得重试
+    """
+    if isinstance(error, (requests.exceptions.HTTPError, httpx.HTTPStatusError)):
+        response = error.response
+        return response is None or response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (
+        requests.exceptions.Timeout,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        httpx.TimeoutException,
+        httpx.TransportError
+    ))
+
+
+def is_client_error(error):
+    """判断上游调用的异常是否是上游明确拒绝了这个请求（429以外的4xx响应）
+
+    这类错误说明上游能够正常响应，计为熔断器的一次成功；其他不值得重试的异常
+    （例如响应体无法解析、响应格式变化或代码错误）不能说明上游正常，计为失败。
+
+    Args:
+        error (Exception): 上游调用抛出的异常
+
+    Returns:
+        bool: 是否是客户端错误
+    """
+    if isinstance(error, (requests.exceptions.HTTPError, httpx.HTTPStatusError)):
+        response = error.response
+        return response is not None and 400 <= response.status_code < 500 \
+            and response.status_code not in RETRYABLE_STATUS_CODES
+    return False
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """计算第attempt次重试前的等待时间（full jitter指数退避）
+
+    在[0, min(max_delay, base_delay * 2 ** (attempt - 1))]中均匀随机取值，
+    使大量同时失败的请求分散开，不会在同一时刻一起重试。
+
+    Args:
+        attempt (int): 重试序号，从1开始
+        base_delay (float): 第一次重试的最大等待时间（秒）
+        max_delay (float): 等待时间上限（秒）
+
+    Returns:
+        float: 等待时间（秒）
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """进程级的重试预算
+
+    在滑动窗口内，重试次数不超过 min_retries + ratio * 请求次数。上游正常时预算充足，
+    上游故障时所有请求都在失败，重试被限制在请求量的一小部分，避免重试放大故障期间的负载。
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10):
+        """初始化重试预算
+
+        Args:
+            ratio (float): 每个请求可以带来的重试次数
+            min_retries (int): 窗口内无论请求多少都允许的重试次数
+            window (float): 滑动窗口长度（秒）
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """移除窗口之外的记录（需持有锁）"""
+        cutoff = now - self.window
+        for records in (self._requests, self._retries):
+            while records and records[0] < cutoff:
+                records.popleft()
+
+    def record_request(self):
+        """记录一次请求（不含重试）"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_acquire(self):
+        """申请一次重试
+
+        Returns:
+            bool: 预算充足时记录这次重试并返回True，否则返回False
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self._rejected += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 窗口内的请求数、重试数和被拒绝的重试总数
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'requests': len(self._requests),
+                'retries': len(self._retries),
+                'rejected_retries': self._rejected
+            }
+
+
+class CircuitBreaker:
+    """熔断器
+
+    滑动窗口内的调用数达到min_requests且失败率达到failure_rate时打开，在cooldown秒内直接拒绝请求；
+    冷却结束后进入半开状态，只放行一个探测请求，探测成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_requests=10, window=30, cooldown=15):
+        """初始化熔断器
+
+        Args:
+            name (str): 名称，用于日志
+            failure_rate (float): 打开熔断器的失败率阈值
+            min_requests (int): 计算失败率所需的最少调用数
+            window (float): 统计失败率的滑动窗口长度（秒）
+            cooldown (float): 打开后拒绝请求的时间（秒）
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self._state = STATE_CLOSED
+        self._outcomes = deque()  # (时间, 是否成功)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """判断是否允许发送请求
+
+        Raises:
+            CircuitOpenError: 熔断器处于打开状态，或半开状态下已有探测请求
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._state == STATE_OPEN:
+                retry_after = self._opened_at + self.cooldown - now
+                if retry_after > 0:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, retry_after)
+                self._state = STATE_HALF_OPEN
+                self._probing = False
+                logger.info("%s熔断器进入半开状态，放行一个探测请求", self.name)
+            if self._state == STATE_HALF_OPEN:
+                # 探测请求被取消时不会记录结果，超过冷却时间后允许新的探测请求
+                if self._probing and now < self._probe_started + self.cooldown:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probing = True
+                self._probe_started = now
+
+    def record_success(self):
+        """记录一次成功的调用"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.info("%s熔断器探测请求成功，恢复正常", self.name)
+                self._state = STATE_CLOSED
+                self._outcomes.clear()
+                self._failures = 0
+                return
+            self._record(True)
+
+    def record_failure(self):
+        """记录一次失败的调用"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._open(now, '探测请求失败')
+                return
+            if self._state == STATE_OPEN:
+                return
+            self._record(False)
+            total = len(self._outcomes)
+            if total >= self.min_requests and self._failures / total >= self.failure_rate:
+                self._open(now, f"最近{self.window}秒内失败率{self._failures / total:.0%}")
+
+    def _record(self, success):
+        """记录调用结果并移除窗口之外的记录（需持有锁）"""
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        if not success:
+            self._failures += 1
+        cutoff = now - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _open(self, now, reason):
+        """打开熔断器（需持有锁）"""
+        logger.warning("%s熔断器打开（%s），%s秒内直接拒绝请求", self.name, reason, self.cooldown)
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._probing = False
+        self._outcomes.clear()
+        self._failures = 0
+
+    @property
+    def state(self):
+        """当前状态"""
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 当前状态、窗口内的调用数和失败数以及被拒绝的请求总数
+        """
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'calls': len(self._outcomes),
+                'failures': self._failures,
+                'rejected': self._rejected
+            }
+
+
+class RetryPolicy:
+    """上游调用的重试策略：指数退避、重试预算、单次与整体超时以及熔断
+
+    每次尝试的超时为attempt_timeout和剩余整体时间中的较小值；重试前的退避时间
+    会超过整体截止时间、或重试预算不足时，不再重试而是直接返回最后一次的错误。
+    """
+
+    def __init__(self, name, max_attempts=3, attempt_timeout=30, total_timeout=60,
+                 base_delay=1, max_delay=10, breaker=None, budget=None):
+        """初始化重试策略
+
+        Args:
+            name (str): 名称，用于日志
+            max_attempts (int): 最大尝试次数（含第一次）
+            attempt_timeout (float): 单次尝试的超时时间（秒）
+            total_timeout (float): 包含重试和退避在内的整体超时时间（秒）
+            base_delay (float): 第一次重试的最大退避时间（秒）
+            max_delay (float): 退避时间上限（秒）
+            breaker (CircuitBreaker): 熔断器，默认为该策略单独创建一个
+            budget (RetryBudget): 重试预算，默认使用进程内共享的预算
+        """
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker(name, **_breaker_settings())
+        self.budget = budget or get_retry_budget()
+
+    @classmethod
+    def from_env(cls, prefix, name, attempt_timeout=30, max_attempts=3, base_delay=1):
+        """根据环境变量创建重试策略
+
+        读取 {prefix}_TIMEOUT、{prefix}_TOTAL_TIMEOUT、{prefix}_MAX_RETRIES、
+        {prefix}_RETRY_DELAY 和 {prefix}_RETRY_MAX_DELAY。
+
+        Args:
+            prefix (str): 环境变量前缀，例如QIANWEN
+            name (str): 名称，用于日志
+            attempt_timeout (float): 未设置环境变量时的单次超时时间（秒）
+            max_attempts (int): 未设置环境变量时的最大尝试次数
+            base_delay (float): 未设置环境变量时的第一次重试最大退避时间（秒）
+
+        Returns:
+            RetryPolicy: 重试策略
+        """
+        attempt_timeout = float(os.getenv(f'{prefix}_TIMEOUT', str(attempt_timeout)))
+        return cls(
+            name,
+            max_attempts=int(os.getenv(f'{prefix}_MAX_RETRIES', str(max_attempts))),
+            attempt_timeout=attempt_timeout,
+            total_timeout=float(os.getenv(f'{prefix}_TOTAL_TIMEOUT', str(attempt_timeout * 2))),
+            base_delay=float(os.getenv(f'{prefix}_RETRY_DELAY', str(base_delay))),
+            max_delay=float(os.getenv(f'{prefix}_RETRY_MAX_DELAY', '10'))
+        )
+
+    def _next_delay(self, attempt, error, deadline):
+        """计算下一次重试前的等待时间，不应重试时返回None
+
+        Args:
+            attempt (int): 已完成的尝试次数
+            error (Exception): 本次尝试的异常
+            deadline (float): 整体截止时间（time.monotonic()）
+
+        Returns:
+            float: 等待时间（秒），不应重试时返回None
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        if time.monotonic() + delay >= deadline:
+            logger.warning("%s剩余时间不足，不再重试: %s", self.name, error)
+            return None
+        if not self.budget.try_acquire():
+            logger.warning("%s重试预算已用完，不再重试: %s", self.name, error)
+            return None
+        return delay
+
+    def _attempt_timeout(self, deadline):
+        """计算本次尝试的超时时间"""
+        return max(0.001, min(self.attempt_timeout, deadline - time.monotonic()))
+
+    def call(self, fn):
+        """按重试策略执行上游调用
+
+        Args:
+            fn (callable): 接收本次尝试超时时间（秒）的函数，失败时抛出requests或httpx的异常
+
+        Returns:
+            object: fn的返回值
+
+        Raises:
+            CircuitOpenError: 熔断器处于打开状态
+            Exception: 最后一次尝试的异常
+        """
+        deadline = time.monotonic() + self.total_timeout
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            attempt += 1
+            try:
+                result = fn(self._attempt_timeout(deadline))
+            except Exception as e:
+                if not is_retryable_error(e):
+                    # 上游能够正常响应、只是拒绝了这个请求时不计为失败，返回了无法处理的响应时计为失败
+                    if is_client_error(e):
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                    raise
+                self.breaker.record_failure()
+                delay = self._next_delay(attempt, e, deadline)
+                if delay is None:
+                    raise
+                logger.warning("%s调用失败 (尝试 %s/%s)，%.2f秒后重试: %s",
+                               self.name, attempt, self.max_attempts, delay, e)
+                UPSTREAM_RETRIES.inc(policy=self.name)
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn):
+        """call的异步版本，退避等待期间不占用线程
+
+        Args:
+            fn (callable): 接收本次尝试超时时间（秒）、返回协程的函数
+
+        Returns:
+            object: 协程的返回值
+
+        Raises:
+            CircuitOpenError: 熔断器处于打开状态
+            Exception: 最后一次尝试的异常
+        """
+        deadline = time.monotonic() + self.total_timeout
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            attempt += 1
+            try:
+                result = await fn(self._attempt_timeout(deadline))
+            except Exception as e:
+                if not is_retryable_error(e):
+                    if is_client_error(e):
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                    raise
+                self.breaker.record_failure()
+                delay = self._next_delay(attempt, e, deadline)
+                if delay is None:
+                    raise
+                logger.warning("%s调用失败 (尝试 %s/%s)，%.2f秒后重试: %s",
+                               self.name, attempt, self.max_attempts, delay, e)
+                UPSTREAM_RETRIES.inc(policy=self.name)
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 熔断器状态
+        """
+        return self.breaker.stats()
+
+
+def _breaker_settings():
+    """从环境变量读取熔断器配置"""
+    return {
+        'failure_rate': float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE', '0.5')),
+        'min_requests': int(os.getenv('CIRCUIT_BREAKER_MIN_REQUESTS', '10')),
+        'window': float(os.getenv('CIRCUIT_BREAKER_WINDOW', '30')),
+        'cooldown': float(os.getenv('CIRCUIT_BREAKER_COOLDOWN', '15'))
+    }
+
+
+_retry_budget = None
+_retry_budget_lock = threading.Lock()
+
+
+def get_retry_budget():
+    """获取进程内共享的重试预算，所有上游服务共用
+
+    Returns:
+        RetryBudget: 重试预算
+    """
+    global _retry_budget
+    if _retry_budget is None:
+        with _retry_budget_lock:
+            if _retry_budget is None:
+                _retry_budget = RetryBudget(
+                    ratio=float(os.getenv('RETRY_BUDGET_RATIO', '0.2')),
+                    min_retries=int(os.getenv('RETRY_BUDGET_MIN_RETRIES', '10')),
+                    window=float(os.getenv('RETRY_BUDGET_WINDOW', '10'))
+                )
+    return _retry_budget
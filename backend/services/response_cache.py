@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.disk_cache import DiskResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(provider, model, prompt, max_tokens):
+    """根据请求内容生成稳定的缓存键
+
+    与内置的hash()不同，这里使用SHA-256摘要，不受进程随机盐影响，
+    因此同一请求在不同进程、不同重启之间得到的缓存键完全一致。
+
+    Args:
+        provider (str): 服务提供方名称，例如qianwen、custom
+        model (str): 模型名称
+        prompt (str): 提问内容
+        max_tokens (int): 最大生成token数
+
+    Returns:
+        str: 十六进制摘要字符串
+    """
+    payload = json.dumps([provider, model, prompt, max_tokens], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _estimate_size(value):
+    """估算缓存值占用的字节数（按JSON序列化后的长度计算）"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    except (TypeError, ValueError):
+        return len(repr(value).encode('utf-8'))
+
+
+class ResponseCache:
+    """线程安全的LLM响应缓存，支持LRU淘汰、TTL过期和字节容量上限
+
+    可选地挂载一个磁盘缓存作为第二级缓存：内存未命中时查询磁盘缓存，
+    写入时同时写入两级缓存。
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, max_bytes=64 * 1024 * 1024, disk_cache=None):
+        """初始化响应缓存
+
+        Args:
+            max_entries (int): 最大缓存条目数
+            ttl (float): 缓存条目的存活时间（秒），小于等于0表示永不过期
+            max_bytes (int): 缓存值的总字节数上限
+            disk_cache (DiskResponseCache): 可选的磁盘缓存，默认不启用
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.disk_cache = disk_cache
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_hits = 0
+
+    def get(self, key):
+        """读取缓存值
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            dict: 命中时返回缓存值的副本，未命中或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    # 返回副本，避免调用方修改缓存中的对象
+                    return dict(value)
+                self._remove(key)
+
+        if self.disk_cache is not None:
+            value, remaining_ttl = self.disk_cache.get(key)
+            if value is not None:
+                # 回填内存缓存，但不再写回磁盘
+                self.set(key, value, ttl=remaining_ttl, write_through=False)
+                with self._lock:
+                    self._hits += 1
+                    self._disk_hits += 1
+                return dict(value)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key, value, ttl=None, write_through=True):
+        """写入缓存值
+
+        Args:
+            key (str): 缓存键
+            value (dict): 要缓存的响应
+            ttl (float): 本条目的存活时间（秒），为None时使用缓存的默认TTL
+            write_through (bool): 是否同时写入磁盘缓存
+        """
+        if write_through and self.disk_cache is not None:
+            self.disk_cache.set(key, value)
+
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            logger.debug("缓存值过大（%s字节），跳过内存缓存", size)
+            return
+
+        if ttl is None:
+            ttl = self.ttl if self.ttl > 0 else None
+        else:
+            ttl = min(ttl, self.ttl) if self.ttl > 0 else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (dict(value), size, expires_at)
+            self._current_bytes += size
+            self._evict()
+
+    def clear(self):
+        """清空缓存（包括磁盘缓存）"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+        if self.disk_cache is not None:
+            self.disk_cache.clear()
+
+    def stats(self):
+        """获取缓存统计信息
+
+        Returns:
+            dict: 包含条目数、字节数、命中数和未命中数的统计信息
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'disk_hits': self._disk_hits,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
+        if self.disk_cache is not None:
+            stats['disk'] = self.disk_cache.stats()
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key):
+        """删除条目（调用方需持有锁）"""
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+    def _evict(self):
+        """按LRU顺序淘汰条目，直到满足条目数和字节数限制（调用方需持有锁）"""
+        while self._entries and (len(self._entries) > self.max_entries or self._current_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def _create_disk_cache():
+    """根据环境变量创建磁盘缓存，未启用时返回None"""
+    if os.getenv('ENABLE_DISK_CACHE', 'false').lower() != 'true':
+        return None
+
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'responses.db')
+    try:
+        disk_cache = DiskResponseCache(
+            path=os.getenv('DISK_CACHE_PATH', default_path),
+            ttl=float(os.getenv('DISK_CACHE_TTL', '86400')),
+            max_bytes=int(os.getenv('DISK_CACHE_MAX_BYTES', str(512 * 1024 * 1024))),
+            compaction_interval=float(os.getenv('DISK_CACHE_COMPACTION_INTERVAL', '300'))
+        )
+    except Exception as e:
+        logger.error("初始化磁盘缓存失败，仅使用内存缓存: %s", e)
+        return None
+
+    disk_cache.start_background_maintenance()
+    logger.info("启用磁盘响应缓存: %s", disk_cache.path)
+    return disk_cache
+
+
+def get_response_cache():
+    """获取进程内共享的响应缓存实例
+
+    所有请求处理器和服务实例共用同一个缓存，配置从环境变量读取：
+    RESPONSE_CACHE_MAX_ENTRIES、RESPONSE_CACHE_TTL、RESPONSE_CACHE_MAX_BYTES。
+    设置ENABLE_DISK_CACHE=true时启用基于SQLite的磁盘缓存，由同一台机器上的
+    所有工作进程共享，相关配置为DISK_CACHE_PATH、DISK_CACHE_TTL、
+    DISK_CACHE_MAX_BYTES和DISK_CACHE_COMPACTION_INTERVAL。
+
+    Returns:
+        ResponseCache: 共享的缓存实例
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache(
+                    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+                    ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+                    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+                    disk_cache=_create_disk_cache()
+                )
+                logger.info("初始化响应缓存，最大条目数: %s，TTL: %s秒",
+                            _shared_cache.max_entries, _shared_cache.ttl)
+    return _shared_cache
@@ -0,0 +1,198 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时不启用语义缓存
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 连续空白
+_WHITESPACE = re.compile(r'\s+')
+# 英文单词和标识符
+_WORD = re.compile(r'[a-z0-9_]+')
+# 运算符和数字：只在这些地方不同的问题含义完全不同（a < b 与 a > b），必须逐字相同才能匹配
+_EXACT_TOKEN = re.compile(r'[<>=!+\-*/%&|^~]+|\d+(?:\.\d+)?')
+
+
+def normalize_text(question):
+    """规范化问题用于计算相似度：转为小写，连续空白合并为一个空格
+
+    字符n-gram跳过空白、保留标点和运算符，只在空白或大小写上不同的问题得到相同的向量。
+    """
+    return _WHITESPACE.sub(' ', question.lower()).strip()
+
+
+def exact_signature(text, context=''):
+    """计算必须完全相同的部分的摘要：问题中的运算符和数字序列，以及整个上下文
+
+    Args:
+        text (str): 规范化后的问题
+        context (str): 上下文，例如语言和代码上下文
+
+    Returns:
+        int: 63位非负整数，用作命名空间之外的匹配条件
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update('\x00'.join(_EXACT_TOKEN.findall(text)).encode('utf-8'))
+    digest.update(b'\x01')
+    digest.update(context.encode('utf-8', errors='replace'))
+    return int.from_bytes(digest.digest(), 'big') >> 1
+
+
+class SemanticCache:
+    """近似重复问题的响应缓存
+
+    把规范化后的问题映射为哈希字符n-gram、单词和运算符组成的向量（不需要训练，也不依赖外部模型），
+    查询时用一次矩阵乘法计算与所有缓存问题的余弦相似度，相似度达到阈值的最近邻直接作为缓存结果。
+    只比较问题本身：代码上下文等随问题一起发送的内容按精确摘要匹配，不参与相似度计算，
+    否则几KB相同的代码会淹没问题之间的差异。只有命名空间（服务提供方、模型和max_tokens）、
+    上下文以及问题中的运算符和数字都相同的条目才会匹配。
+    """
+
+    def __init__(self, threshold=0.9, max_entries=1000, ttl=3600, dim=2048, ngram=3):
+        """初始化语义缓存
+
+        Args:
+            threshold (float): 命中所需的最小余弦相似度
+            max_entries (int): 最大缓存条目数，超过时覆盖最早写入的条目
+            ttl (float): 缓存条目的存活时间（秒），小于等于0表示永不过期
+            dim (int): 哈希向量的维数
+            ngram (int): 字符n-gram的长度
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dim = dim
+        self.ngram = ngram
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        # 每行的匹配键（命名空间、上下文和精确部分的摘要），-1表示空行
+        self._keys = np.full(max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._values = [None] * max_entries
+        self._next_row = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _vectorize(self, text):
+        """把规范化后的文本映射为L2归一化的哈希特征向量"""
+        # 字符n-gram跳过空白但保留标点和运算符
+        compact = text.replace(' ', '')
+        features = [compact[i:i + self.ngram] for i in range(max(1, len(compact) - self.ngram + 1))]
+        features.extend('w:' + word for word in _WORD.findall(text))
+        # crc32在不同进程之间稳定，不受hash()随机盐影响
+        indices = np.fromiter((zlib.crc32(feature.encode('utf-8')) % self.dim for feature in features),
+                              dtype=np.int64, count=len(features))
+        vector = np.bincount(indices, minlength=self.dim).astype(np.float32)
+        # 对词频取对数，避免重复出现的片段主导相似度
+        np.log1p(vector, out=vector)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _key(self, namespace, text, context):
+        """计算条目的匹配键"""
+        return exact_signature(text, f'{namespace}\x00{context}')
+
+    def get(self, namespace, question, context=''):
+        """查找与问题足够相似的缓存结果
+
+        Args:
+            namespace (str): 命名空间，例如服务提供方、模型和max_tokens的组合
+            question (str): 问题，参与相似度比较
+            context (str): 随问题发送的上下文（例如语言和代码上下文），必须完全相同
+
+        Returns:
+            tuple: (缓存结果的副本, 相似度)，未命中时为(None, 最高相似度)
+        """
+        text = normalize_text(question)
+        vector = self._vectorize(text)
+        key = self._key(namespace, text, context)
+        with self._lock:
+            similarities = self._vectors @ vector
+            valid = self._keys == key
+            if self.ttl > 0:
+                valid &= self._expires > time.time()
+            similarities = np.where(valid, similarities, -1.0)
+            row = int(np.argmax(similarities))
+            similarity = float(similarities[row])
+            if similarity < self.threshold:
+                self._misses += 1
+                return None, max(similarity, 0.0)
+            self._hits += 1
+            return copy.deepcopy(self._values[row]), similarity
+
+    def set(self, namespace, question, value, context=''):
+        """写入缓存，超过条目数上限时覆盖最早写入的条目
+
+        Args:
+            namespace (str): 命名空间
+            question (str): 问题
+            value (dict): 缓存值
+            context (str): 随问题发送的上下文
+        """
+        text = normalize_text(question)
+        vector = self._vectorize(text)
+        key = self._key(namespace, text, context)
+        with self._lock:
+            row = self._next_row % self.max_entries
+            self._next_row += 1
+            self._vectors[row] = vector
+            self._keys[row] = key
+            self._expires[row] = time.time() + self.ttl
+            self._values[row] = copy.deepcopy(value)
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 条目数、命中数、未命中数和命中率
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'entries': min(self._next_row, self.max_entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / total if total else 0.0,
+                'threshold': self.threshold
+            }
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """获取进程内共享的语义缓存实例
+
+    设置ENABLE_SEMANTIC_CACHE=true时启用，配置从环境变量读取：SEMANTIC_CACHE_THRESHOLD、
+    SEMANTIC_CACHE_MAX_ENTRIES、SEMANTIC_CACHE_TTL和SEMANTIC_CACHE_DIM。
+
+    Returns:
+        SemanticCache: 共享的语义缓存实例，未启用或未安装numpy时返回None
+    """
+    global _semantic_cache
+    if os.getenv('ENABLE_SEMANTIC_CACHE', 'false').lower() != 'true':
+        return None
+    if np is None:
+        logger.warning("未安装numpy，语义缓存不可用")
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+                    max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000')),
+                    ttl=float(os.getenv('SEMANTIC_CACHE_TTL', '3600')),
+                    dim=int(os.getenv('SEMANTIC_CACHE_DIM', '2048'))
+                )
+                logger.info("初始化语义缓存，相似度阈值: %s", _semantic_cache.threshold)
+    return _semantic_cache
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 行尾空白
+_TRAILING_WHITESPACE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+
+def normalize_prompt(prompt):
+    """规范化提示词，用于判断两个请求是否相同
+
+    统一换行符并去除首尾空白和行尾空白；行首缩进会影响代码的含义，因此保留。
+
+    Args:
+        prompt (str): 提示词
+
+    Returns:
+        str: 规范化后的提示词
+    """
+    return _TRAILING_WHITESPACE.sub('', prompt.replace('\r\n', '\n')).strip()
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # 等待该调用结果的其他调用方数量
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并相同键的并发调用（single-flight）
+
+    同一个键同时只有一个调用方（leader）真正执行函数，其余调用方等待并共享它的结果或异常，
+    调用结束后键立即被移除，之后的调用会重新执行。同步调用方在各自的线程中等待，
+    异步调用方在同一个事件循环中等待同一个Future，两者互不合并。
+    """
+
+    def __init__(self):
+        """初始化single-flight"""
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key, fn):
+        """执行函数，相同键的并发调用只执行一次
+
+        Args:
+            key (str): 调用键
+            fn (callable): 无参数的函数
+
+        Returns:
+            tuple: (函数的返回值, 是否共享了其他调用方的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.info("合并了%s个相同的并发请求，key=%s...", call.waiters, key[:8])
+            call.done.set()
+
+    async def ado(self, key, fn):
+        """do的异步版本，相同键的并发调用只执行一次
+
+        Args:
+            key (str): 调用键
+            fn (callable): 无参数、返回协程的函数
+
+        Returns:
+            tuple: (协程的返回值, 是否共享了其他调用方的结果)
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._async_calls.get(flight_key)
+        if future is not None:
+            with self._lock:
+                self._coalesced += 1
+            # shield避免某个等待方被取消时取消所有调用方共享的调用
+            return await asyncio.shield(future), True
+
+        future = self._async_calls[flight_key] = loop.create_task(fn())
+        future.add_done_callback(lambda _: self._async_calls.pop(flight_key, None))
+        with self._lock:
+            self._leaders += 1
+        return await asyncio.shield(future), False
+
+    def stats(self):
+        """获取统计信息
+
+        Returns:
+            dict: 真正执行的调用数、共享结果的调用数和正在进行的调用数
+        """
+        with self._lock:
+            total = self._leaders + self._coalesced
+            return {
+                'upstream_calls': self._leaders,
+                'coalesced_calls': self._coalesced,
+                'coalesce_rate': self._coalesced / total if total else 0.0,
+                'in_flight': len(self._calls) + len(self._async_calls)
+            }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """获取进程内共享的single-flight实例，设置LLM_SINGLE_FLIGHT=false时返回None
+
+    Returns:
+        SingleFlight: 共享的single-flight实例
+    """
+    global _single_flight
+    if os.getenv('LLM_SINGLE_FLIGHT', 'true').lower() != 'true':
+        return None
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
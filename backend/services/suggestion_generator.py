@@ -20,7 +20,7 @@ class SuggestionGenerator:
         Returns:
             dict: 包含改进后的代码、解释和改进点的建议结果
         """
-        logger.info(f"为{language}代码生成{improvement_type}类型的建议")
+        logger.info("为%s代码生成%s类型的建议", language, improvement_type)
         
         # 这里实现代码建议生成逻辑
         # 实际项目中可能会调用更复杂的分析工具或AI模型
@@ -80,7 +80,7 @@ class SuggestionGenerator:
         Returns:
             dict: 包含代码示例和解释的结果
         """
-        logger.info(f"为{concept}概念提供{language}语言的{complexity}复杂度示例")
+        logger.info("为%s概念提供%s语言的%s复杂度示例", concept, language, complexity)
         
         # 这里实现代码示例生成逻辑
         # 实际项目中可能会有预定义的示例库或使用AI生成
@@ -0,0 +1,224 @@
+import io
+import json
+import unittest
+import sys
+import os
+import zipfile
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from services.base_llm_service import LLMServiceError
+from services.qianwen_service import QianwenService
+from services.rate_limiter import RateLimiter
+
+class TestAPI(unittest.TestCase):
+    """API接口测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.client = app.test_client()
+        self.services = app.extensions['services']
+
+    def test_services_are_shared_between_requests(self):
+        """测试服务实例在应用启动时创建并被所有请求复用"""
+        self.assertIs(self.services.problem_solver.qianwen_service, self.services.qianwen_service)
+
+        with mock.patch.object(self.services.code_analyzer, 'analyze', wraps=self.services.code_analyzer.analyze) as analyze:
+            for _ in range(2):
+                response = self.client.post('/api/code-analysis/analyze', json={
+                    'code': 'def add(a, b):\n    return a + b\n',
+                    'language': 'python'
+                })
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(analyze.call_count, 2)
+
+    def test_complexity_endpoint(self):
+        """测试代码复杂度接口返回函数级指标"""
+        response = self.client.post('/api/code-analysis/complexity', json={
+            'code': 'def pick(x):\n    return [i for i in x if i] if x else []\n',
+            'language': 'python'
+        })
+        
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result['functions'][0]['name'], 'pick')
+        self.assertEqual(result['functions'][0]['cyclomatic_complexity'], 4)
+
+    def test_batch_endpoint(self):
+        """测试批量分析接口返回每个文件的结果和仓库级汇总"""
+        response = self.client.post('/api/code-analysis/batch', json={
+            'files': [
+                {'filename': 'src/util.py', 'code': 'def add(a, b):\n    return a + b\n'},
+                {'filename': 'web/app.js', 'code': 'function run(x) {\n  if (x) { return 1; }\n}\n'},
+                {'filename': 'notes.txt', 'code': 'hello', 'language': 'text'}
+            ],
+            'summary_only': True
+        })
+        
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()['result']
+        self.assertEqual([item['language'] for item in result['files']], ['python', 'javascript'])
+        self.assertNotIn('result', result['files'][0])
+        self.assertEqual(result['skipped'][0]['filename'], 'notes.txt')
+        aggregate = result['aggregate']
+        self.assertEqual(aggregate['analyzed_files'], 2)
+        self.assertEqual(aggregate['skipped_files'], 1)
+        self.assertEqual(aggregate['function_count'], 2)
+        self.assertEqual(aggregate['most_complex_files'][0]['filename'], 'web/app.js')
+
+    def test_batch_endpoint_archive(self):
+        """测试上传zip压缩包时只分析源码文件，并忽略依赖目录和越界路径"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('repo/main.py', 'import os\n\n\ndef main():\n    return os.getcwd()\n')
+            archive.writestr('repo/node_modules/lib/index.js', 'var a = 1;\n')
+            archive.writestr('repo/logo.png', b'\x89PNG\r\n')
+            archive.writestr('../evil.py', 'x = 1\n')
+        buffer.seek(0)
+        
+        response = self.client.post(
+            '/api/code-analysis/batch',
+            data={'archive': (buffer, 'repo.zip')},
+            content_type='multipart/form-data'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()['result']
+        self.assertEqual([item['filename'] for item in result['files']], ['repo/main.py'])
+        self.assertEqual(result['files'][0]['result']['structure']['functions'], ['main'])
+        self.assertEqual([item['filename'] for item in result['skipped']], ['../evil.py'])
+
+    def test_batch_endpoint_invalid_archive(self):
+        """测试上传无法识别的压缩包时返回400"""
+        response = self.client.post(
+            '/api/code-analysis/batch',
+            data={'archive': (io.BytesIO(b'not an archive'), 'repo.zip')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_ask_question(self):
+        """测试直接提问接口"""
+        api_result = {'success': True, 'content': '闭包是引用了外部变量的函数', 'model': 'qwen-turbo'}
+        with mock.patch.object(QianwenService, '_call_qianwen_api', return_value=api_result):
+            response = self.client.post('/api/direct-question/ask', json={'question': 'test_ask_question'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['explanation'], '闭包是引用了外部变量的函数')
+
+    def test_ask_question_stream(self):
+        """测试流式提问时以SSE逐段返回千问API的增量输出，并在结束后写入响应缓存"""
+        upstream = mock.MagicMock()
+        upstream.iter_lines.return_value = [
+            'id:1',
+            'event:result',
+            'data:{"output":{"text":"闭包是"},"request_id":"1"}',
+            '',
+            'data:{"output":{"text":"引用了外部变量的函数"},"request_id":"1"}'
+        ]
+        session = mock.Mock()
+        session.post.return_value = upstream
+        question = 'test_ask_question_stream'
+        
+        with mock.patch.object(QianwenService, 'session', new_callable=mock.PropertyMock, return_value=session):
+            response = self.client.post('/api/direct-question/ask', json={'question': question, 'stream': True})
+            body = response.get_data(as_text=True)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/event-stream'))
+        events = [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.strip().split('\n\n')
+        ]
+        self.assertEqual([event for event, _ in events], ['start', 'delta', 'delta', 'done'])
+        self.assertEqual(events[1][1]['content'], '闭包是')
+        self.assertEqual(events[3][1]['explanation'], '闭包是引用了外部变量的函数')
+        self.assertTrue(session.post.call_args.kwargs['stream'])
+        self.assertTrue(session.post.call_args.kwargs['json']['parameters']['incremental_output'])
+        
+        # 流式输出的完整回答已写入缓存，普通请求不再调用上游API
+        with mock.patch.object(QianwenService, '_call_qianwen_api') as call_api:
+            response = self.client.post('/api/direct-question/ask', json={'question': question})
+        call_api.assert_not_called()
+        self.assertEqual(response.get_json()['explanation'], '闭包是引用了外部变量的函数')
+
+    def test_solve_problem_stream_ndjson(self):
+        """测试不支持增量输出的服务以一个片段返回完整回答，done事件包含解析后的解决方案"""
+        custom_api_service = self.services.custom_api_service
+        api_result = {'success': True, 'content': '```python\nprint(1)\n```\n输出1'}
+        with mock.patch.object(custom_api_service, 'is_configured', return_value=True), \
+                mock.patch.object(custom_api_service, '_call_custom_api', return_value=api_result):
+            response = self.client.post('/api/problem-solving/solve', json={
+                'problem_description': 'test_solve_problem_stream_ndjson',
+                'use_custom_api': True,
+                'stream': 'ndjson'
+            })
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['event'] for line in lines], ['start', 'delta', 'done'])
+        self.assertEqual(lines[1]['content'], api_result['content'])
+        self.assertEqual(lines[2]['solution_code'], 'print(1)')
+        self.assertEqual(lines[2]['additional_resources'], ['自定义API提供的资源'])
+
+    def test_ask_question_rate_limited(self):
+        """测试超出上游配额且无法排队时返回429和Retry-After，不调用上游API"""
+        limiter = RateLimiter('qianwen/test', requests_per_second=1, max_wait=0.1)
+        limiter.acquire()
+        with mock.patch.object(self.services.qianwen_service, 'rate_limiter', limiter), \
+                mock.patch.object(QianwenService, '_call_qianwen_api') as call_api:
+            response = self.client.post('/api/direct-question/ask', json={'question': 'test_ask_question_rate_limited'})
+
+        call_api.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.get_json()['retry_after'], 1.0)
+
+    def test_stream_rate_limited(self):
+        """测试流式请求超出上游配额时同样在开始输出之前返回429，而不是200加error事件"""
+        limiter = RateLimiter('test', requests_per_second=1, max_wait=0.1)
+        limiter.acquire()
+        with mock.patch.object(self.services.qianwen_service, 'rate_limiter', limiter), \
+                mock.patch.object(self.services.custom_api_service, 'rate_limiter', limiter), \
+                mock.patch.object(QianwenService, '_stream_api') as stream_api:
+            ask = self.client.post('/api/direct-question/ask', json={
+                'question': 'test_stream_rate_limited', 'stream': True
+            })
+            solve = self.client.post('/api/problem-solving/solve', json={
+                'problem_description': 'test_stream_rate_limited', 'use_qianwen': True, 'stream': 'ndjson'
+            })
+
+        stream_api.assert_not_called()
+        for response in (ask, solve):
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            self.assertEqual(response.get_json()['retry_after'], 1.0)
+
+    def test_stream_refunds_unused_tokens(self):
+        """测试流式输出结束或上游出错后，按已生成内容归还预留的最大生成数中未用完的token"""
+        service = self.services.qianwen_service
+        limiter = RateLimiter('qianwen/test', tokens_per_minute=100000)
+
+        def stream(prompt, max_tokens):
+            yield '闭包是'
+            raise LLMServiceError({'success': False, 'error': '连接中断', 'content': '连接中断'})
+
+        for stream_api in (lambda prompt, max_tokens: iter(['闭包是', '引用了外部变量的函数']), stream):
+            with mock.patch.object(service, 'rate_limiter', limiter), \
+                    mock.patch.object(service, 'response_cache', None), \
+                    mock.patch.object(QianwenService, '_stream_api', side_effect=stream_api):
+                events = list(service.stream_response('test_stream_refunds_unused_tokens'))
+            # 只扣除提示词和已生成内容的估算值，而不是整个max_tokens
+            self.assertGreater(limiter._token_bucket.tokens, 100000 - 50)
+        self.assertEqual(events[-1]['event'], 'error')
+
+    def test_ask_question_missing_parameter(self):
+        """测试缺少问题参数时返回400"""
+        response = self.client.post('/api/direct-question/ask', json={})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
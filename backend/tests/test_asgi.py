@@ -0,0 +1,205 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+import time
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+try:
+    from fastapi.testclient import TestClient
+    import asgi
+except ImportError:  # 只安装了同步路径的依赖
+    asgi = None
+
+from services.qianwen_service import QianwenService
+from services.rate_limiter import RateLimiter
+from utils.metrics import REQUEST_LATENCY, UPSTREAM_LATENCY
+
+
+def _mock_client(handler):
+    """返回把请求交给handler处理的异步HTTP客户端工厂"""
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@unittest.skipIf(asgi is None, '未安装fastapi或a2wsgi')
+class TestASGI(unittest.TestCase):
+    """ASGI服务路径测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.client = TestClient(asgi.app)
+
+    def test_flask_routes_are_served_through_asgi(self):
+        """测试未改写为异步的接口仍由Flask应用处理"""
+        response = self.client.get('/api/health')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ok')
+        self.assertIn('X-Request-ID', response.headers)
+
+        response = self.client.get('/api/problem-solving/solve')
+        self.assertEqual(response.status_code, 405)
+
+    def test_ask_question_uses_async_client(self):
+        """测试异步提问接口通过异步HTTP客户端调用千问API，响应格式与Flask路由相同，并记录耗时指标"""
+        route_labels = {'method': 'POST', 'route': '/api/direct-question/ask', 'status': '200'}
+        request_count = REQUEST_LATENCY.count(**route_labels)
+        upstream_count = UPSTREAM_LATENCY.count(upstream='qianwen', phase='total')
+
+        def handler(request):
+            self.assertEqual(json.loads(request.content)['input']['messages'][0]['content'], 'test_asgi_ask')
+            return httpx.Response(200, json={'output': {'text': '异步回答'}})
+
+        with mock.patch('services.async_http_client._create_client', _mock_client(handler)), \
+                mock.patch.object(QianwenService, '_call_qianwen_api') as call_api:
+            response = self.client.post('/api/direct-question/ask', json={'question': 'test_asgi_ask'})
+
+        call_api.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'problem': 'test_asgi_ask',
+            'solution_code': '',
+            'explanation': '异步回答',
+            'additional_resources': []
+        })
+        self.assertEqual(REQUEST_LATENCY.count(**route_labels), request_count + 1)
+        self.assertEqual(UPSTREAM_LATENCY.count(upstream='qianwen', phase='total'), upstream_count + 1)
+
+    def test_ask_question_stream(self):
+        """测试异步提问接口以SSE逐段返回千问API的增量输出"""
+        body = (
+            'data:{"output":{"text":"第一段"}}\n\n'
+            'data:{"output":{"text":"第二段"}}\n\n'
+        )
+
+        def handler(request):
+            self.assertEqual(request.headers['X-DashScope-SSE'], 'enable')
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+
+        with mock.patch('services.async_http_client._create_client', _mock_client(handler)):
+            response = self.client.post('/api/direct-question/ask', json={
+                'question': 'test_asgi_ask_stream',
+                'stream': True
+            })
+
+        self.assertEqual(response.status_code, 200)
+        events = [block.split('\n')[0] for block in response.text.strip().split('\n\n')]
+        self.assertEqual(events, ['event: start', 'event: delta', 'event: delta', 'event: done'])
+        self.assertIn('第一段第二段', response.text)
+
+    def test_solve_problem_matches_sync_route(self):
+        """测试异步问题解决接口的响应与Flask路由相同"""
+        data = {'problem_description': 'test_asgi_solve', 'language': 'go'}
+        response = self.client.post('/api/problem-solving/solve', json=data)
+        expected = asgi.flask_app.test_client().post('/api/problem-solving/solve', json=data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected.get_json())
+
+    def test_solve_problem_prepares_request_off_event_loop(self):
+        """测试异步问题解决接口在线程池中推断语言和构建提示词，不阻塞事件循环；缺少参数时与Flask路由返回相同的错误"""
+        on_event_loop = []
+
+        def record(result):
+            def call(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_event_loop.append(True)
+                except RuntimeError:
+                    on_event_loop.append(False)
+                return result
+            return call
+
+        def handler(request):
+            return httpx.Response(200, json={'output': {'text': '```python\nprint(1)\n```'}})
+
+        with mock.patch('services.async_http_client._create_client', _mock_client(handler)), \
+                mock.patch('api.problem_solving.detect_language', side_effect=record('python')), \
+                mock.patch.object(QianwenService, 'build_solution_prompt', side_effect=record('test_asgi_prompt')):
+            response = self.client.post('/api/problem-solving/solve', json={
+                'problem_description': 'test_asgi_off_loop', 'code_context': 'x = 1', 'use_qianwen': True
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(on_event_loop, [False, False])
+
+        response = self.client.post('/api/problem-solving/solve', json={'code_context': 'x = 1'})
+        expected = asgi.flask_app.test_client().post('/api/problem-solving/solve', json={'code_context': 'x = 1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), expected.get_json())
+
+    def test_request_limits_apply_to_async_routes(self):
+        """测试异步路由在解析请求体之前执行与Flask路由相同的请求体和字段长度限制"""
+        with mock.patch.object(QianwenService, 'agenerate_response') as generate:
+            response = self.client.post('/api/direct-question/ask', json={'question': 'x' * (2 * 1024 * 1024)})
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(response.json()['limit'], asgi.app.state.request_limits.max_body_size)
+
+            response = self.client.post('/api/problem-solving/solve', json={
+                'problem_description': 'test_asgi_limits', 'code_context': 'x' * 150001, 'use_qianwen': True
+            })
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(response.json()['field'], 'code_context')
+
+            # 没有Content-Length的分块请求体在接收超过上限时中止
+            chunks = (b'{"question": "' + b'x' * 65536 for _ in range(32))
+            response = self.client.post('/api/direct-question/ask', content=chunks,
+                                        headers={'Content-Type': 'application/json'})
+            self.assertEqual(response.status_code, 413)
+        generate.assert_not_called()
+
+        response = self.client.post('/api/problem-solving/solve', json={
+            'problem_description': 'test_asgi_limits', 'code_context': 'x' * 150000, 'language': 'go'
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_stream_rate_limited(self):
+        """测试异步流式请求超出上游配额时在开始输出之前返回429"""
+        services = asgi.app.state.services
+        limiter = RateLimiter('test', requests_per_second=1, max_wait=0.1)
+        limiter.acquire()
+        with mock.patch.object(services.qianwen_service, 'rate_limiter', limiter), \
+                mock.patch.object(services.custom_api_service, 'rate_limiter', limiter), \
+                mock.patch.object(QianwenService, '_astream_api') as stream_api:
+            ask = self.client.post('/api/direct-question/ask', json={
+                'question': 'test_asgi_stream_rate_limited', 'stream': True
+            })
+            solve = self.client.post('/api/problem-solving/solve', json={
+                'problem_description': 'test_asgi_stream_rate_limited', 'use_qianwen': True, 'stream': True
+            })
+
+        stream_api.assert_not_called()
+        for response in (ask, solve):
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_concurrent_upstream_calls_do_not_hold_threads(self):
+        """测试大量同时进行的上游调用在一个事件循环中并发等待"""
+        async def handler(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={'output': {'text': 'ok'}})
+
+        service = QianwenService()
+        # 这里只验证事件循环的并发能力，不经过上游配额的限流
+        service.rate_limiter = None
+
+        async def run():
+            return await asyncio.gather(*(
+                service.agenerate_response(f'test_asgi_concurrent_{i}') for i in range(200)
+            ))
+
+        start_time = time.time()
+        with mock.patch('services.async_http_client._create_client', _mock_client(handler)):
+            results = asyncio.run(run())
+
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertLess(time.time() - start_time, 2)
+
+if __name__ == '__main__':
+    unittest.main()
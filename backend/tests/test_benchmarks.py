@@ -0,0 +1,152 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from benchmarks.corpus import build_corpus, generate_source
+from benchmarks.load_test import build_schedule, default_mix, run_self_hosted
+from benchmarks.run_benchmarks import (
+    compare_results, percentile, run_analyzer_benchmarks, run_endpoint_benchmarks
+)
+from benchmarks.stub_llm import StubLLMServer, parse_latency
+from services.qianwen_service import QianwenService
+from utils.validators import MAX_CODE_LENGTH
+
+
+class TestBenchmarks(unittest.TestCase):
+    """基准测试语料、统计和基线比较测试类"""
+
+    def test_corpus_is_deterministic_and_bounded(self):
+        """测试语料按种子固定生成，大小不超过代码长度上限，并包含病态输入"""
+        self.assertEqual(generate_source('python', 4096), generate_source('python', 4096))
+        self.assertNotEqual(generate_source('python', 4096, seed=1), generate_source('python', 4096))
+
+        corpus = build_corpus()
+        names = {item['name'] for item in corpus}
+        for language in ('python', 'javascript'):
+            for kind in ('long-lines', 'deep-nesting', 'huge-docstring'):
+                self.assertIn(f'{language}-{kind}', names)
+        self.assertTrue(all(0 < len(item['code']) <= MAX_CODE_LENGTH for item in corpus))
+        self.assertGreater(max(len(item['code']) for item in corpus), MAX_CODE_LENGTH * 0.9)
+
+    def test_percentile(self):
+        """测试最近秩法分位数"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.5), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_compare_results_detects_regressions(self):
+        """测试超过阈值且超过最小差值的变慢被视为退化，新增的测试项不参与比较"""
+        baseline = {'analyzer': {'a': {'p50_ms': 10.0, 'p99_ms': 20.0}, 'tiny': {'p50_ms': 0.1, 'p99_ms': 0.2}}}
+        results = {'analyzer': {
+            'a': {'p50_ms': 12.0, 'p99_ms': 40.0},
+            'tiny': {'p50_ms': 0.5, 'p99_ms': 0.6},
+            'new': {'p50_ms': 100.0, 'p99_ms': 100.0}
+        }}
+
+        regressions = compare_results(results, baseline, threshold=0.3, min_delta_ms=1.0)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('analyzer/a p99_ms', regressions[0])
+
+    def test_analyzer_benchmark(self):
+        """测试分析器基准测试覆盖病态输入且不报错"""
+        corpus = [item for item in build_corpus(sizes=(1024,)) if 'python' in item['name']]
+        results = run_analyzer_benchmarks(corpus, repeats=2, max_seconds=0)
+
+        self.assertEqual(set(results), {item['name'] for item in corpus})
+        self.assertTrue(all(stats['samples'] >= 2 for stats in results.values()))
+
+    def test_endpoint_benchmark_uses_stub_server(self):
+        """测试接口基准测试通过桩服务器调用大模型，结束后恢复服务配置"""
+        from app import app
+        qianwen = app.extensions['services'].qianwen_service
+        api_url = qianwen.api_url
+
+        results = run_endpoint_benchmarks(repeats=2, max_seconds=0, code_size=1024)
+
+        self.assertIn('ask', results)
+        self.assertIn('solve', results)
+        self.assertGreaterEqual(results['_upstream_calls'].get('/qianwen', 0), 6)
+        self.assertEqual(qianwen.api_url, api_url)
+
+
+class TestStubLLMServer(unittest.TestCase):
+    """桩服务器测试类"""
+
+    def test_parse_latency(self):
+        """测试延迟分布的解析"""
+        import random
+        rng = random.Random(0)
+        self.assertEqual(parse_latency('0.25')(rng), 0.25)
+        self.assertTrue(all(0.1 <= parse_latency('uniform:0.1:0.2')(rng) <= 0.2 for _ in range(20)))
+        self.assertTrue(all(parse_latency('normal:0:1')(rng) >= 0 for _ in range(20)))
+        self.assertGreater(parse_latency('lognormal:0.5:0.3')(rng), 0)
+        with self.assertRaises(ValueError):
+            parse_latency('poisson:1')
+
+    def test_rate_limit_returns_retry_after(self):
+        """测试超过每秒请求数上限时返回429和Retry-After"""
+        with StubLLMServer(rate_limit=1) as stub:
+            first = requests.post(stub.url + '/qianwen', json={}, timeout=5)
+            second = requests.post(stub.url + '/qianwen', json={}, timeout=5)
+
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(second.status_code, 429)
+            self.assertGreaterEqual(int(second.headers['Retry-After']), 1)
+            self.assertEqual(stub.stats(), {'/qianwen': {'200': 1, '429': 1}})
+
+    def test_error_rate_and_custom_format(self):
+        """测试错误率为1时返回500，自定义API路径返回content字段"""
+        with StubLLMServer(error_rate=1) as stub:
+            self.assertEqual(requests.post(stub.url + '/qianwen', json={}, timeout=5).status_code, 500)
+        with StubLLMServer() as stub:
+            response = requests.post(stub.url + '/custom', json={}, timeout=5)
+            self.assertIn('content', response.json())
+
+    def test_stream_matches_qianwen_format(self):
+        """测试流式响应可以被千问服务的解析逻辑还原为完整回答"""
+        with StubLLMServer(stream_chunks=4) as stub:
+            response = requests.post(stub.url + '/qianwen', json={}, headers={'X-DashScope-SSE': 'enable'},
+                                     stream=True, timeout=5)
+            response.encoding = 'utf-8'
+            service = QianwenService()
+            pieces = [service._parse_stream_line(line) for line in response.iter_lines(decode_unicode=True)]
+            text = ''.join(piece for piece in pieces if piece)
+
+        self.assertEqual(len([piece for piece in pieces if piece]), 4)
+        self.assertIn('def solve', text)
+
+
+class TestLoadTest(unittest.TestCase):
+    """压测工具测试类"""
+
+    def test_schedule_follows_weights(self):
+        """测试请求序列按权重生成，部分提问来自重复问题池"""
+        schedule = build_schedule(default_mix(), 200)
+        names = [name for name, _, _, _ in schedule]
+        questions = [body['question'] for name, _, _, body in schedule if name == 'ask']
+
+        self.assertGreater(names.count('ask'), names.count('analyze'))
+        self.assertLess(len(set(questions)), len(questions))
+        self.assertEqual(schedule, build_schedule(default_mix(), 200))
+
+    def test_self_hosted_load(self):
+        """测试自托管压测报告吞吐量、延迟分位数和上游调用次数"""
+        report = run_self_hosted(default_mix(), qps=20, duration=1, concurrency=8, disable_caches=True)
+
+        self.assertEqual(report['requests'], 20)
+        self.assertEqual(report['statuses'], {'200': 20})
+        self.assertGreater(report['throughput_per_s'], 0)
+        self.assertGreater(report['latency']['p99_ms'], 0)
+        upstream = sum(report['upstream'].get('/qianwen', {}).values())
+        llm_requests = sum(stats['count'] for name, stats in report['endpoints'].items() if name != 'analyze')
+        self.assertEqual(upstream, llm_requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
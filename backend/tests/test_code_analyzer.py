@@ -1,11 +1,17 @@
+import runpy
 import unittest
 import sys
 import os
+import time
+from unittest import mock
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from services.analysis_executor import AnalysisExecutor
 from services.code_analyzer import CodeAnalyzer
+from services.code_scanner import scan_source
+from services.incremental_analysis import split_units
 
 class TestCodeAnalyzer(unittest.TestCase):
     """代码分析器测试类"""
@@ -109,11 +115,318 @@ class TestCodeAnalyzer(unittest.TestCase):
             return pickle.loads(data)  # 不安全的反序列化
         """
         
-        result = self.analyzer._analyze_security(insecure_code, 'python')
+        _, security_ids, _ = self.analyzer._analyze_units(insecure_code, 'python')
+        result = self.analyzer._security_report('python', security_ids)
         
         self.assertIn('issues', result)
         self.assertIn('risk_level', result)
         self.assertGreater(len(result['issues']), 0)  # 应该检测到至少一个安全问题
 
+    def test_security_findings_have_rule_id_and_severity(self):
+        """测试安全问题包含规则ID和严重级别"""
+        _, security_ids, _ = self.analyzer._analyze_units('el.innerHTML = eval(userInput);', 'javascript')
+        result = self.analyzer._security_report('javascript', security_ids)
+        
+        rule_ids = [finding['rule_id'] for finding in result['findings']]
+        self.assertEqual(rule_ids, ['javascript.eval', 'javascript.xss'])
+        self.assertEqual(result['findings'][0]['severity'], 'high')
+        self.assertEqual(result['risk_level'], 'high')
+        
+    def test_rule_family_single_scan(self):
+        """测试规则族一次扫描即可区分各条规则并提取捕获内容"""
+        from services.analysis_rules import get_rule_family
+        
+        code = "class Parser extends Base {}\n// 注释\nfunction parse(text) {}\n"
+        matches = [
+            (rule.kind, captures) for rule, captures, _ in get_rule_family('javascript', 'lexer').scan(code)
+            if rule.kind not in ('newline', 'brace_open', 'brace_close')
+        ]
+        
+        self.assertEqual(matches[0], ('class', ('Parser',)))
+        self.assertEqual(matches[1][0], 'comment')
+        self.assertEqual(matches[2], ('function', ('parse',)))
+        
+    def test_keywords_in_strings_and_comments_are_ignored(self):
+        """测试字符串和注释中的关键字不计入复杂度和结构统计"""
+        code = (
+            'def run(items):\n'
+            '    """for each item: if it fails, try again"""\n'
+            '    message = "if for while"  # def fake(): pass\n'
+            '    for item in items:\n'
+            '        if item:\n'
+            '            print(item)\n'
+        )
+        model = scan_source(code, 'python')
+        
+        self.assertEqual(model.functions, ['run'])
+        self.assertEqual(model.counts['loop'], 1)
+        self.assertEqual(model.counts['condition'], 1)
+        self.assertEqual(model.counts['try'], 0)
+        self.assertEqual(model.comment_lines, 2)
+        
+    def test_nesting_depth_is_independent_of_indent_width(self):
+        """测试嵌套深度按缩进层级计算，与缩进宽度无关"""
+        code = 'def f(x):\n  if x:\n    for i in x:\n      print(i)\n  return x\n'
+        
+        self.assertEqual(scan_source(code, 'python').max_nesting, 3)
+        self.assertEqual(scan_source(code.replace('  ', '    '), 'python').max_nesting, 3)
+        
+    def test_scan_brace_languages(self):
+        """测试花括号语言的函数、类、导入和嵌套深度"""
+        code = (
+            '#include <stdio.h>\n'
+            'struct Point { int x; };\n'
+            'int main(void) {\n'
+            '    for (int i = 0; i < 3; i++) {\n'
+            '        if (i) { printf("}"); }\n'
+            '    }\n'
+            '}\n'
+        )
+        model = scan_source(code, 'c')
+        
+        self.assertEqual(model.imports, ['stdio.h'])
+        self.assertEqual(model.classes, ['Point'])
+        self.assertEqual(model.functions, ['main'])
+        self.assertEqual(model.max_nesting, 3)
+        self.assertEqual(model.counts['loop'], 1)
+        self.assertEqual(model.counts['condition'], 1)
+
+    def test_python_ast_complexity(self):
+        """测试Python语法树分析的函数级圈复杂度和认知复杂度"""
+        code = (
+            'def check(a, b):\n'
+            '    if a and b or not a:\n'
+            '        return [x for x in a if x]\n'
+            '    elif b:\n'
+            '        for i in b:\n'
+            '            while i:\n'
+            '                i -= 1\n'
+            '    else:\n'
+            '        y = 1 if a else 2\n'
+            '    try:\n'
+            '        pass\n'
+            '    except ValueError:\n'
+            '        pass\n'
+        )
+        result = self.analyzer.analyze_complexity(code, 'python')
+        
+        self.assertEqual(result['backend'], 'ast')
+        self.assertEqual(result['functions'][0]['name'], 'check')
+        self.assertEqual(result['functions'][0]['cyclomatic_complexity'], 11)
+        self.assertEqual(result['functions'][0]['cognitive_complexity'], 15)
+        self.assertEqual(result['max_nesting_depth'], 4)
+        self.assertEqual(result['complexity_rating'], 'high')
+        
+    def test_python_ast_falls_back_on_syntax_error(self):
+        """测试Python代码存在语法错误时回退到词法扫描"""
+        result = self.analyzer.analyze_complexity('def broken(:\n    if x:\n        pass\n', 'python')
+        
+        self.assertEqual(result['backend'], 'lexer')
+        self.assertIsNone(result['cognitive_complexity'])
+        self.assertEqual(result['functions'], [])
+        
+    def test_python_ast_handles_cr_and_crlf_newlines(self):
+        """测试CR和CRLF换行的Python代码与LF换行的分析结果一致"""
+        code = 'def f(a, b):\n    x = 1\n    y = 2\n    return a and b or (1 if a else 2)\n'
+        expected = self.analyzer.analyze_complexity(code, 'python')
+        
+        for newline in ('\r', '\r\n'):
+            with self.subTest(newline=repr(newline)):
+                analyzer = CodeAnalyzer(incremental=False)
+                converted = code.replace('\n', newline)
+                self.assertEqual(analyzer.analyze_complexity(converted, 'python'), expected)
+                self.assertNotIn('error', analyzer.analyze(converted, 'python'))
+        self.assertEqual(expected['backend'], 'ast')
+        self.assertEqual(expected['functions'][0]['cyclomatic_complexity'], 4)
+        
+    def test_python_ast_falls_back_on_walker_error(self):
+        """测试遍历语法树发生意外错误时回退到词法扫描，而不是使分析失败"""
+        with mock.patch('services.python_ast_analyzer._ComplexityWalker.walk', side_effect=IndexError('boom')):
+            result = CodeAnalyzer(incremental=False).analyze_complexity('def f(a):\n    return a\n', 'python')
+        
+        self.assertEqual(result['backend'], 'lexer')
+        
+    def test_executor_backend_chosen_by_size(self):
+        """测试auto模式按代码大小选择执行方式"""
+        executor = AnalysisExecutor(backend='auto', process_threshold=1000)
+        
+        self.assertEqual(executor.choose_backend(999), 'inline')
+        self.assertEqual(executor.choose_backend(1000), 'process')
+        self.assertEqual(AnalysisExecutor(backend='thread').choose_backend(10 ** 6), 'thread')
+        
+    def test_analyze_results_match_across_backends(self):
+        """测试直接执行、线程池和进程池的分析结果一致"""
+        analyzer = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), incremental=False)
+        expected = analyzer.analyze(self.python_code, 'python')
+        
+        for backend in ('thread', 'process'):
+            executor = AnalysisExecutor(backend=backend, max_workers=1)
+            try:
+                result = CodeAnalyzer(executor=executor, incremental=False).analyze(self.python_code, 'python')
+            finally:
+                executor.shutdown()
+            self.assertEqual(result, expected)
+            self.assertEqual(executor.stats()['runs'][backend], 1)
+
+    def test_spawned_workers_skip_app_setup(self):
+        """测试以python app.py启动时，spawn的分析工作进程重新执行app.py不会创建应用和配置日志"""
+        app_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+        with mock.patch('utils.log_config.configure_logging') as configure_logging:
+            namespace = runpy.run_path(app_path, run_name='__mp_main__')
+        
+        self.assertIn('create_app', namespace)
+        self.assertNotIn('app', namespace)
+        configure_logging.assert_not_called()
+
+    def test_incremental_analysis_matches_full_analysis(self):
+        """测试按单元合并的分析结果与整体分析一致"""
+        full = CodeAnalyzer(incremental=False)
+        incremental = CodeAnalyzer(incremental=True)
+        
+        for code, language in ((self.python_code, 'python'), (self.js_code, 'javascript')):
+            self.assertGreater(len(split_units(code, language)), 1)
+            self.assertEqual(incremental.analyze(code, language), full.analyze(code, language))
+        self.assertEqual(
+            incremental.analyze_complexity(self.python_code, 'python'),
+            full.analyze_complexity(self.python_code, 'python')
+        )
+        
+    def test_incremental_analysis_reanalyzes_changed_units_only(self):
+        """测试修改一个函数后只重新分析该函数所在的单元"""
+        analyzer = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), incremental=True)
+        functions = [f"def func_{i}(x):\n    if x > {i}:\n        return x\n    return {i}\n" for i in range(20)]
+        code = '\n'.join(functions)
+        analyzer.analyze(code, 'python')
+        
+        functions[7] = functions[7].replace('return x', 'return [y for y in x if y]')
+        with mock.patch.object(analyzer, '_build_model', wraps=analyzer._build_model) as build_model:
+            result = analyzer.analyze('\n'.join(functions), 'python')
+        
+        self.assertEqual(build_model.call_count, 1)
+        self.assertIn('[y for y in x if y]', build_model.call_args[0][0])
+        self.assertEqual(result['structure']['function_count'], 20)
+        self.assertEqual(result['complexity']['cyclomatic_complexity'], 1 + 20 + 2)
+        
+    def test_analyze_many_matches_analyze(self):
+        """测试批量分析的结果与逐个分析一致，且单个文件失败不影响其他文件"""
+        analyzer = CodeAnalyzer(executor=AnalysisExecutor(backend='thread', max_workers=2), incremental=False)
+        analyzer.chunk_size = 1
+        sources = [(self.python_code, 'python'), (self.js_code, 'javascript'), ('x = 1\n', 'python')]
+        try:
+            with mock.patch('services.code_analyzer.scan_source', side_effect=[RuntimeError('boom')]):
+                failed = analyzer.analyze_many([('x = (\n', 'python')])
+            results = analyzer.analyze_many(sources, max_concurrency=1)
+        finally:
+            analyzer.executor.shutdown()
+        
+        self.assertEqual(failed[0]['error'], 'boom')
+        self.assertEqual(results, [CodeAnalyzer(incremental=False).analyze(code, language) for code, language in sources])
+        
+    def test_failed_unit_reports_error_and_is_not_cached(self):
+        """测试某个单元分析失败时整段代码返回该错误，失败结果不写入单元缓存，下次分析重新计算"""
+        analyzer = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), incremental=True)
+        code = self.python_code + '\n# test_failed_unit_reports_error_and_is_not_cached\n'
+        build_model = analyzer._build_model
+        
+        def fail_on_last_unit(text, language):
+            if 'test_failed_unit_reports_error_and_is_not_cached' in text:
+                raise ValueError('boom')
+            return build_model(text, language)
+        
+        with mock.patch.object(analyzer, '_build_model', side_effect=fail_on_last_unit):
+            failed = analyzer.analyze(code, 'python')
+        
+        self.assertEqual(failed['error'], 'boom')
+        self.assertEqual(analyzer.analyze(code, 'python'), CodeAnalyzer(incremental=False).analyze(code, 'python'))
+        
+    def test_executor_map_limits_concurrency(self):
+        """测试执行器批量执行时同时进行的任务数不超过max_concurrency"""
+        executor = AnalysisExecutor(backend='thread', max_workers=4)
+        running = []
+        peak = []
+        
+        def task(item):
+            running.append(item)
+            peak.append(len(running))
+            time.sleep(0.01)
+            running.remove(item)
+            return item * 2
+        
+        try:
+            results = executor.map(task, list(range(8)), max_concurrency=2)
+        finally:
+            executor.shutdown()
+        
+        self.assertEqual(results, [item * 2 for item in range(8)])
+        self.assertLessEqual(max(peak), 2)
+        
+    def test_incremental_matches_full_on_unusual_python_layout(self):
+        """测试顶格注释、装饰器后的空行和误切的跨行字符串不影响按单元分析的结果"""
+        sources = [
+            'def f(a):\n    if a:\n        x = 1\n\n# note\n    for i in a:\n        if i:\n            pass\n'
+            '    return x\n',
+            'import os\n\n@decorator\n\ndef g(a):\n    if a:\n        return 1\n    return 2\n\n\n'
+            'class C:\n    pass\n',
+            # 注释中的引号不影响跨行字符串的配对检查
+            'def h(a):\n    # uses """ quotes\n    text = """\n\ny = 1\n"""\n    if a:\n        return text\n'
+            '    return None\n',
+            # 词法规则不识别转义的三引号，切分出的单元无法单独解析
+            'def k(a):\n    text = """a \\""" quote\n\ny = 1\n"""\n    if a:\n        return text\n'
+            '    return None\n'
+        ]
+        self.assertEqual(len(split_units(sources[2], 'python')), 1)
+        self.assertGreater(len(split_units(sources[3], 'python')), 1)
+        
+        for python_ast in (True, False):
+            full = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), python_ast=python_ast, incremental=False)
+            incremental = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), python_ast=python_ast,
+                                       incremental=True)
+            for code in sources:
+                with self.subTest(python_ast=python_ast, code=code[:10]):
+                    expected = full.analyze_complexity(code, 'python')
+                    self.assertEqual(incremental.analyze_complexity(code, 'python'), expected)
+                    # 第二次分析命中缓存，结果不变
+                    self.assertEqual(incremental.analyze_complexity(code, 'python'), expected)
+                    self.assertEqual(incremental.analyze(code, 'python'), full.analyze(code, 'python'))
+        
+    def test_split_units_keeps_strings_and_blocks_together(self):
+        """测试单元边界不会落在跨行字符串或代码块内部"""
+        code = (
+            'TEMPLATE = """\n'
+            'header\n'
+            '\n'
+            'def not_a_function():\n'
+            '"""\n'
+            '\n'
+            'def real():\n'
+            '    pass\n'
+        )
+        units = split_units(code, 'python')
+        
+        self.assertEqual(len(units), 2)
+        self.assertTrue(units[1].text.startswith('def real'))
+        self.assertEqual(units[1].start_line, 7)
+        
+    def test_incremental_matches_full_with_braces_in_strings(self):
+        """测试字符串和注释中的括号不影响花括号语言的单元切分，按单元分析的结果与整体分析一致"""
+        sources = [
+            ('int f(int a) {\n    char *s = "}";\n\n#ifdef DEBUG\n    if (a) {\n        if (a > 1) {\n'
+             '            return 1;\n        }\n    }\n#endif\n    return 0;\n}\n', 'c'),
+            ("int g(int a) {\n    char c = '}'; /* } */\n\n#ifdef DEBUG\n    while (a) {\n        if (a) {\n"
+             '            a--;\n        }\n    }\n#endif\n    return a;\n}\n', 'c'),
+            ('function f(a) {\n    const s = `${a} }`; // }\n\nif (a) {\n        if (a > 1) {\n'
+             '            return s;\n        }\n    }\n}\n\nfunction g() {\n    return 1;\n}\n', 'javascript')
+        ]
+        full = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), incremental=False)
+        incremental = CodeAnalyzer(executor=AnalysisExecutor(backend='inline'), incremental=True)
+        
+        for code, language in sources:
+            with self.subTest(code=code[:10]):
+                expected = full.analyze(code, language)
+                self.assertEqual(expected['complexity']['max_nesting_depth'], 3)
+                self.assertEqual(incremental.analyze(code, language), expected)
+        self.assertEqual(len(split_units(sources[0][0], 'c')), 1)
+        self.assertEqual(len(split_units(sources[2][0], 'javascript')), 2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,123 @@
+import threading
+import unittest
+import sys
+import os
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# 添加项目根目录到Python路径
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import requests
+from services import http_client
+from services.http_client import get_http_session, get_pool_stats, pool_stats, warm_up_pool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """支持keep-alive的本地服务器，记录收到的请求"""
+
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+
+    def _reply(self, body=b'ok'):
+        self.requests_seen.append((self.command, self.path))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_HEAD(self):
+        self._reply()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPClient(unittest.TestCase):
+    """共享HTTP连接池测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _Handler.requests_seen.clear()
+        pool_stats.reset()
+
+    def test_session_shared_and_recreated_after_fork(self):
+        """测试同一进程内共用一个会话，进程号变化（fork出的子进程）时重新创建"""
+        session = get_http_session()
+        self.assertIs(get_http_session(), session)
+
+        with mock.patch.object(http_client.os, 'getpid', return_value=os.getpid() + 1):
+            child_session = get_http_session()
+        self.assertIsNot(child_session, session)
+
+    def test_pool_reuses_connections(self):
+        """测试连续请求复用同一个keep-alive连接，统计信息记录取出次数和新建连接数"""
+        session = get_http_session()
+        for _ in range(3):
+            self.assertEqual(session.get(f'{self.base_url}/ping', timeout=5).text, 'ok')
+
+        stats = get_pool_stats()
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 2)
+        self.assertAlmostEqual(stats['reuse_rate'], 2 / 3)
+
+    def test_warm_up_pool(self):
+        """测试预热只向每个主机的根路径发HEAD请求，去重并跳过空值和非HTTP地址"""
+        urls = [f'{self.base_url}/api/v1/generate', f'{self.base_url}/other', '', None, 'ftp://example.com/file']
+        threads = warm_up_pool(urls, connections_per_host=2, background=False)
+
+        self.assertEqual(threads, [])
+        self.assertEqual(_Handler.requests_seen, [('HEAD', '/'), ('HEAD', '/')])
+        self.assertGreaterEqual(get_pool_stats()['new_connections'], 1)
+
+    def test_warm_up_pool_ignores_connection_errors(self):
+        """测试预热失败（上游不可达）时不抛出异常，在后台执行时返回预热线程"""
+        with mock.patch.object(requests.Session, 'head', side_effect=requests.exceptions.ConnectionError('down')):
+            threads = warm_up_pool(['https://unreachable.invalid/v1'], connections_per_host=2)
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(threads), 2)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def test_importing_app_does_not_warm_up(self):
+        """测试导入app时不预热，预热只在服务器启动时由warm_up_upstreams执行"""
+        # 在新进程中导入，不受其他测试已经导入app的影响
+        script = ('import services.http_client as http_client\n'
+                  'http_client.warm_up_pool = lambda *args, **kwargs: exit(3)\n'
+                  'import app\n')
+        result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, capture_output=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        import app as app_module
+
+        with mock.patch.object(app_module, 'warm_up_pool', return_value=[]) as warm_up, \
+                mock.patch.dict(os.environ, {'HTTP_POOL_WARMUP': 'true', 'HTTP_POOL_WARMUP_CONNECTIONS': '3'}):
+            app_module.warm_up_upstreams(app_module.app)
+        warm_up.assert_called_once_with(app_module.app.extensions['services'].upstream_urls(), connections_per_host=3)
+
+        with mock.patch.object(app_module, 'warm_up_pool') as warm_up, \
+                mock.patch.dict(os.environ, {'HTTP_POOL_WARMUP': 'false'}):
+            self.assertEqual(app_module.warm_up_upstreams(app_module.app), [])
+        warm_up.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,429 @@
+import unittest
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.language_detector import LANGUAGES, LanguageDetector
+from utils.validators import SUPPORTED_LANGUAGES, detect_language, validate_code_input
+
+# 每种支持的语言一段典型代码
+SAMPLES = {
+    'python': '''import os
+from typing import List
+
+class Stack:
+    def __init__(self):
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("empty")
+        return self.items.pop()
+
+if __name__ == "__main__":
+    print(Stack())
+''',
+    'javascript': '''const express = require('express');
+const app = express();
+
+function greet(name) {
+  return `Hello ${name}`;
+}
+
+app.get('/', (req, res) => {
+  if (req.query.name !== undefined) {
+    console.log(greet(req.query.name));
+  }
+  res.send('ok');
+});
+
+module.exports = app;
+''',
+    'typescript': '''interface User {
+  id: number;
+  name: string;
+  active: boolean;
+}
+
+export function findUser(users: User[], id: number): User | undefined {
+  return users.find((u) => u.id === id);
+}
+
+const names: string[] = [];
+let count: any = 0;
+''',
+    'java': '''package com.example;
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Main {
+    private final List<String> items = new ArrayList<>();
+
+    @Override
+    public String toString() {
+        return items.toString();
+    }
+
+    public static void main(String[] args) throws Exception {
+        System.out.println("Hello");
+    }
+}
+''',
+    'c': '''#include <stdio.h>
+#include <stdlib.h>
+
+typedef struct node {
+    int value;
+    struct node *next;
+} node_t;
+
+int main(void) {
+    node_t *head = malloc(sizeof(node_t));
+    if (head == NULL) {
+        return 1;
+    }
+    head->value = 42;
+    printf("%d\\n", head->value);
+    free(head);
+    return 0;
+}
+''',
+    'cpp': '''#include <iostream>
+#include <vector>
+
+namespace demo {
+template <typename T>
+class Box {
+public:
+    explicit Box(T value) : value_(value) {}
+    T get() const { return value_; }
+private:
+    T value_;
+};
+}
+
+int main() {
+    std::vector<int> v{1, 2, 3};
+    for (auto x : v) std::cout << x << std::endl;
+    return 0;
+}
+''',
+    'csharp': '''using System;
+using System.Collections.Generic;
+
+namespace Demo
+{
+    public class Program
+    {
+        public string Name { get; set; }
+
+        public static void Main(string[] args)
+        {
+            var items = new List<int> { 1, 2, 3 };
+            foreach (var item in items)
+            {
+                Console.WriteLine(item);
+            }
+        }
+    }
+}
+''',
+    'go': '''package main
+
+import (
+	"fmt"
+	"errors"
+)
+
+type Server struct {
+	port int
+}
+
+func (s *Server) Start() error {
+	if s.port == 0 {
+		return errors.New("no port")
+	}
+	return nil
+}
+
+func main() {
+	s := &Server{port: 8080}
+	if err := s.Start(); err != nil {
+		fmt.Println(err)
+	}
+}
+''',
+    'ruby': '''require 'json'
+
+class User
+  attr_accessor :name, :email
+
+  def initialize(name, email)
+    @name = name
+    @email = email
+  end
+
+  def to_s
+    "#{name} <#{email}>"
+  end
+end
+
+[1, 2, 3].each do |n|
+  puts n unless n.nil?
+end
+''',
+    'php': '''<?php
+namespace App;
+
+class UserController
+{
+    private $users = array();
+
+    public function show($id)
+    {
+        if (!isset($this->users[$id])) {
+            return null;
+        }
+        foreach ($this->users as $key => $user) {
+            echo $user;
+        }
+    }
+}
+?>
+''',
+    'swift': '''import UIKit
+
+protocol Shape {
+    func area() -> Double
+}
+
+struct Circle: Shape {
+    let radius: Double
+    func area() -> Double {
+        return Double.pi * radius * radius
+    }
+}
+
+class ViewController: UIViewController {
+    override func viewDidLoad() {
+        super.viewDidLoad()
+        guard let view = self.view else { return }
+        print(view)
+    }
+}
+''',
+    'kotlin': '''package com.example
+
+data class User(val name: String, val age: Int)
+
+class Repository {
+    private val users = mutableListOf<User>()
+    lateinit var source: String
+
+    fun add(user: User) {
+        users.add(user)
+    }
+
+    companion object {
+        fun create(): Repository = Repository()
+    }
+}
+
+fun main() {
+    val names = listOf("a", "b")
+    names.forEach { println(it) }
+}
+''',
+    'rust': '''use std::collections::HashMap;
+
+#[derive(Debug)]
+pub struct Counter {
+    counts: HashMap<String, usize>,
+}
+
+impl Counter {
+    pub fn new() -> Self {
+        Counter { counts: HashMap::new() }
+    }
+
+    pub fn add(&mut self, word: &str) {
+        *self.counts.entry(word.to_string()).or_insert(0) += 1;
+    }
+}
+
+fn main() {
+    let mut c = Counter::new();
+    c.add("hi");
+    println!("{:?}", c);
+}
+''',
+    'scala': '''package demo
+
+sealed trait Shape
+case class Circle(r: Double) extends Shape
+case class Square(s: Double) extends Shape
+
+object Main {
+  def area(shape: Shape): Double = shape match {
+    case Circle(r) => math.Pi * r * r
+    case Square(s) => s * s
+  }
+
+  def main(args: Array[String]): Unit = {
+    val shapes = List(Circle(1), Square(2))
+    shapes.foreach(s => println(area(s)))
+  }
+}
+''',
+    'perl': '''#!/usr/bin/perl
+use strict;
+use warnings;
+
+my %counts;
+my @lines = <STDIN>;
+foreach my $line (@lines) {
+    chomp $line;
+    next unless $line =~ /\\S/;
+    $counts{$line}++;
+}
+
+sub report {
+    my ($hash) = @_;
+    print "$_: $hash->{$_}\\n" for sort keys %$hash;
+}
+
+report(\\%counts);
+''',
+    'html': '''<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>Demo</title>
+</head>
+<body>
+  <div class="container">
+    <ul>
+      <li><a href="/home">Home</a></li>
+    </ul>
+    <span>&nbsp;</span>
+  </div>
+</body>
+</html>
+''',
+    'css': '''.container {
+  display: flex;
+  margin: 0 auto;
+  padding: 16px;
+  max-width: 960px;
+}
+
+a:hover {
+  color: rgba(0, 0, 0, 0.8);
+  border-bottom: 1px solid #ccc;
+}
+
+body {
+  font-family: sans-serif;
+  background: #fff !important;
+}
+''',
+    'sql': '''CREATE TABLE users (
+    id INT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(255)
+);
+
+INSERT INTO users (id, name, email) VALUES (1, 'a', 'a@example.com');
+
+SELECT u.name, COUNT(o.id) AS orders
+FROM users u
+LEFT JOIN orders o ON o.user_id = u.id
+WHERE u.email IS NOT NULL
+GROUP BY u.name
+ORDER BY orders DESC;
+''',
+}
+
+class TestLanguageDetector(unittest.TestCase):
+    """根据代码内容推断语言测试类"""
+
+    def setUp(self):
+        self.detector = LanguageDetector()
+
+    def test_covers_supported_languages(self):
+        """测试权重表覆盖所有支持的语言"""
+        self.assertEqual(set(LANGUAGES), set(SUPPORTED_LANGUAGES))
+        self.assertEqual(set(SAMPLES), set(SUPPORTED_LANGUAGES))
+
+    def test_detects_each_language(self):
+        """测试每种语言的典型代码都能被正确识别"""
+        for language, code in SAMPLES.items():
+            with self.subTest(language=language):
+                self.assertEqual(self.detector.detect(code), language)
+
+    def test_unknown_content(self):
+        """测试空代码和没有特征的文本无法判断"""
+        self.assertIsNone(self.detector.detect(''))
+        self.assertIsNone(self.detector.detect('   \n'))
+        self.assertIsNone(self.detector.detect('hello world'))
+
+    def test_cache_by_content(self):
+        """测试相同内容的代码只计算一次"""
+        code = SAMPLES['go']
+        self.assertEqual(self.detector.detect(code), 'go')
+        self.assertEqual(self.detector.detect(str(code)), 'go')
+        self.assertEqual(self.detector.stats(), {'entries': 1, 'hits': 1, 'misses': 1})
+
+        detector = LanguageDetector(cache_size=2)
+        for language in ('c', 'cpp', 'rust'):
+            detector.detect(SAMPLES[language])
+        self.assertEqual(detector.stats()['entries'], 2)
+
+    def test_only_samples_code_prefix(self):
+        """测试只用代码开头打分，长代码的耗时与长度无关"""
+        code = SAMPLES['rust'] + SAMPLES['python'] * 5000
+        detector = LanguageDetector(sample_size=len(SAMPLES['rust']), cache_size=0)
+        self.assertEqual(detector.detect(code), 'rust')
+        self.assertEqual(LanguageDetector(cache_size=0).detect(SAMPLES['python'] * 5000), 'python')
+
+        start = time.perf_counter()
+        for _ in range(20):
+            detector.detect(code)
+        self.assertLess((time.perf_counter() - start) / 20, 0.01)
+
+
+class TestLanguageInference(unittest.TestCase):
+    """语言推断集成测试类"""
+
+    def test_detect_language(self):
+        """测试优先使用文件扩展名，其次是代码内容，最后是默认值"""
+        self.assertEqual(detect_language(SAMPLES['python'], 'main.rs'), 'rust')
+        self.assertEqual(detect_language(SAMPLES['kotlin'], 'Main'), 'kotlin')
+        self.assertEqual(detect_language(SAMPLES['sql']), 'sql')
+        self.assertEqual(detect_language(''), 'python')
+        self.assertEqual(detect_language('hello', default='go'), 'go')
+
+    def test_validate_infers_language_from_content(self):
+        """测试未提供语言和文件名时根据代码内容补全language"""
+        data = {'code': SAMPLES['java']}
+        self.assertTrue(validate_code_input(data)['valid'])
+        self.assertEqual(data['language'], 'java')
+
+        data = {'code': SAMPLES['java'], 'filename': 'Main.cs'}
+        validate_code_input(data)
+        self.assertEqual(data['language'], 'csharp')
+
+        data = {'code': 'hello world'}
+        validate_code_input(data)
+        self.assertNotIn('language', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+import json
+import logging
+import shutil
+import tempfile
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from utils.log_config import JSONFormatter, body_preview, configure_logging, stop_listener
+
+
+class TestLogConfig(unittest.TestCase):
+    """日志配置、结构化日志和请求体截取测试类"""
+
+    def setUp(self):
+        root_logger = logging.getLogger()
+        self.saved_handlers = list(root_logger.handlers)
+        self.saved_level = root_logger.level
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            if handler not in self.saved_handlers:
+                root_logger.removeHandler(handler)
+        root_logger.setLevel(self.saved_level)
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def _read_log(self):
+        with open(os.path.join(self.log_dir, 'app.log'), encoding='utf-8') as f:
+            return [line for line in f.read().splitlines() if line]
+
+    def test_json_formatter(self):
+        """测试JSON格式包含extra传入的字段和异常堆栈"""
+        try:
+            raise ValueError('坏了')
+        except ValueError:
+            record = logging.getLogger('test').makeRecord(
+                'test', logging.ERROR, __file__, 1, '处理%s失败', ('请求',), sys.exc_info(),
+                extra={'request_id': 'req-1', 'elapsed': 0.5}
+            )
+
+        entry = json.loads(JSONFormatter().format(record))
+
+        self.assertEqual(entry['message'], '处理请求失败')
+        self.assertEqual(entry['level'], 'ERROR')
+        self.assertEqual(entry['request_id'], 'req-1')
+        self.assertEqual(entry['elapsed'], 0.5)
+        self.assertIn('ValueError: 坏了', entry['exception'])
+
+    def test_queue_listener_writes_in_background(self):
+        """测试经队列写日志时由监听器线程写入文件，请求线程上只有QueueHandler"""
+        listener = configure_logging(self.log_dir, level='INFO', log_format='json', use_queue=True)
+        try:
+            new_handlers = [h for h in logging.getLogger().handlers if h not in self.saved_handlers]
+            self.assertEqual([type(h).__name__ for h in new_handlers], ['QueueHandler'])
+            with app.test_request_context('/'):
+                from flask import g
+                g.request_id = 'req-test'
+                logging.getLogger('test').info('你好%s', '世界')
+                logging.getLogger('test').debug('不会输出')
+        finally:
+            stop_listener(listener)
+
+        entries = [json.loads(line) for line in self._read_log()]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['message'], '你好世界')
+        self.assertEqual(entries[0]['request_id'], 'req-test')
+
+    def test_body_preview_is_bounded(self):
+        """测试请求体只截取开头，超过上限时标记截断"""
+        body = json.dumps({'code': 'x' * 5000})
+        with app.test_request_context('/', method='POST', data=body, content_type='application/json'):
+            from flask import request
+            preview = body_preview(request, limit=100)
+            self.assertEqual(len(preview), 100 + len('... [截断]'))
+            self.assertTrue(preview.endswith('... [截断]'))
+            # 请求体已缓存，路由仍然可以解析JSON
+            self.assertEqual(len(request.get_json()['code']), 5000)
+
+    def test_body_not_captured_unless_debug(self):
+        """测试未开启DEBUG级别时不截取请求体"""
+        client = app.test_client()
+        with mock.patch('app.body_preview', return_value='') as preview:
+            client.post('/api/code-analysis/analyze', json={'code': 'x = 1', 'language': 'python'})
+            preview.assert_not_called()
+
+            app_logger = logging.getLogger('app')
+            level = app_logger.level
+            app_logger.setLevel(logging.DEBUG)
+            try:
+                client.post('/api/code-analysis/analyze', json={'code': 'x = 1', 'language': 'python'})
+            finally:
+                app_logger.setLevel(level)
+            preview.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
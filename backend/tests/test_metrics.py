@@ -0,0 +1,97 @@
+import re
+import unittest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, create_app
+from utils.metrics import REQUEST_LATENCY, STAGE_LATENCY, MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    """延迟直方图、计数器和/metrics接口测试类"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """测试直方图按Prometheus格式导出累计分桶、总和和次数"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('test_seconds', '测试耗时', ('stage',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, stage='a')
+
+        text = registry.render()
+
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{stage="a",le="1"} 3', text)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_sum{stage="a"} 6.05', text)
+        self.assertIn('test_seconds_count{stage="a"} 4', text)
+
+    def test_counter_and_labels(self):
+        """测试计数器累加，标签值被转义，标签名不匹配时报错"""
+        registry = MetricsRegistry()
+        counter = registry.counter('test_total', '测试计数', ('name',))
+        counter.inc(name='a"b')
+        counter.inc(2, name='a"b')
+
+        self.assertEqual(counter.value(name='a"b'), 3)
+        self.assertIn('test_total{name="a\\"b"} 3', registry.render())
+        with self.assertRaises(ValueError):
+            counter.inc(other='x')
+        # 同名指标只注册一次
+        self.assertIs(registry.counter('test_total', '测试计数', ('name',)), counter)
+
+    def test_collector_errors_are_isolated(self):
+        """测试采集函数出错时不影响其他指标的导出"""
+        registry = MetricsRegistry()
+
+        def broken():
+            raise RuntimeError('统计信息不可用')
+
+        registry.register_collector(broken)
+        registry.register_collector(lambda: [('test_gauge', 'gauge', '测试', [({'x': '1'}, 2.5)])])
+
+        self.assertIn('test_gauge{x="1"} 2.5', registry.render())
+
+    def test_metrics_endpoint(self):
+        """测试/metrics接口导出路由延迟、各阶段耗时和组件的统计信息"""
+        client = app.test_client()
+        analyze_count = REQUEST_LATENCY.count(method='POST', route='/api/code-analysis/analyze', status='200')
+        validation_count = STAGE_LATENCY.count(stage='validation')
+
+        response = client.post('/api/code-analysis/analyze', json={
+            'code': 'def add(a, b):\n    return a + b\n',
+            'language': 'python'
+        })
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            REQUEST_LATENCY.count(method='POST', route='/api/code-analysis/analyze', status='200'), analyze_count + 1
+        )
+        self.assertEqual(STAGE_LATENCY.count(stage='validation'), validation_count + 1)
+
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        for stage in ('validation', 'analyze_units', 'analyze_quality', 'serialization'):
+            self.assertIn(f'stage_duration_seconds_count{{stage="{stage}"}}', text)
+        self.assertIn('cache_hits_total{cache="analysis_unit"}', text)
+        self.assertIn('circuit_breaker_state{upstream="qianwen"} 0', text)
+        self.assertIn('http_pool_checkouts_total', text)
+
+    def test_create_app_twice_does_not_duplicate_families(self):
+        """测试多次创建应用时组件的采集函数只注册一次，导出的指标族不重复"""
+        create_app()
+        second_app = create_app()
+
+        text = second_app.test_client().get('/metrics').get_data(as_text=True)
+
+        families = re.findall(r'^# TYPE (\S+) ', text, re.MULTILINE)
+        self.assertIn('circuit_breaker_state', families)
+        self.assertEqual(len(families), len(set(families)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_builder import PromptBuilder, fit_context, fit_text
+from services.rate_limiter import estimate_tokens
+
+
+def _large_module(count=200):
+    """生成包含大量无关函数和一个出错函数的源码"""
+    helpers = '\n\n'.join(f"def helper_{i}(x):\n    y = x + {i}\n    return y * 2\n" for i in range(count))
+    return ("import os\nimport json\n\n" + helpers +
+            "\n\ndef load_config(path):\n    data = helper_7(path)\n    return json.loads(data)\n")
+
+
+class TestPromptBuilder(unittest.TestCase):
+    """提示词预算和代码上下文裁剪测试类"""
+
+    def test_small_context_unchanged(self):
+        """测试没有超过预算的代码上下文原样保留"""
+        code = "def add(a, b):\n    return a + b"
+        self.assertEqual(fit_context(code, 'add函数有问题', 'python', 1000), code)
+
+    def test_keep_relevant_units(self):
+        """测试保留问题中提到的函数、它引用的函数和导入语句，丢弃其余代码"""
+        code = _large_module()
+        context = fit_context(code, 'load_config 抛出 JSONDecodeError', 'python', 300)
+
+        self.assertLessEqual(estimate_tokens(context), 300)
+        self.assertIn('def load_config(path):', context)
+        self.assertIn('def helper_7(x):', context)
+        self.assertIn('import json', context)
+        self.assertNotIn('def helper_100(x):', context)
+        self.assertIn('# ... 省略了', context)
+        # 保留的代码按原来的顺序排列
+        self.assertLess(context.index('helper_7'), context.index('load_config'))
+
+    def test_keep_enclosing_function_of_line(self):
+        """测试保留问题中提到的行号所在的函数"""
+        code = _large_module()
+        line = code.split('\n').index('def helper_150(x):') + 2
+
+        context = fit_context(code, f'第{line}行报错', 'python', 100)
+
+        self.assertIn('y = x + 150', context)
+
+    def test_omission_marker_uses_language_comment(self):
+        """测试省略标记使用对应语言的注释语法"""
+        functions = '\n\n'.join(f"function f{i}(x) {{\n  return x + {i};\n}}\n" for i in range(200))
+        context = fit_context(functions + '\n\nfunction target() {\n  return f3(1);\n}\n', 'target 返回值不对',
+                              'javascript', 100)
+
+        self.assertIn('function target()', context)
+        self.assertIn('// ... 省略了', context)
+
+    def test_single_unit_over_budget(self):
+        """测试最相关的单元本身超过预算时只保留它的开头"""
+        body = '\n'.join(f"    value_{i} = {i}" for i in range(2000))
+        context = fit_context(f"def huge():\n{body}\n", 'huge函数太慢', 'python', 200)
+
+        self.assertTrue(context.startswith('def huge():'))
+        self.assertLessEqual(estimate_tokens(context), 200)
+
+    def test_prompt_within_model_budget(self):
+        """测试整个提示词不超过模型的token预算，环境变量可以覆盖默认预算"""
+        os.environ['TEST_PROMPT_MAX_PROMPT_TOKENS'] = '500'
+        try:
+            builder = PromptBuilder.for_model('qwen-turbo', 'TEST_PROMPT')
+        finally:
+            del os.environ['TEST_PROMPT_MAX_PROMPT_TOKENS']
+        self.assertEqual(builder.max_prompt_tokens, 500)
+        self.assertEqual(PromptBuilder.for_model('qwen-plus', 'TEST_PROMPT').max_prompt_tokens, 28000)
+
+        prompt = builder.build_solution_prompt('load_config 抛出异常', _large_module(), 'python')
+
+        self.assertLessEqual(estimate_tokens(prompt), 500)
+        self.assertIn('def load_config(path):', prompt)
+        self.assertIn('请提供以下格式的回答', prompt)
+
+    def test_oversized_description_truncated(self):
+        """测试问题描述也计入预算，超长的问题描述被截断并加上省略标记，代码上下文仍保留相关的部分"""
+        description = 'load_config 抛出异常\n' + 'Traceback 信息 ' * 20000
+        builder = PromptBuilder(2000)
+
+        prompt = builder.build_solution_prompt(description, _large_module(), 'python')
+
+        self.assertLessEqual(estimate_tokens(prompt), 2000)
+        self.assertIn('load_config 抛出异常', prompt)
+        self.assertIn('个字符 ...', prompt)
+        self.assertIn('def load_config(path):', prompt)
+        self.assertIn('请提供以下格式的回答', prompt)
+
+        # 没有代码上下文时问题描述可以使用全部预算
+        prompt = builder.build_solution_prompt(description)
+        self.assertLessEqual(estimate_tokens(prompt), 2000)
+        self.assertGreater(estimate_tokens(prompt), 1900)
+
+    def test_fit_text(self):
+        """测试文本不超过预算时原样返回，超过时保留开头并标记省略的字符数"""
+        self.assertEqual(fit_text('short', 10), 'short')
+        text = 'x' * 1000
+        truncated = fit_text(text, 50)
+        self.assertLessEqual(estimate_tokens(truncated), 50)
+        head, marker = truncated.split('\n')
+        self.assertEqual(marker, f'... 省略了{1000 - len(head)}个字符 ...')
+        self.assertEqual(fit_text(text, 1), '')
+
+    def test_unlimited_budget(self):
+        """测试预算为0时不裁剪"""
+        code = _large_module()
+        prompt = PromptBuilder(0).build_solution_prompt('问题', code, 'python')
+        self.assertIn(code, prompt)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import asyncio
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.provider_router import LatencyTracker, ProviderRouter
+from services.rate_limiter import PRIORITY_BATCH, PRIORITY_DEFAULT
+from services.resilience import CircuitBreaker, RetryPolicy
+
+
+class FakeService:
+    """按给定延迟返回给定结果的大模型服务"""
+
+    def __init__(self, name, delay=0.0, success=True):
+        self.provider_name = name
+        self.display_name = name
+        self.delay = delay
+        self.success = success
+        self.calls = 0
+        self.prompts = []
+        self.priorities = []
+        self.threads = []
+        self.retry_policy = RetryPolicy(name, breaker=CircuitBreaker(name))
+
+    def is_configured(self):
+        return True
+
+    def _result(self):
+        if self.success:
+            return {'success': True, 'content': self.provider_name}
+        return {'success': False, 'error': f'{self.provider_name}不可用'}
+
+    def generate_response(self, prompt, max_tokens=2048, priority=None, semantic_key=None):
+        self.calls += 1
+        self.prompts.append(prompt)
+        self.priorities.append(priority)
+        self.threads.append(threading.current_thread())
+        time.sleep(self.delay)
+        return self._result()
+
+    async def agenerate_response(self, prompt, max_tokens=2048, priority=None, semantic_key=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self._result()
+
+
+def _router(services, **kwargs):
+    """创建对冲预算充足、少量样本即可计算p95的路由器"""
+    settings = {'hedge_ratio': 1.0, 'min_samples': 1, 'min_hedge_delay': 0.01}
+    settings.update(kwargs)
+    return ProviderRouter(services, **settings)
+
+
+class TestProviderRouter(unittest.TestCase):
+    """大模型服务路由器测试类"""
+
+    def test_latency_percentiles(self):
+        """测试延迟分位数只统计成功的调用，错误率统计所有调用"""
+        tracker = LatencyTracker(window=100)
+        for i in range(1, 101):
+            tracker.record(i / 100, True)
+        tracker.record(30, False)
+
+        self.assertEqual(tracker.percentile(0.5), 0.51)
+        self.assertEqual(tracker.percentile(0.99), 1.0)
+        self.assertAlmostEqual(tracker.error_rate(), 0.01)
+        self.assertIsNone(LatencyTracker().percentile(0.95, min_samples=20))
+
+    def test_rank_prefers_healthy_service(self):
+        """测试指定的服务健康时排第一，错误率过高或熔断时排到最后"""
+        qianwen, custom = FakeService('qianwen'), FakeService('custom')
+        router = _router([qianwen, custom])
+        self.assertEqual(router.rank(preferred=custom), [custom, qianwen])
+
+        for _ in range(10):
+            router.trackers['custom'].record(0.1, False)
+        self.assertEqual(router.rank(preferred=custom), [qianwen, custom])
+
+        router = _router([qianwen, custom])
+        for _ in range(10):
+            qianwen.retry_policy.breaker.record_failure()
+        self.assertEqual(router.select(preferred=qianwen), custom)
+
+    def test_failover_when_primary_fails(self):
+        """测试主服务返回失败时改用下一个服务"""
+        qianwen, custom = FakeService('qianwen', success=False), FakeService('custom')
+        router = _router([qianwen, custom])
+
+        service, result = router.generate('test_failover', preferred=qianwen)
+
+        self.assertIs(service, custom)
+        self.assertTrue(result['success'])
+        self.assertEqual(router.stats()['failovers'], 1)
+
+    def test_all_services_fail(self):
+        """测试所有服务都失败时返回主服务的失败结果"""
+        qianwen, custom = FakeService('qianwen', success=False), FakeService('custom', success=False)
+
+        service, result = _router([qianwen, custom]).generate('test_all_fail', preferred=qianwen)
+
+        self.assertIs(service, qianwen)
+        self.assertFalse(result['success'])
+
+    def test_hedge_after_p95(self):
+        """测试主服务超过p95延迟仍未返回时对冲到另一个服务，采用先返回的结果"""
+        qianwen, custom = FakeService('qianwen', delay=0.5), FakeService('custom', delay=0.01)
+        router = _router([qianwen, custom])
+        router.trackers['qianwen'].record(0.05, True)
+
+        start_time = time.time()
+        service, result = router.generate('test_hedge', preferred=qianwen)
+
+        self.assertLess(time.time() - start_time, 0.4)
+        self.assertIs(service, custom)
+        self.assertEqual(result['content'], 'custom')
+        self.assertEqual(router.stats()['hedges'], 1)
+        self.assertEqual(router.stats()['hedge_wins'], 1)
+        # 对冲请求以最低优先级排队，配额紧张时先于正常请求被拒绝
+        self.assertEqual(qianwen.priorities, [PRIORITY_DEFAULT])
+        self.assertEqual(custom.priorities, [PRIORITY_BATCH])
+
+    def test_no_hedge_without_budget_or_samples(self):
+        """测试对冲预算用完或延迟样本不足时只等待主服务"""
+        for kwargs in ({'hedge_ratio': 0}, {'min_samples': 20}):
+            qianwen, custom = FakeService('qianwen', delay=0.2), FakeService('custom')
+            router = _router([qianwen, custom], **kwargs)
+            router.trackers['qianwen'].record(0.05, True)
+
+            service, _ = router.generate('test_no_hedge', preferred=qianwen)
+
+            self.assertIs(service, qianwen)
+            self.assertEqual(custom.calls, 0)
+
+    def test_calls_without_hedge_run_on_caller_thread(self):
+        """测试不可能对冲的请求在调用方线程中调用主服务，失败时依次改用备用服务"""
+        qianwen, custom = FakeService('qianwen', success=False), FakeService('custom')
+        router = _router([qianwen, custom], min_samples=20)
+
+        service, _ = router.generate('test_inline', preferred=qianwen)
+
+        self.assertIs(service, custom)
+        self.assertEqual(qianwen.threads + custom.threads, [threading.current_thread()] * 2)
+        self.assertEqual(router.stats()['failovers'], 1)
+        self.assertIsNone(router._executor)
+
+    def test_primary_calls_are_not_limited_by_pool(self):
+        """测试可能对冲的请求的主服务调用不在线程池中排队，并发数不受线程池大小限制"""
+        qianwen, custom = FakeService('qianwen', delay=0.2), FakeService('custom')
+        router = _router([qianwen, custom], max_workers=1)
+        router.trackers['qianwen'].record(1.0, True)
+        results = []
+
+        def call():
+            results.append(router.generate('test_concurrent', preferred=qianwen))
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        start_time = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLess(time.time() - start_time, 0.6)
+        self.assertEqual([service for service, _ in results], [qianwen] * 4)
+        self.assertEqual(custom.calls, 0)
+
+    def test_prompt_built_for_chosen_service(self):
+        """测试提示词按实际调用的服务构建"""
+        qianwen, custom = FakeService('qianwen', success=False), FakeService('custom')
+
+        _router([qianwen, custom]).generate(lambda service: f'prompt for {service.provider_name}', preferred=qianwen)
+
+        self.assertEqual(qianwen.prompts, ['prompt for qianwen'])
+        self.assertEqual(custom.prompts, ['prompt for custom'])
+
+    def test_async_hedge(self):
+        """测试异步调用同样对冲，并取消仍在进行的调用"""
+        qianwen, custom = FakeService('qianwen', delay=5), FakeService('custom', delay=0.01)
+        router = _router([qianwen, custom])
+        router.trackers['qianwen'].record(0.05, True)
+
+        start_time = time.time()
+        service, result = asyncio.run(router.agenerate('test_async_hedge', preferred=qianwen))
+
+        self.assertLess(time.time() - start_time, 1)
+        self.assertIs(service, custom)
+        self.assertTrue(result['success'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rate_limiter import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimiter, RateLimitExceeded, estimate_tokens
+)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """上游配额限流器测试类"""
+
+    def _wait_queued(self, limiter, count):
+        """等待指定数量的请求进入队列"""
+        for _ in range(500):
+            if limiter.stats()['queued'] >= count:
+                return
+            time.sleep(0.01)
+        self.fail('请求没有进入等待队列')
+
+    def test_burst_then_wait(self):
+        """测试令牌桶允许一秒的突发请求，之后按速率放行"""
+        limiter = RateLimiter('test', requests_per_second=10)
+        start_time = time.time()
+        for _ in range(10):
+            limiter.acquire()
+        self.assertLess(time.time() - start_time, 0.05)
+
+        limiter.acquire()
+        self.assertGreater(time.time() - start_time, 0.05)
+
+    def test_tokens_per_minute(self):
+        """测试每分钟token数上限，以及归还多预留的token"""
+        limiter = RateLimiter('test', tokens_per_minute=600, max_wait=0.5)
+        limiter.acquire(tokens=600)
+
+        with self.assertRaises(RateLimitExceeded) as context:
+            limiter.acquire(tokens=100)
+        # 每秒补充10个token，100个token需要大约10秒
+        self.assertGreater(context.exception.retry_after, 9)
+
+        limiter.refund(100)
+        limiter.acquire(tokens=100)
+
+    def test_reject_when_wait_too_long(self):
+        """测试预计排队时间超过上限时立即拒绝，而不是等到超时"""
+        limiter = RateLimiter('test', requests_per_second=1, max_wait=0.5)
+        limiter.acquire()
+
+        start_time = time.time()
+        with self.assertRaises(RateLimitExceeded) as context:
+            limiter.acquire()
+        self.assertLess(time.time() - start_time, 0.05)
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+        self.assertEqual(limiter.stats()['rejected'], 1)
+
+    def test_priority_order(self):
+        """测试交互式请求排在先到达的批量请求之前"""
+        limiter = RateLimiter('test', requests_per_second=20)
+        for _ in range(20):
+            limiter.acquire()
+        order = []
+
+        def acquire(name, priority):
+            limiter.acquire(priority=priority)
+            order.append(name)
+
+        threads = [threading.Thread(target=acquire, args=(f'batch{i}', PRIORITY_BATCH)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        self._wait_queued(limiter, 3)
+        threads.append(threading.Thread(target=acquire, args=('interactive', PRIORITY_INTERACTIVE)))
+        threads[-1].start()
+        for thread in threads:
+            thread.join(5)
+
+        # 第一个批量请求可能已经是队首，交互式请求最晚排在第二位
+        self.assertIn('interactive', order[:2])
+        self.assertEqual(len(order), 4)
+
+    def test_full_queue_evicts_lower_priority(self):
+        """测试队列已满时高优先级请求挤掉低优先级请求，同优先级请求被拒绝"""
+        limiter = RateLimiter('test', requests_per_second=5, max_queue=2)
+        for _ in range(5):
+            limiter.acquire()
+        errors = []
+
+        def acquire(priority):
+            try:
+                limiter.acquire(priority=priority)
+            except RateLimitExceeded as e:
+                errors.append(e.reason)
+
+        threads = [threading.Thread(target=acquire, args=(PRIORITY_BATCH,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        self._wait_queued(limiter, 2)
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(priority=PRIORITY_BATCH)
+        limiter.acquire(priority=PRIORITY_INTERACTIVE)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(errors, ['被更高优先级的请求挤出队列'])
+        self.assertEqual(limiter.stats()['evicted'], 1)
+
+    def test_async_acquire(self):
+        """测试异步等待方同样按速率放行"""
+        limiter = RateLimiter('test', requests_per_second=20)
+
+        async def run():
+            await asyncio.gather(*(limiter.aacquire() for _ in range(25)))
+
+        start_time = time.time()
+        asyncio.run(run())
+
+        self.assertGreater(time.time() - start_time, 0.2)
+        self.assertEqual(limiter.stats()['admitted'], 25)
+        self.assertEqual(limiter.stats()['queued'], 0)
+
+    def test_estimate_tokens(self):
+        """测试中文按字符、英文按大约4个字符估算token数"""
+        self.assertEqual(estimate_tokens('什么是闭包'), 5)
+        self.assertEqual(estimate_tokens('a' * 40), 10)
+
+if __name__ == '__main__':
+    unittest.main()
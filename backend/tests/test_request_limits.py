@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import io
+import json
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from utils.request_limits import PayloadTooLarge, RequestLimits
+
+
+class _TrackingStream(io.BytesIO):
+    """记录读取了多少字节的输入流"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class TestRequestLimits(unittest.TestCase):
+    """请求体大小和字段长度限制测试类"""
+
+    def setUp(self):
+        self.limits = RequestLimits(max_body_size=10000, route_limits={'/api/code-analysis/batch': 50000},
+                                    field_limits={'code': 100}, chunk_size=64)
+
+    def _enforce(self, body, path='/api/code-analysis/analyze', chunked=False):
+        """对请求执行限制检查，返回输入流和路由解析到的JSON"""
+        stream = _TrackingStream(body)
+        overrides = {'wsgi.input_terminated': True} if chunked else {}
+        headers = {} if chunked else {'Content-Length': str(len(body))}
+        with app.test_request_context(path, method='POST', input_stream=stream, headers=headers,
+                                      content_type='application/json', environ_overrides=overrides):
+            from flask import request
+            try:
+                self.limits.enforce(request)
+                return stream, request.get_json()
+            except PayloadTooLarge as e:
+                e.stream = stream
+                raise
+
+    def test_content_length_rejected_without_reading(self):
+        """测试Content-Length超过路由上限时不读取请求体"""
+        body = json.dumps({'code': 'x', 'padding': 'y' * 20000}).encode()
+        with self.assertRaises(PayloadTooLarge) as context:
+            self._enforce(body)
+        self.assertEqual(context.exception.stream.bytes_read, 0)
+        self.assertEqual(context.exception.limit, 10000)
+
+        # 批量分析接口的上限更高，且不逐字段检查
+        stream, data = self._enforce(body, '/api/code-analysis/batch')
+        self.assertEqual(data['padding'], 'y' * 20000)
+
+    def test_chunked_body_over_limit(self):
+        """测试没有Content-Length的请求体读取超过上限时中止"""
+        body = json.dumps({'code': 'x', 'padding': 'y' * 20000}).encode()
+        with self.assertRaises(PayloadTooLarge) as context:
+            self._enforce(body, chunked=True)
+        self.assertLess(context.exception.stream.bytes_read, len(body))
+
+    def test_oversized_field_rejected_early(self):
+        """测试超长字段一结束就拒绝，不读取剩余的请求体"""
+        body = json.dumps({'code': 'x' * 101, 'padding': 'y' * 5000}).encode()
+        with self.assertRaises(PayloadTooLarge) as context:
+            self._enforce(body)
+        self.assertEqual(context.exception.field, 'code')
+        self.assertLess(context.exception.stream.bytes_read, 1000)
+
+    def test_field_length_counts_decoded_characters(self):
+        """测试字段长度按解码后的字符数计算，转义和多字节字符不会被误判"""
+        for code in ('x' * 100, '\n' * 100, '中' * 100, '"' * 100, '\\' * 100):
+            body = json.dumps({'note': '"code": ' + 'z' * 300, 'code': code}, ensure_ascii=False).encode()
+            _, data = self._enforce(body)
+            self.assertEqual(data['code'], code)
+            with self.assertRaises(PayloadTooLarge):
+                self._enforce(json.dumps({'code': code + 'x'}, ensure_ascii=False).encode())
+
+    def test_nested_and_non_string_values(self):
+        """测试只检查键直接对应的字符串值"""
+        body = json.dumps({'code': {'inner': 'x' * 500}, 'other': ['code', 'y' * 500]}).encode()
+        _, data = self._enforce(body)
+        self.assertEqual(data['code']['inner'], 'x' * 500)
+
+    def test_app_returns_413(self):
+        """测试应用对超大的请求体返回413和上限"""
+        client = app.test_client()
+        response = client.post('/api/code-analysis/analyze', json={'code': 'x' * (2 * 1024 * 1024)})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('limit', response.get_json())
+
+        response = client.post('/api/code-suggestion/suggest', json={'code': 'x' * 150001})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.get_json()['field'], 'code')
+
+
+if __name__ == '__main__':
+    unittest.main()
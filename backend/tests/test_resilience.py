@@ -0,0 +1,202 @@
+import asyncio
+import unittest
+import sys
+import os
+import time
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import requests
+
+from services.qianwen_service import QianwenService
+from services.resilience import (
+    CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy,
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, backoff_delay, is_client_error, is_retryable_error
+)
+from utils.metrics import UPSTREAM_RETRIES
+
+
+def _http_error(status_code):
+    """构造带有指定状态码的requests.HTTPError"""
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f'{status_code} Error', response=response)
+
+
+def _policy(**kwargs):
+    """创建不受其他测试影响、退避时间很短的重试策略"""
+    settings = {
+        'max_attempts': 3,
+        'attempt_timeout': 1,
+        'total_timeout': 5,
+        'base_delay': 0.01,
+        'max_delay': 0.02,
+        'breaker': CircuitBreaker('test', min_requests=100),
+        'budget': RetryBudget()
+    }
+    settings.update(kwargs)
+    return RetryPolicy('test', **settings)
+
+
+class TestResilience(unittest.TestCase):
+    """重试、重试预算与熔断器测试类"""
+
+    def test_backoff_delay_is_bounded(self):
+        """测试退避时间随重试次数指数增长，并且不超过上限"""
+        for attempt in range(1, 10):
+            delays = [backoff_delay(attempt, 1, 8) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= min(8, 2 ** (attempt - 1)) for delay in delays))
+
+    def test_retryable_errors(self):
+        """测试只有超时、连接错误和429/5xx响应需要重试"""
+        self.assertTrue(is_retryable_error(requests.exceptions.Timeout()))
+        self.assertTrue(is_retryable_error(requests.exceptions.ConnectionError()))
+        self.assertTrue(is_retryable_error(httpx.ConnectTimeout('timeout')))
+        self.assertTrue(is_retryable_error(_http_error(503)))
+        self.assertTrue(is_retryable_error(_http_error(429)))
+        self.assertFalse(is_retryable_error(_http_error(400)))
+        self.assertFalse(is_retryable_error(ValueError()))
+        self.assertTrue(is_client_error(_http_error(400)))
+        self.assertFalse(is_client_error(_http_error(429)))
+        self.assertFalse(is_client_error(ValueError()))
+
+    def test_retry_until_success(self):
+        """测试可重试的错误会退避重试，每次尝试的超时不超过单次超时，重试次数计入指标"""
+        timeouts = []
+        retries = UPSTREAM_RETRIES.value(policy='test')
+
+        def call(timeout):
+            timeouts.append(timeout)
+            if len(timeouts) < 3:
+                raise requests.exceptions.Timeout()
+            return 'ok'
+
+        self.assertEqual(_policy().call(call), 'ok')
+        self.assertEqual(len(timeouts), 3)
+        self.assertTrue(all(0 < timeout <= 1 for timeout in timeouts))
+        self.assertEqual(UPSTREAM_RETRIES.value(policy='test'), retries + 2)
+
+    def test_non_retryable_error_is_not_retried(self):
+        """测试4xx错误不重试，也不计入熔断器的失败次数"""
+        policy = _policy()
+        call = mock.Mock(side_effect=_http_error(400))
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            policy.call(call)
+        self.assertEqual(call.call_count, 1)
+        self.assertEqual(policy.breaker.stats()['failures'], 0)
+
+    def test_malformed_response_counts_as_failure(self):
+        """测试上游返回无法解析或格式变化的响应时不重试，但计入熔断器的失败次数，失败率过高时打开熔断器"""
+        policy = _policy(breaker=CircuitBreaker('test', min_requests=4, failure_rate=0.5))
+        errors = [requests.exceptions.JSONDecodeError('Expecting value', '<html>', 0), KeyError('output')]
+
+        for error in errors * 2:
+            call = mock.Mock(side_effect=error)
+            with self.assertRaises(type(error)):
+                policy.call(call)
+            self.assertEqual(call.call_count, 1)
+
+        self.assertEqual(policy.breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            policy.call(mock.Mock(return_value='ok'))
+
+    def test_total_timeout_stops_retries(self):
+        """测试重试不会超过整体截止时间"""
+        policy = _policy(max_attempts=100, total_timeout=0.3, base_delay=0.05, max_delay=0.05)
+
+        def call(timeout):
+            time.sleep(min(timeout, 0.05))
+            raise requests.exceptions.Timeout()
+
+        start_time = time.time()
+        with self.assertRaises(requests.exceptions.Timeout):
+            policy.call(call)
+        self.assertLess(time.time() - start_time, 0.5)
+
+    def test_retry_budget_limits_retries(self):
+        """测试重试预算用完后不再重试"""
+        budget = RetryBudget(ratio=0, min_retries=2, window=60)
+        policy = _policy(budget=budget)
+        call = mock.Mock(side_effect=requests.exceptions.ConnectionError())
+
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                policy.call(call)
+
+        # 第一次请求重试了两次，之后的请求没有预算，只尝试一次
+        self.assertEqual(call.call_count, 5)
+        self.assertEqual(budget.stats()['rejected_retries'], 2)
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        """测试失败率过高时熔断器打开，冷却后放行一个探测请求，探测成功后关闭"""
+        breaker = CircuitBreaker('test', failure_rate=0.5, min_requests=4, window=60, cooldown=0.1)
+        for _ in range(4):
+            breaker.allow()
+            breaker.record_failure()
+
+        self.assertEqual(breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+        time.sleep(0.15)
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        breaker.allow()
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()  # 探测请求进行中时拒绝其他请求
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        breaker.allow()
+
+    def test_failed_probe_reopens_circuit(self):
+        """测试探测请求失败时熔断器重新打开"""
+        breaker = CircuitBreaker('test', min_requests=1, cooldown=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, STATE_OPEN)
+
+    def test_open_circuit_fails_fast(self):
+        """测试熔断器打开后服务直接返回失败结果，不调用上游API"""
+        service = QianwenService()
+        service.response_cache = None
+        service.retry_policy = _policy(breaker=CircuitBreaker('千问AI', min_requests=2, cooldown=60))
+
+        with mock.patch('requests.Session.post', side_effect=requests.exceptions.ConnectionError('down')) as post:
+            first = service.generate_response('test_circuit_breaker_1')
+            second = service.generate_response('test_circuit_breaker_2')
+
+        self.assertFalse(first['success'])
+        self.assertEqual(post.call_count, 2)
+        self.assertFalse(second['success'])
+        self.assertIn('retry_after', second)
+
+    def test_async_retry_until_success(self):
+        """测试异步调用同样按策略重试"""
+        service = QianwenService()
+        service.response_cache = None
+        service.retry_policy = _policy()
+        responses = [httpx.Response(503), httpx.Response(200, json={'output': {'text': 'ok'}})]
+
+        def handler(request):
+            return responses.pop(0)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                with mock.patch.object(QianwenService, 'async_client', client):
+                    return await service.agenerate_response('test_async_retry')
+
+        result = asyncio.run(run())
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['content'], 'ok')
+        self.assertEqual(responses, [])
+
+if __name__ == '__main__':
+    unittest.main()
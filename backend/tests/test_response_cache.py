@@ -0,0 +1,333 @@
+import asyncio
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.response_cache import ResponseCache, make_cache_key
+from services.disk_cache import DiskResponseCache
+from services.qianwen_service import QianwenService
+from services.semantic_cache import SemanticCache, np
+from services.single_flight import SingleFlight, normalize_prompt
+
+class TestResponseCache(unittest.TestCase):
+    """响应缓存测试类"""
+
+    def test_cache_key_is_stable(self):
+        """测试缓存键只由请求内容决定"""
+        key1 = make_cache_key('qianwen', 'qwen-turbo', '什么是闭包？', 2048)
+        key2 = make_cache_key('qianwen', 'qwen-turbo', '什么是闭包？', 2048)
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, make_cache_key('custom', 'qwen-turbo', '什么是闭包？', 2048))
+        self.assertNotEqual(key1, make_cache_key('qianwen', 'qwen-turbo', '什么是闭包？', 1024))
+
+    def test_lru_eviction(self):
+        """测试超过条目数上限时淘汰最久未使用的条目"""
+        cache = ResponseCache(max_entries=2, ttl=0)
+        cache.set('a', {'content': 'A'})
+        cache.set('b', {'content': 'B'})
+        cache.get('a')  # a变为最近使用
+        cache.set('c', {'content': 'C'})
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_ttl_expiry(self):
+        """测试过期条目不会被返回"""
+        cache = ResponseCache(ttl=10)
+        with mock.patch('services.response_cache.time.monotonic', return_value=100.0):
+            cache.set('a', {'content': 'A'})
+        with mock.patch('services.response_cache.time.monotonic', return_value=105.0):
+            self.assertIsNotNone(cache.get('a'))
+        with mock.patch('services.response_cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_byte_budget(self):
+        """测试总字节数超过上限时淘汰旧条目"""
+        cache = ResponseCache(max_entries=100, ttl=0, max_bytes=200)
+        cache.set('a', {'content': 'x' * 120})
+        cache.set('b', {'content': 'y' * 120})
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+        self.assertLessEqual(cache.stats()['bytes'], 200)
+
+    def test_service_uses_shared_cache(self):
+        """测试不同服务实例共享缓存，重复请求不再调用API"""
+        api_result = {'success': True, 'content': '回答', 'model': 'qwen-turbo'}
+        with mock.patch.object(QianwenService, '_call_qianwen_api', return_value=api_result) as call_api:
+            first = QianwenService()
+            first.response_cache.clear()
+            prompt = 'test_service_uses_shared_cache'
+            self.assertEqual(first.generate_response(prompt)['content'], '回答')
+
+            second = QianwenService()
+            response = second.generate_response(prompt)
+
+        self.assertEqual(call_api.call_count, 1)
+        call_api.assert_called_with(prompt, 2048)  # 发送给API的是原始提示词
+        self.assertTrue(response['cached'])
+
+    def test_failed_response_not_cached(self):
+        """测试失败的响应不会被缓存"""
+        api_result = {'success': False, 'error': 'API请求超时', 'content': ''}
+        with mock.patch.object(QianwenService, '_call_qianwen_api', return_value=api_result) as call_api:
+            service = QianwenService()
+            service.generate_response('test_failed_response_not_cached')
+            service.generate_response('test_failed_response_not_cached')
+
+        self.assertEqual(call_api.call_count, 2)
+
+class TestSingleFlight(unittest.TestCase):
+    """合并相同并发请求的测试类"""
+
+    def test_concurrent_identical_prompts_share_one_call(self):
+        """测试相同提示词的并发请求只调用一次上游API，所有请求得到相同的回答"""
+        release = threading.Event()
+
+        def call_api(prompt, max_tokens):
+            release.wait(5)
+            return {'success': True, 'content': '共享的回答'}
+
+        service = QianwenService()
+        service.single_flight = SingleFlight()
+        results = []
+        with mock.patch.object(QianwenService, '_call_qianwen_api', side_effect=call_api) as mocked:
+            threads = [
+                threading.Thread(target=lambda i=i: results.append(service.generate_response(
+                    'test_single_flight' + ' ' * (i % 2)  # 只有行尾空白不同的提示词视为相同
+                )))
+                for i in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for _ in range(500):
+                if service.single_flight.stats()['coalesced_calls'] >= 7:
+                    break
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual([result['content'] for result in results], ['共享的回答'] * 8)
+        self.assertEqual(sum(1 for result in results if result.get('coalesced')), 7)
+        self.assertEqual(service.single_flight.stats()['in_flight'], 0)
+
+    def test_leader_error_is_shared_and_not_remembered(self):
+        """测试执行中的异常传递给所有等待方，调用结束后相同的键会重新执行"""
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def failing():
+            release.wait(5)
+            raise RuntimeError('upstream down')
+
+        def call():
+            try:
+                flight.do('key', failing)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if flight.stats()['coalesced_calls'] >= 2:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(errors, ['upstream down'] * 3)
+        self.assertEqual(flight.stats()['upstream_calls'], 1)
+        self.assertEqual(flight.do('key', lambda: 'again'), ('again', False))
+
+    def test_async_concurrent_calls_are_coalesced(self):
+        """测试异步调用方的相同并发请求只执行一次"""
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'ok'
+
+        async def run():
+            return await asyncio.gather(*(flight.ado('key', call) for _ in range(10)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ['ok'] * 10)
+        self.assertEqual(sum(1 for _, shared in results if shared), 9)
+
+    def test_normalize_prompt_keeps_indentation(self):
+        """测试规范化只去除首尾和行尾空白，保留代码缩进"""
+        self.assertEqual(normalize_prompt('  def f():\r\n    return 1  \n'), 'def f():\n    return 1')
+        self.assertNotEqual(normalize_prompt('a\n  b'), normalize_prompt('a\nb'))
+
+@unittest.skipIf(np is None, '未安装numpy')
+class TestSemanticCache(unittest.TestCase):
+    """语义缓存测试类"""
+
+    def test_near_duplicate_prompts_hit(self):
+        """测试只在空白和大小写上不同的问题命中缓存，不同的问题不命中"""
+        cache = SemanticCache()
+        cache.set('qianwen:qwen-turbo:2048', '如何在Python中反转一个列表？', {'content': '使用reversed'})
+
+        value, similarity = cache.get('qianwen:qwen-turbo:2048', '如何在 python 中反转一个列表？')
+        self.assertEqual(value['content'], '使用reversed')
+        self.assertGreater(similarity, 0.99)
+
+        value, similarity = cache.get('qianwen:qwen-turbo:2048', '如何在Python中合并两个字典？')
+        self.assertIsNone(value)
+        self.assertLess(similarity, cache.threshold)
+
+    def test_operators_and_numbers_must_match(self):
+        """测试只在运算符或数字上不同的问题不会命中"""
+        pairs = [
+            ('Why is a < b true here?', 'Why is a > b true here?'),
+            ('How do I check x == y for two lists?', 'How do I check x != y for two lists?'),
+            ('What does 1 + 2 evaluate to in JavaScript?', 'What does 1 - 2 evaluate to in JavaScript?'),
+            ('Sort the first 10 items', 'Sort the first 100 items')
+        ]
+        for first, second in pairs:
+            with self.subTest(first=first):
+                cache = SemanticCache()
+                cache.set('ns', first, {'content': first})
+                self.assertIsNone(cache.get('ns', second)[0])
+                self.assertIsNotNone(cache.get('ns', first.upper())[0])
+
+    def test_context_matches_exactly(self):
+        """测试问题相同但上下文不同时不命中，上下文相同时只比较问题"""
+        code = '\n'.join(f'def handler_{i}(request):\n    return process(request, {i})\n' for i in range(100))
+        cache = SemanticCache()
+        cache.set('ns', '如何让这段代码更快？', {'content': 'A'}, context='python\n' + code)
+
+        self.assertIsNone(cache.get('ns', '如何让这段代码更快？', context='python\n' + code + ' ')[0])
+        self.assertIsNone(cache.get('ns', '如何让这段代码线程安全？', context='python\n' + code)[0])
+        self.assertEqual(cache.get('ns', '如何让这段代码 更快？', context='python\n' + code)[0]['content'], 'A')
+
+    def test_namespaces_are_isolated(self):
+        """测试不同服务提供方、模型或max_tokens的条目不会相互匹配"""
+        cache = SemanticCache()
+        cache.set('qianwen:qwen-turbo:2048', 'What is a closure?', {'content': 'A'})
+
+        self.assertIsNone(cache.get('custom:default-model:2048', 'What is a closure?')[0])
+        self.assertIsNone(cache.get('qianwen:qwen-turbo:1024', 'What is a closure?')[0])
+
+    def test_expired_and_overwritten_entries(self):
+        """测试过期条目不命中，超过条目数上限时覆盖最早写入的条目"""
+        cache = SemanticCache(max_entries=2, ttl=0.05)
+        cache.set('ns', 'first question', {'content': '1'})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('ns', 'first question')[0])
+
+        cache = SemanticCache(max_entries=2)
+        for i, prompt in enumerate(['alpha beta gamma', 'delta epsilon zeta', 'eta theta iota']):
+            cache.set('ns', prompt, {'content': str(i)})
+        self.assertIsNone(cache.get('ns', 'alpha beta gamma')[0])
+        self.assertEqual(cache.get('ns', 'eta theta iota')[0]['content'], '2')
+
+    def test_service_serves_near_duplicate_from_cache(self):
+        """测试服务对近似重复的问题不再调用上游API，未提供语义缓存键的提示词不使用语义缓存"""
+        service = QianwenService()
+        service.response_cache = ResponseCache()
+        service.semantic_cache = SemanticCache()
+        api_result = {'success': True, 'content': '闭包是引用了外部变量的函数'}
+
+        with mock.patch.object(QianwenService, '_call_qianwen_api', return_value=api_result) as call_api:
+            service.generate_response('What is a closure in Python?', semantic_key=('What is a closure in Python?', ''))
+            result = service.generate_response('what is a  closure in python?',
+                                               semantic_key=('what is a  closure in python?', ''))
+            self.assertEqual(call_api.call_count, 1)
+            self.assertTrue(result['cached'])
+            self.assertGreater(result['semantic_similarity'], 0.9)
+
+            service.generate_response('WHAT IS A CLOSURE IN PYTHON?')
+            self.assertEqual(call_api.call_count, 2)
+
+    def test_solutions_with_shared_context_do_not_collide(self):
+        """测试同一段代码上的不同问题不会命中彼此的解决方案"""
+        service = QianwenService()
+        service.response_cache = None
+        service.semantic_cache = SemanticCache()
+        code = '\n'.join(f'def handler_{i}(request):\n    return process(request, {i})\n' for i in range(60))
+        api_result = {'success': True, 'content': '```python\npass\n```'}
+
+        with mock.patch.object(QianwenService, '_call_qianwen_api', return_value=api_result) as call_api:
+            service.solve_problem('如何让这些处理函数更快？', code)
+            service.solve_problem('如何为这些处理函数添加日志？', code)
+            service.solve_problem('如何让这些处理函数更快？', code, language='go')
+            self.assertEqual(call_api.call_count, 3)
+
+            service.solve_problem('如何让这些处理函数 更快？', code)
+            self.assertEqual(call_api.call_count, 3)
+
+class TestDiskResponseCache(unittest.TestCase):
+    """磁盘响应缓存测试类"""
+
+    def setUp(self):
+        """创建临时缓存目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'responses.db')
+
+    def tearDown(self):
+        """清理临时缓存目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_shared_between_instances(self):
+        """测试多个实例（模拟多个工作进程）共享同一个缓存文件"""
+        writer = DiskResponseCache(self.path)
+        writer.set('key', {'success': True, 'content': '回答'})
+
+        reader = DiskResponseCache(self.path)
+        value, remaining_ttl = reader.get('key')
+        self.assertEqual(value['content'], '回答')
+        self.assertGreater(remaining_ttl, 0)
+
+    def test_expired_entry_not_returned(self):
+        """测试过期条目不会被返回，并在压缩时被删除"""
+        cache = DiskResponseCache(self.path, ttl=10)
+        with mock.patch('services.disk_cache.time.time', return_value=1000.0):
+            cache.set('key', {'content': '回答'})
+        with mock.patch('services.disk_cache.time.time', return_value=1011.0):
+            self.assertEqual(cache.get('key'), (None, None))
+            self.assertEqual(cache.compact(force=True), 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_compaction_enforces_byte_budget(self):
+        """测试压缩时按访问时间淘汰超出容量的条目"""
+        cache = DiskResponseCache(self.path, ttl=0, max_bytes=300)
+        for i in range(5):
+            with mock.patch('services.disk_cache.time.time', return_value=1000.0 + i):
+                cache.set(f'key{i}', {'content': 'x' * 100})
+
+        cache.compact(force=True)
+        self.assertLessEqual(cache.stats()['bytes'], 300)
+        self.assertEqual(cache.get('key0'), (None, None))
+        self.assertIsNotNone(cache.get('key4')[0])
+
+    def test_memory_cache_backfilled_from_disk(self):
+        """测试内存缓存未命中时从磁盘缓存读取并回填"""
+        DiskResponseCache(self.path).set('key', {'content': '回答'})
+
+        cache = ResponseCache(disk_cache=DiskResponseCache(self.path))
+        self.assertEqual(cache.get('key')['content'], '回答')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import sys
+import os
+import gzip
+import json
+import math
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, jsonify, request
+from app import app
+from models.response import SuggestionResponse, parse_exclude
+from utils.compression import ResponseCompressor
+from utils.json_provider import InstrumentedJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class TestJSONProvider(unittest.TestCase):
+    """JSON提供者测试类"""
+
+    def _app(self, backend):
+        test_app = Flask(__name__)
+        test_app.json = InstrumentedJSONProvider(test_app, backend=backend)
+        return test_app
+
+    def _check_backend(self, backend):
+        test_app = self._app(backend)
+        with test_app.app_context():
+            response = test_app.json.response({'b': '中文', 'a': [1, 2.5, None], 'big': 2 ** 70})
+            body = response.get_data()
+
+            # 紧凑输出、键排序、中文不转义，超过64位的整数回退到标准库
+            self.assertEqual(body, '{"a":[1,2.5,null],"b":"中文","big":1180591620717411303424}\n'.encode('utf-8'))
+            self.assertEqual(test_app.json.loads(body), json.loads(body))
+            self.assertTrue(math.isnan(test_app.json.loads('{"x": NaN}')['x']))
+            with self.assertRaises(ValueError):
+                test_app.json.loads('{"x": ')
+
+    def test_stdlib_backend(self):
+        """测试标准库json后端"""
+        self.assertFalse(self._app('json').json.use_orjson)
+        self._check_backend('json')
+
+    @unittest.skipIf(orjson is None, '未安装orjson')
+    def test_orjson_backend(self):
+        """测试orjson后端与标准库的输出一致"""
+        self.assertTrue(self._app('auto').json.use_orjson)
+        self._check_backend('orjson')
+
+
+class TestResponseCompression(unittest.TestCase):
+    """响应压缩测试类"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        compressor = ResponseCompressor(min_size=100)
+
+        @self.app.route('/<int:size>')
+        def payload(size):
+            return jsonify({'data': 'x' * size})
+
+        @self.app.route('/stream')
+        def stream():
+            return Response((f'data: {i}\n\n' * 100 for i in range(3)), mimetype='text/event-stream')
+
+        @self.app.after_request
+        def compress(response):
+            return compressor.compress(response, request.accept_encodings)
+
+        self.client = self.app.test_client()
+
+    def test_gzip_above_threshold(self):
+        """测试超过阈值的响应按gzip压缩，并设置Vary和Content-Length"""
+        response = self.client.get('/5000', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))['data']), 5000)
+
+    def test_small_or_unaccepted_responses_are_not_compressed(self):
+        """测试小响应、客户端不接受压缩和流式响应都不压缩"""
+        self.assertNotIn('Content-Encoding', self.client.get('/10', headers={'Accept-Encoding': 'gzip'}).headers)
+        self.assertNotIn('Content-Encoding', self.client.get('/5000').headers)
+        self.assertNotIn('Content-Encoding',
+                         self.client.get('/5000', headers={'Accept-Encoding': 'gzip;q=0'}).headers)
+        stream = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', stream.headers)
+        self.assertIn(b'data: 2', stream.data)
+
+    @unittest.skipIf(brotli is None, '未安装brotli')
+    def test_brotli_preferred(self):
+        """测试安装了brotli时优先使用br"""
+        response = self.client.get('/5000', headers={'Accept-Encoding': 'gzip, br'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(brotli.decompress(response.data))['data']), 5000)
+
+
+class TestExcludeFields(unittest.TestCase):
+    """省略响应字段测试类"""
+
+    def test_parse_exclude(self):
+        """测试从列表和逗号分隔的字符串解析字段名"""
+        self.assertEqual(parse_exclude(['original_code'], 'best_practices, problem'),
+                         {'original_code', 'best_practices', 'problem'})
+        self.assertEqual(parse_exclude(None, ''), frozenset())
+        self.assertEqual(SuggestionResponse(original_code='x').to_dict(exclude={'original_code'}),
+                         {'improved_code': None, 'explanation': '', 'improvement_points': []})
+
+    def test_endpoints_omit_excluded_fields(self):
+        """测试接口按请求体或查询参数省略字段"""
+        client = app.test_client()
+        code = 'def f(x):\n    return x\n'
+
+        suggestion = client.post('/api/code-suggestion/suggest',
+                                 json={'code': code, 'language': 'python', 'exclude': ['original_code']})
+        analysis = client.post('/api/code-analysis/analyze?exclude=best_practices,structure',
+                               json={'code': code, 'language': 'python'})
+        full = client.post('/api/code-suggestion/suggest', json={'code': code, 'language': 'python'})
+
+        self.assertEqual(suggestion.status_code, 200)
+        self.assertNotIn('original_code', suggestion.get_json())
+        self.assertIn('improved_code', suggestion.get_json())
+        self.assertEqual(full.get_json()['original_code'], code)
+        result = analysis.get_json()['result']
+        self.assertNotIn('best_practices', result)
+        self.assertNotIn('structure', result)
+        self.assertIn('code_quality', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
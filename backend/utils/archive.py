@@ -0,0 +1,118 @@
+import io
+import logging
+import posixpath
+import tarfile
+import zipfile
+import zlib
+from utils.validators import MAX_CODE_LENGTH, is_supported_filename
+
+logger = logging.getLogger(__name__)
+
+# 这些目录中的文件是依赖、构建产物或版本控制数据，不参与分析
+SKIPPED_DIRECTORIES = frozenset((
+    '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+    '.tox', '.mypy_cache', '.idea', '.vscode', 'dist', 'build'
+))
+
+# 单个文件解压后的最大字节数（UTF-8中一个字符最多4个字节）
+MAX_FILE_BYTES = MAX_CODE_LENGTH * 4
+
+
+class ArchiveError(ValueError):
+    """压缩包无法读取或超出限制"""
+
+
+def _normalize_path(name):
+    """规范化压缩包中的路径，包含上级目录引用的路径返回None"""
+    path = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+    if path in ('', '.') or path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def _iter_members(data):
+    """遍历压缩包中的普通文件
+
+    Yields:
+        tuple: (路径, 声明的解压后大小, 读取函数)，读取函数接受最大字节数
+    """
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                yield info.filename, info.file_size, \
+                    lambda limit, info=info: archive.open(info).read(limit)
+        return
+
+    try:
+        archive = tarfile.open(fileobj=io.BytesIO(data), mode='r:*')
+    except tarfile.TarError as e:
+        raise ArchiveError(f"无法识别的压缩包格式，请上传zip或tar（可使用gzip、bz2、xz压缩）: {str(e)}")
+    with archive:
+        for member in archive:
+            # 符号链接、硬链接和设备文件都不读取
+            if not member.isfile():
+                continue
+            yield member.name, member.size, \
+                lambda limit, member=member: archive.extractfile(member).read(limit)
+
+
+def read_source_files(data, max_files=500, max_total_bytes=20000000):
+    """读取zip或tar压缩包中的源码文件
+
+    文件内容只在内存中读取，不会写入磁盘。扩展名不属于支持语言的文件、
+    依赖和构建目录中的文件会被忽略；过大、非UTF-8编码或包含空字节的文件记录在skipped中。
+    每个文件最多读取MAX_FILE_BYTES字节，不依赖压缩包中声明的大小。
+
+    Args:
+        data (bytes): 压缩包内容
+        max_files (int): 最多读取的源码文件数
+        max_total_bytes (int): 所有源码文件解压后的最大总字节数
+
+    Returns:
+        tuple: (files, skipped)，files为{'filename', 'code'}列表，skipped为{'filename', 'reason'}列表
+
+    Raises:
+        ArchiveError: 压缩包无法读取，或源码文件数量、总大小超出限制
+    """
+    files = []
+    skipped = []
+    total_bytes = 0
+    try:
+        for name, declared_size, read in _iter_members(data):
+            path = _normalize_path(name)
+            if path is None:
+                skipped.append({'filename': name, 'reason': '文件路径无效'})
+                continue
+            if any(part in SKIPPED_DIRECTORIES for part in path.split('/')[:-1]):
+                continue
+            if not is_supported_filename(path):
+                continue
+            if len(files) >= max_files:
+                raise ArchiveError(f"压缩包中的源码文件超过{max_files}个")
+            if declared_size > MAX_FILE_BYTES:
+                skipped.append({'filename': path, 'reason': '文件过大'})
+                continue
+
+            content = read(MAX_FILE_BYTES + 1)
+            if len(content) > MAX_FILE_BYTES:
+                skipped.append({'filename': path, 'reason': '文件过大'})
+                continue
+            total_bytes += len(content)
+            if total_bytes > max_total_bytes:
+                raise ArchiveError(f"压缩包中的源码文件解压后超过{max_total_bytes // 1000000}MB")
+            if b'\0' in content:
+                skipped.append({'filename': path, 'reason': '二进制文件'})
+                continue
+            try:
+                code = content.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                skipped.append({'filename': path, 'reason': '文件不是UTF-8编码'})
+                continue
+            files.append({'filename': path, 'code': code})
+    except (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, OSError) as e:
+        raise ArchiveError(f"压缩包已损坏: {str(e)}")
+
+    logger.info("从压缩包中读取%s个源码文件，跳过%s个", len(files), len(skipped))
+    return files, skipped
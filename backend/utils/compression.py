@@ -0,0 +1,114 @@
+"""响应压缩
+
+超过大小阈值的JSON和文本响应按客户端的Accept-Encoding压缩：安装了brotli时优先使用br，
+否则使用gzip。流式响应（SSE、NDJSON）不压缩，避免压缩缓冲推迟已经生成的内容。
+"""
+import gzip
+import logging
+import os
+from utils.metrics import stage_timer
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 压缩效果明显的内容类型
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml'
+})
+
+
+class ResponseCompressor:
+    """按Accept-Encoding压缩响应体"""
+
+    def __init__(self, enabled=True, min_size=1024, gzip_level=6, brotli_quality=4):
+        """初始化响应压缩器
+
+        Args:
+            enabled (bool): 是否压缩
+            min_size (int): 响应体达到该字节数时才压缩，更小的响应压缩后节省有限
+            gzip_level (int): gzip压缩级别，1到9
+            brotli_quality (int): brotli压缩质量，0到11，4在压缩率和CPU之间较为均衡
+        """
+        self.enabled = enabled
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @classmethod
+    def from_env(cls):
+        """根据环境变量创建响应压缩器
+
+        读取 RESPONSE_COMPRESSION、RESPONSE_COMPRESSION_MIN_SIZE、
+        RESPONSE_COMPRESSION_GZIP_LEVEL 和 RESPONSE_COMPRESSION_BROTLI_QUALITY。
+
+        Returns:
+            ResponseCompressor: 响应压缩器
+        """
+        return cls(
+            enabled=os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true',
+            min_size=int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024')),
+            gzip_level=int(os.getenv('RESPONSE_COMPRESSION_GZIP_LEVEL', '6')),
+            brotli_quality=int(os.getenv('RESPONSE_COMPRESSION_BROTLI_QUALITY', '4'))
+        )
+
+    def choose_encoding(self, accept_encodings):
+        """根据Accept-Encoding选择编码
+
+        Args:
+            accept_encodings (Accept): 请求的accept_encodings
+
+        Returns:
+            str: br或gzip，客户端不接受任何一种时为None
+        """
+        if brotli is not None and accept_encodings.quality('br') > 0:
+            return 'br'
+        if accept_encodings.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def _should_compress(self, response):
+        if response.direct_passthrough or response.is_streamed:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+            return False
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+    def compress(self, response, accept_encodings):
+        """按需压缩响应
+
+        Args:
+            response (Response): Flask响应
+            accept_encodings (Accept): 请求的accept_encodings
+
+        Returns:
+            Response: 同一个响应对象，压缩时响应体、Content-Encoding和Content-Length已更新
+        """
+        if not self.enabled or not self._should_compress(response):
+            return response
+        # 响应内容随Accept-Encoding变化，不论是否压缩都要告知缓存
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        with stage_timer('compression'):
+            if encoding == 'br':
+                compressed = brotli.compress(data, quality=self.brotli_quality)
+            else:
+                compressed = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,235 @@
+"""根据代码内容推断编程语言
+
+只取代码开头的一段，用两次findall提取标识符和少量有区分度的符号（例如:=、=>、<?php），
+再按预先编译好的特征权重表给每种语言打分。权重表在导入时从按语言书写的规则转换为
+“特征 -> [(语言序号, 权重)]”的稀疏形式，打分时只遍历代码中实际出现的特征。
+结果按代码开头的哈希缓存，同一段代码重复提交时不再重新计算。
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 参与打分的代码长度（字符数），几KB足以区分语言
+DEFAULT_SAMPLE_SIZE = 4096
+# 最高得分低于该值时认为无法判断
+MIN_SCORE = 4.0
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# 有区分度的符号，较长的写在前面
+_SYMBOL = re.compile(r'<\?php|<!DOCTYPE|#include|#define|===|!==|=~|:=|=>|->|::|<-|\?>|</|/>|#!|\{%|\$|@|;')
+
+# 每种语言的特征及权重：关键字、常用库名和符号
+_LANGUAGE_FEATURES = {
+    'python': {
+        'def': 3, 'elif': 5, 'self': 2, 'None': 3, 'True': 2, 'False': 2, 'import': 1, 'from': 1,
+        '__init__': 6, '__name__': 6, 'print': 1, 'lambda': 3, 'pass': 2, 'isinstance': 4, 'len': 2,
+        'range': 1, 'and': 1, 'or': 1, 'not': 1, 'is': 1, 'with': 1, 'as': 1, 'except': 4, 'raise': 3,
+        'dict': 1, 'list': 1
+    },
+    'javascript': {
+        'function': 3, 'const': 2, 'let': 1.5, 'var': 1.5, '=>': 2, 'console': 5, 'undefined': 4,
+        'require': 3, 'document': 4, 'window': 3, '===': 4, '!==': 3, 'null': 1, 'this': 1,
+        'prototype': 4, 'exports': 3, 'module': 1, 'async': 1, 'await': 1, 'JSON': 2, 'typeof': 2, ';': 0.5
+    },
+    'typescript': {
+        'function': 2.5, 'const': 2, 'let': 1.5, '=>': 2, 'console': 4, 'undefined': 3, 'document': 3,
+        '===': 3.5, '!==': 2.5, 'null': 1, 'this': 1, 'async': 1, 'await': 1, 'JSON': 1.5, ';': 0.5,
+        'interface': 3, 'number': 3, 'string': 2, 'boolean': 3, 'readonly': 2, 'type': 1, 'enum': 1,
+        'implements': 1, 'private': 1, 'any': 3, 'void': 1, 'export': 1
+    },
+    'java': {
+        'public': 1, 'class': 1, 'static': 1, 'void': 1, 'System': 4, 'println': 2, 'String': 1,
+        'extends': 1, 'implements': 2, 'throws': 4, 'package': 2, 'new': 0.5, 'final': 2, 'boolean': 2,
+        'Override': 2, 'ArrayList': 3, 'private': 1, 'protected': 1, 'int': 0.5, ';': 0.5, '@': 0.5
+    },
+    'c': {
+        '#include': 3, '#define': 2, 'printf': 3, 'malloc': 4, 'free': 2, 'struct': 2, 'int': 1,
+        'char': 2, 'void': 1, 'sizeof': 2, 'NULL': 2, 'stdio': 5, 'stdlib': 3, 'unsigned': 2,
+        'typedef': 2, '->': 1, ';': 0.5
+    },
+    'cpp': {
+        '#include': 3, 'std': 5, '::': 2, 'cout': 5, 'cin': 3, 'endl': 5, 'namespace': 3, 'template': 3,
+        'typename': 4, 'vector': 3, 'iostream': 5, 'nullptr': 4, 'class': 1, 'public': 1, 'auto': 1,
+        'virtual': 3, 'delete': 1, 'int': 1, 'void': 0.5, ';': 0.5
+    },
+    'csharp': {
+        'using': 3, 'namespace': 2, 'Console': 4, 'WriteLine': 5, 'string': 1, 'var': 1, 'public': 1,
+        'static': 1, 'void': 1, 'get': 1, 'set': 1, 'override': 2, 'Task': 3, 'foreach': 3, 'bool': 2,
+        'internal': 3, 'System': 2, ';': 0.5
+    },
+    'go': {
+        'func': 4, 'package': 3, ':=': 4, 'fmt': 5, 'Println': 2, 'Printf': 2, 'go': 1, 'chan': 4,
+        'defer': 4, 'err': 2, 'nil': 2, 'struct': 1, 'interface': 1, 'range': 1, 'make': 1
+    },
+    'ruby': {
+        'def': 2, 'end': 3, 'puts': 4, 'require': 1, 'attr_accessor': 6, 'elsif': 6, 'unless': 3,
+        'do': 1, 'nil': 2, 'self': 1, 'module': 1, 'each': 2, 'yield': 1, '=>': 1, '@': 1
+    },
+    'php': {
+        '<?php': 10, '?>': 3, '$': 1, 'echo': 3, 'function': 1, 'array': 2, '->': 1, 'foreach': 2,
+        'isset': 5, '=>': 1, ';': 0.5
+    },
+    'swift': {
+        'func': 3, 'var': 1, 'let': 2, 'guard': 5, 'UIKit': 5, 'Foundation': 4, 'struct': 1,
+        'extension': 3, 'protocol': 4, 'nil': 1, 'print': 1, 'self': 1, 'override': 1, 'init': 2,
+        '->': 1, 'Int': 1, 'String': 1, 'weak': 3, 'inout': 5
+    },
+    'kotlin': {
+        'fun': 5, 'val': 3, 'var': 1, 'println': 1, 'when': 2, 'override': 1, 'data': 1, 'object': 1,
+        'companion': 6, 'lateinit': 6, 'Int': 1, 'String': 1, 'package': 1, 'it': 1, 'listOf': 5,
+        'mutableListOf': 6
+    },
+    'rust': {
+        'fn': 5, 'let': 1, 'mut': 5, 'impl': 5, 'pub': 4, 'use': 2, 'crate': 5, 'struct': 1, 'enum': 1,
+        'match': 2, 'Some': 3, 'None': 1, 'Ok': 2, 'Err': 2, 'println': 1, 'Vec': 3, '::': 1, '->': 1,
+        'unwrap': 4, 'trait': 4, 'derive': 4, ';': 0.5
+    },
+    'scala': {
+        'def': 2, 'val': 3, 'var': 1, 'object': 3, 'extends': 1, 'case': 1, 'trait': 2, 'implicit': 6,
+        'println': 1, 'Unit': 4, 'match': 1, 'sealed': 4, 'with': 1, '=>': 1, 'Int': 1, 'List': 1,
+        'Option': 3
+    },
+    'perl': {
+        'my': 5, 'sub': 4, 'use': 1, 'strict': 5, 'warnings': 5, '$': 1, 'print': 1, 'foreach': 1,
+        'elsif': 3, 'unless': 1, '@': 1, '=~': 6, 'chomp': 6, 'shift': 2, '#!': 1, 'perl': 5, 'qw': 6,
+        ';': 0.5
+    },
+    'html': {
+        '<!DOCTYPE': 8, '</': 3, '/>': 1, 'div': 3, 'html': 3, 'body': 2, 'href': 3, 'class': 1,
+        'span': 3, 'head': 1, 'meta': 2, 'script': 1, 'nbsp': 3, 'li': 1, 'ul': 1
+    },
+    'css': {
+        'px': 3, 'margin': 3, 'padding': 3, 'color': 2, 'font': 2, 'display': 2, 'width': 1, 'border': 2,
+        'background': 2, 'important': 2, 'rgba': 3, 'hover': 2, 'em': 1, 'rem': 2, 'flex': 2, ';': 0.5
+    },
+    'sql': {
+        'SELECT': 4, 'FROM': 2, 'WHERE': 3, 'INSERT': 3, 'INTO': 2, 'VALUES': 3, 'UPDATE': 2,
+        'CREATE': 2, 'TABLE': 3, 'JOIN': 3, 'GROUP': 2, 'ORDER': 2, 'BY': 2, 'PRIMARY': 3, 'KEY': 1,
+        'NOT': 1, 'NULL': 1, 'VARCHAR': 4, 'select': 3, 'where': 2, 'join': 1, 'varchar': 4,
+        'insert': 2, 'values': 1, ';': 0.5
+    }
+}
+
+LANGUAGES = tuple(_LANGUAGE_FEATURES)
+
+
+def _compile_weights(features):
+    """把按语言书写的特征权重转换为“特征 -> ((语言序号, 权重), ...)”"""
+    table = {}
+    for index, language in enumerate(LANGUAGES):
+        for feature, weight in features[language].items():
+            table.setdefault(feature, []).append((index, weight))
+    return {feature: tuple(weights) for feature, weights in table.items()}
+
+
+_WEIGHTS = _compile_weights(_LANGUAGE_FEATURES)
+
+
+class LanguageDetector:
+    """根据代码内容推断编程语言，结果按内容哈希缓存"""
+
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE, cache_size=1024, min_score=MIN_SCORE):
+        """初始化语言检测器
+
+        Args:
+            sample_size (int): 参与打分的代码开头长度（字符数）
+            cache_size (int): 缓存的检测结果数，0表示不缓存
+            min_score (float): 最高得分低于该值时认为无法判断
+        """
+        self.sample_size = sample_size
+        self.cache_size = cache_size
+        self.min_score = min_score
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def scores(self, code):
+        """计算每种语言的得分
+
+        每个特征按出现次数计分，最多计3次，避免大量重复的同一个关键字压过其他特征。
+
+        Args:
+            code (str): 代码
+
+        Returns:
+            dict: 语言到得分的映射
+        """
+        sample = code[:self.sample_size]
+        counts = Counter(_IDENTIFIER.findall(sample))
+        counts.update(_SYMBOL.findall(sample))
+        totals = [0.0] * len(LANGUAGES)
+        for feature, count in counts.items():
+            weights = _WEIGHTS.get(feature)
+            if weights:
+                count = min(count, 3)
+                for index, weight in weights:
+                    totals[index] += weight * count
+        return dict(zip(LANGUAGES, totals))
+
+    def _classify(self, code):
+        scores = self.scores(code)
+        language = max(scores, key=scores.get)
+        return language if scores[language] >= self.min_score else None
+
+    def detect(self, code):
+        """推断代码的语言
+
+        Args:
+            code (str): 代码
+
+        Returns:
+            str: 推断的语言，无法判断时为None
+        """
+        if not code or not code.strip():
+            return None
+        if self.cache_size <= 0:
+            return self._classify(code)
+
+        key = hashlib.blake2b(code[:self.sample_size].encode('utf-8', errors='replace'), digest_size=16).digest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        language = self._classify(code)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = language
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return language
+
+    def stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# 进程内共享的语言检测器
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_language_detector():
+    """获取共享的语言检测器
+
+    读取 LANGUAGE_DETECTION_SAMPLE_SIZE 和 LANGUAGE_DETECTION_CACHE_SIZE。
+
+    Returns:
+        LanguageDetector: 共享的语言检测器
+    """
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = LanguageDetector(
+                    sample_size=int(os.getenv('LANGUAGE_DETECTION_SAMPLE_SIZE', str(DEFAULT_SAMPLE_SIZE))),
+                    cache_size=int(os.getenv('LANGUAGE_DETECTION_CACHE_SIZE', '1024'))
+                )
+    return _detector
@@ -0,0 +1,143 @@
+"""日志配置
+
+日志记录经QueueHandler放入内存队列，由QueueListener的后台线程格式化并写入文件和控制台，
+请求线程不执行磁盘I/O，也不等待日志轮转。LOG_FORMAT=json时每行输出一个JSON对象，
+便于日志系统按字段检索。
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] [%(name)s] - %(message)s'
+
+# LogRecord的标准属性，其余属性视为通过extra传入的结构化字段
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+# 运行中的监听器，进程退出前写完队列中剩余的日志
+_listeners = set()
+
+
+def stop_listener(listener):
+    """写完队列中剩余的日志并停止监听器，重复调用无影响"""
+    if listener in _listeners:
+        _listeners.discard(listener)
+        listener.stop()
+
+
+@atexit.register
+def _stop_all_listeners():
+    for listener in list(_listeners):
+        stop_listener(listener)
+
+
+class JSONFormatter(logging.Formatter):
+    """把日志记录格式化为一行JSON，extra传入的字段作为顶层字段输出"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """为请求处理过程中产生的日志记录附加request_id
+
+    在请求线程上执行（挂在QueueHandler上），后台线程中已经没有请求上下文。
+    """
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            from flask import g, has_request_context
+            if has_request_context():
+                request_id = g.get('request_id')
+                if request_id:
+                    record.request_id = request_id
+        return True
+
+
+def configure_logging(log_dir, level=None, log_format=None, use_queue=None):
+    """配置根日志记录器
+
+    读取 LOG_LEVEL、LOG_FORMAT（text或json）和 LOG_ASYNC 环境变量，参数优先于环境变量。
+
+    Args:
+        log_dir (str): 日志文件目录，日志写入其中的app.log，按10MB轮转并保留5个备份
+        level (str): 日志级别，默认为INFO
+        log_format (str): text或json
+        use_queue (bool): 是否经队列由后台线程写日志
+
+    Returns:
+        QueueListener: 后台写日志的监听器，不使用队列时为None
+    """
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    log_format = (log_format or os.getenv('LOG_FORMAT', 'text')).lower()
+    if use_queue is None:
+        use_queue = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+
+    os.makedirs(log_dir, exist_ok=True)
+    formatter = JSONFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    # 文件处理器 - 使用RotatingFileHandler进行日志轮转
+    file_handler = RotatingFileHandler(os.path.join(log_dir, 'app.log'), maxBytes=10*1024*1024, backupCount=5,
+                                       encoding='utf-8')
+    # 控制台处理器
+    console_handler = logging.StreamHandler()
+    handlers = [file_handler, console_handler]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.setLevel(level)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    listener = None
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(RequestContextFilter())
+        root_logger.addHandler(queue_handler)
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.add(listener)
+    else:
+        for handler in handlers:
+            handler.addFilter(RequestContextFilter())
+            root_logger.addHandler(handler)
+    return listener
+
+
+def body_preview(request, limit=None):
+    """截取请求体的开头用于调试日志
+
+    只解码前limit个字节，不解析和重新序列化JSON。请求体由get_data缓存，
+    之后路由中的get_json不会重复读取。
+
+    Args:
+        request (Request): Flask请求对象
+        limit (int): 最多保留的字节数，默认读取 LOG_BODY_PREVIEW_BYTES（1000）
+
+    Returns:
+        str: 请求体的开头，超过limit时以“... [截断]”结尾
+    """
+    if limit is None:
+        limit = int(os.getenv('LOG_BODY_PREVIEW_BYTES', '1000'))
+    data = request.get_data(cache=True)
+    preview = data[:limit].decode('utf-8', errors='replace')
+    if len(data) > limit:
+        preview += '... [截断]'
+    return preview
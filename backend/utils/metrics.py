@@ -0,0 +1,254 @@
+"""进程内的延迟直方图和计数器，以Prometheus文本格式导出
+
+不依赖prometheus_client。直方图和计数器在请求处理过程中更新；缓存命中数、熔断器状态、
+连接池等已有组件自己维护的统计信息由采集函数在导出时读取，不需要在热路径上重复计数。
+"""
+import functools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 默认的延迟分桶（秒），覆盖从几毫秒的缓存命中到几十秒的大模型调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    """转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标{self.name}的标签应为{self.labelnames}，实际为{tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        return tuple(zip(self.labelnames, key)) + tuple(extra)
+
+    def collect(self):
+        """生成导出文本的各行"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """计数器加上amount
+
+        Args:
+            amount (float): 增加的数量
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """获取当前值，没有记录时为0"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self._labels(key))} {_format_value(value)}'
+
+
+class Histogram(_Metric):
+    """延迟直方图，记录每个分桶的累计数量、总和和次数"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """记录一次观测值
+
+        Args:
+            value (float): 观测值，例如耗时（秒）
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 各分桶的数量（非累计）、总和
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录with语句块的耗时，语句块抛出异常时同样记录"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def count(self, **labels):
+        """获取观测次数"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def collect(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1])) for key, state in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self._labels(key, (('le', _format_value(float(bound))),))
+                yield f'{self.name}_bucket{_format_labels(labels)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self._labels(key))} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self._labels(key))} {cumulative}'
+
+
+class MetricsRegistry:
+    """指标注册表，导出所有指标和采集函数的结果"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """获取或创建计数器"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """获取或创建直方图"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector, name=None):
+        """注册在导出时调用的采集函数
+
+        同名的采集函数只保留最后注册的一个，重复创建应用时不会重复导出同一组指标。
+
+        Args:
+            collector (callable): 无参数函数，返回(名称, 类型, 说明, [(标签字典, 值)])列表，
+                类型为gauge或counter
+            name (str): 采集函数的名称，为None时以采集函数本身区分
+        """
+        with self._lock:
+            self._collectors[collector if name is None else name] = collector
+
+    def render(self):
+        """以Prometheus文本格式导出所有指标
+
+        Returns:
+            str: 导出文本
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            lines.extend(metric.collect())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                # 某个组件的统计信息出错不影响其他指标的导出
+                logger.error("采集指标时发生错误: %s", e)
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# 每个路由的请求耗时
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', '每个路由的请求处理耗时（秒）', ('method', 'route', 'status')
+)
+# 请求处理中各阶段的耗时：输入验证、各分析步骤、缓存查询和序列化
+STAGE_LATENCY = registry.histogram(
+    'stage_duration_seconds', '请求处理中各阶段的耗时（秒）', ('stage',)
+)
+# 上游大模型调用的耗时：connect为新建TCP/TLS连接，按主机名记录；
+# ttfb为收到响应头或首个片段，total为一次尝试或整个流式输出，按服务提供方记录
+UPSTREAM_LATENCY = registry.histogram(
+    'upstream_duration_seconds', '上游大模型调用各阶段的耗时（秒）', ('upstream', 'phase')
+)
+UPSTREAM_RETRIES = registry.counter(
+    'upstream_retries_total', '上游调用的重试次数', ('policy',)
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """记录一个处理阶段的耗时
+
+    Args:
+        stage (str): 阶段名称，例如validation、cache_lookup
+    """
+    with STAGE_LATENCY.time(stage=stage):
+        yield
+
+
+def timed_stage(stage):
+    """记录函数耗时的装饰器，见stage_timer"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with STAGE_LATENCY.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,285 @@
+"""请求体大小限制
+
+在路由读取和解析请求体之前执行：Content-Length超过路由上限的请求直接返回413，不读取请求体；
+没有Content-Length的分块请求在读取超过上限时中止。JSON请求体在分块读取的同时检查code等字段的长度，
+超长字段一结束就拒绝，不再读取剩余部分，也不解析整个请求体。
+Flask路由在before_request中调用enforce，ASGI模式的异步路由通过aread_body读取请求体，限制相同。
+"""
+import io
+import json
+import logging
+import os
+import re
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.validators import MAX_CODE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# 默认的请求体上限（字节）：MAX_CODE_LENGTH个字符在JSON中全部转义为\uXXXX时约为900KB
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+
+# 逐字段检查的长度上限（字符数），与validate_code_input一致
+FIELD_LIMITS = {
+    'code': MAX_CODE_LENGTH,
+    'code_context': MAX_CODE_LENGTH
+}
+
+# 不逐字段检查的路由：批量分析跳过超长的文件而不是拒绝整个请求
+UNCHECKED_FIELD_ROUTES = frozenset({'/api/code-analysis/batch'})
+
+# 字符串之外需要关注的字符：字符串开始和键值分隔符
+_OUTSIDE_STRING = re.compile(rb'[":]')
+
+
+class PayloadTooLarge(RequestEntityTooLarge):
+    """请求体或其中的字段超过上限"""
+
+    def __init__(self, description, limit, field=None):
+        super().__init__(description)
+        self.limit = limit
+        self.field = field
+
+
+class _BoundedStream(io.RawIOBase):
+    """读取超过上限时抛出PayloadTooLarge的输入流"""
+
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self._limit = limit
+        self._read = 0
+
+    def readable(self):
+        return True
+
+    def _count(self, data):
+        self._read += len(data)
+        if self._read > self._limit:
+            raise PayloadTooLarge(f"请求体超过{self._limit}字节", self._limit)
+        return data
+
+    def read(self, size=-1):
+        return self._count(self._stream.read(size))
+
+    def readline(self, size=-1):
+        return self._count(self._stream.readline(size))
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _FieldScanner:
+    """在分块读取JSON请求体时检查指定字段的字符串长度
+
+    只定位字符串的边界和键值分隔符，不构建任何对象；只有原始字节数超过上限的字符串才会被解码计数
+    （字符数不会多于字节数）。
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.buffer = bytearray()
+        self._pos = 0
+        self._string_start = None  # 当前字符串内容的起始位置
+        self._last_string = None  # 最近结束的字符串的(起始, 结束)位置
+        self._pending_key = None  # 刚读到的键及其分隔符的位置
+        self._value_key = None  # 当前字符串作为哪个受限字段的值
+
+    def feed(self, chunk):
+        """追加一块请求体并检查
+
+        Raises:
+            PayloadTooLarge: 受限字段的长度超过上限
+        """
+        self.buffer += chunk
+        data = self.buffer
+        while True:
+            if self._string_start is not None:
+                end = self._find_closing_quote(data, self._pos)
+                if end < 0:
+                    # 反斜杠的奇偶性向前回看整个缓冲区，下一块从当前末尾继续查找即可
+                    self._pos = len(data)
+                    return
+                self._close_string(data, end)
+                self._pos = end + 1
+            else:
+                match = _OUTSIDE_STRING.search(data, self._pos)
+                if match is None:
+                    self._pos = len(data)
+                    return
+                position = match.start()
+                if data[position] == ord(':'):
+                    if self._last_string is not None:
+                        self._pending_key = (self._decode(*self._last_string), position)
+                    self._last_string = None
+                else:
+                    self._open_string(data, position)
+                self._pos = position + 1
+
+    @staticmethod
+    def _find_closing_quote(data, start):
+        """查找未被转义的双引号，末尾是未完成的转义时等待下一块"""
+        while True:
+            end = data.find(b'"', start)
+            if end < 0:
+                return -1
+            backslashes = 0
+            while end - backslashes - 1 >= 0 and data[end - backslashes - 1] == ord('\\'):
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end
+            start = end + 1
+
+    def _open_string(self, data, position):
+        self._value_key = None
+        if self._pending_key is not None:
+            key, colon = self._pending_key
+            # 键和字符串之间只有空白时，这个字符串是该键的值
+            if key in self.limits and not bytes(data[colon + 1:position]).strip():
+                self._value_key = key
+            self._pending_key = None
+        self._string_start = position + 1
+
+    def _close_string(self, data, end):
+        start, self._string_start = self._string_start, None
+        self._last_string = (start, end)
+        key, self._value_key = self._value_key, None
+        if key is None:
+            return
+        limit = self.limits[key]
+        if end - start > limit and len(self._decode(start, end)) > limit:
+            raise PayloadTooLarge(f"字段{key}的长度超过{limit}个字符", limit, field=key)
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(b'"' + bytes(self.buffer[start:end]) + b'"')
+        except ValueError:
+            # 不合法的字符串交给JSON解析报错
+            return ''
+
+
+class RequestLimits:
+    """按路由限制请求体大小，并在读取JSON请求体时检查字段长度"""
+
+    def __init__(self, max_body_size=DEFAULT_MAX_BODY_SIZE, route_limits=None, field_limits=None,
+                 chunk_size=64 * 1024):
+        """初始化请求体限制
+
+        Args:
+            max_body_size (int): 未单独配置的路由的请求体上限（字节）
+            route_limits (dict): 路由模板到请求体上限（字节）的映射
+            field_limits (dict): 字段名到长度上限（字符数）的映射，默认为FIELD_LIMITS
+            chunk_size (int): 分块读取请求体的大小（字节）
+        """
+        self.max_body_size = max_body_size
+        self.route_limits = route_limits or {}
+        self.field_limits = FIELD_LIMITS if field_limits is None else field_limits
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_env(cls):
+        """根据环境变量创建请求体限制
+
+        读取 REQUEST_MAX_BODY_SIZE；批量分析接口的上限为BATCH_MAX_TOTAL_SIZE与
+        BATCH_MAX_UPLOAD_SIZE中较大者再加1MB。
+
+        Returns:
+            RequestLimits: 请求体限制
+        """
+        batch_limit = max(int(os.getenv('BATCH_MAX_TOTAL_SIZE', '20000000')),
+                          int(os.getenv('BATCH_MAX_UPLOAD_SIZE', '10000000'))) + 1024 * 1024
+        return cls(
+            max_body_size=int(os.getenv('REQUEST_MAX_BODY_SIZE', str(DEFAULT_MAX_BODY_SIZE))),
+            route_limits={'/api/code-analysis/batch': batch_limit}
+        )
+
+    def limit_for(self, rule):
+        """获取路由的请求体上限（字节）"""
+        return self.route_limits.get(rule, self.max_body_size)
+
+    def _check_length(self, rule, content_length):
+        """检查Content-Length，返回路由的请求体上限"""
+        limit = self.limit_for(rule)
+        if content_length is not None and content_length > limit:
+            raise PayloadTooLarge(f"请求体超过{limit}字节", limit)
+        return limit
+
+    def _needs_scan(self, rule, is_json, content_length):
+        """是否需要逐字段检查：请求体不超过字段上限时任何字段都不可能超长，省去扫描"""
+        field_limit = min(self.field_limits.values(), default=None)
+        return (
+            field_limit is not None and is_json and rule not in UNCHECKED_FIELD_ROUTES
+            and (content_length is None or content_length > field_limit)
+        )
+
+    def enforce(self, request):
+        """在路由读取请求体之前检查请求体大小
+
+        需要逐字段检查时先分块读入请求体，再换成内存中的流，路由中的get_json照常读取。
+
+        Args:
+            request (Request): Flask请求对象，请求体尚未被读取
+
+        Raises:
+            PayloadTooLarge: 请求体或字段超过上限
+        """
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        content_length = request.content_length
+        limit = self._check_length(rule, content_length)
+
+        environ = request.environ
+        if not self._needs_scan(rule, request.is_json, content_length):
+            if content_length is None:
+                environ['wsgi.input'] = _BoundedStream(environ['wsgi.input'], limit)
+            return
+        if content_length is None and not environ.get('wsgi.input_terminated'):
+            # 既没有Content-Length也不是分块传输，没有请求体
+            return
+
+        scanner = _FieldScanner(self.field_limits)
+        stream = environ['wsgi.input']
+        remaining = content_length if content_length is not None else limit + 1
+        while remaining > 0:
+            chunk = stream.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if len(scanner.buffer) + len(chunk) > limit:
+                raise PayloadTooLarge(f"请求体超过{limit}字节", limit)
+            scanner.feed(chunk)
+        environ['wsgi.input'] = io.BytesIO(bytes(scanner.buffer))
+        environ['wsgi.input_terminated'] = True
+
+    async def aread_body(self, request):
+        """ASGI模式下读取请求体，限制与enforce相同
+
+        Content-Length超过路由上限时不读取请求体；否则边接收边检查总大小，
+        需要时同时检查字段长度，超过上限时立即停止接收。
+
+        Args:
+            request (starlette.requests.Request): 请求，请求体尚未被读取
+
+        Returns:
+            bytes: 请求体
+
+        Raises:
+            PayloadTooLarge: 请求体或字段超过上限
+        """
+        route = request.scope.get('route')
+        rule = route.path if route is not None else request.url.path
+        header = request.headers.get('content-length')
+        content_length = int(header) if header is not None and header.isdigit() else None
+        limit = self._check_length(rule, content_length)
+
+        mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+        is_json = mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+        scanner = _FieldScanner(self.field_limits) if self._needs_scan(rule, is_json, content_length) else None
+        body = scanner.buffer if scanner is not None else bytearray()
+        async for chunk in request.stream():
+            if len(body) + len(chunk) > limit:
+                raise PayloadTooLarge(f"请求体超过{limit}字节", limit)
+            if scanner is not None:
+                scanner.feed(chunk)
+            else:
+                body += chunk
+        return bytes(body)
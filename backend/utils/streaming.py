@@ -0,0 +1,113 @@
+import json
+import logging
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+# 流式输出格式：Server-Sent Events或每行一个JSON对象
+STREAM_SSE = 'sse'
+STREAM_NDJSON = 'ndjson'
+
+STREAM_MIMETYPES = {
+    STREAM_SSE: 'text/event-stream',
+    STREAM_NDJSON: 'application/x-ndjson'
+}
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # 禁止Nginx等反向代理缓冲响应，否则客户端仍要等到全部内容生成后才能收到
+    'X-Accel-Buffering': 'no'
+}
+
+
+def get_stream_format(data, accept_header=''):
+    """根据请求参数判断客户端要求的流式输出格式
+
+    请求体中stream为true或"sse"、或Accept头包含text/event-stream时使用SSE，
+    stream为"ndjson"时使用每行一个JSON对象的分块输出。
+
+    Args:
+        data (dict): 请求体
+        accept_header (str): 请求的Accept头
+
+    Returns:
+        str: sse或ndjson，不需要流式输出时返回None
+    """
+    stream = data.get('stream')
+    if isinstance(stream, str):
+        stream = stream.lower()
+        if stream == STREAM_NDJSON:
+            return STREAM_NDJSON
+        if stream in (STREAM_SSE, 'true'):
+            return STREAM_SSE
+    elif stream:
+        return STREAM_SSE
+    if 'text/event-stream' in (accept_header or ''):
+        return STREAM_SSE
+    return None
+
+
+def format_event(event, data, stream_format=STREAM_SSE):
+    """把一个事件编码为流式输出的一段文本
+
+    Args:
+        event (str): 事件名称
+        data (dict): 事件数据
+        stream_format (str): sse或ndjson
+
+    Returns:
+        str: 编码后的文本
+    """
+    if stream_format == STREAM_NDJSON:
+        return json.dumps(dict(data, event=event), ensure_ascii=False) + '\n'
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_response(events, stream_format=STREAM_SSE, request_id=None):
+    """把事件生成器包装为流式HTTP响应
+
+    响应开始时立即发送start事件，客户端不需要等待上游返回第一个片段就能确认请求已被接受；
+    生成器抛出的异常会被转换为error事件，而不是中断连接。
+
+    Args:
+        events (iterable): (事件名称, 事件数据)的生成器
+        stream_format (str): sse或ndjson
+        request_id (str): 请求ID，包含在start事件中
+
+    Returns:
+        Response: 流式响应
+    """
+    def generate():
+        yield format_event('start', {'request_id': request_id}, stream_format)
+        try:
+            for event, data in events:
+                yield format_event(event, data, stream_format)
+        except Exception as e:
+            logger.error("[%s] 流式输出过程中发生错误: %s", request_id, e, exc_info=True)
+            yield format_event('error', {'error': '处理请求时发生错误'}, stream_format)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_MIMETYPES[stream_format],
+        headers=STREAM_HEADERS
+    )
+
+
+async def aiter_stream(events, stream_format=STREAM_SSE, request_id=None):
+    """stream_response的异步版本，把异步事件生成器编码为流式输出的文本片段
+
+    Args:
+        events (async iterable): (事件名称, 事件数据)的异步生成器
+        stream_format (str): sse或ndjson
+        request_id (str): 请求ID，包含在start事件中
+
+    Yields:
+        str: 编码后的文本
+    """
+    yield format_event('start', {'request_id': request_id}, stream_format)
+    try:
+        async for event, data in events:
+            yield format_event(event, data, stream_format)
+    except Exception as e:
+        logger.error("[%s] 流式输出过程中发生错误: %s", request_id, e, exc_info=True)
+        yield format_event('error', {'error': '处理请求时发生错误'}, stream_format)
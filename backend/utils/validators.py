@@ -1,6 +1,8 @@
 import logging
 import re
 from typing import Dict, Any, List, Tuple
+from utils.metrics import timed_stage
+from utils.language_detector import get_language_detector
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,7 @@ LANGUAGE_EXTENSIONS = {
     'sql': ['.sql']
 }
 
+@timed_stage('validation')
 def validate_code_input(data: Dict[str, Any]) -> Dict[str, Any]:
     """验证代码输入数据
     
@@ -63,26 +66,31 @@ def validate_code_input(data: Dict[str, Any]) -> Dict[str, Any]:
     # 检查语言参数是否有效（如果提供）
     if 'language' in data and data['language']:
         if data['language'] not in SUPPORTED_LANGUAGES:
-            logger.warning(f"不支持的语言: {data['language']}")
+            logger.warning("不支持的语言: %s", data['language'])
             validation_errors.append(
                 f"不支持的语言: {data['language']}。支持的语言包括: {', '.join(SUPPORTED_LANGUAGES)}"
             )
     else:
         # 如果未提供语言，尝试从文件扩展名或代码内容推断
-        if 'filename' in data and data['filename']:
+        if 'filename' in data and data['filename'] and is_supported_filename(data['filename']):
             data['language'] = detect_language_from_filename(data['filename'])
-            logger.info(f"从文件名推断语言: {data['language']}")
+            logger.info("从文件名推断语言: %s", data['language'])
+        elif data['code'] and isinstance(data['code'], str):
+            detected = get_language_detector().detect(data['code'])
+            if detected:
+                data['language'] = detected
+                logger.info("从代码内容推断语言: %s", detected)
     
     # 检查代码长度是否在合理范围内
     if 'code' in data and len(data['code']) > MAX_CODE_LENGTH:
-        logger.warning(f"代码长度超过限制: {len(data['code'])} > {MAX_CODE_LENGTH}")
+        logger.warning("代码长度超过限制: %s > %s", len(data['code']), MAX_CODE_LENGTH)
         validation_errors.append(
             f"代码长度超过限制，请提供不超过{MAX_CODE_LENGTH//1000}K字符的代码片段"
         )
     
     # 检查上下文参数（如果提供）
     if 'context' in data and data['context'] and len(data['context']) > MAX_CODE_LENGTH:
-        logger.warning(f"上下文长度超过限制: {len(data['context'])} > {MAX_CODE_LENGTH}")
+        logger.warning("上下文长度超过限制: %s > %s", len(data['context']), MAX_CODE_LENGTH)
         validation_errors.append(
             f"上下文长度超过限制，请提供不超过{MAX_CODE_LENGTH//1000}K字符的上下文"
         )
@@ -122,4 +130,37 @@ def detect_language_from_filename(filename: str) -> str:
             return language
     
     # 无法确定语言时的默认值
-    return 'python'
\ No newline at end of file
+    return 'python'
+
+def is_supported_filename(filename: str) -> bool:
+    """检查文件名的扩展名是否属于支持的语言
+    
+    Args:
+        filename (str): 文件名或文件路径
+        
+    Returns:
+        bool: 扩展名属于支持的语言时返回True
+    """
+    if not filename or '.' not in filename.rsplit('/', 1)[-1]:
+        return False
+    extension = '.' + filename.split('.')[-1].lower()
+    return any(extension in extensions for extensions in LANGUAGE_EXTENSIONS.values())
+
+def detect_language(code: str, filename: str = None, default: str = 'python') -> str:
+    """推断代码的编程语言
+
+    优先使用文件扩展名，没有文件名或扩展名无法识别时根据代码内容推断。
+
+    Args:
+        code (str): 代码
+        filename (str): 文件名或文件路径
+        default (str): 都无法推断时返回的语言
+
+    Returns:
+        str: 推断的编程语言
+    """
+    if is_supported_filename(filename):
+        return detect_language_from_filename(filename)
+    if isinstance(code, str):
+        return get_language_detector().detect(code) or default
+    return default
\ No newline at end of file